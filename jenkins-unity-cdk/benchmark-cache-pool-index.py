@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Cache pool index benchmark
+Compares cache set lookups on a local DynamoDB stand-in: the AZ-Status-Index
+query that filters by partition after the read, and the allocate Lambda's
+one-item Pool-Index queries. Seeds a cache pool table with both indexes, then
+runs bursts of allocations in one AZ from concurrent workers, each with its own
+copy of the allocate Lambda (as concurrent Lambda invocations have).
+
+  run     benchmark the strategies and append results to a JSON Lines file
+  report  compare recorded results
+
+The stand-in is DynamoDB Local (--endpoint-url http://localhost:8000, e.g.
+`docker run -p 8000:8000 amazon/dynamodb-local`), or moto in-process when no
+endpoint is given. Neither throttles hot partitions: compare reads per
+allocation and the share of queries on the busiest key, not absolute latency.
+moto does not serialize concurrent conditional writes, so rare double claims of
+pool-index under moto are the stand-in's; DynamoDB Local does serialize them.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import queue
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import boto3
+
+from benchmarks.pool_index import STRATEGIES, load_results, render_report, summarize
+
+TABLE_NAME = "cache-pool-index-benchmark"
+ALLOCATE_LAMBDA = Path(__file__).parent / "lambda_functions" / "allocate_cache_volume" / "lambda_function.py"
+LAMBDA_LAYERS = sorted((Path(__file__).parent / "lambda_layers").glob("*/python"))
+# The pool Lambdas' layers: the allocate Lambda imports them, the seeding writes their Pool-Index keys
+sys.path[:0] = [str(layer) for layer in LAMBDA_LAYERS]
+
+import cache_sets  # noqa: E402
+
+
+def create_table(dynamodb):
+    """The cache pool table of the storage stack, with both indexes."""
+    index_projection = {'ProjectionType': 'ALL'}
+    dynamodb.create_table(
+        TableName=TABLE_NAME,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[
+            {'AttributeName': 'VolumeId', 'AttributeType': 'S'},
+            {'AttributeName': 'AvailabilityZone', 'AttributeType': 'S'},
+            {'AttributeName': 'Status', 'AttributeType': 'S'},
+            {'AttributeName': 'PoolKey', 'AttributeType': 'S'},
+            {'AttributeName': 'LastUsed', 'AttributeType': 'N'},
+        ],
+        KeySchema=[{'AttributeName': 'VolumeId', 'KeyType': 'HASH'}],
+        GlobalSecondaryIndexes=[
+            {
+                'IndexName': 'AZ-Status-Index',
+                'KeySchema': [
+                    {'AttributeName': 'AvailabilityZone', 'KeyType': 'HASH'},
+                    {'AttributeName': 'Status', 'KeyType': 'RANGE'},
+                ],
+                'Projection': index_projection,
+            },
+            {
+                'IndexName': 'Pool-Index',
+                'KeySchema': [
+                    {'AttributeName': 'PoolKey', 'KeyType': 'HASH'},
+                    {'AttributeName': 'LastUsed', 'KeyType': 'RANGE'},
+                ],
+                'Projection': index_projection,
+            },
+        ],
+    )
+    dynamodb.get_waiter('table_exists').wait(TableName=TABLE_NAME)
+
+
+def seed_pool(table, args, shards):
+    """Write the pool: sets spread over AZs and partitions, a share of them Available."""
+    now = int(time.time())
+    projects = [f"unity-game-{index}" for index in range(args.projects)]
+    # Same pool on every seeding, independent of the AZ and partition spread
+    rng = random.Random(args.volumes)
+    cache_sets.INDEX_SHARDS = shards
+    with table.batch_writer() as batch:
+        for index in range(args.volumes):
+            volume_id = f"vol-{index:017x}"
+            zone = args.zones[index % len(args.zones)]
+            project_id = projects[(index // len(args.zones)) % len(projects)]
+            item = {
+                'VolumeId': volume_id,
+                'VolumeIds': [volume_id],
+                'StripeWidth': 1,
+                'Status': 'Available' if rng.random() < args.available_ratio else 'InUse',
+                'AvailabilityZone': zone,
+                'ProjectId': project_id,
+                'LastUsed': now - index,
+            }
+            if item['Status'] == 'Available':
+                # As the pool Lambdas write it
+                item['PoolKey'] = cache_sets.available_pool_key(item)
+            batch.put_item(Item=item)
+    return projects
+
+
+def load_allocate_lambda(shards):
+    """A fresh copy of the allocate Lambda module, as one Lambda execution environment has."""
+    spec = importlib.util.spec_from_file_location("allocate_cache_volume", ALLOCATE_LAMBDA)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # The copies share one cache_sets layer module
+    cache_sets.INDEX_SHARDS = shards
+    return module
+
+
+class Worker:
+    """One concurrent allocator with its own clients; counts its queries and reads."""
+
+    def __init__(self, strategy, shards):
+        self.strategy = strategy
+        self.allocate = load_allocate_lambda(shards)
+        self.table = self.allocate.dynamodb.Table(TABLE_NAME)
+        self.queries = 0
+        self.items_read = 0
+        self.keys = {}
+        events = self.allocate.dynamodb.meta.client.meta.events
+        events.register('provide-client-params.dynamodb.Query', self._count_query)
+        events.register('after-call.dynamodb.Query', self._count_reads)
+
+    def _count_query(self, params, **kwargs):
+        values = params.get('ExpressionAttributeValues', {})
+        key = values.get(':pool_key') or values.get(':az')
+        key = key.get('S') if isinstance(key, dict) else key
+        self.queries += 1
+        self.keys[key] = self.keys.get(key, 0) + 1
+
+    def _count_reads(self, parsed, **kwargs):
+        self.items_read += parsed.get('ScannedCount', 0)
+
+    def allocate_set(self, zone, project_id, instance_id):
+        if self.strategy == 'pool-index':
+            item = self.allocate.claim_available_volume(zone, project_id, 1, instance_id)
+            return item['VolumeId'] if item else None
+        return self._allocate_az_status(zone, project_id, instance_id)
+
+    def _allocate_az_status(self, zone, project_id, instance_id):
+        """Allocation before Pool-Index: read the AZ's Available sets, filter, mark the first InUse."""
+        response = self.table.query(
+            IndexName='AZ-Status-Index',
+            KeyConditionExpression='AvailabilityZone = :az AND #status = :status',
+            ExpressionAttributeNames={'#status': 'Status'},
+            ExpressionAttributeValues={':az': zone, ':status': 'Available', ':project_id': project_id},
+            FilterExpression='ProjectId = :project_id'
+        )
+        for item in response['Items']:
+            if len(item.get('VolumeIds') or [item['VolumeId']]) == 1:
+                self.table.update_item(
+                    Key={'VolumeId': item['VolumeId']},
+                    UpdateExpression='SET #status = :status, LastUsed = :last_used, InstanceId = :instance_id '
+                                     'REMOVE PoolKey',
+                    ExpressionAttributeNames={'#status': 'Status'},
+                    ExpressionAttributeValues={':status': 'InUse', ':last_used': int(time.time()),
+                                               ':instance_id': instance_id}
+                )
+                return item['VolumeId']
+        return None
+
+
+def run_burst(args, strategy, shards, concurrency, run, projects):
+    """Allocations in the first AZ from concurrent workers; one result record."""
+    # Workers load the Lambda before the clock starts; each serves one allocation at a time
+    workers = [Worker(strategy, shards) for _ in range(concurrency)]
+    idle = queue.Queue()
+    for worker in workers:
+        idle.put(worker)
+    
+    def allocate(index):
+        worker = idle.get()
+        try:
+            start = time.perf_counter()
+            volume_id = worker.allocate_set(args.zones[0], projects[index % len(projects)], f"i-{index:017x}")
+            return volume_id, (time.perf_counter() - start) * 1000
+        finally:
+            idle.put(worker)
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(allocate, range(args.allocations)))
+        seconds = time.perf_counter() - start
+    
+    claimed = [volume_id for volume_id, _ in results if volume_id]
+    keys = {}
+    for worker in workers:
+        for key, count in worker.keys.items():
+            keys[key] = keys.get(key, 0) + count
+    queries = sum(worker.queries for worker in workers)
+    return {
+        'strategy': strategy,
+        'shards': shards,
+        'concurrency': concurrency,
+        'run': run,
+        'volumes': args.volumes,
+        'allocations': args.allocations,
+        'claimed': len(claimed),
+        'double_claims': len(claimed) - len(set(claimed)),
+        'seconds': seconds,
+        'latencies_ms': [latency for _, latency in results],
+        'queries': queries,
+        'items_read': sum(worker.items_read for worker in workers),
+        'hottest_key_share': max(keys.values()) / queries if queries else 0.0,
+    }
+
+
+def run_benchmark(args):
+    os.environ['CACHE_POOL_TABLE'] = TABLE_NAME
+    os.environ.setdefault('AWS_DEFAULT_REGION', args.region)
+    if args.endpoint_url:
+        # DynamoDB Local takes any credentials
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = args.endpoint_url
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+        backend = f"DynamoDB Local at {args.endpoint_url}"
+        mock = None
+    else:
+        from moto import mock_aws
+        os.environ.update(AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing')
+        backend = "moto"
+        mock = mock_aws()
+        mock.start()
+
+    try:
+        dynamodb = boto3.client('dynamodb')
+        if TABLE_NAME in dynamodb.list_tables()['TableNames']:
+            dynamodb.delete_table(TableName=TABLE_NAME)
+            dynamodb.get_waiter('table_not_exists').wait(TableName=TABLE_NAME)
+        create_table(dynamodb)
+        table = boto3.resource('dynamodb').Table(TABLE_NAME)
+
+        for run in range(1, args.runs + 1):
+            for concurrency in args.concurrency:
+                for strategy in args.strategies:
+                    for shards in (args.shards if strategy == 'pool-index' else [1]):
+                        # Every burst starts from the same pool
+                        projects = seed_pool(table, args, shards)
+                        record = run_burst(args, strategy, shards, concurrency, run, projects)
+                        record['backend'] = backend
+                        with open(args.results, 'a') as f:
+                            f.write(json.dumps(record) + "\n")
+                        print(f"📊 {strategy} shards={shards} concurrency={concurrency} run {run}: "
+                              f"{record['allocations'] / record['seconds']:.1f} allocations/s, "
+                              f"{record['items_read'] / record['allocations']:.1f} items read each")
+    finally:
+        if mock:
+            mock.stop()
+
+    report(args)
+
+
+def report(args):
+    records = [record for record in load_results(args.results) if record.get('volumes') == args.volumes]
+    if not records:
+        raise SystemExit(f"No results for {args.volumes} cache sets in {args.results}")
+
+    with open(args.report, 'w') as f:
+        f.write(render_report(summarize(records), args.volumes, records[-1].get('backend', '-')))
+    print(f"✅ Wrote {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cache pool lookups on a local DynamoDB stand-in')
+    parser.add_argument('action', choices=['run', 'report'], help='Run benchmarks or report on recorded results')
+    parser.add_argument('--endpoint-url', help='DynamoDB Local endpoint (default: moto in-process)')
+    parser.add_argument('--volumes', type=int, default=2000, help='Cache sets in the pool')
+    parser.add_argument('--zones', nargs='+', default=['us-east-1a', 'us-east-1b', 'us-east-1c'],
+                        help='AZs of the pool; allocations go to the first')
+    parser.add_argument('--projects', type=int, default=4, help='Cache partitions')
+    parser.add_argument('--available-ratio', type=float, default=0.5, help='Share of the sets that are Available')
+    parser.add_argument('--allocations', type=int, default=200, help='Allocations per burst')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32], help='Concurrent allocators')
+    parser.add_argument('--strategies', nargs='+', choices=STRATEGIES, default=STRATEGIES, help='Lookups to measure')
+    parser.add_argument('--shards', nargs='+', type=int, default=[1, 4], help='Pool-Index write shards to measure')
+    parser.add_argument('--runs', type=int, default=2, help='Runs of each configuration')
+    parser.add_argument('--results', default='pool-index-results.jsonl', help='Recorded results (JSON Lines)')
+    parser.add_argument('--report', default='pool-index-report.md', help='Markdown report output')
+    parser.add_argument('--region', default='us-east-1', help='AWS region of the stand-in')
+
+    args = parser.parse_args()
+
+    if args.action == 'run':
+        if not 0 < args.available_ratio <= 1:
+            parser.error('--available-ratio must be in (0, 1]')
+        run_benchmark(args)
+    else:
+        report(args)
+
+
+if __name__ == "__main__":
+    main()
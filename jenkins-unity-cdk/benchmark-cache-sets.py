@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Jenkins Agent cache set benchmark
+Measures striped cache sets against a single cache volume. Launches one agent
+from the pool's launch template, then for each stripe width creates that many
+volumes with the pool's cache volume profile, stripes them with md RAID0 like
+manage-cache-volume.sh does, and runs fio (sequential read, random read/write)
+and, with a reference project, a cold and warm Unity Library import on the set.
+
+  run     benchmark stripe widths and append results to a JSON Lines file
+  report  compare recorded results against a single volume (no AWS access needed)
+"""
+
+import argparse
+import json
+
+import aws_cdk as cdk
+
+from benchmarks.cache_sets import load_results, render_report, summarize
+from benchmarks.driver import BenchmarkDriver, bench_records
+from stacks.config_loader import ConfigLoader
+
+# Benchmark volumes attach after the agent's own cache set (/dev/sdf../dev/sdm)
+BENCHMARK_DEVICES = ["/dev/sdp", "/dev/sdq", "/dev/sdr", "/dev/sds", "/dev/sdt", "/dev/sdu", "/dev/sdv", "/dev/sdw"]
+
+# Runs on the instance through SSM; prints one "BENCH <json>" line per test
+BENCHMARK_SCRIPT = r"""
+set -u
+UNITY=/opt/unity/Editor/Unity
+WORK=/opt/cache-benchmark
+BENCH=/mnt/cache-benchmark
+DEVICES=(/dev/sdp /dev/sdq /dev/sdr /dev/sds /dev/sdt /dev/sdu /dev/sdv /dev/sdw)
+MEMBERS=("${DEVICES[@]:0:$WIDTH}")
+rm -rf "$WORK" && mkdir -p "$WORK" "$BENCH"
+yum install -y -q fio mdadm > /dev/null
+
+for device in "${MEMBERS[@]}"; do
+    for i in $(seq 1 30); do
+        [ -e "$device" ] && break
+        sleep 1
+    done
+done
+
+# Same layout as the agent: md RAID0 over the set, ext4 on top
+if [ "$WIDTH" -gt 1 ]; then
+    mdadm --create /dev/md/cache-benchmark --run --level=0 --chunk=256 --raid-devices="$WIDTH" "${MEMBERS[@]}"
+    DEVICE=/dev/md/cache-benchmark
+else
+    DEVICE=${MEMBERS[0]}
+fi
+mkfs.ext4 -q -F "$DEVICE"
+mount "$DEVICE" "$BENCH"
+
+# bench <run> <test> <exit_code> <seconds> <mb_per_s> <ops_per_s>
+bench() {
+    printf 'BENCH {"stripe_width": %d, "run": %d, "test": "%s", "exit_code": %d, "seconds": %.1f, "mb_per_s": %.1f, "ops_per_s": %.1f}\n' \
+        "$WIDTH" "$1" "$2" "$3" "$4" "$5" "$6"
+}
+
+# run_fio <run> <test> <rw> <block size>
+run_fio() {
+    local exit_code=0
+    fio --name="$2" --directory="$BENCH" --rw="$3" --bs="$4" --direct=1 --ioengine=libaio \
+        --iodepth=32 --numjobs=4 --size=4G --runtime=60 --time_based --group_reporting \
+        --output-format=json > "$WORK/fio.json" 2> /dev/null || exit_code=$?
+    rm -f "$BENCH/$2".*
+    read -r seconds mb_per_s ops_per_s < <(python3 - "$WORK/fio.json" << 'PY'
+import json, sys
+try:
+    job = json.load(open(sys.argv[1]))["jobs"][0]
+    io = job["read"] if job["read"]["io_bytes"] else job["write"]
+    print(job["job_runtime"] / 1000, io["bw"] / 1024, io["iops"])
+except (ValueError, KeyError, IndexError):
+    print(0, 0, 0)
+PY
+)
+    bench "$1" "$2" "$exit_code" "$seconds" "$mb_per_s" "$ops_per_s"
+}
+
+# run_import <run> <test>: open the project in batch mode, Library on the set
+run_import() {
+    local start end exit_code=0
+    start=$(date +%s.%N)
+    "$UNITY" -batchmode -nographics -quit -projectPath "$BENCH/project" -logFile "$WORK/import.log" > /dev/null 2>&1 || exit_code=$?
+    end=$(date +%s.%N)
+    bench "$1" "$2" "$exit_code" "$(awk -v start="$start" -v end="$end" 'BEGIN { print end - start }')" 0 0
+}
+
+if [ -n "$BUCKET" ]; then
+    mkdir -p "$BENCH/project"
+    aws s3 cp "s3://$BUCKET/$PREFIX/project.tar.gz" - | tar -xz -C "$BENCH/project"
+    [ -x /opt/activate-unity-license.sh ] && /opt/activate-unity-license.sh
+fi
+
+for run in $(seq 1 "$RUNS"); do
+    run_fio "$run" seq_read read 1M
+    run_fio "$run" rand_read randread 16k
+    run_fio "$run" rand_write randwrite 16k
+    if [ -n "$BUCKET" ]; then
+        rm -rf "$BENCH/project/Library" "$BENCH/project/Temp"
+        run_import "$run" import_cold
+        run_import "$run" import_warm
+    fi
+done
+
+umount "$BENCH"
+[ "$WIDTH" -gt 1 ] && mdadm --stop /dev/md/cache-benchmark
+exit 0
+"""
+
+
+class CacheSetBenchmark(BenchmarkDriver):
+    def __init__(self, region, launch_template, subnet_id, bucket, prefix):
+        super().__init__(region, launch_template, subnet_id, bucket, prefix, 'CacheSetBenchmark')
+
+    def upload_project(self, project_archive):
+        """Upload the reference project."""
+        self.upload(project_archive, "project.tar.gz")
+        print(f"✅ Uploaded reference project to s3://{self.bucket}/{self.prefix}/")
+
+    def attach_set(self, instance_id, availability_zone, profile, stripe_width):
+        """Create and attach a cache set of fresh volumes outside the cache pool."""
+        volume_ids = self.attach_volumes(instance_id, availability_zone, profile,
+                                         BENCHMARK_DEVICES[:stripe_width], 'jenkins-agent-cache-set-benchmark')
+        print(f"💾 Attached {stripe_width} volume(s): {', '.join(volume_ids)}")
+        return volume_ids
+
+    def delete_set(self, instance_id, volume_ids):
+        """Detach and delete the benchmark volumes."""
+        self.delete_volumes(instance_id, volume_ids)
+        print(f"🗑️  Deleted {', '.join(volume_ids)}")
+
+    def run(self, instance_id, stripe_width, runs, with_import):
+        """Run the benchmark tests on the attached set and return the recorded results."""
+        env = {
+            'WIDTH': str(stripe_width),
+            'RUNS': str(runs),
+            'BUCKET': self.bucket if with_import else '',
+            'PREFIX': self.prefix,
+        }
+        status, output = self.run_script(instance_id, env, BENCHMARK_SCRIPT,
+                                         f'Cache set benchmark, {stripe_width} volume(s)')
+        records = bench_records(output)
+        print(f"📊 {stripe_width} volume(s): {status}, {len(records)} test results")
+        return records
+
+
+def load_profile(args):
+    """Cache volume profile of the agent pool being sized."""
+    config = ConfigLoader(cdk.App(context={"config_file": args.config})).load_config()
+    for pool in config["jenkins_agents"]["pools"]:
+        if pool["name"] == args.pool:
+            return config, pool
+    raise SystemExit(f"Unknown agent pool: {args.pool}")
+
+
+def run_benchmark(args):
+    config, pool = load_profile(args)
+    profile = pool["cache"]
+    benchmark = CacheSetBenchmark(args.region or config["aws_region"],
+                                  args.launch_template or f"unity-cicd-jenkins-agent-lt-{pool['name']}",
+                                  args.subnet_id, args.bucket, args.prefix)
+    with_import = bool(args.project_archive)
+    if with_import:
+        benchmark.upload_project(args.project_archive)
+
+    # Always measure the single volume the sets are compared against
+    stripe_widths = sorted({1, *(args.stripe_widths or [profile["stripe_width"], 2])})
+
+    instance_id = None
+    try:
+        instance_id, availability_zone = benchmark.launch(args.instance_type, 'jenkins-agent-cache-set-benchmark')
+        benchmark.wait_for_ssm(instance_id)
+        for stripe_width in stripe_widths:
+            volume_ids = benchmark.attach_set(instance_id, availability_zone, profile, stripe_width)
+            try:
+                records = benchmark.run(instance_id, stripe_width, args.runs, with_import)
+            finally:
+                benchmark.delete_set(instance_id, volume_ids)
+            with open(args.results, 'a') as f:
+                for record in records:
+                    record.update(
+                        pool=pool["name"],
+                        instance_type=args.instance_type,
+                        **{key: profile[key] for key in ("volume_type", "volume_size", "iops", "throughput")},
+                    )
+                    f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"❌ Cache set benchmark failed: {e}")
+    finally:
+        if instance_id:
+            benchmark.terminate(instance_id)
+
+    report(args)
+
+
+def report(args):
+    records = [record for record in load_results(args.results) if record.get('pool', args.pool) == args.pool]
+    if not records:
+        raise SystemExit(f"No results for pool {args.pool} in {args.results}")
+
+    profile = {key: records[-1][key] for key in ("volume_type", "volume_size", "iops", "throughput")}
+    with open(args.report, 'w') as f:
+        f.write(render_report(summarize(records), profile))
+    print(f"✅ Wrote {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark striped cache sets against a single cache volume')
+    parser.add_argument('action', choices=['run', 'report'], help='Run benchmarks or report on recorded results')
+    parser.add_argument('--config', default='default', help='Config file name (config/<name>.yaml)')
+    parser.add_argument('--pool', default='linux', help='Agent pool whose cache volume profile is benchmarked')
+    parser.add_argument('--stripe-widths', type=int, nargs='+',
+                        help='Volumes per set to compare (default: 1, 2 and the pool stripe_width)')
+    parser.add_argument('--runs', type=int, default=3, help='Runs of each test per stripe width')
+    parser.add_argument('--instance-type', default='c6i.4xlarge',
+                        help='Benchmark instance; its EBS bandwidth caps what a set can reach')
+    parser.add_argument('--results', default='cache-set-results.jsonl', help='Recorded results (JSON Lines)')
+    parser.add_argument('--report', default='cache-set-report.md', help='Markdown report output')
+    parser.add_argument('--project-archive', help='Reference Unity project (.tar.gz) for the import tests')
+    parser.add_argument('--bucket', help='S3 bucket for the reference project (e.g. the build-artifacts bucket)')
+    parser.add_argument('--prefix', default='cache-set-benchmark', help='S3 key prefix')
+    parser.add_argument('--launch-template', help='Agent launch template (default: the pool\'s)')
+    parser.add_argument('--subnet-id', help='Private subnet of the agent VPC')
+    parser.add_argument('--region', help='AWS region')
+
+    args = parser.parse_args()
+
+    if args.action == 'run':
+        if not args.subnet_id:
+            parser.error('run requires --subnet-id')
+        if args.project_archive and not args.bucket:
+            parser.error('--project-archive requires --bucket')
+        if args.stripe_widths and max(args.stripe_widths) > len(BENCHMARK_DEVICES):
+            parser.error(f'at most {len(BENCHMARK_DEVICES)} volumes per set')
+        run_benchmark(args)
+    else:
+        report(args)
+
+
+if __name__ == "__main__":
+    main()
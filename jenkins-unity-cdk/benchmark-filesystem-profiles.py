@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Jenkins Agent cache filesystem profile benchmark
+Replays a recorded Unity Library access pattern with fio on every profile in
+config/filesystem_profiles.yaml and reports the fastest profile per instance type.
+
+  record  convert an strace of a Unity import into a Library trace (fio iolog + file sizes)
+  run     launch each instance type with a cache volume of the pool's profile, format it
+          with every filesystem profile, lay out the traced files and replay the trace
+  report  rank recorded results (no AWS access needed)
+
+Record the strace on an agent, in the project being sized:
+
+    strace -f -y -e trace=openat,read,pread64,write,pwrite64,lseek,close \\
+        -o library.strace /opt/unity/Editor/Unity -batchmode -nographics -quit -projectPath .
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import aws_cdk as cdk
+import yaml
+
+from benchmarks.driver import BenchmarkDriver, bench_records
+from benchmarks.filesystem_profiles import (
+    file_sizes,
+    load_results,
+    parse_strace,
+    render_report,
+    summarize,
+    to_iolog,
+)
+from stacks.config_loader import ConfigLoader
+
+ROOT = Path(__file__).parent
+PROFILES_PATH = ROOT / "config" / "filesystem_profiles.yaml"
+TABLE_PATH = ROOT / "config" / "instance_performance.yaml"
+
+# Benchmark volume attaches after the agent's own cache set (/dev/sdf../dev/sdm)
+BENCHMARK_DEVICE = "/dev/sdp"
+
+# Runs on the instance through SSM; prints one "BENCH <json>" line per phase
+BENCHMARK_SCRIPT = r"""
+set -u
+WORK=/opt/fs-benchmark
+BENCH=/mnt/fs-benchmark
+rm -rf "$WORK" && mkdir -p "$WORK" "$BENCH"
+yum install -y -q fio xfsprogs e2fsprogs > /dev/null
+aws s3 cp "s3://$BUCKET/$PREFIX/library.iolog" "$WORK/library.iolog" > /dev/null
+aws s3 cp "s3://$BUCKET/$PREFIX/library.files" "$WORK/library.files" > /dev/null
+for i in $(seq 1 30); do
+    [ -e "$DEVICE" ] && break
+    sleep 1
+done
+DISK=$(basename "$(readlink -f "$DEVICE")")
+
+# bench <profile> <run> <phase> <exit_code> <seconds>
+bench() {
+    printf 'BENCH {"instance_type": "%s", "profile": "%s", "run": %d, "phase": "%s", "exit_code": %d, "seconds": %.1f}\n' \
+        "$INSTANCE_TYPE" "$1" "$2" "$3" "$4" "$5"
+}
+
+# timed <profile> <run> <phase> <command...>
+timed() {
+    local profile=$1 run=$2 phase=$3 start end exit_code=0
+    shift 3
+    start=$(date +%s.%N)
+    "$@" > "$WORK/$phase.log" 2>&1 || exit_code=$?
+    sync
+    end=$(date +%s.%N)
+    bench "$profile" "$run" "$phase" "$exit_code" "$(awk -v start="$start" -v end="$end" 'BEGIN { print end - start }')"
+}
+
+drop_caches() {
+    sync
+    echo 3 > /proc/sys/vm/drop_caches
+}
+
+# Write every traced file at its traced size; what a cold import writes
+populate() {
+    python3 - "$WORK/library.files" << 'PY'
+import os, sys
+block = os.urandom(1 << 20)
+for line in open(sys.argv[1]):
+    size, path = line.rstrip("\n").split("\t", 1)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        remaining = int(size)
+        while remaining > 0:
+            remaining -= f.write(block[:min(remaining, len(block))])
+PY
+}
+
+replay() {
+    fio --name=replay --read_iolog="$WORK/library.iolog" --ioengine=psync --replay_no_stall=1
+}
+
+# Profiles arrive as "name|fs|mkfs_options|mount_options|readahead_kb|scheduler" lines on fd 3
+while IFS='|' read -r -u 3 name fs mkfs_options mount_options readahead_kb scheduler; do
+    umount "$BENCH" 2> /dev/null
+    wipefs -a -q "$DEVICE"
+    if [ "$fs" = "xfs" ]; then
+        mkfs.xfs -f -q $mkfs_options "$DEVICE" || { bench "$name" 1 populate 1 0; continue; }
+    else
+        mkfs.ext4 -F -q $mkfs_options "$DEVICE" || { bench "$name" 1 populate 1 0; continue; }
+    fi
+    blockdev --setra $((readahead_kb * 2)) "$DEVICE"
+    echo "$scheduler" > "/sys/block/$DISK/queue/scheduler"
+    mount -o "$mount_options" "$DEVICE" "$BENCH" || { bench "$name" 1 populate 1 0; continue; }
+
+    cd "$BENCH"
+    for run in $(seq 1 "$RUNS"); do
+        rm -rf "$BENCH/Library"
+        drop_caches
+        timed "$name" "$run" populate populate
+        drop_caches
+        timed "$name" "$run" replay replay
+    done
+    cd /
+done 3< <(echo "$PROFILES" | tr ';' '\n')
+
+umount "$BENCH"
+exit 0
+"""
+
+
+class FilesystemBenchmark(BenchmarkDriver):
+    def __init__(self, region, launch_template, subnet_id, bucket, prefix):
+        super().__init__(region, launch_template, subnet_id, bucket, prefix, 'FilesystemBenchmark')
+
+    def upload_trace(self, trace):
+        """Upload the Library trace."""
+        for suffix in ("iolog", "files"):
+            self.upload(f"{trace}.{suffix}", f"library.{suffix}")
+        print(f"✅ Uploaded Library trace to s3://{self.bucket}/{self.prefix}/")
+
+    def run(self, instance_id, instance_type, profiles, runs):
+        """Replay the trace on every profile and return the recorded results."""
+        env = {
+            'BUCKET': self.bucket,
+            'PREFIX': self.prefix,
+            'INSTANCE_TYPE': instance_type,
+            'DEVICE': BENCHMARK_DEVICE,
+            'RUNS': str(runs),
+            'PROFILES': ";".join(
+                "|".join([name, p['fs'], p['mkfs_options'], p['mount_options'], str(p['readahead_kb']), p['scheduler']])
+                for name, p in profiles.items()
+            ),
+        }
+        status, output = self.run_script(instance_id, env, BENCHMARK_SCRIPT,
+                                         f'Filesystem profile benchmark {instance_type}')
+        records = bench_records(output)
+        print(f"📊 {instance_type}: {status}, {len(records)} phase results")
+        return records
+
+
+def record(args):
+    with open(args.strace, 'r', errors='replace') as f:
+        events = parse_strace(f)
+    if not events:
+        raise SystemExit(f"No accesses under Library/ in {args.strace}")
+
+    sizes = file_sizes(events)
+    Path(f"{args.trace}.iolog").write_text(to_iolog(events))
+    Path(f"{args.trace}.files").write_text("".join(f"{size}\t{path}\n" for path, size in sorted(sizes.items())))
+    print(f"✅ Wrote {args.trace}.iolog and {args.trace}.files: {len(events)} accesses to {len(sizes)} files, "
+          f"{sum(sizes.values()) / (1 << 30):.1f} GiB")
+
+
+def run_benchmark(args):
+    config = ConfigLoader(cdk.App(context={"config_file": args.config})).load_config()
+    pool = next((pool for pool in config["jenkins_agents"]["pools"] if pool["name"] == args.pool), None)
+    if pool is None:
+        raise SystemExit(f"Unknown agent pool: {args.pool}")
+
+    with open(PROFILES_PATH, 'r') as f:
+        profiles = yaml.safe_load(f)["profiles"]
+    if args.profiles:
+        profiles = {name: profiles[name] for name in args.profiles}
+
+    instance_types = args.instance_types
+    if not instance_types:
+        with open(TABLE_PATH, 'r') as f:
+            instance_types = [row['instance_type'] for row in yaml.safe_load(f)['instance_types']][:3]
+
+    benchmark = FilesystemBenchmark(args.region or config["aws_region"],
+                                    args.launch_template or f"unity-cicd-jenkins-agent-lt-{pool['name']}",
+                                    args.subnet_id, args.bucket, args.prefix)
+    benchmark.upload_trace(args.trace)
+
+    for instance_type in instance_types:
+        instance_id = volume_id = None
+        try:
+            instance_id, availability_zone = benchmark.launch(
+                instance_type, f'jenkins-agent-fs-benchmark-{instance_type}', spot=True)
+            benchmark.wait_for_ssm(instance_id)
+            [volume_id] = benchmark.attach_volumes(instance_id, availability_zone, pool["cache"],
+                                                   [BENCHMARK_DEVICE], 'jenkins-agent-fs-benchmark')
+            with open(args.results, 'a') as f:
+                for result in benchmark.run(instance_id, instance_type, profiles, args.runs):
+                    f.write(json.dumps(result) + "\n")
+        except Exception as e:
+            print(f"❌ Benchmark of {instance_type} failed: {e}")
+        finally:
+            if volume_id:
+                benchmark.delete_volumes(instance_id, [volume_id])
+            if instance_id:
+                benchmark.terminate(instance_id)
+
+    report(args)
+
+
+def report(args):
+    with open(args.report, 'w') as f:
+        f.write(render_report(summarize(load_results(args.results))))
+    print(f"✅ Wrote {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cache filesystem profiles on a recorded Library trace')
+    parser.add_argument('action', choices=['record', 'run', 'report'],
+                        help='Convert an strace, run benchmarks or report on recorded results')
+    parser.add_argument('--strace', help='record: strace output of a Unity import')
+    parser.add_argument('--trace', default='library', help='Trace files prefix (<trace>.iolog, <trace>.files)')
+    parser.add_argument('--config', default='default', help='Config file name (config/<name>.yaml)')
+    parser.add_argument('--pool', default='linux', help='Agent pool whose cache volume profile is benchmarked')
+    parser.add_argument('--profiles', nargs='+', help='Filesystem profiles to compare (default: all)')
+    parser.add_argument('--instance-types', nargs='+',
+                        help='Types to benchmark (default: the three cheapest in the price/performance table)')
+    parser.add_argument('--runs', type=int, default=3, help='Populate/replay runs per profile')
+    parser.add_argument('--results', default='fs-benchmark-results.jsonl', help='Recorded results (JSON Lines)')
+    parser.add_argument('--report', default='fs-benchmark-report.md', help='Markdown report output')
+    parser.add_argument('--bucket', help='S3 bucket for the trace (e.g. the build-artifacts bucket)')
+    parser.add_argument('--prefix', default='fs-benchmark', help='S3 key prefix')
+    parser.add_argument('--launch-template', help='Agent launch template (default: the pool\'s)')
+    parser.add_argument('--subnet-id', help='Private subnet of the agent VPC')
+    parser.add_argument('--region', help='AWS region')
+
+    args = parser.parse_args()
+
+    if args.action == 'record':
+        if not args.strace:
+            parser.error('record requires --strace')
+        record(args)
+    elif args.action == 'run':
+        if not (args.bucket and args.subnet_id):
+            parser.error('run requires --bucket and --subnet-id')
+        run_benchmark(args)
+    else:
+        report(args)
+
+
+if __name__ == "__main__":
+    main()
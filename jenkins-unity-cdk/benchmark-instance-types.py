@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Jenkins Agent instance-type build benchmark
+Launches each candidate instance type from the agent launch template, builds a
+reference Unity project (import, tests, build) with cold and warm caches through
+examples/BuildScript.cs, and ranks the types by Spot cost per build.
+
+  run     benchmark instance types and append results to a JSON Lines file
+  report  analyze recorded results (no AWS access needed)
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import yaml
+
+from benchmarks.driver import BenchmarkDriver, bench_records
+from benchmarks.instance_types import (
+    CACHE_STATES,
+    load_results,
+    render_report,
+    rank,
+    summarize,
+    table_results,
+    write_results,
+)
+
+ROOT = Path(__file__).parent
+BUILD_SCRIPT = ROOT / "examples" / "BuildScript.cs"
+TABLE_PATH = ROOT / "config" / "instance_performance.yaml"
+
+# Runs on the instance through SSM; prints one "BENCH <json>" line per phase
+BENCHMARK_SCRIPT = r"""
+set -u
+UNITY=/opt/unity/Editor/Unity
+WORK=/opt/benchmark
+PROJECT=$WORK/project
+rm -rf "$WORK" && mkdir -p "$PROJECT/Assets/Editor"
+
+aws s3 cp "s3://$BUCKET/$PREFIX/project.tar.gz" - | tar -xz -C "$PROJECT"
+aws s3 cp "s3://$BUCKET/$PREFIX/BuildScript.cs" "$PROJECT/Assets/Editor/BuildScript.cs"
+[ -x /opt/activate-unity-license.sh ] && /opt/activate-unity-license.sh
+
+TOKEN=$(curl -s -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 21600")
+AZ=$(curl -s -H "X-aws-ec2-metadata-token: $TOKEN" http://169.254.169.254/latest/meta-data/placement/availability-zone)
+
+# run_phase <run_id> <cache> <phase> <command...>: time a phase and sample CPU/IO wait
+run_phase() {
+    local run_id=$1 cache=$2 phase=$3
+    shift 3
+    vmstat -n 5 > "$WORK/$phase.vmstat" &
+    local vmstat_pid=$! start end exit_code=0
+    start=$(date +%s.%N)
+    "$@" > /dev/null 2>&1 || exit_code=$?
+    end=$(date +%s.%N)
+    kill "$vmstat_pid"
+    # vmstat columns 13-14 are us/sy, 16 is wa; skip headers and the since-boot line
+    awk -v run_id="$run_id" -v type="$INSTANCE_TYPE" -v az="$AZ" -v cache="$cache" -v phase="$phase" \
+        -v start="$start" -v end="$end" -v exit_code="$exit_code" -v price="$SPOT_PRICE" '
+        NR > 3 { cpu += $13 + $14; wa += $16; n++ }
+        END {
+            if (n) { cpu /= n; wa /= n }
+            printf "BENCH {\"run_id\": \"%s\", \"instance_type\": \"%s\", \"availability_zone\": \"%s\", \"cache\": \"%s\", \"phase\": \"%s\", \"seconds\": %.1f, \"cpu_percent\": %.1f, \"iowait_percent\": %.1f, \"exit_code\": %d, \"spot_price\": %s}\n", \
+                run_id, type, az, cache, phase, end - start, cpu, wa, exit_code, price
+        }' "$WORK/$phase.vmstat"
+}
+
+for run in $(seq 1 "$RUNS"); do
+    # The warm pass reuses the Library folder the cold pass just imported
+    for cache in cold warm; do
+        if [ "$cache" = cold ]; then rm -rf "$PROJECT/Library" "$PROJECT/Temp"; fi
+        run_id="$INSTANCE_TYPE-$run"
+        run_phase "$run_id" "$cache" Import "$UNITY" -batchmode -nographics -quit \
+            -projectPath "$PROJECT" -logFile "$WORK/import.log"
+        run_phase "$run_id" "$cache" Tests "$UNITY" -batchmode -nographics \
+            -projectPath "$PROJECT" -runTests -testPlatform EditMode \
+            -testResults "$WORK/tests.xml" -logFile "$WORK/tests.log"
+        run_phase "$run_id" "$cache" Build "$UNITY" -batchmode -nographics -quit \
+            -projectPath "$PROJECT" -executeMethod BuildScript.Build \
+            -customBuildTarget StandaloneLinux64 -customBuildName benchmark \
+            -customBuildPath "$WORK/Builds" -logFile "$WORK/build.log"
+    done
+done
+"""
+
+
+class InstanceBenchmark(BenchmarkDriver):
+    def __init__(self, region, launch_template, subnet_id, bucket, prefix):
+        super().__init__(region, launch_template, subnet_id, bucket, prefix, 'InstanceBenchmark')
+
+    def upload_project(self, project_archive):
+        """Upload the reference project and the build script."""
+        self.upload(project_archive, "project.tar.gz")
+        self.upload(str(BUILD_SCRIPT), "BuildScript.cs")
+        print(f"✅ Uploaded reference project to s3://{self.bucket}/{self.prefix}/")
+
+    def spot_price(self, instance_type, availability_zone):
+        """Current Spot price in USD/hour."""
+        history = self.ec2.describe_spot_price_history(
+            InstanceTypes=[instance_type],
+            AvailabilityZone=availability_zone,
+            ProductDescriptions=['Linux/UNIX'],
+            MaxResults=1,
+        )['SpotPriceHistory']
+        return float(history[0]['SpotPrice']) if history else 0.0
+
+    def run(self, instance_id, instance_type, spot_price, runs):
+        """Run the benchmark builds on the instance and return the recorded results."""
+        env = {
+            'BUCKET': self.bucket,
+            'PREFIX': self.prefix,
+            'INSTANCE_TYPE': instance_type,
+            'SPOT_PRICE': str(spot_price),
+            'RUNS': str(runs),
+        }
+        status, output = self.run_script(instance_id, env, BENCHMARK_SCRIPT, f'Instance benchmark {instance_type}')
+        records = bench_records(output)
+        print(f"📊 {instance_type}: {status}, {len(records)} phase results")
+        return records
+
+
+def run_benchmark(args):
+    benchmark = InstanceBenchmark(args.region, args.launch_template, args.subnet_id, args.bucket, args.prefix)
+    benchmark.upload_project(args.project_archive)
+
+    instance_types = args.instance_types
+    if not instance_types:
+        with open(TABLE_PATH, 'r') as f:
+            instance_types = [row['instance_type'] for row in yaml.safe_load(f)['instance_types']]
+
+    for instance_type in instance_types:
+        instance_id = None
+        try:
+            instance_id, availability_zone = benchmark.launch(
+                instance_type, f'jenkins-agent-benchmark-{instance_type}', spot=True)
+            benchmark.wait_for_ssm(instance_id)
+            spot_price = benchmark.spot_price(instance_type, availability_zone)
+            write_results(args.results, benchmark.run(instance_id, instance_type, spot_price, args.runs))
+        except Exception as e:
+            print(f"❌ Benchmark of {instance_type} failed: {e}")
+        finally:
+            if instance_id:
+                benchmark.terminate(instance_id)
+
+    report(args)
+
+
+def report(args):
+    summaries = summarize(load_results(args.results))
+
+    with open(args.report, 'w') as f:
+        f.write(render_report(summaries, args.cache))
+    print(f"✅ Wrote {args.report}")
+
+    # Feed the ranking into the Spot priority table: rank-instance-types.py --results
+    with open(args.table_results, 'w') as f:
+        json.dump(table_results(rank(summaries, args.cache)), f, indent=2)
+    print(f"✅ Wrote {args.table_results} (python rank-instance-types.py --results {args.table_results})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Jenkins agent instance types on a reference Unity build')
+    parser.add_argument('action', choices=['run', 'report'], help='Run benchmarks or report on recorded results')
+    parser.add_argument('--results', default='benchmark-results.jsonl', help='Recorded results (JSON Lines)')
+    parser.add_argument('--report', default='benchmark-report.md', help='Markdown report output')
+    parser.add_argument('--table-results', default='benchmark-results.json',
+                        help='Ranking output for rank-instance-types.py --results')
+    parser.add_argument('--cache', choices=CACHE_STATES, default='warm', help='Cache state to rank by')
+    parser.add_argument('--instance-types', nargs='+', help='Types to benchmark (default: the price/performance table)')
+    parser.add_argument('--runs', type=int, default=2, help='Cold/warm build pairs per instance type')
+    parser.add_argument('--project-archive', help='Reference Unity project (.tar.gz of the project root)')
+    parser.add_argument('--bucket', help='S3 bucket for the reference project (e.g. the build-artifacts bucket)')
+    parser.add_argument('--prefix', default='instance-benchmark', help='S3 key prefix')
+    parser.add_argument('--launch-template', default='unity-cicd-jenkins-agent-lt-linux', help='Agent launch template name')
+    parser.add_argument('--subnet-id', help='Private subnet of the agent VPC')
+    parser.add_argument('--region', help='AWS region')
+
+    args = parser.parse_args()
+
+    if args.action == 'run':
+        if not (args.project_archive and args.bucket and args.subnet_id):
+            parser.error('run requires --project-archive, --bucket and --subnet-id')
+        run_benchmark(args)
+    else:
+        report(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Jenkins Agent restored-volume prefetch benchmark
+Measures how much a cache volume restored from a snapshot slows the first Unity
+import down, and how much of that the access-order prefetch of
+manage-cache-volume.sh wins back. Launches one agent from the pool's launch
+template; for every mode and run it restores a fresh volume from the snapshot
+(blocks load lazily from S3 on a new volume), links the volume's Library into
+the reference project and times the import:
+
+  lazy      import right away
+  prefetch  prefetch (recorded access order first, then the rest) alongside the import
+  hydrated  import after prefetch has read the whole volume
+
+  run     benchmark the modes and append results to a JSON Lines file
+  report  compare recorded results (no AWS access needed)
+
+The snapshot is a single-volume cache backup whose Library matches the project;
+its .access-order/library.list is what agents recorded before it was taken.
+Fast snapshot restore must be off for the snapshot, or every mode is hydrated.
+"""
+
+import argparse
+import json
+
+import aws_cdk as cdk
+
+from benchmarks.driver import BenchmarkDriver, bench_records
+from benchmarks.prefetch import MODES, load_results, render_report, summarize
+from stacks.config_loader import ConfigLoader
+
+# Benchmark volumes attach after the agent's own cache set (/dev/sdf../dev/sdm)
+BENCHMARK_DEVICE = "/dev/sdp"
+
+# Runs on the instance through SSM; prints one "BENCH <json>" line
+BENCHMARK_SCRIPT = r"""
+set -u
+UNITY=/opt/unity/Editor/Unity
+WORK=/opt/prefetch-benchmark
+BENCH=/mnt/prefetch-benchmark
+DEVICE=/dev/sdp
+mkdir -p "$WORK" "$BENCH"
+
+for i in $(seq 1 30); do
+    [ -e "$DEVICE" ] && break
+    sleep 1
+done
+mount "$DEVICE" "$BENCH" || exit 1
+
+if [ ! -d "$WORK/project" ]; then
+    mkdir -p "$WORK/project"
+    aws s3 cp "s3://$BUCKET/$PREFIX/project.tar.gz" - | tar -xz -C "$WORK/project"
+    [ -x /opt/activate-unity-license.sh ] && /opt/activate-unity-license.sh
+fi
+# Sources on the instance, Library on the restored volume
+rm -rf "$WORK/project/Library" "$WORK/project/Temp"
+ln -s "$BENCH/Library" "$WORK/project/Library"
+
+drop_caches() {
+    sync
+    echo 3 > /proc/sys/vm/drop_caches
+}
+
+# run_import: wall time of opening the project in batch mode
+run_import() {
+    local start end
+    IMPORT_EXIT=0
+    start=$(date +%s.%N)
+    "$UNITY" -batchmode -nographics -quit -projectPath "$WORK/project" -logFile "$WORK/import.log" > /dev/null 2>&1 || IMPORT_EXIT=$?
+    end=$(date +%s.%N)
+    IMPORT_SECONDS=$(awk -v start="$start" -v end="$end" 'BEGIN { print end - start }')
+}
+
+prefetch() {
+    /opt/manage-cache-volume.sh prefetch "$BENCH" > "$WORK/prefetch.out" 2>&1
+}
+
+drop_caches
+case $MODE in
+  lazy)
+    run_import
+    ;;
+  prefetch)
+    # Started together, the prefetch runs ahead of Unity through the recorded order
+    prefetch &
+    PREFETCH_PID=$!
+    run_import
+    wait "$PREFETCH_PID"
+    ;;
+  hydrated)
+    prefetch
+    drop_caches
+    run_import
+    ;;
+esac
+
+HYDRATION=null
+if [ "$MODE" != "lazy" ]; then
+    HYDRATION=$(grep '^{' "$WORK/prefetch.out" | tail -1)
+    HYDRATION=${HYDRATION:-null}
+fi
+printf 'BENCH {"mode": "%s", "run": %d, "exit_code": %d, "import_seconds": %.1f, "hydration": %s}\n' \
+    "$MODE" "$RUN" "$IMPORT_EXIT" "$IMPORT_SECONDS" "$HYDRATION"
+
+rm -f "$WORK/project/Library"
+umount "$BENCH"
+exit 0
+"""
+
+
+class PrefetchBenchmark(BenchmarkDriver):
+    def __init__(self, region, launch_template, subnet_id, bucket, prefix):
+        super().__init__(region, launch_template, subnet_id, bucket, prefix, 'PrefetchBenchmark')
+
+    def upload_project(self, project_archive):
+        """Upload the reference project."""
+        self.upload(project_archive, "project.tar.gz")
+        print(f"✅ Uploaded reference project to s3://{self.bucket}/{self.prefix}/")
+
+    def restore_volume(self, instance_id, availability_zone, profile, snapshot_id):
+        """Restore and attach a fresh volume from the snapshot with the pool's volume profile."""
+        [volume_id] = self.attach_volumes(instance_id, availability_zone, profile, [BENCHMARK_DEVICE],
+                                          'jenkins-agent-prefetch-benchmark', snapshot_id=snapshot_id)
+        print(f"💾 Restored {snapshot_id} as {volume_id}")
+        return volume_id
+
+    def delete_volume(self, instance_id, volume_id):
+        """Detach and delete the benchmark volume."""
+        self.delete_volumes(instance_id, [volume_id])
+        print(f"🗑️  Deleted {volume_id}")
+
+    def run(self, instance_id, mode, run):
+        """Run one mode on the attached volume and return the recorded results."""
+        env = {
+            'MODE': mode,
+            'RUN': str(run),
+            'BUCKET': self.bucket,
+            'PREFIX': self.prefix,
+        }
+        status, output = self.run_script(instance_id, env, BENCHMARK_SCRIPT, f'Prefetch benchmark, {mode} run {run}')
+
+        records = bench_records(output)
+        for record in records:
+            hydration = record.pop('hydration') or {}
+            record.update(
+                hydration_seconds=hydration.get('seconds'),
+                ordered_seconds=hydration.get('ordered_seconds'),
+                ordered_files=hydration.get('ordered_files'),
+                hydrated_bytes=hydration.get('bytes'),
+            )
+        print(f"📊 {mode} run {run}: {status}, {len(records)} result(s)")
+        return records
+
+
+def load_profile(args):
+    """Cache volume profile of the agent pool being measured."""
+    config = ConfigLoader(cdk.App(context={"config_file": args.config})).load_config()
+    for pool in config["jenkins_agents"]["pools"]:
+        if pool["name"] == args.pool:
+            return config, pool
+    raise SystemExit(f"Unknown agent pool: {args.pool}")
+
+
+def run_benchmark(args):
+    config, pool = load_profile(args)
+    benchmark = PrefetchBenchmark(args.region or config["aws_region"],
+                                  args.launch_template or f"unity-cicd-jenkins-agent-lt-{pool['name']}",
+                                  args.subnet_id, args.bucket, args.prefix)
+    benchmark.upload_project(args.project_archive)
+
+    instance_id = None
+    try:
+        instance_id, availability_zone = benchmark.launch(args.instance_type, 'jenkins-agent-prefetch-benchmark')
+        benchmark.wait_for_ssm(instance_id)
+        for run in range(1, args.runs + 1):
+            for mode in args.modes:
+                # A fresh volume per mode: reads hydrate the volume they were made on
+                volume_id = benchmark.restore_volume(instance_id, availability_zone, pool["cache"], args.snapshot_id)
+                try:
+                    records = benchmark.run(instance_id, mode, run)
+                finally:
+                    benchmark.delete_volume(instance_id, volume_id)
+                with open(args.results, 'a') as f:
+                    for record in records:
+                        record.update(pool=pool["name"], instance_type=args.instance_type, snapshot_id=args.snapshot_id)
+                        f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"❌ Prefetch benchmark failed: {e}")
+    finally:
+        if instance_id:
+            benchmark.terminate(instance_id)
+
+    report(args)
+
+
+def report(args):
+    records = [record for record in load_results(args.results) if record.get('pool', args.pool) == args.pool]
+    if args.snapshot_id:
+        records = [record for record in records if record.get('snapshot_id') == args.snapshot_id]
+    if not records:
+        raise SystemExit(f"No results for pool {args.pool} in {args.results}")
+
+    with open(args.report, 'w') as f:
+        f.write(render_report(summarize(records), records[-1].get('snapshot_id', '-')))
+    print(f"✅ Wrote {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark access-order prefetch of cache volumes restored from snapshots')
+    parser.add_argument('action', choices=['run', 'report'], help='Run benchmarks or report on recorded results')
+    parser.add_argument('--config', default='default', help='Config file name (config/<name>.yaml)')
+    parser.add_argument('--pool', default='linux', help='Agent pool whose cache volume profile is used')
+    parser.add_argument('--snapshot-id', help='Cache volume snapshot to restore (a single-volume cache backup)')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES, help='Modes to measure')
+    parser.add_argument('--runs', type=int, default=2, help='Runs of each mode')
+    parser.add_argument('--instance-type', default='c6i.4xlarge', help='Benchmark instance type')
+    parser.add_argument('--results', default='prefetch-results.jsonl', help='Recorded results (JSON Lines)')
+    parser.add_argument('--report', default='prefetch-report.md', help='Markdown report output')
+    parser.add_argument('--project-archive', help='Reference Unity project (.tar.gz) matching the snapshot\'s Library')
+    parser.add_argument('--bucket', help='S3 bucket for the reference project (e.g. the build-artifacts bucket)')
+    parser.add_argument('--prefix', default='prefetch-benchmark', help='S3 key prefix')
+    parser.add_argument('--launch-template', help='Agent launch template (default: the pool\'s)')
+    parser.add_argument('--subnet-id', help='Private subnet of the agent VPC')
+    parser.add_argument('--region', help='AWS region')
+
+    args = parser.parse_args()
+
+    if args.action == 'run':
+        if not (args.subnet_id and args.snapshot_id and args.project_archive and args.bucket):
+            parser.error('run requires --subnet-id, --snapshot-id, --project-archive and --bucket')
+        run_benchmark(args)
+    else:
+        report(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks for the Jenkins Unity CI/CD infrastructure."""
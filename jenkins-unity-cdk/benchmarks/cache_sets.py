@@ -0,0 +1,87 @@
+"""Analysis of striped cache set benchmarks.
+
+benchmark-cache-sets.py records one result per (stripe width, run, test):
+
+    {"stripe_width": 2, "run": 1, "test": "seq_read", "volume_type": "gp3",
+     "volume_size": 200, "iops": 6000, "throughput": 250,
+     "seconds": 60.0, "mb_per_s": 498.7, "ops_per_s": 498.7, "exit_code": 0}
+
+fio tests report throughput (mb_per_s) and IOPS (ops_per_s); the Unity import
+tests report wall time. Everything here works on those recorded results only.
+"""
+
+import json
+import statistics
+from collections import defaultdict
+from typing import Dict, Any, List
+
+# Test name: (metric, higher is better)
+TESTS = {
+    "seq_read": ("mb_per_s", True),
+    "rand_read": ("ops_per_s", True),
+    "rand_write": ("ops_per_s", True),
+    "import_cold": ("seconds", False),
+    "import_warm": ("seconds", False),
+}
+
+UNITS = {"mb_per_s": "MB/s", "ops_per_s": "IOPS", "seconds": "s"}
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """Load recorded results from a JSON Lines file."""
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Median of each test per stripe width, with the speedup over a single volume.
+    
+    speedup is > 1 when the set is faster: throughput and IOPS divided by the
+    single-volume value, wall time the other way round. Failed runs are excluded.
+    """
+    values = defaultdict(list)
+    for record in records:
+        metric, _ = TESTS[record['test']]
+        if record['exit_code'] == 0:
+            values[(record['test'], record['stripe_width'])].append(record[metric])
+    
+    medians = {key: statistics.median(samples) for key, samples in values.items()}
+    
+    summaries = []
+    order = list(TESTS)
+    for test, stripe_width in sorted(medians, key=lambda key: (order.index(key[0]), key[1])):
+        median = medians[(test, stripe_width)]
+        metric, higher_is_better = TESTS[test]
+        baseline = medians.get((test, 1))
+        speedup = None
+        if baseline and median:
+            speedup = median / baseline if higher_is_better else baseline / median
+        summaries.append({
+            'test': test,
+            'stripe_width': stripe_width,
+            'runs': len(values[(test, stripe_width)]),
+            'metric': metric,
+            'value': median,
+            'speedup': speedup,
+        })
+    
+    return summaries
+
+
+def render_report(summaries: List[Dict[str, Any]], profile: Dict[str, Any]) -> str:
+    """Render a Markdown report comparing stripe widths against a single volume."""
+    lines = [
+        f"# Cache set benchmark ({profile['volume_type']}, {profile['volume_size']} GiB, "
+        f"{profile['iops']} IOPS, {profile['throughput']} MB/s per volume)",
+        "",
+        "| Test | Volumes | Runs | Median | vs 1 volume |",
+        "|---|---:|---:|---:|---:|",
+    ]
+    for summary in summaries:
+        speedup = f"{summary['speedup']:.2f}x" if summary['speedup'] is not None else "-"
+        lines.append(
+            f"| {summary['test']} | {summary['stripe_width']} | {summary['runs']} "
+            f"| {summary['value']:.1f} {UNITS[summary['metric']]} | {speedup} |"
+        )
+    
+    return "\n".join(lines) + "\n"
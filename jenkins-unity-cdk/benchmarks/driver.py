@@ -0,0 +1,154 @@
+"""Benchmark instances launched from an agent launch template.
+
+The benchmark-*.py scripts launch an agent instance, create volumes with a
+pool's cache volume profile next to it, run a shell script on it through SSM
+and collect the "BENCH <json>" lines the script prints:
+
+    benchmark = BenchmarkDriver(region, launch_template, subnet_id, bucket, prefix, "CacheSetBenchmark")
+    instance_id, availability_zone = benchmark.launch("c6i.4xlarge", "jenkins-agent-cache-set-benchmark")
+    benchmark.wait_for_ssm(instance_id)
+    status, output = benchmark.run_script(instance_id, {"RUNS": "3"}, BENCHMARK_SCRIPT, "Cache set benchmark")
+    records = bench_records(output)
+    benchmark.terminate(instance_id)
+
+Instances keep the launch template's AMI, instance profile and network but not
+its user data: an agent would register a Jenkins node, allocate a cache set
+from the pool and take builds while being measured.
+"""
+
+import json
+import shlex
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import boto3
+
+# Replaces the agent user data: only SSM is needed to drive the benchmark
+BENCHMARK_USER_DATA = """#!/bin/bash
+rpm -q amazon-ssm-agent > /dev/null || yum install -y amazon-ssm-agent
+systemctl enable --now amazon-ssm-agent
+"""
+
+
+def bench_records(output: str) -> List[Dict[str, Any]]:
+    """Parse the "BENCH <json>" lines of a benchmark script's output."""
+    return [
+        json.loads(line[len('BENCH '):])
+        for line in output.splitlines()
+        if line.startswith('BENCH ')
+    ]
+
+
+class BenchmarkDriver:
+    def __init__(self, region, launch_template, subnet_id, bucket, prefix, purpose):
+        self.ec2 = boto3.client('ec2', region_name=region)
+        self.ssm = boto3.client('ssm', region_name=region)
+        self.s3 = boto3.client('s3', region_name=region)
+        self.launch_template = launch_template
+        self.subnet_id = subnet_id
+        self.bucket = bucket
+        self.prefix = prefix
+        self.purpose = purpose
+
+    def tags(self, resource_type: str, name: str) -> List[Dict[str, Any]]:
+        """Tag specification marking a resource as the benchmark's."""
+        return [
+            {
+                'ResourceType': resource_type,
+                'Tags': [
+                    {'Key': 'Name', 'Value': name},
+                    {'Key': 'Purpose', 'Value': self.purpose},
+                ]
+            }
+        ]
+
+    def upload(self, path: str, name: str):
+        """Upload a benchmark input under the S3 prefix."""
+        self.s3.upload_file(path, self.bucket, f"{self.prefix}/{name}")
+
+    def launch(self, instance_type: str, name: str, spot: bool = False) -> Tuple[str, str]:
+        """Launch an instance of the given type from the launch template, without the agent user data."""
+        params = {}
+        if spot:
+            params['InstanceMarketOptions'] = {'MarketType': 'spot'}
+        response = self.ec2.run_instances(
+            LaunchTemplate={'LaunchTemplateName': self.launch_template, 'Version': '$Default'},
+            InstanceType=instance_type,
+            SubnetId=self.subnet_id,
+            MinCount=1,
+            MaxCount=1,
+            UserData=BENCHMARK_USER_DATA,  # boto3 base64-encodes it
+            TagSpecifications=self.tags('instance', name),
+            **params,
+        )
+        instance = response['Instances'][0]
+        print(f"🚀 Launched {instance_type}: {instance['InstanceId']}")
+        return instance['InstanceId'], instance['Placement']['AvailabilityZone']
+
+    def wait_for_ssm(self, instance_id: str, timeout: int = 900):
+        """Wait until the instance is online in SSM."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            info = self.ssm.describe_instance_information(
+                Filters=[{'Key': 'InstanceIds', 'Values': [instance_id]}]
+            )['InstanceInformationList']
+            if info and info[0]['PingStatus'] == 'Online':
+                return
+            time.sleep(15)
+        raise TimeoutError(f"{instance_id} did not register with SSM within {timeout}s")
+
+    def attach_volumes(self, instance_id: str, availability_zone: str, profile: Dict[str, Any],
+                       devices: List[str], name: str, snapshot_id: Optional[str] = None) -> List[str]:
+        """Create and attach one volume per device with the pool's cache volume profile, outside the cache pool."""
+        volume_ids = []
+        for index, _ in enumerate(devices):
+            source = {'SnapshotId': snapshot_id} if snapshot_id else {'Size': profile['volume_size']}
+            response = self.ec2.create_volume(
+                VolumeType=profile['volume_type'],
+                Iops=profile['iops'],
+                Throughput=profile['throughput'],
+                AvailabilityZone=availability_zone,
+                Encrypted=True,
+                TagSpecifications=self.tags('volume', name if len(devices) == 1 else f"{name}-{index}"),
+                **source,
+            )
+            volume_ids.append(response['VolumeId'])
+
+        self.ec2.get_waiter('volume_available').wait(VolumeIds=volume_ids)
+        for volume_id, device in zip(volume_ids, devices):
+            self.ec2.attach_volume(VolumeId=volume_id, InstanceId=instance_id, Device=device)
+        self.ec2.get_waiter('volume_in_use').wait(VolumeIds=volume_ids)
+        return volume_ids
+
+    def delete_volumes(self, instance_id: str, volume_ids: List[str]):
+        """Detach and delete benchmark volumes."""
+        for volume_id in volume_ids:
+            self.ec2.detach_volume(VolumeId=volume_id, InstanceId=instance_id, Force=True)
+        self.ec2.get_waiter('volume_available').wait(VolumeIds=volume_ids)
+        for volume_id in volume_ids:
+            self.ec2.delete_volume(VolumeId=volume_id)
+
+    def run_script(self, instance_id: str, env: Dict[str, str], script: str, comment: str) -> Tuple[str, str]:
+        """Run a shell script with the given environment through SSM; return its status and output."""
+        script = "\n".join(f"{key}={shlex.quote(value)}" for key, value in env.items()) + script
+
+        command_id = self.ssm.send_command(
+            InstanceIds=[instance_id],
+            DocumentName='AWS-RunShellScript',
+            Parameters={'commands': [script], 'executionTimeout': ['14400']},
+            Comment=comment,
+        )['Command']['CommandId']
+
+        while True:
+            time.sleep(30)
+            try:
+                invocation = self.ssm.get_command_invocation(CommandId=command_id, InstanceId=instance_id)
+            except self.ssm.exceptions.InvocationDoesNotExist:
+                continue
+            if invocation['Status'] not in ['Pending', 'InProgress', 'Delayed']:
+                return invocation['Status'], invocation['StandardOutputContent']
+
+    def terminate(self, instance_id: str):
+        """Terminate the benchmark instance."""
+        self.ec2.terminate_instances(InstanceIds=[instance_id])
+        print(f"🗑️  Terminated {instance_id}")
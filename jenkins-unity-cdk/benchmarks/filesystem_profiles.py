@@ -0,0 +1,224 @@
+"""Library access traces and analysis of filesystem profile benchmarks.
+
+A trace is recorded with strace on an agent while Unity imports a project:
+
+    strace -f -y -e trace=openat,read,pread64,write,pwrite64,lseek,close \\
+        -o library.strace /opt/unity/Editor/Unity -batchmode -quit -projectPath .
+
+and converted to a fio version 2 iolog of the accesses under Library/ plus
+the size of every file touched. benchmark-filesystem-profiles.py lays the
+files out on each profile and replays the iolog with fio, recording:
+
+    {"instance_type": "c6i.4xlarge", "profile": "xfs-library", "run": 1,
+     "phase": "replay", "seconds": 48.2, "exit_code": 0}
+
+populate is the time to write the traced files (what a cold import writes),
+replay the time fio takes to replay the recorded accesses from a cold page cache.
+"""
+
+import json
+import re
+import statistics
+from collections import defaultdict
+from typing import Dict, Any, List, Iterable, Tuple
+
+PHASES = ["populate", "replay"]
+
+# <pid> <syscall>(<fd></path>, ...) = <result>; -y annotates descriptors with their path
+SYSCALL = re.compile(r'^(?P<pid>\d+)\s+(?P<call>\w+)\((?P<args>.*)\)\s+=\s+(?P<result>-?\d+)')
+UNFINISHED = re.compile(r'^(?P<pid>\d+)\s+(?P<head>.*)\s<unfinished \.\.\.>$')
+RESUMED = re.compile(r'^(?P<pid>\d+)\s+<\.\.\. \w+ resumed>\s?(?P<tail>.*)$')
+DESCRIPTOR = re.compile(r'^(?P<fd>\d+)<(?P<path>[^>]*)>')
+LIBRARY = "Library/"
+
+# (path relative to the project, action, offset, length)
+Event = Tuple[str, str, int, int]
+
+
+def _join_unfinished(lines: Iterable[str]) -> Iterable[str]:
+    """Stitch "<unfinished ...>" / "<... resumed>" pairs of a thread back into one line."""
+    pending = {}
+    for line in lines:
+        line = line.rstrip("\n")
+        unfinished = UNFINISHED.match(line)
+        if unfinished:
+            pending[unfinished.group('pid')] = unfinished.group('head')
+            continue
+        resumed = RESUMED.match(line)
+        if resumed and resumed.group('pid') in pending:
+            head = pending.pop(resumed.group('pid'))
+            yield f"{resumed.group('pid')} {head}{resumed.group('tail')}"
+            continue
+        yield line
+
+
+def parse_strace(lines: Iterable[str]) -> List[Event]:
+    """Convert strace output into file events under the project's Library folder.
+    
+    Positions are tracked per descriptor for read/write; lseek results set
+    them. Failed calls and files outside Library/ are skipped.
+    """
+    events = []
+    positions = {}
+    for line in _join_unfinished(lines):
+        match = SYSCALL.match(line)
+        if not match or int(match.group('result')) < 0:
+            continue
+        call, args, result = match.group('call'), match.group('args'), int(match.group('result'))
+        
+        if call == 'openat':
+            # The returned descriptor carries the resolved path
+            descriptor = DESCRIPTOR.match(line[line.rindex('= ') + 2:])
+            if not descriptor or LIBRARY not in descriptor.group('path'):
+                continue
+            path = descriptor.group('path')
+            positions[(descriptor.group('fd'), path)] = 0
+            events.append((_relative(path), 'open', 0, 0))
+            continue
+        
+        descriptor = DESCRIPTOR.match(args)
+        if not descriptor or LIBRARY not in descriptor.group('path'):
+            continue
+        key = (descriptor.group('fd'), descriptor.group('path'))
+        path = _relative(descriptor.group('path'))
+        
+        if call in ('read', 'write') and result > 0:
+            offset = positions.get(key, 0)
+            events.append((path, call, offset, result))
+            positions[key] = offset + result
+        elif call in ('pread64', 'pwrite64') and result > 0:
+            offset = int(args.rsplit(',', 1)[1])
+            events.append((path, call[1:-2], offset, result))
+        elif call == 'lseek':
+            positions[key] = result
+        elif call == 'close':
+            positions.pop(key, None)
+            events.append((path, 'close', 0, 0))
+    
+    return events
+
+
+def _relative(path: str) -> str:
+    """Path from the project's Library folder on, so the trace replays on any mount."""
+    return path[path.index(LIBRARY):]
+
+
+def to_iolog(events: List[Event]) -> str:
+    """Render events as a fio version 2 iolog; files are added on first use."""
+    lines = ["fio version 2 iolog"]
+    added = set()
+    open_files = defaultdict(int)
+    for path, action, offset, length in events:
+        if path not in added:
+            lines.append(f"{path} add")
+            added.add(path)
+        if action == 'open':
+            # fio keeps one descriptor per file; nested opens of the same file share it
+            open_files[path] += 1
+            if open_files[path] == 1:
+                lines.append(f"{path} open")
+        elif action == 'close':
+            if open_files[path] == 1:
+                lines.append(f"{path} close")
+            open_files[path] = max(0, open_files[path] - 1)
+        else:
+            if not open_files[path]:
+                lines.append(f"{path} open")
+                open_files[path] = 1
+            lines.append(f"{path} {action} {offset} {length}")
+    
+    lines.extend(f"{path} close" for path, count in open_files.items() if count)
+    return "\n".join(lines) + "\n"
+
+
+def file_sizes(events: List[Event]) -> Dict[str, int]:
+    """Size each traced file must have for the replay: its furthest access."""
+    sizes = {}
+    for path, action, offset, length in events:
+        sizes[path] = max(sizes.get(path, 0), offset + length)
+    return sizes
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """Load recorded results from a JSON Lines file."""
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Median phase times per instance type and profile, fastest replay first per type.
+    
+    Runs with a failed phase are counted but excluded from the timings.
+    """
+    runs = defaultdict(lambda: defaultdict(dict))
+    for record in records:
+        runs[(record['instance_type'], record['profile'])][record['run']][record['phase']] = record
+    
+    summaries = []
+    for (instance_type, profile), by_run in runs.items():
+        complete = [
+            phases for phases in by_run.values()
+            if all(phase in phases and phases[phase]['exit_code'] == 0 for phase in PHASES)
+        ]
+        summary = {
+            'instance_type': instance_type,
+            'profile': profile,
+            'runs': len(complete),
+            'failed_runs': len(by_run) - len(complete),
+        }
+        if complete:
+            summary['phase_seconds'] = {
+                phase: statistics.median(phases[phase]['seconds'] for phases in complete)
+                for phase in PHASES
+            }
+        summaries.append(summary)
+    
+    # Profiles without a complete run sort last
+    return sorted(summaries, key=lambda s: (
+        s['instance_type'],
+        'phase_seconds' not in s,
+        s.get('phase_seconds', {}).get('replay', 0),
+    ))
+
+
+def fastest_profiles(summaries: List[Dict[str, Any]]) -> Dict[str, str]:
+    """The profile with the fastest replay on each instance type."""
+    fastest = {}
+    for summary in summaries:
+        if summary['runs'] and summary['instance_type'] not in fastest:
+            fastest[summary['instance_type']] = summary['profile']
+    return fastest
+
+
+def render_report(summaries: List[Dict[str, Any]]) -> str:
+    """Render a Markdown report: the fastest profile per instance type, then all timings."""
+    lines = [
+        "# Filesystem profile benchmark (Library trace replay)",
+        "",
+        "| Instance type | Fastest profile |",
+        "|---|---|",
+    ]
+    for instance_type, profile in fastest_profiles(summaries).items():
+        lines.append(f"| {instance_type} | {profile} |")
+    
+    lines += [
+        "",
+        "## Timings",
+        "",
+        "| Instance type | Profile | Runs | Failed | Populate (s) | Replay (s) | Replay vs fastest |",
+        "|---|---|---:|---:|---:|---:|---:|",
+    ]
+    best = {}
+    for summary in summaries:
+        if not summary['runs']:
+            lines.append(f"| {summary['instance_type']} | {summary['profile']} | 0 | {summary['failed_runs']} | - | - | - |")
+            continue
+        seconds = summary['phase_seconds']
+        best.setdefault(summary['instance_type'], seconds['replay'])
+        ratio = seconds['replay'] / best[summary['instance_type']] if best[summary['instance_type']] else 1.0
+        lines.append(
+            f"| {summary['instance_type']} | {summary['profile']} | {summary['runs']} | {summary['failed_runs']} "
+            f"| {seconds['populate']:.1f} | {seconds['replay']:.1f} | {ratio:.2f}x |"
+        )
+    
+    return "\n".join(lines) + "\n"
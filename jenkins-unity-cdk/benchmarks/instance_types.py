@@ -0,0 +1,142 @@
+"""Analysis of instance-type build benchmarks.
+
+benchmark-instance-types.py records one result per (run, cache, phase):
+
+    {"run_id": "c6i.4xlarge-1", "instance_type": "c6i.4xlarge",
+     "availability_zone": "us-east-1a", "cache": "warm", "phase": "Build",
+     "seconds": 512.3, "cpu_percent": 81.5, "iowait_percent": 2.4,
+     "exit_code": 0, "spot_price": 0.3012}
+
+Everything here works on those recorded results only, without AWS.
+"""
+
+import json
+import statistics
+from collections import defaultdict
+from typing import Dict, Any, List, Iterable
+
+# Reference build phases, in the order the harness runs them
+PHASES = ["Import", "Tests", "Build"]
+CACHE_STATES = ["cold", "warm"]
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """Load recorded results from a JSON Lines file."""
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_results(path: str, records: Iterable[Dict[str, Any]]):
+    """Append recorded results to a JSON Lines file."""
+    with open(path, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Summarize results per instance type and cache state.
+    
+    Phase times are medians across runs; a build's total is the sum of the
+    phase medians. CPU and IO wait are averaged weighted by phase time.
+    Runs with a failed phase are counted but excluded from the timings.
+    """
+    runs = defaultdict(lambda: defaultdict(dict))
+    for record in records:
+        runs[(record['instance_type'], record['cache'])][record['run_id']][record['phase']] = record
+    
+    summaries = []
+    for (instance_type, cache), by_run in sorted(runs.items()):
+        complete = [
+            phases for phases in by_run.values()
+            if all(phase in phases and phases[phase]['exit_code'] == 0 for phase in PHASES)
+        ]
+        summary = {
+            'instance_type': instance_type,
+            'cache': cache,
+            'runs': len(complete),
+            'failed_runs': len(by_run) - len(complete),
+        }
+        
+        if complete:
+            phase_seconds = {
+                phase: statistics.median(phases[phase]['seconds'] for phases in complete)
+                for phase in PHASES
+            }
+            timed = [phases[phase] for phases in complete for phase in PHASES]
+            total_time = sum(record['seconds'] for record in timed) or 1.0
+            summary.update({
+                'phase_seconds': phase_seconds,
+                'total_seconds': sum(phase_seconds.values()),
+                'cpu_percent': sum(r['cpu_percent'] * r['seconds'] for r in timed) / total_time,
+                'iowait_percent': sum(r['iowait_percent'] * r['seconds'] for r in timed) / total_time,
+                'spot_price': statistics.mean(r['spot_price'] for r in timed),
+            })
+        
+        summaries.append(summary)
+    
+    return summaries
+
+
+def rank(summaries: List[Dict[str, Any]], cache: str = "warm") -> List[Dict[str, Any]]:
+    """Rank instance types by Spot cost per build for one cache state, cheapest first."""
+    ranking = []
+    for summary in summaries:
+        if summary['cache'] != cache or not summary['runs']:
+            continue
+        ranking.append({
+            'instance_type': summary['instance_type'],
+            'build_minutes': summary['total_seconds'] / 60,
+            'spot_price': summary['spot_price'],
+            'cost_per_build': summary['total_seconds'] / 3600 * summary['spot_price'],
+        })
+    
+    # Faster build breaks ties in cost
+    return sorted(ranking, key=lambda row: (row['cost_per_build'], row['build_minutes']))
+
+
+def table_results(ranking: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Results in the format rank-instance-types.py --results merges into the Spot table."""
+    return [
+        {
+            'instance_type': row['instance_type'],
+            'build_minutes': round(row['build_minutes'], 1),
+            'spot_price': round(row['spot_price'], 4),
+        } for row in ranking
+    ]
+
+
+def render_report(summaries: List[Dict[str, Any]], cache: str = "warm") -> str:
+    """Render a Markdown report: the cost ranking, then per-phase timings."""
+    lines = [
+        f"# Instance-type build benchmark ({cache} cache ranking)",
+        "",
+        "| Rank | Instance type | Build (min) | Spot $/h | $/build |",
+        "|---:|---|---:|---:|---:|",
+    ]
+    for position, row in enumerate(rank(summaries, cache), 1):
+        lines.append(
+            f"| {position} | {row['instance_type']} | {row['build_minutes']:.1f} "
+            f"| {row['spot_price']:.4f} | {row['cost_per_build']:.4f} |"
+        )
+    
+    lines += [
+        "",
+        "## Phase timings",
+        "",
+        "| Instance type | Cache | Runs | Failed | " + " | ".join(f"{phase} (s)" for phase in PHASES)
+        + " | CPU % | IO wait % |",
+        "|---|---|---:|---:|" + "---:|" * (len(PHASES) + 2),
+    ]
+    for summary in summaries:
+        if summary['runs']:
+            timings = " | ".join(f"{summary['phase_seconds'][phase]:.0f}" for phase in PHASES)
+            usage = f"{summary['cpu_percent']:.1f} | {summary['iowait_percent']:.1f}"
+        else:
+            timings = " | ".join("-" for _ in PHASES)
+            usage = "- | -"
+        lines.append(
+            f"| {summary['instance_type']} | {summary['cache']} | {summary['runs']} "
+            f"| {summary['failed_runs']} | {timings} | {usage} |"
+        )
+    
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,59 @@
+"""API call and latency budgets of the cache pool Lambdas.
+
+tests/benchmark runs the allocate, release and maintain Lambdas against moto at
+pool sizes from 10 to 50,000 cache sets, records every AWS API call each
+operation makes (as "service.Operation", waiter polls included) and times it
+with pytest-benchmark. The budgets are in tests/benchmark/budgets.yaml:
+
+    allocate-warm:
+      calls:                        # the most calls allowed, at every pool size
+        dynamodb.Query: 1
+        dynamodb.UpdateItem: 1
+      median_ms: {10: 40, 1000: 80}
+
+Operations whose calls grow with the pool budget them per pool size instead
+({10: {...}, 1000: {...}}). Latency is always per pool size, as moto reads its
+whole table for scans and index queries. A pool size without a budget is
+measured and recorded but not checked.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+
+def load_budgets(path: str) -> Dict[str, Dict[str, Any]]:
+    """Load the budgets of each operation."""
+    with open(path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+
+def call_budget(budget: Dict[str, Any], volumes: int) -> Optional[Dict[str, int]]:
+    """The most calls of each API the operation may make with this many cache sets."""
+    calls = budget.get('calls')
+    if not calls:
+        return None
+    if all(isinstance(key, int) for key in calls):
+        return calls.get(volumes)
+    return calls
+
+
+def latency_budget(budget: Dict[str, Any], volumes: int) -> Optional[float]:
+    """The slowest median latency (ms) allowed with this many cache sets."""
+    return (budget.get('median_ms') or {}).get(volumes)
+
+
+def budget_violations(calls: Dict[str, int], median_ms: Optional[float], budget: Dict[str, Any],
+                      volumes: int) -> List[str]:
+    """Everything the operation does beyond its budget; empty when it is within."""
+    violations = []
+    allowed = call_budget(budget, volumes)
+    if allowed is not None:
+        for api, count in sorted(calls.items()):
+            if count > allowed.get(api, 0):
+                violations.append(f"{api}: {count} calls, budget {allowed.get(api, 0)}")
+
+    slowest = latency_budget(budget, volumes)
+    if slowest is not None and median_ms is not None and median_ms > slowest:
+        violations.append(f"median {median_ms:.1f} ms, budget {slowest} ms")
+    return violations
@@ -0,0 +1,96 @@
+"""Analysis of cache pool index benchmarks.
+
+benchmark-cache-pool-index.py seeds a cache pool table on a local DynamoDB
+stand-in (DynamoDB Local or moto) and runs bursts of allocations in one AZ,
+round-robin over the cache partitions, with each lookup strategy:
+
+    az-status   query AZ-Status-Index for the AZ's Available sets, filter by
+                partition and width after the read, mark the first one InUse
+                (allocation before Pool-Index)
+    pool-index  the allocate Lambda's claim_available_volume: one-item queries
+                on Pool-Index and a conditional claim
+
+and records one result per (strategy, shards, concurrency, run):
+
+    {"strategy": "pool-index", "shards": 1, "concurrency": 8, "run": 1,
+     "allocations": 200, "claimed": 200, "double_claims": 0, "seconds": 1.9,
+     "latencies_ms": [...], "queries": 212, "items_read": 212,
+     "hottest_key_share": 0.26}
+
+items_read counts the index items each query read (ScannedCount) and
+hottest_key_share is the share of queries that went to the busiest index
+partition key. A local stand-in does not throttle hot partitions, so that share
+stands in for it. double_claims counts sets handed to two allocations at once.
+"""
+
+import json
+import statistics
+from collections import defaultdict
+from typing import Dict, Any, List
+
+STRATEGIES = ["az-status", "pool-index"]
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """Load recorded results from a JSON Lines file."""
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Throughput, latency and reads per allocation per (strategy, shards, concurrency).
+    
+    Throughput is the median over runs, latency percentiles are over all
+    allocations of all runs, reads and queries are per allocation.
+    """
+    groups = defaultdict(list)
+    for record in records:
+        groups[(record['strategy'], record['shards'], record['concurrency'])].append(record)
+    
+    summaries = []
+    for (strategy, shards, concurrency), runs in groups.items():
+        latencies = [latency for run in runs for latency in run['latencies_ms']]
+        allocations = sum(run['allocations'] for run in runs)
+        summaries.append({
+            'strategy': strategy,
+            'shards': shards,
+            'concurrency': concurrency,
+            'runs': len(runs),
+            'throughput': statistics.median(run['allocations'] / run['seconds'] for run in runs),
+            'p50_ms': _percentile(latencies, 50),
+            'p95_ms': _percentile(latencies, 95),
+            'queries_per_allocation': sum(run['queries'] for run in runs) / allocations,
+            'items_read_per_allocation': sum(run['items_read'] for run in runs) / allocations,
+            'hottest_key_share': max(run['hottest_key_share'] for run in runs),
+            'missed': sum(run['allocations'] - run['claimed'] for run in runs),
+            'double_claims': sum(run['double_claims'] for run in runs),
+        })
+    
+    order = {strategy: index for index, strategy in enumerate(STRATEGIES)}
+    summaries.sort(key=lambda s: (s['concurrency'], order.get(s['strategy'], len(order)), s['shards']))
+    return summaries
+
+
+def render_report(summaries: List[Dict[str, Any]], volumes: int, backend: str) -> str:
+    """Render a Markdown report comparing the lookup strategies."""
+    lines = [
+        f"# Cache pool index benchmark ({volumes} cache sets, {backend})",
+        "",
+        "| Concurrency | Strategy | Shards | Allocations/s | p50 (ms) | p95 (ms) | Queries/alloc | Items read/alloc "
+        "| Hottest key | Missed | Double claims |",
+        "|---:|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for s in summaries:
+        lines.append(
+            f"| {s['concurrency']} | {s['strategy']} | {s['shards']} | {s['throughput']:.1f} | {s['p50_ms']:.1f} "
+            f"| {s['p95_ms']:.1f} | {s['queries_per_allocation']:.2f} | {s['items_read_per_allocation']:.1f} "
+            f"| {s['hottest_key_share']:.0%} | {s['missed']} | {s['double_claims']} |"
+        )
+    
+    return "\n".join(lines) + "\n"
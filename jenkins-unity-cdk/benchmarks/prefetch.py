@@ -0,0 +1,93 @@
+"""Analysis of restored-volume prefetch benchmarks.
+
+benchmark-prefetch.py restores a fresh cache volume from a snapshot for every
+(mode, run) and opens the reference project with its Library on the volume:
+
+    lazy      import right away; blocks load from S3 as Unity reads them
+    prefetch  manage-cache-volume.sh prefetch starts with the import, reading the
+              recorded access order first, then the rest of the volume
+    hydrated  import once prefetch has read the whole volume (the target)
+
+and records:
+
+    {"mode": "prefetch", "run": 1, "exit_code": 0, "import_seconds": 212.4,
+     "hydration_seconds": 640.2, "ordered_seconds": 95.1, "ordered_files": 48211}
+
+hydration_seconds is the time prefetch took to read the volume (time to hydrated),
+ordered_seconds the part spent on the recorded files.
+"""
+
+import json
+import statistics
+from collections import defaultdict
+from typing import Dict, Any, List
+
+MODES = ["lazy", "prefetch", "hydrated"]
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """Load recorded results from a JSON Lines file."""
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _median(values: List[Any]) -> Any:
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Median import and hydration times per mode, with the import slowdown against a hydrated volume.
+    
+    slowdown is the median import time divided by the hydrated one (1.0 = no
+    penalty for restoring from a snapshot). Failed imports are excluded.
+    """
+    by_mode = defaultdict(list)
+    failed = defaultdict(int)
+    for record in records:
+        if record['exit_code'] == 0:
+            by_mode[record['mode']].append(record)
+        else:
+            failed[record['mode']] += 1
+    
+    hydrated = _median([record['import_seconds'] for record in by_mode['hydrated']])
+    
+    summaries = []
+    for mode in MODES:
+        if mode not in by_mode and mode not in failed:
+            continue
+        runs = by_mode[mode]
+        import_seconds = _median([record['import_seconds'] for record in runs])
+        summaries.append({
+            'mode': mode,
+            'runs': len(runs),
+            'failed_runs': failed[mode],
+            'import_seconds': import_seconds,
+            'hydration_seconds': _median([record.get('hydration_seconds') for record in runs]),
+            'ordered_seconds': _median([record.get('ordered_seconds') for record in runs]),
+            'slowdown': import_seconds / hydrated if import_seconds is not None and hydrated else None,
+        })
+    
+    return summaries
+
+
+def render_report(summaries: List[Dict[str, Any]], snapshot_id: str) -> str:
+    """Render a Markdown report comparing import times on a restored volume."""
+    lines = [
+        f"# Restored volume prefetch benchmark ({snapshot_id})",
+        "",
+        "| Mode | Runs | Failed | Import (s) | vs hydrated | Time to hydrated (s) | Recorded files read (s) |",
+        "|---|---:|---:|---:|---:|---:|---:|",
+    ]
+    
+    def cell(value):
+        return f"{value:.1f}" if value is not None else "-"
+    
+    for summary in summaries:
+        slowdown = f"{summary['slowdown']:.2f}x" if summary['slowdown'] is not None else "-"
+        lines.append(
+            f"| {summary['mode']} | {summary['runs']} | {summary['failed_runs']} | {cell(summary['import_seconds'])} "
+            f"| {slowdown} | {cell(summary['hydration_seconds'])} | {cell(summary['ordered_seconds'])} |"
+        )
+    
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Jenkins Agent demand forecast
+Backtests and previews the hour-of-week forecast the agent-prescaling Lambda uses
+to raise agent pool minimums before recurring queue peaks.
+
+  backtest  replay the forecast against recorded queue metrics and report the
+            forecast error and the build wait minutes it would have avoided
+  plan      print the minimum-capacity changes the Lambda would schedule next
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import aws_cdk as cdk
+import boto3
+
+from stacks.config_loader import ConfigLoader
+
+sys.path.insert(0, str(Path(__file__).parent / "lambda_functions" / "agent_prescaling"))
+from demand_forecast import HOUR, WEEK, backtest, load_demand_history, plan_capacity, schedule_changes  # noqa: E402
+
+
+def load_history(cloudwatch, namespace, pool, start, end):
+    history = load_demand_history(cloudwatch, namespace, pool["name"], pool["num_executors"], start, end)
+    print(f"📊 {pool['name']}: {len(history)} hours of queue metrics since {start:%Y-%m-%d}")
+    return history
+
+
+def run_backtest(args, config, pools, cloudwatch):
+    prescaling = config["jenkins_agents"]["prescaling"]
+    lookback_weeks = args.lookback_weeks or prescaling["lookback_weeks"]
+    quantile = args.quantile or prescaling["quantile"]
+    boot_minutes = args.boot_minutes or prescaling["lead_minutes"]
+
+    end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    test_start = end - WEEK * args.test_weeks
+
+    print(f"Backtest: {args.test_weeks} week(s), {lookback_weeks} weeks lookback, "
+          f"quantile {quantile}, {boot_minutes} min per agent boot")
+    print(f"{'pool':<10} {'hours':>6} {'MAE':>6} {'bias':>6} {'reactive wait':>14} "
+          f"{'prescaled wait':>15} {'avoided':>9} {'extra agent-h':>14}")
+    for pool in pools:
+        history = load_history(cloudwatch, args.namespace, pool, test_start - WEEK * lookback_weeks - HOUR, end)
+        result = backtest(history, test_start, end, lookback_weeks, quantile,
+                          pool["min_instances"], pool["max_instances"], boot_minutes)
+        if not result["hours"]:
+            print(f"{pool['name']:<10} not enough history")
+            continue
+        print(f"{pool['name']:<10} {result['hours']:>6} {result['mean_absolute_error']:>6.2f} {result['bias']:>6.2f} "
+              f"{result['reactive_wait_minutes']:>12.0f} m {result['predictive_wait_minutes']:>13.0f} m "
+              f"{result['avoided_wait_minutes']:>7.0f} m {result['extra_agent_hours']:>14.1f}")
+
+
+def run_plan(args, config, pools, cloudwatch):
+    prescaling = config["jenkins_agents"]["prescaling"]
+    lookback_weeks = args.lookback_weeks or prescaling["lookback_weeks"]
+    quantile = args.quantile or prescaling["quantile"]
+
+    now = datetime.now(timezone.utc)
+    start = now.replace(minute=0, second=0, microsecond=0) + HOUR
+    for pool in pools:
+        history = load_history(cloudwatch, args.namespace, pool, start - WEEK * lookback_weeks - HOUR, now)
+        plan = plan_capacity(history, start, prescaling["horizon_hours"], lookback_weeks, quantile,
+                             pool["min_instances"], pool["max_instances"])
+        for time, capacity in schedule_changes(plan, timedelta(minutes=prescaling["lead_minutes"])):
+            print(f"   {time:%a %Y-%m-%d %H:%M} UTC  min {capacity}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest and preview predictive agent pre-scaling')
+    parser.add_argument('action', choices=['backtest', 'plan'], help='Backtest the forecast or preview the schedule')
+    parser.add_argument('--config', default='default', help='Config file name (config/<name>.yaml)')
+    parser.add_argument('--pool', action='append', help='Agent pool(s) to evaluate (default: all)')
+    parser.add_argument('--test-weeks', type=int, default=2, help='Backtest: most recent weeks to replay')
+    parser.add_argument('--lookback-weeks', type=int, help='Override prescaling.lookback_weeks')
+    parser.add_argument('--quantile', type=float, help='Override prescaling.quantile')
+    parser.add_argument('--boot-minutes', type=float, help='Backtest: build wait per reactively launched agent '
+                                                           '(default: prescaling.lead_minutes)')
+    parser.add_argument('--region', help='AWS region')
+
+    args = parser.parse_args()
+
+    config = ConfigLoader(cdk.App(context={"config_file": args.config})).load_config()
+    args.namespace = config["monitoring"]["fleet_metrics_namespace"]
+    pools = [
+        pool for pool in config["jenkins_agents"]["pools"]
+        if not args.pool or pool["name"] in args.pool
+    ]
+    cloudwatch = boto3.client('cloudwatch', region_name=args.region or config["aws_region"])
+
+    if args.action == 'backtest':
+        run_backtest(args, config, pools, cloudwatch)
+    else:
+        run_plan(args, config, pools, cloudwatch)
+
+
+if __name__ == "__main__":
+    main()
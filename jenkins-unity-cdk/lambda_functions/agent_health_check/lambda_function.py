@@ -0,0 +1,231 @@
+"""Lambda function to mark wedged Jenkins agents unhealthy so the ASG replaces them."""
+
+import json
+import os
+import time
+import boto3
+import logging
+import urllib.request
+from typing import Dict, Any, List, Optional
+
+import ec2_clients  # Lambda layer
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+autoscaling = boto3.client('autoscaling')
+# Adaptive retries, on the EC2 API budget shared by the cache pool functions
+ec2 = ec2_clients.ec2_client()
+cloudwatch = boto3.client('cloudwatch')
+
+# Environment variables
+AUTO_SCALING_GROUP_NAMES = os.environ.get('AUTO_SCALING_GROUP_NAMES', 'unity-cicd-jenkins-agent-asg-linux').split(',')
+JENKINS_URL = os.environ.get('JENKINS_URL', 'http://jenkins.unity-cicd.internal:8080')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'JenkinsUnity/AgentFleet')
+ONLINE_DEADLINE_MINUTES = int(os.environ.get('ONLINE_DEADLINE_MINUTES', '20'))
+BOOT_STARTED_GRACE_MINUTES = int(os.environ.get('BOOT_STARTED_GRACE_MINUTES', '10'))
+OFFLINE_DEADLINE_MINUTES = int(os.environ.get('OFFLINE_DEADLINE_MINUTES', '10'))
+MAX_OFFLINE_DROPS = int(os.environ.get('MAX_OFFLINE_DROPS', '3'))
+OFFLINE_DROPS_WINDOW_HOURS = int(os.environ.get('OFFLINE_DROPS_WINDOW_HOURS', '24'))
+
+# Health state is kept on the instance itself between evaluations
+BOOT_PHASE_TAG = 'jenkins:boot-phase'
+NODE_STATE_TAG = 'jenkins:node-state'
+OFFLINE_DROPS_TAG = 'jenkins:offline-drops'
+
+
+def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    Compare ASG agents with Jenkins node state and replace the wedged ones.
+    
+    Args:
+        event: Scheduled EventBridge event (contents are ignored)
+    
+    Returns:
+        {
+            "statusCode": 200,
+            "unhealthy": {"i-1234567890abcdef0": "not online after 20 minutes"}
+        }
+    """
+    try:
+        instances = get_in_service_instances()
+        # Raises while the master is unreachable: nothing is evaluated, no drop is counted
+        nodes = get_node_states()
+        now = time.time()
+        
+        agents = {instance['InstanceId']: nodes.get(f"unity-agent-{instance['InstanceId']}") for instance in instances}
+        master_restarted = dropped_together(instances, agents)
+        if master_restarted:
+            logger.warning("Every connected agent dropped offline at once, not counting the drops")
+        
+        unhealthy = {}
+        for instance in instances:
+            reason = evaluate_instance(instance, agents[instance['InstanceId']], now, master_restarted)
+            if reason:
+                unhealthy[instance['InstanceId']] = reason
+        
+        for instance_id, reason in unhealthy.items():
+            logger.warning(f"Replacing agent {instance_id}: {reason}")
+            # The register Lambda returns the cache set to the pool once the instance has terminated
+            autoscaling.set_instance_health(
+                InstanceId=instance_id,
+                HealthStatus='Unhealthy',
+                ShouldRespectGracePeriod=True,
+            )
+        
+        publish_metrics(len(unhealthy))
+        
+        return {
+            'statusCode': 200,
+            'unhealthy': unhealthy
+        }
+        
+    except Exception as e:
+        logger.error(f"Error evaluating agent health: {str(e)}")
+        return {
+            'statusCode': 500,
+            'error': str(e)
+        }
+
+
+def evaluate_instance(instance: Dict[str, Any], node: Optional[Dict[str, Any]], now: float,
+                      master_restarted: bool = False) -> Optional[str]:
+    """Return why an instance is unhealthy, or None if it is healthy."""
+    instance_id = instance['InstanceId']
+    tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+    age_minutes = (now - instance['LaunchTime'].timestamp()) / 60
+    
+    # Nodes taken offline on purpose are left alone
+    if node and node['temporarilyOffline']:
+        return None
+    
+    online = bool(node) and not node['offline']
+    previous_state = tags.get(NODE_STATE_TAG)
+    drops = recent_drops(tags.get(OFFLINE_DROPS_TAG), now)
+    
+    if online:
+        if previous_state != 'online':
+            tag_instance(instance_id, {NODE_STATE_TAG: 'online'})
+        return None
+    
+    if previous_state == 'online':
+        # Left online, so a node that does not reconnect counts its drop once the master is back
+        if master_restarted:
+            return None
+        drops.append(int(now))
+        tag_instance(instance_id, {
+            NODE_STATE_TAG: f"offline@{int(now)}",
+            OFFLINE_DROPS_TAG: ' '.join(str(dropped) for dropped in drops[-MAX_OFFLINE_DROPS:]),
+        })
+        if len(drops) >= MAX_OFFLINE_DROPS:
+            return f"dropped offline {len(drops)} times in {OFFLINE_DROPS_WINDOW_HOURS} hours"
+        return None
+    
+    if previous_state:
+        # Was online before; the JNLP service gets a while to reconnect
+        _, offline_minutes = parse_timestamped(previous_state, now)
+        if offline_minutes is not None and offline_minutes >= OFFLINE_DEADLINE_MINUTES:
+            return f"offline for {offline_minutes:.0f} minutes"
+        return None
+    
+    # Never came online: a boot whose user data started (and tagged it) gets a grace period
+    if age_minutes < ONLINE_DEADLINE_MINUTES:
+        return None
+    boot_state, _ = parse_timestamped(tags.get(BOOT_PHASE_TAG), now)
+    if boot_state and age_minutes < ONLINE_DEADLINE_MINUTES + BOOT_STARTED_GRACE_MINUTES:
+        return None
+    return f"not online after {age_minutes:.0f} minutes (boot {boot_state or 'never started'})"
+
+
+def dropped_together(instances: List[Dict[str, Any]], nodes: Dict[str, Optional[Dict[str, Any]]]) -> bool:
+    """Whether every agent that was online has dropped at once, as when the master restarts."""
+    connected = [
+        instance['InstanceId'] for instance in instances
+        if any(tag['Key'] == NODE_STATE_TAG and tag['Value'] == 'online' for tag in instance.get('Tags', []))
+    ]
+    dropped = [
+        instance_id for instance_id in connected
+        if not nodes[instance_id] or (nodes[instance_id]['offline'] and not nodes[instance_id]['temporarilyOffline'])
+    ]
+    return len(connected) > 1 and len(dropped) == len(connected)
+
+
+def recent_drops(value: Optional[str], now: float) -> List[int]:
+    """Epochs of the offline drops within the window, from the space-separated tag value."""
+    drops = []
+    for dropped in (value or '').split():
+        try:
+            dropped = int(dropped)
+        except ValueError:
+            continue
+        # Older drops age out, as do the plain counts of earlier versions
+        if now - dropped < OFFLINE_DROPS_WINDOW_HOURS * 3600:
+            drops.append(dropped)
+    return drops
+
+
+def parse_timestamped(value: Optional[str], now: float):
+    """Parse a '<state>@<epoch>' tag value into (state, minutes since then)."""
+    if not value or '@' not in value:
+        return None, None
+    phase, started = value.rsplit('@', 1)
+    try:
+        return phase, (now - int(started)) / 60
+    except ValueError:
+        return phase, None
+
+
+def get_in_service_instances() -> List[Dict[str, Any]]:
+    """Return InService agent instances of all pools with their launch time and tags."""
+    response = autoscaling.describe_auto_scaling_groups(
+        AutoScalingGroupNames=AUTO_SCALING_GROUP_NAMES
+    )
+    
+    instance_ids = [
+        instance['InstanceId']
+        for group in response['AutoScalingGroups']
+        for instance in group['Instances']
+        if instance['LifecycleState'] == 'InService'
+    ]
+    if not instance_ids:
+        return []
+    
+    instances = []
+    paginator = ec2.get_paginator('describe_instances')
+    for page in paginator.paginate(InstanceIds=instance_ids):
+        for reservation in page['Reservations']:
+            instances.extend(reservation['Instances'])
+    
+    return instances
+
+
+def get_node_states() -> Dict[str, Dict[str, Any]]:
+    """Return the online state of every Jenkins node by name."""
+    url = f"{JENKINS_URL}/computer/api/json?tree=computer[displayName,offline,temporarilyOffline]"
+    with urllib.request.urlopen(url, timeout=10) as response:
+        computers = json.loads(response.read())['computer']
+    
+    return {computer['displayName']: computer for computer in computers}
+
+
+def tag_instance(instance_id: str, tags: Dict[str, str]):
+    """Persist health state on the instance."""
+    ec2.create_tags(
+        Resources=[instance_id],
+        Tags=[{'Key': key, 'Value': value} for key, value in tags.items()]
+    )
+
+
+def publish_metrics(unhealthy: int):
+    """Publish the number of agents marked unhealthy."""
+    try:
+        cloudwatch.put_metric_data(
+            Namespace=METRICS_NAMESPACE,
+            MetricData=[
+                {'MetricName': 'UnhealthyAgentsReplaced', 'Value': unhealthy, 'Unit': 'Count'},
+            ]
+        )
+    except Exception as e:
+        logger.error(f"Error publishing health metrics: {str(e)}")
@@ -0,0 +1,145 @@
+"""Hour-of-week demand forecast for predictive agent pre-scaling.
+
+Demand is the number of agents a pool needed in an hour: peak busy executors
+plus peak queued builds, divided by the executors per agent. The forecast for
+an hour is a quantile of the same hour of the week in the previous weeks.
+Shared by the agent-prescaling Lambda and forecast-agent-demand.py.
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+HOUR = timedelta(hours=1)
+WEEK = timedelta(weeks=1)
+
+
+def hourly_demand(busy: Dict[datetime, float], queued: Dict[datetime, float], num_executors: int) -> Dict[datetime, int]:
+    """Agents needed per hour from busy executors and queued builds."""
+    return {
+        hour: math.ceil((busy.get(hour, 0) + queued.get(hour, 0)) / num_executors)
+        for hour in set(busy) | set(queued)
+    }
+
+
+def load_demand_history(cloudwatch, namespace: str, pool_name: str, num_executors: int,
+                        start: datetime, end: datetime) -> Dict[datetime, int]:
+    """Hourly demand of a pool from the metrics of the agent-queue-metrics Lambda."""
+    queries = [
+        {
+            'Id': query_id,
+            'MetricStat': {
+                'Metric': {
+                    'Namespace': namespace,
+                    'MetricName': metric_name,
+                    'Dimensions': [{'Name': 'Pool', 'Value': pool_name}],
+                },
+                'Period': 3600,
+                'Stat': 'Maximum',
+            },
+        }
+        for query_id, metric_name in [('busy', 'BusyExecutors'), ('queued', 'QueueLength')]
+    ]
+    
+    series = {'busy': {}, 'queued': {}}
+    paginator = cloudwatch.get_paginator('get_metric_data')
+    for page in paginator.paginate(MetricDataQueries=queries, StartTime=start, EndTime=end):
+        for result in page['MetricDataResults']:
+            series[result['Id']].update(
+                (timestamp.astimezone(timezone.utc), value)
+                for timestamp, value in zip(result['Timestamps'], result['Values'])
+            )
+    
+    return hourly_demand(series['busy'], series['queued'], num_executors)
+
+
+def quantile(values: List[float], q: float) -> float:
+    """Linearly interpolated quantile of a non-empty list."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def forecast(history: Dict[datetime, int], hour: datetime, lookback_weeks: int, q: float) -> Optional[int]:
+    """Agents needed in an hour, or None without history for that hour of the week."""
+    samples = [
+        history[hour - WEEK * weeks]
+        for weeks in range(1, lookback_weeks + 1)
+        if hour - WEEK * weeks in history
+    ]
+    if not samples:
+        return None
+    return math.ceil(quantile(samples, q))
+
+
+def plan_capacity(history: Dict[datetime, int], start: datetime, hours: int, lookback_weeks: int, q: float,
+                  min_instances: int, max_instances: int) -> List[Tuple[datetime, int]]:
+    """Minimum capacity for each hour from start, within the pool's bounds."""
+    plan = []
+    for offset in range(hours):
+        hour = start + HOUR * offset
+        predicted = forecast(history, hour, lookback_weeks, q) or 0
+        plan.append((hour, min(max_instances, max(min_instances, predicted))))
+    return plan
+
+
+def schedule_changes(plan: List[Tuple[datetime, int]], lead: timedelta) -> List[Tuple[datetime, int]]:
+    """Times at which the minimum capacity changes.
+    
+    Each hour's capacity must be in service from `lead` before the hour until
+    its end, so raises happen early and drops wait for the busier hour to end.
+    """
+    intervals = [(hour - lead, hour + HOUR, capacity) for hour, capacity in plan]
+    boundaries = sorted({time for start, end, _ in intervals for time in (start, end)})
+    
+    changes = []
+    for time in boundaries:
+        covering = [capacity for start, end, capacity in intervals if start <= time < end]
+        if not covering:
+            continue
+        capacity = max(covering)
+        if not changes or changes[-1][1] != capacity:
+            changes.append((time, capacity))
+    
+    return changes
+
+
+def backtest(history: Dict[datetime, int], start: datetime, end: datetime, lookback_weeks: int, q: float,
+             min_instances: int, max_instances: int, boot_minutes: float) -> Dict[str, float]:
+    """Replay the forecast hour by hour against recorded demand.
+    
+    Both fleets keep the agents of the previous hour. Each agent needed above
+    that costs one agent boot of waiting builds: above min_instances for the
+    reactive fleet, above the forecast for the pre-scaled one.
+    """
+    hours = 0
+    abs_error = error = 0
+    reactive_wait = predictive_wait = extra_agent_hours = 0.0
+    
+    hour = start
+    while hour < end:
+        predicted = forecast(history, hour, lookback_weeks, q)
+        if hour in history and predicted is not None:
+            actual = history[hour]
+            carried = history.get(hour - HOUR, 0)
+            reactive = max(min_instances, carried)
+            prescaled = max(reactive, min(max_instances, predicted))
+            
+            hours += 1
+            abs_error += abs(predicted - actual)
+            error += predicted - actual
+            reactive_wait += max(0, actual - reactive) * boot_minutes
+            predictive_wait += max(0, actual - prescaled) * boot_minutes
+            extra_agent_hours += max(0, prescaled - max(reactive, actual))
+        hour += HOUR
+    
+    return {
+        'hours': hours,
+        'mean_absolute_error': round(abs_error / hours, 2) if hours else None,
+        'bias': round(error / hours, 2) if hours else None,
+        'reactive_wait_minutes': round(reactive_wait, 1),
+        'predictive_wait_minutes': round(predictive_wait, 1),
+        'avoided_wait_minutes': round(reactive_wait - predictive_wait, 1),
+        'extra_agent_hours': round(extra_agent_hours, 1),
+    }
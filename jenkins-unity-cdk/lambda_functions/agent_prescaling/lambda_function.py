@@ -0,0 +1,121 @@
+"""Lambda function to raise agent pool minimums ahead of recurring queue peaks."""
+
+import json
+import os
+import boto3
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Tuple
+
+from demand_forecast import HOUR, WEEK, load_demand_history, plan_capacity, schedule_changes
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+autoscaling = boto3.client('autoscaling')
+cloudwatch = boto3.client('cloudwatch')
+
+# Environment variables
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'JenkinsUnity/AgentFleet')
+# {pool_name: {asg_name, num_executors, min_instances, max_instances}}
+AGENT_POOLS = json.loads(os.environ.get('AGENT_POOLS') or '{}')
+LOOKBACK_WEEKS = int(os.environ.get('LOOKBACK_WEEKS', '4'))
+QUANTILE = float(os.environ.get('QUANTILE', '0.8'))
+LEAD_MINUTES = int(os.environ.get('LEAD_MINUTES', '30'))
+HORIZON_HOURS = int(os.environ.get('HORIZON_HOURS', '24'))
+PRESCALING_ENABLED = os.environ.get('PRESCALING_ENABLED', 'true').lower() == 'true'
+
+# Scheduled actions owned by this function; others on the group are left alone
+ACTION_PREFIX = 'prescale-'
+# BatchPutScheduledUpdateGroupAction accepts at most 50 actions per call
+ACTION_BATCH_SIZE = 50
+
+
+def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    Replace each pool's pre-scaling scheduled actions with a fresh forecast.
+    
+    Args:
+        event: Scheduled EventBridge event (contents are ignored)
+    
+    Returns:
+        {
+            "statusCode": 200,
+            "pools": {"linux": [["2024-01-15T07:30:00Z", 4], ["2024-01-15T19:00:00Z", 0]]}
+        }
+    """
+    try:
+        now = datetime.now(timezone.utc)
+        start = now.replace(minute=0, second=0, microsecond=0) + HOUR
+        
+        scheduled = {}
+        for pool_name, pool in AGENT_POOLS.items():
+            history = load_demand_history(
+                cloudwatch, METRICS_NAMESPACE, pool_name, pool['num_executors'],
+                start - WEEK * LOOKBACK_WEEKS - HOUR, now,
+            )
+            plan = plan_capacity(
+                history, start, HORIZON_HOURS, LOOKBACK_WEEKS, QUANTILE,
+                pool['min_instances'], pool['max_instances'],
+            )
+            changes = schedule_changes(plan, timedelta(minutes=LEAD_MINUTES))
+            
+            # Disabled: clear the pending actions, the pool minimum applies again
+            if not PRESCALING_ENABLED:
+                changes = []
+            
+            replace_scheduled_actions(pool['asg_name'], changes, now)
+            scheduled[pool_name] = [
+                [time.strftime('%Y-%m-%dT%H:%M:%SZ'), capacity] for time, capacity in changes
+            ]
+            logger.info(f"Pool {pool_name}: {len(history)} hours of history, minimum changes {scheduled[pool_name]}")
+        
+        return {
+            'statusCode': 200,
+            'pools': scheduled
+        }
+    
+    except Exception as e:
+        logger.error(f"Error scheduling agent pre-scaling: {str(e)}")
+        return {
+            'statusCode': 500,
+            'error': str(e)
+        }
+
+
+def replace_scheduled_actions(asg_name: str, changes: List[Tuple[datetime, int]], now: datetime):
+    """Delete the group's pending pre-scaling actions and schedule the new minimum changes."""
+    existing = []
+    paginator = autoscaling.get_paginator('describe_scheduled_actions')
+    for page in paginator.paginate(AutoScalingGroupName=asg_name):
+        existing.extend(
+            action['ScheduledActionName'] for action in page['ScheduledUpdateGroupActions']
+            if action['ScheduledActionName'].startswith(ACTION_PREFIX)
+        )
+    for i in range(0, len(existing), ACTION_BATCH_SIZE):
+        autoscaling.batch_delete_scheduled_action(
+            AutoScalingGroupName=asg_name,
+            ScheduledActionNames=existing[i:i + ACTION_BATCH_SIZE],
+        )
+    
+    # Changes due before now are applied right away, only the latest counts
+    earliest = now + timedelta(minutes=1)
+    actions = {}
+    for time, capacity in changes:
+        start_time = max(time, earliest)
+        actions[start_time] = {
+            'ScheduledActionName': f"{ACTION_PREFIX}{start_time.strftime('%Y%m%d%H%M')}",
+            'StartTime': start_time,
+            'MinSize': capacity,
+        }
+    
+    actions = list(actions.values())
+    for i in range(0, len(actions), ACTION_BATCH_SIZE):
+        response = autoscaling.batch_put_scheduled_update_group_action(
+            AutoScalingGroupName=asg_name,
+            ScheduledUpdateGroupActions=actions[i:i + ACTION_BATCH_SIZE],
+        )
+        for failed in response.get('FailedScheduledUpdateGroupActions', []):
+            logger.error(f"Failed to schedule {failed['ScheduledActionName']} on {asg_name}: {failed.get('ErrorMessage')}")
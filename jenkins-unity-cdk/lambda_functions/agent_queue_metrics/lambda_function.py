@@ -0,0 +1,106 @@
+"""Lambda function to publish the Jenkins build queue and executors of each agent pool."""
+
+import json
+import os
+import boto3
+import logging
+import urllib.parse
+import urllib.request
+from typing import Dict, Any, List
+
+from queue_pools import queue_lengths
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+cloudwatch = boto3.client('cloudwatch')
+
+# Environment variables
+JENKINS_URL = os.environ.get('JENKINS_URL', 'http://jenkins.unity-cicd.internal:8080')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'JenkinsUnity/AgentFleet')
+# Agent pools in config order: [{"name": "linux", "labels": "unity linux"}]
+AGENT_POOLS = json.loads(os.environ.get('AGENT_POOLS') or '[{"name": "linux", "labels": "unity linux"}]')
+
+
+def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    Publish queue length and executor usage per agent pool for queue-based scaling.
+    
+    Args:
+        event: Scheduled EventBridge event (contents are ignored)
+    
+    Returns:
+        {
+            "statusCode": 200,
+            "pools": {"linux": {"QueueLength": 2, "BusyExecutors": 4, "TotalExecutors": 4}}
+        }
+    """
+    try:
+        # Every queued build counts against one pool, the first that can run it
+        queued = queue_lengths(get_queue_items(), AGENT_POOLS)
+        
+        pools = {}
+        for pool in AGENT_POOLS:
+            executors = get_label_stats('&&'.join(pool['labels'].split()))
+            pools[pool['name']] = {
+                'QueueLength': queued[pool['name']],
+                'BusyExecutors': executors['busy_executors'],
+                'TotalExecutors': executors['total_executors'],
+            }
+        
+        publish_metrics(pools)
+        
+        logger.info(f"Agent pool queues: {pools}")
+        return {
+            'statusCode': 200,
+            'pools': pools
+        }
+    
+    except Exception as e:
+        logger.error(f"Error publishing agent queue metrics: {str(e)}")
+        return {
+            'statusCode': 500,
+            'error': str(e)
+        }
+
+
+def get_queue_items() -> List[Dict[str, Any]]:
+    """Return the builds in the Jenkins queue with why they wait (the label they need)."""
+    url = f"{JENKINS_URL}/queue/api/json?tree=items[id,buildable,why]"
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read()).get('items', [])
+
+
+def get_label_stats(label: str) -> Dict[str, int]:
+    """Return the executor counts of a label expression."""
+    url = f"{JENKINS_URL}/label/{urllib.parse.quote(label)}/api/json?tree=busyExecutors,totalExecutors"
+    with urllib.request.urlopen(url, timeout=10) as response:
+        stats = json.loads(response.read())
+    
+    return {
+        'busy_executors': stats.get('busyExecutors', 0),
+        'total_executors': stats.get('totalExecutors', 0),
+    }
+
+
+def publish_metrics(pools: Dict[str, Dict[str, float]]):
+    """Publish pool metrics with the Pool dimension (scaling policies read QueueLength)."""
+    metric_data = [
+        {
+            'MetricName': metric_name,
+            'Dimensions': [{'Name': 'Pool', 'Value': pool_name}],
+            'Value': value,
+            'Unit': 'Count',
+        }
+        for pool_name, metrics in pools.items()
+        for metric_name, value in metrics.items()
+    ]
+    
+    # PutMetricData accepts at most 1000 values per call
+    for i in range(0, len(metric_data), 1000):
+        cloudwatch.put_metric_data(
+            Namespace=METRICS_NAMESPACE,
+            MetricData=metric_data[i:i + 1000]
+        )
@@ -0,0 +1,120 @@
+"""Assign queued Jenkins builds to the agent pools that can run them.
+
+A build waiting for an executor names the label expression it asked for in its
+queue reason ("Waiting for next available executor on ‘unity&&android’",
+"There are no nodes with the label ‘unity&&webgl’"). The expression is matched
+against each pool's labels; the build counts against the first pool, in config
+order, whose agents satisfy it. Each build counts once, so labels several pools
+share never add up, and a pool scaled to zero still sees its own queue.
+"""
+
+import re
+from typing import Any, Dict, FrozenSet, List, Optional
+
+# Operators of Jenkins label expressions, loosest first
+_BINARY_OPERATORS = ['<->', '->', '||', '&&']
+_OPERATIONS = {
+    '<->': lambda a, b: a == b,
+    '->': lambda a, b: not a or b,
+    '||': lambda a, b: a or b,
+    '&&': lambda a, b: a and b,
+}
+_TOKEN = re.compile(r'\s*(<->|->|&&|\|\||!|\(|\)|"(?:[^"\\]|\\.)*"|(?:[^\s()!&|<>"-]|-(?!>))+)')
+# The label in a queue reason, between the typographic quotes of Jenkins' messages
+_REASON_LABEL = re.compile(r"‘(.+?)’")
+
+
+def _tokenize(expression: str) -> List[str]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f"Invalid label expression: {expression}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+def label_matches(expression: str, labels: FrozenSet[str]) -> bool:
+    """Whether an agent with these labels satisfies a Jenkins label expression.
+    
+    Atoms side by side ("unity linux") must all match, as if joined by &&.
+    """
+    tokens = _tokenize(expression)
+    position = 0
+
+    def parse(level):
+        nonlocal position
+        if level == len(_BINARY_OPERATORS):
+            return parse_unary()
+        operator = _BINARY_OPERATORS[level]
+        left = parse(level + 1)
+        while position < len(tokens):
+            token = tokens[position]
+            if token == operator:
+                position += 1
+            elif operator != '&&' or token in (')', *_BINARY_OPERATORS):
+                break
+            # Otherwise atoms side by side
+            left = _OPERATIONS[operator](left, parse(level + 1))
+        return left
+
+    def parse_unary():
+        nonlocal position
+        if position >= len(tokens):
+            raise ValueError(f"Invalid label expression: {expression}")
+        token = tokens[position]
+        position += 1
+        if token == '!':
+            return not parse_unary()
+        if token == '(':
+            value = parse(0)
+            if position >= len(tokens) or tokens[position] != ')':
+                raise ValueError(f"Invalid label expression: {expression}")
+            position += 1
+            return value
+        if token in (')', *_BINARY_OPERATORS):
+            raise ValueError(f"Invalid label expression: {expression}")
+        return token.strip('"') in labels
+    
+    value = parse(0)
+    if position != len(tokens):
+        raise ValueError(f"Invalid label expression: {expression}")
+    return value
+
+
+def queued_label(why: Optional[str]) -> Optional[str]:
+    """The label expression a queued build waits for, None when it asks for none."""
+    match = _REASON_LABEL.search(why or '')
+    return match.group(1) if match else None
+
+
+def pool_for_label(label: Optional[str], pools: List[Dict[str, Any]]) -> Optional[str]:
+    """The first pool whose agents can run a build of this label; the first pool for any agent.
+    
+    None when no pool can (another node's label, a typo in the job).
+    """
+    if label is None:
+        return pools[0]['name']
+    for pool in pools:
+        if label_matches(label, frozenset(pool['labels'].split())):
+            return pool['name']
+    return None
+
+
+def queue_lengths(items: List[Dict[str, Any]], pools: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Buildable queued builds per pool, from the items of Jenkins' queue API."""
+    lengths = {pool['name']: 0 for pool in pools}
+    for item in items:
+        # Blocked builds (quiet period, concurrent build of the job) need no agent yet
+        if not item.get('buildable'):
+            continue
+        try:
+            pool = pool_for_label(queued_label(item.get('why')), pools)
+        except ValueError:
+            pool = None
+        if pool is not None:
+            lengths[pool] += 1
+    return lengths
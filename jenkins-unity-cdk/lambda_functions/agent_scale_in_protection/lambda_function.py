@@ -0,0 +1,186 @@
+"""Lambda function to keep scale-in protection on agents that are running builds."""
+
+import json
+import os
+import boto3
+import logging
+import urllib.request
+from typing import Dict, Any, List, Tuple
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+autoscaling = boto3.client('autoscaling')
+ec2 = boto3.client('ec2')
+cloudwatch = boto3.client('cloudwatch')
+
+# Environment variables
+AUTO_SCALING_GROUP_NAMES = os.environ.get('AUTO_SCALING_GROUP_NAMES', 'unity-cicd-jenkins-agent-asg-linux').split(',')
+JENKINS_URL = os.environ.get('JENKINS_URL', 'http://jenkins.unity-cicd.internal:8080')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'JenkinsUnity/AgentFleet')
+PROTECTION_ENABLED = os.environ.get('PROTECTION_ENABLED', 'true').lower() == 'true'
+
+# SetInstanceProtection accepts at most 50 instances per call
+PROTECTION_BATCH_SIZE = 50
+BUSY_TAG_KEY = 'jenkins:busy'
+
+
+def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    Reconcile ASG scale-in protection with Jenkins executor state.
+    
+    Args:
+        event: Scheduled EventBridge event (contents are ignored)
+    
+    Returns:
+        {
+            "statusCode": 200,
+            "busy": 3,
+            "protected": ["i-1234567890abcdef0"],
+            "unprotected": ["i-0fedcba0987654321"]
+        }
+    """
+    try:
+        instances, groups = get_in_service_instances()
+        busy_executors = get_busy_executors()
+        busy_tags = get_busy_tags()
+        
+        busy = {
+            instance_id for instance_id in instances
+            if busy_executors.get(f"unity-agent-{instance_id}", 0) > 0
+        }
+        idle = {
+            instance_id for instance_id in instances
+            if f"unity-agent-{instance_id}" in busy_executors and instance_id not in busy
+        }
+        # Agents launch protected; only those Jenkins reported idle on the previous run
+        # too are released, unknown nodes and agents between two builds keep protection
+        confirmed_idle = {instance_id for instance_id in idle if busy_tags.get(instance_id) == 'false'}
+        
+        to_protect = sorted(
+            instance_id for instance_id, protected in instances.items()
+            if instance_id in busy and not protected
+        )
+        to_unprotect = sorted(
+            instance_id for instance_id, protected in instances.items()
+            if protected and instance_id in confirmed_idle
+        )
+        
+        # The busy tag outlives the instance, so terminations can be attributed to lost
+        # builds whether or not protection is enabled; it is written when the state changes
+        tag_busy_state(sorted(instance_id for instance_id in busy if busy_tags.get(instance_id) != 'true'), True)
+        tag_busy_state(sorted(instance_id for instance_id in idle if busy_tags.get(instance_id) != 'false'), False)
+        
+        if not PROTECTION_ENABLED:
+            to_protect, to_unprotect = [], []
+        set_protection(to_protect, True, groups)
+        set_protection(to_unprotect, False, groups)
+        
+        protected_count = sum(
+            1 for instance_id, protected in instances.items()
+            if (protected or instance_id in to_protect) and instance_id not in to_unprotect
+        )
+        publish_metrics(
+            busy=len(busy),
+            protected=protected_count,
+            changes=len(to_protect) + len(to_unprotect),
+        )
+        
+        logger.info(f"{len(busy)}/{len(instances)} agents busy, protected {to_protect}, unprotected {to_unprotect}")
+        return {
+            'statusCode': 200,
+            'busy': len(busy),
+            'protected': to_protect,
+            'unprotected': to_unprotect
+        }
+        
+    except Exception as e:
+        logger.error(f"Error reconciling scale-in protection: {str(e)}")
+        return {
+            'statusCode': 500,
+            'error': str(e)
+        }
+
+
+def get_in_service_instances() -> Tuple[Dict[str, bool], Dict[str, str]]:
+    """Return InService agent instances of all pools with their scale-in protection and group."""
+    response = autoscaling.describe_auto_scaling_groups(
+        AutoScalingGroupNames=AUTO_SCALING_GROUP_NAMES
+    )
+    
+    instances = {}
+    groups = {}
+    for group in response['AutoScalingGroups']:
+        for instance in group['Instances']:
+            if instance['LifecycleState'] == 'InService':
+                instances[instance['InstanceId']] = instance['ProtectedFromScaleIn']
+                groups[instance['InstanceId']] = group['AutoScalingGroupName']
+    
+    return instances, groups
+
+
+def get_busy_executors() -> Dict[str, int]:
+    """Return busy executor counts per Jenkins node name."""
+    url = f"{JENKINS_URL}/computer/api/json?tree=computer[displayName,executors[idle]]"
+    with urllib.request.urlopen(url, timeout=10) as response:
+        computers = json.loads(response.read())['computer']
+    
+    return {
+        computer['displayName']: sum(1 for executor in computer.get('executors', []) if not executor.get('idle', True))
+        for computer in computers
+    }
+
+
+def get_busy_tags() -> Dict[str, str]:
+    """Return the busy tag of each agent instance, as the previous runs left it."""
+    paginator = ec2.get_paginator('describe_tags')
+    tags = {}
+    for page in paginator.paginate(Filters=[
+        {'Name': 'key', 'Values': [BUSY_TAG_KEY]},
+        {'Name': 'resource-type', 'Values': ['instance']},
+    ]):
+        tags.update((tag['ResourceId'], tag['Value']) for tag in page['Tags'])
+    return tags
+
+
+def set_protection(instance_ids: List[str], protected: bool, groups: Dict[str, str]):
+    """Toggle scale-in protection in batches, one group at a time."""
+    by_group = {}
+    for instance_id in instance_ids:
+        by_group.setdefault(groups[instance_id], []).append(instance_id)
+    
+    for group_name, group_instance_ids in by_group.items():
+        for i in range(0, len(group_instance_ids), PROTECTION_BATCH_SIZE):
+            autoscaling.set_instance_protection(
+                AutoScalingGroupName=group_name,
+                InstanceIds=group_instance_ids[i:i + PROTECTION_BATCH_SIZE],
+                ProtectedFromScaleIn=protected,
+            )
+
+
+def tag_busy_state(instance_ids: List[str], busy: bool):
+    """Record the busy state on the instances in one call (up to 1000 instances)."""
+    if not instance_ids:
+        return
+    
+    ec2.create_tags(
+        Resources=instance_ids,
+        Tags=[{'Key': BUSY_TAG_KEY, 'Value': 'true' if busy else 'false'}]
+    )
+
+
+def publish_metrics(busy: int, protected: int, changes: int):
+    """Publish fleet protection metrics."""
+    try:
+        cloudwatch.put_metric_data(
+            Namespace=METRICS_NAMESPACE,
+            MetricData=[
+                {'MetricName': 'BusyAgents', 'Value': busy, 'Unit': 'Count'},
+                {'MetricName': 'ProtectedAgents', 'Value': protected, 'Unit': 'Count'},
+                {'MetricName': 'ProtectionChanges', 'Value': changes, 'Unit': 'Count'},
+            ]
+        )
+    except Exception as e:
+        logger.error(f"Error publishing protection metrics: {str(e)}")
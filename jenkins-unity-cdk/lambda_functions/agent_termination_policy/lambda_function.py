@@ -0,0 +1,201 @@
+"""Lambda function implementing a custom ASG termination policy for Jenkins agents."""
+
+import json
+import math
+import os
+import time
+import boto3
+import logging
+import urllib.request
+from typing import Dict, Any, List, Optional, Set
+
+import cache_sets  # Lambda layer
+import ec2_clients  # Lambda layer
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+dynamodb = boto3.resource('dynamodb')
+# Adaptive retries, on the EC2 API budget shared by the cache pool functions
+ec2 = ec2_clients.ec2_client()
+
+# Environment variables
+CACHE_POOL_TABLE = os.environ.get('CACHE_POOL_TABLE', 'unity-cicd-cache-pool-status')
+JENKINS_URL = os.environ.get('JENKINS_URL', 'http://jenkins.unity-cicd.internal:8080')
+RECENCY_HALF_LIFE_HOURS = float(os.environ.get('RECENCY_HALF_LIFE_HOURS', '24'))
+VOLUME_SIZE = int(os.environ.get('VOLUME_SIZE', '100'))
+
+# Cache value weights; a busy executor always outweighs any cache
+RECENCY_WEIGHT = 0.5
+DEMAND_WEIGHT = 0.3
+SIZE_WEIGHT = 0.2
+BUSY_EXECUTOR_VALUE = 10.0
+
+
+def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    Choose which agent instances the ASG terminates, least valuable first.
+    
+    Args:
+        event: {
+            "AutoScalingGroupName": "unity-cicd-jenkins-agent-asg-linux",
+            "CapacityToTerminate": [
+                {"AvailabilityZone": "us-east-1a", "Capacity": 1, "InstanceMarketOption": "spot"}
+            ],
+            "Instances": [
+                {"AvailabilityZone": "us-east-1a", "InstanceId": "i-1234567890abcdef0", ...}
+            ],
+            "Cause": "SCALE_IN"
+        }
+    
+    Returns:
+        {
+            "InstanceIDs": ["i-1234567890abcdef0"]
+        }
+    """
+    instances = event.get('Instances', [])
+    
+    try:
+        instance_ids = [instance['InstanceId'] for instance in instances]
+        busy_executors = get_busy_executors()
+        cache_values = get_cache_values(instance_ids)
+        
+        scores = {
+            instance_id: busy_executors.get(f"unity-agent-{instance_id}", 0) * BUSY_EXECUTOR_VALUE
+            + cache_values.get(instance_id, 0.0)
+            for instance_id in instance_ids
+        }
+        
+        selected = select_instances(instances, event.get('CapacityToTerminate', []), scores)
+        logger.info(f"Termination cause {event.get('Cause')}: scores {scores}, terminating {selected}")
+        return {'InstanceIDs': selected}
+        
+    except Exception as e:
+        # Returning no instances makes the ASG fall back to its default policy
+        logger.error(f"Error selecting instances to terminate: {str(e)}")
+        return {'InstanceIDs': []}
+
+
+def select_instances(instances: List[Dict[str, Any]], capacity_to_terminate: List[Dict[str, Any]],
+                     scores: Dict[str, float]) -> List[str]:
+    """Pick the lowest-scoring instances in each AZ, up to the requested capacity."""
+    selected = []
+    for capacity in capacity_to_terminate:
+        candidates = sorted(
+            (
+                instance for instance in instances
+                if instance['AvailabilityZone'] == capacity['AvailabilityZone']
+                and instance.get('InstanceMarketOption', capacity.get('InstanceMarketOption'))
+                == capacity.get('InstanceMarketOption')
+                and instance['InstanceId'] not in selected
+            ),
+            key=lambda instance: scores.get(instance['InstanceId'], 0.0)
+        )
+        selected.extend(instance['InstanceId'] for instance in candidates[:capacity['Capacity']])
+    return selected
+
+
+def get_busy_executors() -> Dict[str, int]:
+    """Return busy executor counts per Jenkins node name."""
+    try:
+        url = f"{JENKINS_URL}/computer/api/json?tree=computer[displayName,executors[idle]]"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            computers = json.loads(response.read())['computer']
+        
+        return {
+            computer['displayName']: sum(1 for executor in computer.get('executors', []) if not executor.get('idle', True))
+            for computer in computers
+        }
+        
+    except Exception as e:
+        # Without Jenkins state, rank on cache value alone
+        logger.error(f"Error reading executor state from Jenkins: {str(e)}")
+        return {}
+
+
+def get_cache_values(instance_ids: List[str]) -> Dict[str, float]:
+    """Score the cache set attached to each instance in [0, 1]."""
+    try:
+        attached = get_in_use_sets(instance_ids)
+        if not attached:
+            return {}
+        
+        demand = get_project_demand({item.get('ProjectId') for item in attached.values()})
+        # A striped cache set holds the data of all its volumes
+        cache_sets = {
+            instance_id: item.get('VolumeIds') or [item['VolumeId']] for instance_id, item in attached.items()
+        }
+        volume_sizes = get_volume_sizes([volume_id for volume_ids in cache_sets.values() for volume_id in volume_ids])
+        now = time.time()
+        
+        cache_values = {}
+        for instance_id, item in attached.items():
+            age_hours = max(0.0, now - float(item.get('LastUsed', now))) / 3600
+            recency = math.pow(0.5, age_hours / RECENCY_HALF_LIFE_HOURS)
+            set_size = sum(volume_sizes.get(volume_id, 0) for volume_id in cache_sets[instance_id])
+            size = min(1.0, set_size / VOLUME_SIZE)
+            cache_values[instance_id] = (RECENCY_WEIGHT * recency + DEMAND_WEIGHT * demand.get(item.get('ProjectId'), 0.0)
+                                         + SIZE_WEIGHT * size)
+        
+        return cache_values
+        
+    except Exception as e:
+        logger.error(f"Error reading cache pool state: {str(e)}")
+        return {}
+
+
+def get_in_use_sets(instance_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Return the in-use cache set of each instance, looked up under its key in Pool-Index."""
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    
+    attached = {}
+    for instance_id in instance_ids:
+        response = table.query(
+            IndexName='Pool-Index',
+            KeyConditionExpression='PoolKey = :pool_key',
+            ExpressionAttributeValues={':pool_key': cache_sets.held_pool_key(instance_id)}
+        )
+        for item in response['Items']:
+            attached[instance_id] = item
+    
+    return attached
+
+
+def get_project_demand(project_ids: Set[Optional[str]]) -> Dict[str, float]:
+    """Return the in-use cache sets of each project relative to the busiest of them, in [0, 1]."""
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    
+    counts = {}
+    for project_id in project_ids:
+        if not project_id:
+            continue
+        query_kwargs = {
+            'IndexName': 'Project-Status-Index',
+            'KeyConditionExpression': 'ProjectId = :project_id AND #status = :status',
+            'ExpressionAttributeNames': {'#status': 'Status'},
+            'ExpressionAttributeValues': {':project_id': project_id, ':status': 'InUse'},
+            'Select': 'COUNT',
+        }
+        counts[project_id] = 0
+        while True:
+            response = table.query(**query_kwargs)
+            counts[project_id] += response['Count']
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    busiest = max(counts.values(), default=0)
+    return {project_id: count / busiest for project_id, count in counts.items() if busiest}
+
+
+def get_volume_sizes(volume_ids: List[str]) -> Dict[str, int]:
+    """Return volume sizes in GiB; deleted volumes are left out (a filter, unlike VolumeIds, ignores them)."""
+    sizes = {}
+    paginator = ec2.get_paginator('describe_volumes')
+    # At most 200 values per filter
+    for i in range(0, len(volume_ids), 200):
+        for page in paginator.paginate(Filters=[{'Name': 'volume-id', 'Values': volume_ids[i:i + 200]}]):
+            sizes.update((volume['VolumeId'], volume['Size']) for volume in page['Volumes'])
+    return sizes
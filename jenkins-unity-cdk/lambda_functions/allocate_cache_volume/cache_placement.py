@@ -0,0 +1,59 @@
+"""AZ placement for new agents that follows the cache pool.
+
+An agent allocates its cache set in its own AZ, so an agent launched where the
+pool holds an Available set of its partition (and stripe width) starts warm,
+and one launched elsewhere starts from an empty or restored volume. AZs are
+ranked by their freshest matching set (seconds since it was last used by a
+build or warmed), AZs without one keep their given order behind them.
+"""
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+def cache_set_width(item: Dict[str, Any]) -> int:
+    """Volumes in a cache set; single volumes predate cache sets."""
+    return len(item.get('VolumeIds') or [item['VolumeId']])
+
+
+def rank_zones(items: Iterable[Dict[str, Any]], zones: List[str], project_id: str,
+               stripe_width: int, now: int) -> List[Dict[str, Any]]:
+    """Rank the launchable AZs by the warm cache sets waiting there.
+    
+    Returns:
+        [{"availability_zone": "us-east-1b", "warm_sets": 2, "freshest_age": 7200},
+         {"availability_zone": "us-east-1a", "warm_sets": 0, "freshest_age": None}]
+    """
+    ranking = {zone: {'availability_zone': zone, 'warm_sets': 0, 'freshest_age': None} for zone in zones}
+    for item in items:
+        zone = ranking.get(item.get('AvailabilityZone'))
+        if (zone is None or item.get('Status') != 'Available'
+                or item.get('ProjectId', 'unity-game') != project_id or cache_set_width(item) != stripe_width):
+            continue
+        age = now - max(int(item.get('LastUsed', 0)), int(item.get('LastWarmed', 0)))
+        zone['warm_sets'] += 1
+        if zone['freshest_age'] is None or age < zone['freshest_age']:
+            zone['freshest_age'] = age
+    
+    # Stable sort: AZs without a warm set keep the given order
+    return sorted(ranking.values(), key=lambda zone: (zone['freshest_age'] is None, zone['freshest_age'] or 0))
+
+
+def place_instances(ranking: List[Dict[str, Any]], count: int) -> List[Tuple[str, int]]:
+    """(AZ, instances) in launch order: one instance per warm set down the ranking, the rest in the first AZ."""
+    placement = {}
+    remaining = count
+    for zone in ranking:
+        launched = min(zone['warm_sets'], remaining)
+        if launched:
+            placement[zone['availability_zone']] = launched
+            remaining -= launched
+    if remaining and ranking:
+        first = ranking[0]['availability_zone']
+        placement[first] = placement.get(first, 0) + remaining
+    return list(placement.items())
+
+
+def warm_hits(ranking: List[Dict[str, Any]], launched: Dict[str, int]) -> int:
+    """Launched instances that have a warm set waiting in their AZ."""
+    warm_sets = {zone['availability_zone']: zone['warm_sets'] for zone in ranking}
+    return sum(min(count, warm_sets.get(zone, 0)) for zone, count in launched.items())
@@ -2,18 +2,29 @@
 
 import json
 import os
+import random
 import boto3
 import logging
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+from botocore.exceptions import ClientError
+import cache_sets  # Lambda layer
+import ec2_clients  # Lambda layer
+import sdk_profiler  # Lambda layer
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Opt-in AWS call profiling (SDK_PROFILING), hooked before the clients are created
+sdk_profiler.install()
+
 # Initialize AWS clients
 dynamodb = boto3.resource('dynamodb')
-ec2 = boto3.client('ec2')
+# Adaptive retries, on the EC2 API budget shared by the cache pool functions
+ec2 = ec2_clients.ec2_client()
+cloudwatch = boto3.client('cloudwatch')
 
 # Environment variables
 CACHE_POOL_TABLE = os.environ.get('CACHE_POOL_TABLE', 'unity-cicd-cache-pool-status')
@@ -21,8 +32,18 @@ VOLUME_SIZE = int(os.environ.get('VOLUME_SIZE', '100'))
 VOLUME_TYPE = os.environ.get('VOLUME_TYPE', 'gp3')
 IOPS = int(os.environ.get('IOPS', '3000'))
 THROUGHPUT = int(os.environ.get('THROUGHPUT', '125'))
+STRIPE_WIDTH = int(os.environ.get('STRIPE_WIDTH', '1'))
+# Allocations and warm hits per AZ: the maintenance Lambda places the pool's stock
+# by them, manage-launch-templates.py reports how often agents start warm
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'JenkinsUnity/AgentFleet')
+
+# Device names the agent attaches cache set volumes to (/dev/sdf../dev/sdm)
+MAX_STRIPE_WIDTH = 8
+# Sets claimed by concurrent allocations are skipped, up to this many per shard
+MAX_CLAIM_ATTEMPTS = 5
 
 
+@sdk_profiler.profiled
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
     Allocate a cache volume for a Jenkins agent.
@@ -31,13 +52,19 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         event: {
             "availability_zone": "us-east-1a",
             "project_id": "unity-game",
-            "instance_id": "i-1234567890abcdef0"  # optional
+            "instance_id": "i-1234567890abcdef0",  # optional
+            "volume_size": 200,  # optional volume profile of the agent pool,
+            "volume_type": "gp3",  # defaults to the cache_pool settings
+            "iops": 6000,
+            "throughput": 250,
+            "stripe_width": 2  # volumes per cache set, striped on the agent
         }
     
     Returns:
         {
             "statusCode": 200,
-            "volume_id": "vol-1234567890abcdef0",
+            "volume_id": "vol-1234567890abcdef0",  # the set's first volume, its key in the table
+            "volume_ids": ["vol-1234567890abcdef0", "vol-0fedcba0987654321"],
             "status": "Available|Created"
         }
     """
@@ -46,31 +73,43 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         availability_zone = event.get('availability_zone')
         project_id = event.get('project_id', 'unity-game')
         instance_id = event.get('instance_id')
+        volume_profile = {
+            'Size': int(event.get('volume_size', VOLUME_SIZE)),
+            'VolumeType': event.get('volume_type', VOLUME_TYPE),
+            'Iops': int(event.get('iops', IOPS)),
+            'Throughput': int(event.get('throughput', THROUGHPUT)),
+        }
+        stripe_width = int(event.get('stripe_width', STRIPE_WIDTH))
         
         if not availability_zone:
             raise ValueError("availability_zone is required")
+        if not 1 <= stripe_width <= MAX_STRIPE_WIDTH:
+            raise ValueError(f"stripe_width must be between 1 and {MAX_STRIPE_WIDTH}")
         
-        logger.info(f"Allocating cache volume for AZ: {availability_zone}, Project: {project_id}")
+        logger.info(f"Allocating cache volume for AZ: {availability_zone}, Project: {project_id}, "
+                    f"Stripe width: {stripe_width}")
         
-        # Try to find an available volume
-        volume_id = find_available_volume(availability_zone, project_id)
+        # Try to claim the most recently used available cache set of the same width
+        item = claim_available_volume(availability_zone, project_id, stripe_width, instance_id)
+        record_allocation(availability_zone, project_id, item is not None)
         
-        if volume_id:
-            # Mark volume as in use
-            update_volume_status(volume_id, 'InUse', instance_id)
+        if item:
+            volume_id = item['VolumeId']
             logger.info(f"Allocated existing volume: {volume_id}")
             return {
                 'statusCode': 200,
                 'volume_id': volume_id,
+                'volume_ids': cache_sets.cache_set_volumes(item),
                 'status': 'Available'
             }
         else:
-            # Create new volume
-            volume_id = create_new_volume(availability_zone, project_id, instance_id)
-            logger.info(f"Created new volume: {volume_id}")
+            # Create new volume set
+            volume_ids = create_new_volume(availability_zone, project_id, volume_profile, stripe_width, instance_id)
+            logger.info(f"Created new volume: {volume_ids}")
             return {
                 'statusCode': 200,
-                'volume_id': volume_id,
+                'volume_id': volume_ids[0],
+                'volume_ids': volume_ids,
                 'status': 'Created'
             }
             
@@ -82,29 +121,34 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         }
 
 
-def find_available_volume(availability_zone: str, project_id: str) -> Optional[str]:
-    """Find an available cache volume in the specified AZ."""
+def claim_available_volume(availability_zone: str, project_id: str, stripe_width: int = 1,
+                           instance_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Claim the most recently used Available cache set of the given width in the AZ.
+    
+    Pool-Index holds only Available sets, under one key per AZ, partition and
+    width with the newest LastUsed first, so each candidate is a one-item query.
+    With write shards a random shard is read first, spreading concurrent
+    allocations over the keys.
+    """
     try:
         table = dynamodb.Table(CACHE_POOL_TABLE)
         
-        # Query by AZ and Status
-        response = table.query(
-            IndexName='AZ-Status-Index',
-            KeyConditionExpression='AvailabilityZone = :az AND #status = :status',
-            ExpressionAttributeNames={'#status': 'Status'},
-            ExpressionAttributeValues={
-                ':az': availability_zone,
-                ':status': 'Available'
-            },
-            FilterExpression='ProjectId = :project_id',
-            ExpressionAttributeValues={
-                ':project_id': project_id
-            },
-            Limit=1
-        )
-        
-        if response['Items']:
-            return response['Items'][0]['VolumeId']
+        for shard in random.sample(range(cache_sets.INDEX_SHARDS), cache_sets.INDEX_SHARDS):
+            query = {
+                'IndexName': 'Pool-Index',
+                'KeyConditionExpression': 'PoolKey = :pool_key',
+                'ExpressionAttributeValues': {':pool_key': cache_sets.pool_key(availability_zone, project_id, stripe_width, shard)},
+                'ScanIndexForward': False,
+                'Limit': 1,
+            }
+            for _ in range(MAX_CLAIM_ATTEMPTS):
+                response = table.query(**query)
+                for item in response['Items']:
+                    if claim_volume(item['VolumeId'], instance_id):
+                        return item
+                if 'LastEvaluatedKey' not in response:
+                    break
+                query['ExclusiveStartKey'] = response['LastEvaluatedKey']
         
         return None
         
@@ -113,53 +157,102 @@ def find_available_volume(availability_zone: str, project_id: str) -> Optional[s
         return None
 
 
-def create_new_volume(availability_zone: str, project_id: str, instance_id: Optional[str] = None) -> str:
-    """Create a new EBS volume for cache."""
+def claim_volume(volume_id: str, instance_id: Optional[str] = None) -> bool:
+    """Mark an Available set as in use, under its instance's Pool-Index key; False if another allocation was first."""
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    
+    update_expression = 'SET #status = :in_use, LastUsed = :last_used'
+    expression_values = {
+        ':in_use': 'InUse',
+        ':available': 'Available',
+        ':last_used': int(datetime.utcnow().timestamp())
+    }
+    if instance_id:
+        update_expression += ', InstanceId = :instance_id, PoolKey = :pool_key'
+        expression_values[':instance_id'] = instance_id
+        expression_values[':pool_key'] = cache_sets.held_pool_key(instance_id)
+    else:
+        update_expression += ' REMOVE PoolKey'
+    
     try:
-        # Create EBS volume
-        response = ec2.create_volume(
-            Size=VOLUME_SIZE,
-            VolumeType=VOLUME_TYPE,
-            Iops=IOPS,
-            Throughput=THROUGHPUT,
-            AvailabilityZone=availability_zone,
-            Encrypted=True,
-            TagSpecifications=[
-                {
-                    'ResourceType': 'volume',
-                    'Tags': [
-                        {'Key': 'Name', 'Value': f'unity-cicd-cache-{availability_zone}'},
-                        {'Key': 'Project', 'Value': 'unity-cicd'},
-                        {'Key': 'Purpose', 'Value': 'Jenkins-Cache'},
-                        {'Key': 'ProjectId', 'Value': project_id},
-                        {'Key': 'ManagedBy', 'Value': 'Lambda'},
-                    ]
-                }
-            ]
+        table.update_item(
+            Key={'VolumeId': volume_id},
+            UpdateExpression=update_expression,
+            ConditionExpression='#status = :available',
+            ExpressionAttributeNames={'#status': 'Status'},
+            ExpressionAttributeValues=expression_values
         )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        logger.info(f"Volume {volume_id} was allocated meanwhile, trying the next one")
+        return False
+
+
+def create_new_volume(availability_zone: str, project_id: str, volume_profile: Dict[str, Any],
+                      stripe_width: int = 1, instance_id: Optional[str] = None) -> List[str]:
+    """Create a cache set of EBS volumes with the volume profile of the project's agent pool.
+    
+    Every volume of the set gets the full profile, so a set of N volumes has N
+    times the IOPS and throughput of one. The set is tracked under its first volume.
+    """
+    volume_ids = []
+    try:
+        for stripe_index in range(stripe_width):
+            # Create EBS volume
+            response = ec2.create_volume(
+                **volume_profile,
+                AvailabilityZone=availability_zone,
+                Encrypted=True,
+                TagSpecifications=[
+                    {
+                        'ResourceType': 'volume',
+                        'Tags': [
+                            {'Key': 'Name', 'Value': f'unity-cicd-cache-{availability_zone}'},
+                            {'Key': 'Project', 'Value': 'unity-cicd'},
+                            {'Key': 'Purpose', 'Value': 'Jenkins-Cache'},
+                            {'Key': 'ProjectId', 'Value': project_id},
+                            {'Key': 'StripeIndex', 'Value': str(stripe_index)},
+                            {'Key': 'ManagedBy', 'Value': 'Lambda'},
+                        ]
+                    }
+                ]
+            )
+            volume_ids.append(response['VolumeId'])
         
-        volume_id = response['VolumeId']
+        # Members find their set through the first volume
+        ec2.create_tags(Resources=volume_ids, Tags=[{'Key': 'CacheSet', 'Value': volume_ids[0]}])
         
-        # Wait for volume to be available
-        ec2.get_waiter('volume_available').wait(VolumeIds=[volume_id])
+        # Wait for volumes to be available
+        ec2.get_waiter('volume_available').wait(VolumeIds=volume_ids)
         
         # Add to DynamoDB
-        add_volume_to_pool(volume_id, availability_zone, project_id, instance_id)
+        add_volume_to_pool(volume_ids, availability_zone, project_id, instance_id)
         
-        return volume_id
+        return volume_ids
         
     except Exception as e:
         logger.error(f"Error creating new volume: {str(e)}")
+        # Don't leave part of a set behind
+        for volume_id in volume_ids:
+            try:
+                ec2.delete_volume(VolumeId=volume_id)
+            except Exception as cleanup_error:
+                logger.error(f"Error deleting volume {volume_id}: {str(cleanup_error)}")
         raise
 
 
-def add_volume_to_pool(volume_id: str, availability_zone: str, project_id: str, instance_id: Optional[str] = None):
-    """Add volume to the cache pool tracking table."""
+def add_volume_to_pool(volume_ids: List[str], availability_zone: str, project_id: str,
+                       instance_id: Optional[str] = None):
+    """Add a cache set to the cache pool tracking table."""
     try:
         table = dynamodb.Table(CACHE_POOL_TABLE)
         
         item = {
-            'VolumeId': volume_id,
+            'VolumeId': volume_ids[0],
+            'VolumeIds': volume_ids,
+            'StripeWidth': len(volume_ids),
             'Status': 'InUse' if instance_id else 'Building',
             'AvailabilityZone': availability_zone,
             'ProjectId': project_id,
@@ -170,6 +263,7 @@ def add_volume_to_pool(volume_id: str, availability_zone: str, project_id: str,
         
         if instance_id:
             item['InstanceId'] = instance_id
+            item['PoolKey'] = cache_sets.held_pool_key(instance_id)
         
         table.put_item(Item=item)
         
@@ -178,32 +272,33 @@ def add_volume_to_pool(volume_id: str, availability_zone: str, project_id: str,
         raise
 
 
-def update_volume_status(volume_id: str, status: str, instance_id: Optional[str] = None):
-    """Update volume status in DynamoDB."""
+def record_allocation(availability_zone: str, project_id: str, warm_hit: bool):
+    """Count the allocation in its AZ and whether an Available set was waiting there.
+    
+    CacheWarmHits is 1 or 0 per allocation, so its average is the warm hit rate.
+    A missing metric never fails an allocation.
+    """
+    dimensions = [
+        {'Name': 'AvailabilityZone', 'Value': availability_zone},
+        {'Name': 'ProjectId', 'Value': project_id},
+    ]
     try:
-        table = dynamodb.Table(CACHE_POOL_TABLE)
-        
-        update_expression = 'SET #status = :status, LastUsed = :last_used'
-        expression_values = {
-            ':status': status,
-            ':last_used': int(datetime.utcnow().timestamp())
-        }
-        expression_names = {'#status': 'Status'}
-        
-        if instance_id:
-            update_expression += ', InstanceId = :instance_id'
-            expression_values[':instance_id'] = instance_id
-        elif status == 'Available':
-            # Remove InstanceId when marking as available
-            update_expression += ' REMOVE InstanceId'
-        
-        table.update_item(
-            Key={'VolumeId': volume_id},
-            UpdateExpression=update_expression,
-            ExpressionAttributeNames=expression_names,
-            ExpressionAttributeValues=expression_values
+        cloudwatch.put_metric_data(
+            Namespace=METRICS_NAMESPACE,
+            MetricData=[
+                {
+                    'MetricName': 'CacheAllocations',
+                    'Dimensions': dimensions,
+                    'Value': 1,
+                    'Unit': 'Count',
+                },
+                {
+                    'MetricName': 'CacheWarmHits',
+                    'Dimensions': dimensions,
+                    'Value': 1 if warm_hit else 0,
+                    'Unit': 'Count',
+                },
+            ]
         )
-        
     except Exception as e:
-        logger.error(f"Error updating volume status: {str(e)}")
-        raise
\ No newline at end of file
+        logger.error(f"Error recording allocation metric: {str(e)}")
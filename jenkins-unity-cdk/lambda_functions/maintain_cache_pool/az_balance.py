@@ -0,0 +1,97 @@
+"""Per-AZ stock targets for the cache pool, from where agents actually launch.
+
+Agents only run in the AZs of their Auto Scaling group, and within those the
+group launches Spot instances where capacity is. The demand of an AZ is the
+larger of two counts over the lookback window: successful launches in the
+group's scaling activities, and cache allocations recorded by the allocate
+Lambda. Each count can miss events (activity history is capped, allocation
+metrics only exist since they were introduced). Demand is weighted by how
+reliably Spot capacity was there: the share of launches that neither failed
+nor were interrupted. A partition's total stock is split across the AZs by
+that weight, and Available sets are moved from AZs with a surplus to AZs
+short of their target.
+"""
+
+import json
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+AZ_PATTERN = re.compile(r'\(([a-z]{2}(?:-[a-z]+)+-\d[a-z])\)')
+# Terminations caused by a Spot interruption or a rebalance recommendation
+INTERRUPTION_CAUSES = ('rebalance recommendation', 'interruption')
+
+
+def launch_outcomes(activities: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """Successful launches, failed launches and Spot interruptions per AZ from ASG scaling activities."""
+    outcomes = {}
+    for activity in activities:
+        description = activity.get('Description', '')
+        try:
+            zone = json.loads(activity.get('Details') or '{}').get('Availability Zone')
+        except ValueError:
+            zone = None
+        if not zone:
+            # Failed launches name the AZ in the status message only
+            match = AZ_PATTERN.search(activity.get('StatusMessage', ''))
+            zone = match.group(1) if match else None
+        if not zone:
+            continue
+        
+        counts = outcomes.setdefault(zone, {'launched': 0, 'failed': 0, 'interrupted': 0})
+        if description.startswith('Launching'):
+            if activity.get('StatusCode') == 'Successful':
+                counts['launched'] += 1
+            elif activity.get('StatusCode') == 'Failed':
+                counts['failed'] += 1
+        elif description.startswith('Terminating'):
+            cause = activity.get('Cause', '').lower()
+            if any(text in cause for text in INTERRUPTION_CAUSES):
+                counts['interrupted'] += 1
+    
+    return outcomes
+
+
+def zone_targets(total: int, zones: List[str], outcomes: Dict[str, Dict[str, int]],
+                 allocations: Dict[str, float]) -> Dict[str, int]:
+    """Split a partition's stock of Available sets across the agent AZs.
+    
+    Without any history the split is even. AZs outside `zones` get nothing.
+    """
+    weights = {}
+    for zone in zones:
+        counts = outcomes.get(zone, {})
+        launched = counts.get('launched', 0)
+        demand = max(launched, allocations.get(zone, 0))
+        # Smoothed Spot success rate, 0.5 for an AZ without launches
+        spot_score = (launched + 1) / (launched + counts.get('failed', 0) + counts.get('interrupted', 0) + 2)
+        weights[zone] = demand * spot_score
+    
+    if not zones:
+        return {}
+    if sum(weights.values()) == 0:
+        weights = {zone: 1.0 for zone in zones}
+    
+    # Largest remainder, ties to the earlier zone
+    scale = total / sum(weights.values())
+    targets = {zone: int(weights[zone] * scale) for zone in zones}
+    remainders = sorted(zones, key=lambda zone: weights[zone] * scale - targets[zone], reverse=True)
+    for zone in remainders[:total - sum(targets.values())]:
+        targets[zone] += 1
+    return targets
+
+
+def plan_moves(available: Dict[str, int], targets: Dict[str, int], max_moves: int) -> List[Tuple[str, str]]:
+    """(from AZ, to AZ) moves of Available sets, largest surplus and shortfall first."""
+    surplus = {zone: count - targets.get(zone, 0) for zone, count in available.items() if count > targets.get(zone, 0)}
+    shortfall = {zone: target - available.get(zone, 0) for zone, target in targets.items() if target > available.get(zone, 0)}
+    
+    moves = []
+    while surplus and shortfall and len(moves) < max_moves:
+        source = max(surplus, key=surplus.get)
+        destination = max(shortfall, key=shortfall.get)
+        moves.append((source, destination))
+        for counts, zone in ((surplus, source), (shortfall, destination)):
+            counts[zone] -= 1
+            if not counts[zone]:
+                del counts[zone]
+    return moves
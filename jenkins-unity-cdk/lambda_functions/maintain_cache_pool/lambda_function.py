@@ -4,16 +4,30 @@ import json
 import os
 import boto3
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from az_balance import launch_outcomes, plan_moves, zone_targets
+import cache_sets  # Lambda layer
+import ec2_clients  # Lambda layer
+import sdk_profiler  # Lambda layer
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Opt-in AWS call profiling (SDK_PROFILING), hooked before the clients are created
+sdk_profiler.install()
+
 # Initialize AWS clients
 dynamodb = boto3.resource('dynamodb')
-ec2 = boto3.client('ec2')
+# Adaptive retries, on the EC2 API budget shared by the cache pool functions
+ec2 = ec2_clients.ec2_client()
+ssm = boto3.client('ssm')
+autoscaling = boto3.client('autoscaling')
+cloudwatch = boto3.client('cloudwatch')
 
 # Environment variables
 CACHE_POOL_TABLE = os.environ.get('CACHE_POOL_TABLE', 'unity-cicd-cache-pool-status')
@@ -23,6 +37,32 @@ VOLUME_SIZE = int(os.environ.get('VOLUME_SIZE', '100'))
 VOLUME_TYPE = os.environ.get('VOLUME_TYPE', 'gp3')
 IOPS = int(os.environ.get('IOPS', '3000'))
 THROUGHPUT = int(os.environ.get('THROUGHPUT', '125'))
+STRIPE_WIDTH = int(os.environ.get('STRIPE_WIDTH', '1'))
+# Busy volumes are retried on later runs, then snapshotted crash-consistent
+MAX_SNAPSHOT_DEFERRALS = int(os.environ.get('MAX_SNAPSHOT_DEFERRALS', '3'))
+# How long to wait for the agents, all asked at once, to freeze their caches (the NVMe tier writes back first)
+QUIESCE_TIMEOUT_SECONDS = int(os.environ.get('QUIESCE_TIMEOUT_SECONDS', '180'))
+# Instances per SSM command (the SendCommand limit)
+SSM_COMMAND_TARGETS = 50
+# Per-AZ stock follows where each partition's agents launch
+REBALANCE_ENABLED = os.environ.get('REBALANCE_ENABLED', 'true').lower() == 'true'
+REBALANCE_LOOKBACK_DAYS = int(os.environ.get('REBALANCE_LOOKBACK_DAYS', '14'))
+MAX_MOVES_PER_RUN = int(os.environ.get('MAX_MOVES_PER_RUN', '2'))
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'JenkinsUnity/AgentFleet')
+# {project_id: asg_name}: the agent pool of each cache partition
+POOL_ASGS = json.loads(os.environ.get('POOL_ASGS') or '{}')
+
+# One cache partition per agent pool: {project_id: {min_volumes_per_az, volume_size, stripe_width, ...}}
+CACHE_PARTITIONS = json.loads(os.environ.get('CACHE_PARTITIONS') or json.dumps({
+    'unity-game': {
+        'min_volumes_per_az': MIN_VOLUMES_PER_AZ,
+        'volume_size': VOLUME_SIZE,
+        'volume_type': VOLUME_TYPE,
+        'iops': IOPS,
+        'throughput': THROUGHPUT,
+        'stripe_width': STRIPE_WIDTH,
+    }
+}))
 
 # Get AZs dynamically
 def get_availability_zones():
@@ -34,41 +74,74 @@ def get_availability_zones():
         return ['us-east-1a', 'us-east-1b', 'us-east-1c']  # fallback
 
 
+@sdk_profiler.profiled
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
     Maintain the cache pool by cleaning up old volumes and ensuring minimum capacity.
     
+    Args:
+        event: Scheduled EventBridge event; {"action": "complete-moves"} only
+            finishes cache set moves between AZs whose snapshots are done,
+            {"action": "backfill-pool-index"} only sets PoolKey on the sets
+            that lack it (run once after Pool-Index is deployed)
+    
     Returns:
         {
             "statusCode": 200,
             "cleaned_volumes": 3,
+            "pool_keys_repaired": 0,
             "created_volumes": 1,
-            "snapshots_created": 2
+            "moves_started": 1,
+            "moves_completed": 1,
+            "snapshots_created": 2,
+            "snapshots_deferred": 1
         }
     """
     try:
+        if event.get('action') == 'complete-moves':
+            return {
+                'statusCode': 200,
+                'moves_completed': complete_moves()
+            }
+        if event.get('action') == 'backfill-pool-index':
+            return {
+                'statusCode': 200,
+                'pool_keys_repaired': backfill_pool_keys()
+            }
+        
         logger.info("Starting cache pool maintenance")
         
         results = {
             'cleaned_volumes': 0,
+            'pool_keys_repaired': 0,
             'created_volumes': 0,
+            'moves_started': 0,
+            'moves_completed': 0,
             'snapshots_created': 0,
+            'snapshots_deferred': 0,
             'errors': []
         }
         
         # 1. Clean up old unused volumes
         cleaned_count = cleanup_old_volumes()
         results['cleaned_volumes'] = cleaned_count
+        results['pool_keys_repaired'] = backfill_pool_keys()
+        
+        # 2. Move Available sets toward the AZs agents launch in
+        targets = stock_targets()
+        results['moves_completed'] = complete_moves()
+        results['moves_started'] = start_moves(targets)
         
-        # 2. Ensure minimum volumes per AZ
-        created_count = ensure_minimum_volumes()
+        # 3. Ensure the stock target per AZ and partition
+        created_count = ensure_minimum_volumes(targets)
         results['created_volumes'] = created_count
         
-        # 3. Create snapshots for backup
-        snapshot_count = create_backup_snapshots()
+        # 4. Create snapshots for backup
+        snapshot_count, deferred_count = create_backup_snapshots()
         results['snapshots_created'] = snapshot_count
+        results['snapshots_deferred'] = deferred_count
         
-        # 4. Clean up old snapshots
+        # 5. Clean up old snapshots
         cleanup_old_snapshots()
         
         logger.info(f"Cache pool maintenance completed: {results}")
@@ -91,9 +164,9 @@ def cleanup_old_volumes() -> int:
         table = dynamodb.Table(CACHE_POOL_TABLE)
         cutoff_time = int((datetime.utcnow() - timedelta(days=MAX_AGE_DAYS)).timestamp())
         
-        # Scan for old available volumes
+        # Scan for old available volumes; sets being moved are retired by the move
         response = table.scan(
-            FilterExpression='#status = :status AND LastUsed < :cutoff',
+            FilterExpression='#status = :status AND LastUsed < :cutoff AND attribute_not_exists(MoveTo)',
             ExpressionAttributeNames={'#status': 'Status'},
             ExpressionAttributeValues={
                 ':status': 'Available',
@@ -106,11 +179,14 @@ def cleanup_old_volumes() -> int:
             volume_id = item['VolumeId']
             
             try:
-                # Create snapshot before deletion
-                create_volume_snapshot(volume_id, f"Backup before cleanup - {datetime.utcnow().isoformat()}")
+                # Create snapshots before deletion; the set is detached, so they are consistent
+                description = f"Backup before cleanup - {datetime.utcnow().isoformat()}"
+                for stripe_index in range(len(cache_sets.cache_set_volumes(item))):
+                    create_volume_snapshot(item, stripe_index, description, True)
                 
-                # Delete the volume
-                ec2.delete_volume(VolumeId=volume_id)
+                # Delete the volumes
+                for member_id in cache_sets.cache_set_volumes(item):
+                    ec2.delete_volume(VolumeId=member_id)
                 
                 # Remove from DynamoDB
                 table.delete_item(Key={'VolumeId': volume_id})
@@ -129,38 +205,102 @@ def cleanup_old_volumes() -> int:
         return 0
 
 
-def ensure_minimum_volumes() -> int:
-    """Ensure each AZ has minimum number of available volumes."""
+def backfill_pool_keys() -> int:
+    """Give every Available and held InUse set its PoolKey and drop stale ones from the other sets.
+    
+    Migrates sets written before Pool-Index existed and rekeys them after
+    index_shards changes; allocations only find Available sets, and the agent
+    Lambdas only the sets of an instance, that have a PoolKey.
+    """
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    scan = {
+        'FilterExpression': '#status IN (:available, :in_use) OR attribute_exists(PoolKey)',
+        'ProjectionExpression': 'VolumeId, VolumeIds, AvailabilityZone, ProjectId, #status, InstanceId, PoolKey',
+        'ExpressionAttributeNames': {'#status': 'Status'},
+        'ExpressionAttributeValues': {':available': 'Available', ':in_use': 'InUse'},
+    }
+    
+    repaired = 0
+    while True:
+        response = table.scan(**scan)
+        for item in response['Items']:
+            expected = cache_sets.expected_pool_key(item)
+            if item.get('PoolKey') == expected:
+                continue
+            try:
+                if expected:
+                    condition = '#status = :status'
+                    values = {':pool_key': expected, ':status': item['Status']}
+                    if item['Status'] == 'InUse':
+                        condition += ' AND InstanceId = :instance_id'
+                        values[':instance_id'] = item['InstanceId']
+                    table.update_item(
+                        Key={'VolumeId': item['VolumeId']},
+                        UpdateExpression='SET PoolKey = :pool_key',
+                        ConditionExpression=condition,
+                        ExpressionAttributeNames={'#status': 'Status'},
+                        ExpressionAttributeValues=values
+                    )
+                else:
+                    table.update_item(
+                        Key={'VolumeId': item['VolumeId']},
+                        UpdateExpression='REMOVE PoolKey',
+                        ConditionExpression='#status <> :available AND '
+                                            '(#status <> :in_use OR attribute_not_exists(InstanceId))',
+                        ExpressionAttributeNames={'#status': 'Status'},
+                        ExpressionAttributeValues={':available': 'Available', ':in_use': 'InUse'}
+                    )
+                repaired += 1
+            except ClientError as e:
+                # Allocated or released meanwhile, which sets the key itself
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    if repaired:
+        logger.info(f"Repaired the Pool-Index key of {repaired} cache sets")
+    return repaired
+
+
+def ensure_minimum_volumes(targets: Dict[str, Dict[str, int]]) -> int:
+    """Ensure each AZ has the stock target of available volumes of every cache partition."""
     try:
         table = dynamodb.Table(CACHE_POOL_TABLE)
         created_count = 0
         
-        for az in get_availability_zones():
-            # Count available volumes in this AZ
-            response = table.query(
-                IndexName='AZ-Status-Index',
-                KeyConditionExpression='AvailabilityZone = :az AND #status = :status',
-                ExpressionAttributeNames={'#status': 'Status'},
-                ExpressionAttributeValues={
-                    ':az': az,
-                    ':status': 'Available'
-                }
-            )
-            
-            available_count = len(response['Items'])
-            needed_count = max(0, MIN_VOLUMES_PER_AZ - available_count)
-            
-            logger.info(f"AZ {az}: {available_count} available, need {needed_count} more")
-            
-            # Create needed volumes
-            for i in range(needed_count):
-                try:
-                    volume_id = create_cache_volume(az)
-                    logger.info(f"Created new cache volume in {az}: {volume_id}")
-                    created_count += 1
-                except Exception as e:
-                    logger.error(f"Error creating volume in {az}: {str(e)}")
-                    continue
+        # Sets on their way to an AZ count as stocked there
+        incoming = {}
+        for item in pending_moves():
+            key = (item['MoveTo'], item.get('ProjectId', 'unity-game'))
+            incoming[key] = incoming.get(key, 0) + 1
+        
+        # New sets are restored from their partition's newest consistent backup, looked up once per run
+        backups = {}
+        
+        for az in sorted({az for zones in targets.values() for az in zones}):
+            for project_id, partition in CACHE_PARTITIONS.items():
+                # Sets of another width (the partition's stripe_width changed) age out
+                stripe_width = partition.get('stripe_width', 1)
+                available_count = sum(1 for _ in cache_sets.available_sets(table, az, project_id, stripe_width))
+                available_count += incoming.get((az, project_id), 0)
+                needed_count = max(0, targets.get(project_id, {}).get(az, 0) - available_count)
+                
+                logger.info(f"AZ {az}, {project_id}: {available_count} available, need {needed_count} more")
+                
+                if needed_count and project_id not in backups:
+                    backups[project_id] = newest_consistent_backup(project_id, stripe_width, partition['volume_size'])
+                
+                # Create needed volumes
+                for i in range(needed_count):
+                    try:
+                        volume_id = create_cache_volume(az, project_id, partition, backups[project_id])
+                        logger.info(f"Created new {project_id} cache volume in {az}: {volume_id}")
+                        created_count += 1
+                    except Exception as e:
+                        logger.error(f"Error creating {project_id} volume in {az}: {str(e)}")
+                        continue
         
         return created_count
         
@@ -169,94 +309,594 @@ def ensure_minimum_volumes() -> int:
         return 0
 
 
-def create_cache_volume(availability_zone: str) -> str:
-    """Create a new cache volume."""
+def create_cache_volume(availability_zone: str, project_id: str, partition: Dict[str, Any],
+                        snapshot_ids: Optional[List[str]] = None, copied: Optional[Dict[str, Any]] = None) -> str:
+    """Create a new cache set of the partition's stripe width; returns its first volume.
+    
+    A set moved from another AZ is restored from the snapshots of its members
+    and keeps the use and warming times of the set it was `copied` from.
+    """
+    volume_ids = []
     try:
-        # Create EBS volume
-        response = ec2.create_volume(
-            Size=VOLUME_SIZE,
-            VolumeType=VOLUME_TYPE,
-            Iops=IOPS,
-            Throughput=THROUGHPUT,
-            AvailabilityZone=availability_zone,
-            Encrypted=True,
-            TagSpecifications=[
-                {
-                    'ResourceType': 'volume',
-                    'Tags': [
-                        {'Key': 'Name', 'Value': f'unity-cicd-cache-{availability_zone}'},
-                        {'Key': 'Project', 'Value': 'unity-cicd'},
-                        {'Key': 'Purpose', 'Value': 'Jenkins-Cache'},
-                        {'Key': 'ProjectId', 'Value': 'unity-game'},
-                        {'Key': 'ManagedBy', 'Value': 'Lambda-Maintenance'},
-                    ]
-                }
-            ]
-        )
+        for stripe_index in range(partition.get('stripe_width', 1)):
+            restore = {'SnapshotId': snapshot_ids[stripe_index]} if snapshot_ids else {}
+            # Create EBS volume
+            response = ec2.create_volume(
+                **restore,
+                Size=partition['volume_size'],
+                VolumeType=partition['volume_type'],
+                Iops=partition['iops'],
+                Throughput=partition['throughput'],
+                AvailabilityZone=availability_zone,
+                Encrypted=True,
+                TagSpecifications=[
+                    {
+                        'ResourceType': 'volume',
+                        'Tags': [
+                            {'Key': 'Name', 'Value': f'unity-cicd-cache-{availability_zone}'},
+                            {'Key': 'Project', 'Value': 'unity-cicd'},
+                            {'Key': 'Purpose', 'Value': 'Jenkins-Cache'},
+                            {'Key': 'ProjectId', 'Value': project_id},
+                            {'Key': 'StripeIndex', 'Value': str(stripe_index)},
+                            {'Key': 'ManagedBy', 'Value': 'Lambda-Maintenance'},
+                        ]
+                    }
+                ]
+            )
+            volume_ids.append(response['VolumeId'])
         
-        volume_id = response['VolumeId']
+        # Members find their set through the first volume
+        ec2.create_tags(Resources=volume_ids, Tags=[{'Key': 'CacheSet', 'Value': volume_ids[0]}])
         
-        # Wait for volume to be available
-        ec2.get_waiter('volume_available').wait(VolumeIds=[volume_id])
+        # Wait for volumes to be available
+        ec2.get_waiter('volume_available').wait(VolumeIds=volume_ids)
         
         # Add to DynamoDB
+        item = {
+            'VolumeId': volume_ids[0],
+            'VolumeIds': volume_ids,
+            'StripeWidth': len(volume_ids),
+            'Status': 'Available',
+            'AvailabilityZone': availability_zone,
+            'ProjectId': project_id,
+            'CreatedTime': int(datetime.utcnow().timestamp()),
+            'LastUsed': int(datetime.utcnow().timestamp()),
+            'CacheVersion': '1.0'
+        }
+        if copied:
+            item.update({key: copied[key] for key in ('LastUsed', 'LastWarmed', 'WarmedCommit') if key in copied})
+        item['PoolKey'] = cache_sets.available_pool_key(item)
         table = dynamodb.Table(CACHE_POOL_TABLE)
-        table.put_item(
-            Item={
-                'VolumeId': volume_id,
-                'Status': 'Available',
-                'AvailabilityZone': availability_zone,
-                'ProjectId': 'unity-game',
-                'CreatedTime': int(datetime.utcnow().timestamp()),
-                'LastUsed': int(datetime.utcnow().timestamp()),
-                'CacheVersion': '1.0'
-            }
-        )
+        table.put_item(Item=item)
         
-        return volume_id
+        return volume_ids[0]
         
     except Exception as e:
         logger.error(f"Error creating cache volume: {str(e)}")
+        # Don't leave part of a set behind
+        for volume_id in volume_ids:
+            try:
+                ec2.delete_volume(VolumeId=volume_id)
+            except Exception as cleanup_error:
+                logger.error(f"Error deleting volume {volume_id}: {str(cleanup_error)}")
         raise
 
 
-def create_backup_snapshots() -> int:
-    """Create snapshots of in-use volumes for backup."""
+def stock_targets() -> Dict[str, Dict[str, int]]:
+    """Available sets to keep per cache partition and AZ.
+    
+    Only the AZs of the partition's agent pool are stocked, min_volumes_per_az
+    each on average, split by where agents launched and allocated over the
+    lookback window. Partitions without a known pool stock every AZ of the region.
+    """
+    since = datetime.utcnow() - timedelta(days=REBALANCE_LOOKBACK_DAYS)
+    targets = {}
+    for project_id, partition in CACHE_PARTITIONS.items():
+        asg_name = POOL_ASGS.get(project_id)
+        zones = agent_availability_zones(asg_name) if asg_name else []
+        if not zones:
+            targets[project_id] = {az: partition['min_volumes_per_az'] for az in get_availability_zones()}
+            continue
+        
+        total = partition['min_volumes_per_az'] * len(zones)
+        if REBALANCE_ENABLED:
+            try:
+                outcomes = launch_outcomes(scaling_activities(asg_name, since))
+                allocations = allocation_counts(project_id, zones, since)
+                targets[project_id] = zone_targets(total, zones, outcomes, allocations)
+                logger.info(f"{project_id}: launches {outcomes}, allocations {allocations}, stock targets {targets[project_id]}")
+                continue
+            except Exception as e:
+                logger.error(f"Error loading the launch history of {asg_name}: {str(e)}")
+        targets[project_id] = zone_targets(total, zones, {}, {})
+    
+    return targets
+
+
+def agent_availability_zones(asg_name: str) -> List[str]:
+    """AZs the agent pool's Auto Scaling group launches in (its subnets' AZs)."""
+    try:
+        groups = autoscaling.describe_auto_scaling_groups(AutoScalingGroupNames=[asg_name])['AutoScalingGroups']
+        return sorted(groups[0]['AvailabilityZones']) if groups else []
+    except Exception as e:
+        logger.error(f"Error describing Auto Scaling group {asg_name}: {str(e)}")
+        return []
+
+
+def scaling_activities(asg_name: str, since: datetime) -> List[Dict[str, Any]]:
+    """Scaling activities of the group since a time, newest first."""
+    activities = []
+    paginator = autoscaling.get_paginator('describe_scaling_activities')
+    for page in paginator.paginate(AutoScalingGroupName=asg_name):
+        for activity in page['Activities']:
+            if activity['StartTime'].replace(tzinfo=None) < since:
+                return activities
+            activities.append(activity)
+    return activities
+
+
+def allocation_counts(project_id: str, zones: List[str], since: datetime) -> Dict[str, float]:
+    """Cache allocations per AZ since a time, from the allocate Lambda's metrics."""
+    response = cloudwatch.get_metric_data(
+        MetricDataQueries=[
+            {
+                'Id': f'az{index}',
+                'Label': zone,
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': METRICS_NAMESPACE,
+                        'MetricName': 'CacheAllocations',
+                        'Dimensions': [
+                            {'Name': 'AvailabilityZone', 'Value': zone},
+                            {'Name': 'ProjectId', 'Value': project_id},
+                        ],
+                    },
+                    'Period': 86400,
+                    'Stat': 'Sum',
+                },
+            }
+            for index, zone in enumerate(zones)
+        ],
+        StartTime=since,
+        EndTime=datetime.utcnow(),
+    )
+    return {result['Label']: sum(result['Values']) for result in response['MetricDataResults']}
+
+
+def scan_items(table, **scan_kwargs) -> List[Dict[str, Any]]:
+    """All items of a scan, page by page."""
+    items = []
+    while True:
+        response = table.scan(**scan_kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def pending_moves() -> List[Dict[str, Any]]:
+    """Cache sets being copied to another AZ."""
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    return scan_items(table, FilterExpression='attribute_exists(MoveTo)')
+
+
+def start_moves(targets: Dict[str, Dict[str, int]]) -> int:
+    """Snapshot Available sets of AZs over their stock target, to restore them where sets are short.
+    
+    The source set stays Available while its snapshots complete; complete_moves
+    restores it in the new AZ and retires the source unless it was used meanwhile.
+    """
+    if not REBALANCE_ENABLED:
+        return 0
     try:
         table = dynamodb.Table(CACHE_POOL_TABLE)
-        
-        # Get in-use volumes
-        response = table.scan(
-            FilterExpression='#status = :status',
+        available_sets = scan_items(
+            table,
+            FilterExpression='#status = :status AND attribute_not_exists(MoveTo)',
             ExpressionAttributeNames={'#status': 'Status'},
-            ExpressionAttributeValues={':status': 'InUse'}
+            ExpressionAttributeValues={':status': 'Available'}
         )
+        moving = pending_moves()
         
-        snapshot_count = 0
-        for item in response['Items']:
-            volume_id = item['VolumeId']
+        started = 0
+        for project_id, zone_target in targets.items():
+            width = CACHE_PARTITIONS[project_id].get('stripe_width', 1)
+            candidates = {}
+            for item in available_sets:
+                if item.get('ProjectId', 'unity-game') == project_id and len(cache_sets.cache_set_volumes(item)) == width:
+                    candidates.setdefault(item['AvailabilityZone'], []).append(item)
+            
+            available = {zone: len(items) for zone, items in candidates.items()}
+            for item in moving:
+                if item.get('ProjectId', 'unity-game') == project_id:
+                    available[item['MoveTo']] = available.get(item['MoveTo'], 0) + 1
             
+            for source, destination in plan_moves(available, zone_target, MAX_MOVES_PER_RUN - started):
+                if not candidates.get(source):
+                    continue
+                # The warmest Library of the source AZ is the one worth moving
+                item = max(candidates[source], key=lambda c: max(int(c.get('LastUsed', 0)), int(c.get('LastWarmed', 0))))
+                candidates[source].remove(item)
+                snapshot_ids = []
+                # A consistent backup taken since the set was last used already holds its Library
+                backup_ids = current_backup(item)
+                try:
+                    # A detached set takes no writes, so its members' snapshots share a point in
+                    # time as long as no agent allocated it while they were taken
+                    move_started = int(datetime.utcnow().timestamp())
+                    description = f"Move to {destination} - {datetime.utcnow().isoformat()}"
+                    snapshot_ids = backup_ids or [
+                        create_volume_snapshot(item, stripe_index, description, True)
+                        for stripe_index in range(width)
+                    ]
+                    table.update_item(
+                        Key={'VolumeId': item['VolumeId']},
+                        UpdateExpression='SET MoveTo = :destination, MoveSnapshots = :snapshots, MoveStarted = :now',
+                        ConditionExpression='#status = :available AND (attribute_not_exists(LastUsed) OR LastUsed < :now) '
+                                            'AND (attribute_not_exists(LastWarmed) OR LastWarmed < :now)',
+                        ExpressionAttributeNames={'#status': 'Status'},
+                        ExpressionAttributeValues={
+                            ':destination': destination,
+                            ':snapshots': snapshot_ids,
+                            ':now': move_started,
+                            ':available': 'Available',
+                        }
+                    )
+                    logger.info(f"Moving {project_id} cache set {item['VolumeId']} from {source} to {destination} via {snapshot_ids}")
+                    started += 1
+                except Exception as e:
+                    logger.error(f"Error starting the move of {item['VolumeId']}: {str(e)}")
+                    # Snapshots of a set used meanwhile are not a consistent set; a reused backup stays
+                    for snapshot_id in ([] if backup_ids else snapshot_ids):
+                        delete_move_snapshot(snapshot_id)
+        
+        return started
+    
+    except Exception as e:
+        logger.error(f"Error in start_moves: {str(e)}")
+        return 0
+
+
+def current_backup(item: Dict[str, Any]) -> Optional[List[str]]:
+    """Snapshots of the set's last backup if it was consistent and the set was not used since."""
+    if not item.get('LastSnapshotConsistent'):
+        return None
+    last_used = max(int(item.get('LastUsed', 0)), int(item.get('LastWarmed', 0)))
+    if int(item.get('LastSnapshot', 0)) < last_used:
+        return None
+    volume_ids = cache_sets.cache_set_volumes(item)
+    return newest_consistent_backup(item.get('ProjectId', 'unity-game'), len(volume_ids),
+                                    cache_set=item['VolumeId'])
+
+
+def newest_consistent_backup(project_id: str, stripe_width: int, max_size: Optional[int] = None,
+                             cache_set: Optional[str] = None) -> Optional[List[str]]:
+    """Snapshot IDs, in stripe order, of the newest complete consistent backup of a partition's sets.
+    
+    Crash-consistent backups (Consistent=false) are never restored. With cache_set,
+    only backups of that set count; max_size skips backups larger than the volumes.
+    """
+    filters = [
+        {'Name': 'tag:Purpose', 'Values': ['Cache-Backup']},
+        {'Name': 'tag:Consistent', 'Values': ['true']},
+        {'Name': 'tag:ProjectId', 'Values': [project_id]},
+        {'Name': 'tag:StripeWidth', 'Values': [str(stripe_width)]},
+        {'Name': 'status', 'Values': ['completed']},
+    ]
+    if cache_set:
+        filters.append({'Name': 'tag:CacheSet', 'Values': [cache_set]})
+    
+    # The snapshots of one backup share their set and description
+    backups = {}
+    paginator = ec2.get_paginator('describe_snapshots')
+    for page in paginator.paginate(OwnerIds=['self'], Filters=filters):
+        for snapshot in page['Snapshots']:
+            if max_size and snapshot['VolumeSize'] > max_size:
+                continue
+            tags = {tag['Key']: tag['Value'] for tag in snapshot.get('Tags', [])}
+            backup = backups.setdefault((tags['CacheSet'], snapshot.get('Description', '')), {})
+            backup[int(tags.get('StripeIndex', 0))] = snapshot
+    
+    complete = [backup for backup in backups.values() if sorted(backup) == list(range(stripe_width))]
+    if not complete:
+        return None
+    newest = max(complete, key=lambda backup: min(snapshot['StartTime'] for snapshot in backup.values()))
+    return [newest[stripe_index]['SnapshotId'] for stripe_index in range(stripe_width)]
+
+
+def delete_move_snapshot(snapshot_id: str):
+    """Delete a snapshot of an abandoned move."""
+    try:
+        ec2.delete_snapshot(SnapshotId=snapshot_id)
+    except Exception as e:
+        logger.error(f"Error deleting snapshot {snapshot_id}: {str(e)}")
+
+
+def complete_moves() -> int:
+    """Restore moved sets whose snapshots completed in their new AZ and retire the sources."""
+    try:
+        completed = 0
+        for item in pending_moves():
+            volume_id = item['VolumeId']
+            snapshot_ids = list(item['MoveSnapshots'])
             try:
-                snapshot_id = create_volume_snapshot(
-                    volume_id, 
-                    f"Automated backup - {datetime.utcnow().isoformat()}"
-                )
-                logger.info(f"Created snapshot {snapshot_id} for volume {volume_id}")
-                snapshot_count += 1
+                states = {
+                    snapshot['SnapshotId']: snapshot['State']
+                    for snapshot in ec2.describe_snapshots(SnapshotIds=snapshot_ids)['Snapshots']
+                }
+                if 'error' in states.values() or len(states) < len(snapshot_ids):
+                    logger.error(f"Snapshots of {volume_id} failed, move to {item['MoveTo']} abandoned")
+                    finish_move(item, False)
+                    continue
+                if any(state != 'completed' for state in states.values()):
+                    continue
+                
+                project_id = item.get('ProjectId', 'unity-game')
+                partition = CACHE_PARTITIONS.get(project_id)
+                if not partition or partition.get('stripe_width', 1) != len(snapshot_ids):
+                    # The partition changed shape meanwhile; the old set ages out where it is
+                    finish_move(item, False)
+                    continue
                 
+                new_volume_id = create_cache_volume(item['MoveTo'], project_id, partition, snapshot_ids, item)
+                retired = finish_move(item, True)
+                logger.info(f"Moved cache set {volume_id} to {item['MoveTo']} as {new_volume_id}"
+                            f"{'' if retired else ', source kept (used meanwhile)'}")
+                completed += 1
             except Exception as e:
-                logger.error(f"Error creating snapshot for volume {volume_id}: {str(e)}")
+                logger.error(f"Error completing the move of {volume_id}: {str(e)}")
                 continue
         
-        return snapshot_count
+        return completed
+    
+    except Exception as e:
+        logger.error(f"Error in complete_moves: {str(e)}")
+        return 0
+
+
+def finish_move(item: Dict[str, Any], retire: bool) -> bool:
+    """Delete the source set of a completed move if it sat unused since; True if deleted.
+    
+    Otherwise (or when the move is abandoned) it stays in the pool as it is.
+    """
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    if retire:
+        try:
+            table.delete_item(
+                Key={'VolumeId': item['VolumeId']},
+                ConditionExpression='#status = :available AND LastUsed <= :started '
+                                    'AND (attribute_not_exists(LastWarmed) OR LastWarmed <= :started)',
+                ExpressionAttributeNames={'#status': 'Status'},
+                ExpressionAttributeValues={':available': 'Available', ':started': item['MoveStarted']}
+            )
+            for member_id in cache_sets.cache_set_volumes(item):
+                ec2.delete_volume(VolumeId=member_id)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+    
+    try:
+        table.update_item(
+            Key={'VolumeId': item['VolumeId']},
+            UpdateExpression='REMOVE MoveTo, MoveSnapshots, MoveStarted',
+            ConditionExpression='attribute_exists(VolumeId)'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+    return False
+
+
+def create_backup_snapshots() -> Tuple[int, int]:
+    """Create snapshots of in-use volumes for backup, in an idle window of their agent.
+    
+    The agents freeze the cache filesystem between builds for the snapshot; all are
+    asked at once and each is snapshotted and thawed as soon as it froze. Volumes
+    whose agent stays busy are deferred to the next run; after MAX_SNAPSHOT_DEFERRALS
+    runs they are snapshotted anyway and tagged Consistent=false.
+    
+    Returns:
+        (snapshots created, snapshots deferred)
+    """
+    try:
+        table = dynamodb.Table(CACHE_POOL_TABLE)
+        
+        # Get in-use volumes
+        scan_kwargs = {
+            'FilterExpression': '#status = :status',
+            'ExpressionAttributeNames': {'#status': 'Status'},
+            'ExpressionAttributeValues': {':status': 'InUse'},
+        }
+        held = {}
+        while True:
+            response = table.scan(**scan_kwargs)
+            for item in response['Items']:
+                held.setdefault(item.get('InstanceId'), []).append(item)
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        
+        snapshot_count = 0
+        deferred_count = 0
+        for instance_id, consistent in request_quiescent_windows([instance_id for instance_id in held if instance_id]):
+            try:
+                created, deferred = snapshot_cache_sets(held.pop(instance_id), consistent)
+            finally:
+                # The snapshot's point in time is set once the API returns
+                if consistent:
+                    end_quiescent_window(instance_id)
+            snapshot_count += created
+            deferred_count += deferred
+            
+        # Sets not held by an agent have no window to wait for
+        for items in held.values():
+            created, deferred = snapshot_cache_sets(items, False)
+            snapshot_count += created
+            deferred_count += deferred
+        
+        return snapshot_count, deferred_count
         
     except Exception as e:
         logger.error(f"Error in create_backup_snapshots: {str(e)}")
-        return 0
+        return 0, 0
+
+
+def snapshot_cache_sets(items: List[Dict[str, Any]], consistent: bool) -> Tuple[int, int]:
+    """Snapshot the cache sets of one agent, or defer them while it had no idle window.
+    
+    Returns:
+        (snapshots created, snapshots deferred)
+    """
+    snapshot_count = 0
+    deferred_count = 0
+    for item in items:
+        volume_id = item['VolumeId']
+        try:
+            if not consistent and int(item.get('SnapshotDeferrals', 0)) < MAX_SNAPSHOT_DEFERRALS:
+                defer_snapshot(volume_id)
+                logger.info(f"Deferred snapshot of busy volume {volume_id}")
+                deferred_count += 1
+                continue
+            
+            description = f"Automated backup - {datetime.utcnow().isoformat()}"
+            if len(cache_sets.cache_set_volumes(item)) > 1 and item.get('InstanceId'):
+                # Snapshots of a striped set are only usable if taken at the same point in time
+                snapshot_ids = create_cache_set_snapshots(item, description, consistent)
+            else:
+                snapshot_ids = [
+                    create_volume_snapshot(item, stripe_index, description, consistent)
+                    for stripe_index in range(len(cache_sets.cache_set_volumes(item)))
+                ]
+            
+            record_snapshot(volume_id, consistent)
+            logger.info(f"Created {'consistent' if consistent else 'crash-consistent'} snapshots {snapshot_ids} for volume {volume_id}")
+            snapshot_count += 1
+        
+        except Exception as e:
+            logger.error(f"Error creating snapshot for volume {volume_id}: {str(e)}")
+            continue
+    
+    return snapshot_count, deferred_count
+
+
+def request_quiescent_windows(instance_ids: List[str]):
+    """Ask the agents to freeze their cache filesystems between builds, all at once.
+    
+    Yields (instance ID, frozen) as each agent answers; agents that did not answer
+    within QUIESCE_TIMEOUT_SECONDS of the request yield False.
+    """
+    pending = {}
+    # One command per batch of agents, polled together
+    for i in range(0, len(instance_ids), SSM_COMMAND_TARGETS):
+        batch = instance_ids[i:i + SSM_COMMAND_TARGETS]
+        try:
+            command_id = run_cache_command(batch, 'snapshot-freeze')
+            pending.update((instance_id, command_id) for instance_id in batch)
+        except Exception as e:
+            logger.error(f"Error requesting quiescent windows from {batch}: {str(e)}")
+            for instance_id in batch:
+                yield instance_id, False
+    
+    deadline = time.time() + QUIESCE_TIMEOUT_SECONDS
+    while pending and time.time() < deadline:
+        time.sleep(2)
+        for command_id in set(pending.values()):
+            try:
+                statuses = command_statuses(command_id)
+            except Exception as e:
+                logger.error(f"Error polling quiescent windows of command {command_id}: {str(e)}")
+                continue
+            for instance_id, status in statuses.items():
+                if pending.get(instance_id) == command_id and status not in ['Pending', 'InProgress', 'Delayed']:
+                    del pending[instance_id]
+                    # The agent exits non-zero while a build holds the cache
+                    yield instance_id, status == 'Success'
+        
+    for instance_id in pending:
+        logger.warning(f"No quiescent window from {instance_id} within {QUIESCE_TIMEOUT_SECONDS}s")
+        # It may still freeze after we give up
+        end_quiescent_window(instance_id)
+        yield instance_id, False
+    
+
+def command_statuses(command_id: str) -> Dict[str, str]:
+    """Status of an SSM command on each of its instances."""
+    statuses = {}
+    paginator = ssm.get_paginator('list_command_invocations')
+    for page in paginator.paginate(CommandId=command_id):
+        statuses.update((invocation['InstanceId'], invocation['Status']) for invocation in page['CommandInvocations'])
+    return statuses
+
+
+def end_quiescent_window(instance_id: str):
+    """Thaw the agent's cache filesystem; the agent also thaws on its own after a timeout."""
+    try:
+        run_cache_command([instance_id], 'snapshot-thaw')
+    except Exception as e:
+        logger.error(f"Error thawing cache of {instance_id}: {str(e)}")
+
+
+def run_cache_command(instance_ids: List[str], action: str) -> str:
+    """Run a manage-cache-volume.sh action on agents; returns the SSM command ID."""
+    response = ssm.send_command(
+        InstanceIds=instance_ids,
+        DocumentName='AWS-RunShellScript',
+        Parameters={'commands': [f'/opt/manage-cache-volume.sh {action}'], 'executionTimeout': ['600']},
+        Comment=f'Cache pool maintenance: {action}',
+    )
+    return response['Command']['CommandId']
+
+
+def defer_snapshot(volume_id: str):
+    """Count a run in which the volume's agent had no idle window."""
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    table.update_item(
+        Key={'VolumeId': volume_id},
+        UpdateExpression='ADD SnapshotDeferrals :one',
+        ExpressionAttributeValues={':one': 1}
+    )
+
+
+def record_snapshot(volume_id: str, consistent: bool):
+    """Record the volume's latest backup and whether it was taken with the filesystem frozen."""
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    table.update_item(
+        Key={'VolumeId': volume_id},
+        UpdateExpression='SET LastSnapshot = :time, LastSnapshotConsistent = :consistent, SnapshotDeferrals = :zero',
+        ExpressionAttributeValues={
+            ':time': int(datetime.utcnow().timestamp()),
+            ':consistent': consistent,
+            ':zero': 0,
+        }
+    )
+
+
+def backup_tags(item: Dict[str, Any], consistent: bool) -> List[Dict[str, str]]:
+    """Tags of every snapshot of one backup of a cache set; Consistent tags whether it was idle or frozen."""
+    return [
+        {'Key': 'Name', 'Value': f"unity-cicd-cache-backup-{item['VolumeId']}"},
+        {'Key': 'Project', 'Value': 'unity-cicd'},
+        {'Key': 'Purpose', 'Value': 'Cache-Backup'},
+        {'Key': 'CacheSet', 'Value': item['VolumeId']},
+        {'Key': 'ProjectId', 'Value': item.get('ProjectId', 'unity-game')},
+        {'Key': 'StripeWidth', 'Value': str(len(cache_sets.cache_set_volumes(item)))},
+        {'Key': 'Consistent', 'Value': str(consistent).lower()},
+        {'Key': 'ManagedBy', 'Value': 'Lambda-Maintenance'},
+    ]
 
 
-def create_volume_snapshot(volume_id: str, description: str) -> str:
-    """Create a snapshot of the specified volume."""
+def member_tags(volume_id: str, stripe_index: int) -> List[Dict[str, str]]:
+    """Tags placing a snapshot in its backup: the volume it was taken of and its stripe position."""
+    return [
+        {'Key': 'SourceVolume', 'Value': volume_id},
+        {'Key': 'StripeIndex', 'Value': str(stripe_index)},
+    ]
+
+
+def create_volume_snapshot(item: Dict[str, Any], stripe_index: int, description: str, consistent: bool) -> str:
+    """Create a snapshot of one member of a cache set."""
+    volume_id = cache_sets.cache_set_volumes(item)[stripe_index]
     try:
         response = ec2.create_snapshot(
             VolumeId=volume_id,
@@ -264,13 +904,7 @@ def create_volume_snapshot(volume_id: str, description: str) -> str:
             TagSpecifications=[
                 {
                     'ResourceType': 'snapshot',
-                    'Tags': [
-                        {'Key': 'Name', 'Value': f'unity-cicd-cache-backup-{volume_id}'},
-                        {'Key': 'Project', 'Value': 'unity-cicd'},
-                        {'Key': 'Purpose', 'Value': 'Cache-Backup'},
-                        {'Key': 'SourceVolume', 'Value': volume_id},
-                        {'Key': 'ManagedBy', 'Value': 'Lambda-Maintenance'},
-                    ]
+                    'Tags': backup_tags(item, consistent) + member_tags(volume_id, stripe_index)
                 }
             ]
         )
@@ -282,6 +916,49 @@ def create_volume_snapshot(volume_id: str, description: str) -> str:
         raise
 
 
+def create_cache_set_snapshots(item: Dict[str, Any], description: str, consistent: bool) -> List[str]:
+    """Create snapshots of an attached cache set in one call, so its members share a point in time."""
+    try:
+        members = cache_sets.cache_set_volumes(item)
+        instance = ec2.describe_instances(InstanceIds=[item['InstanceId']])['Reservations'][0]['Instances'][0]
+        # The agent's other data volumes (another set, an EBS tier of its own) are not in this backup
+        others = [
+            mapping['Ebs']['VolumeId'] for mapping in instance.get('BlockDeviceMappings', [])
+            if mapping['DeviceName'] != instance.get('RootDeviceName') and 'Ebs' in mapping
+            and mapping['Ebs']['VolumeId'] not in members
+        ]
+        specification = {'InstanceId': item['InstanceId'], 'ExcludeBootVolume': True}
+        if others:
+            specification['ExcludeDataVolumeIds'] = others
+        
+        response = ec2.create_snapshots(
+            InstanceSpecification=specification,
+            Description=description,
+            TagSpecifications=[
+                {
+                    'ResourceType': 'snapshot',
+                    'Tags': backup_tags(item, consistent)
+                }
+            ]
+        )
+        
+        snapshot_ids = {}
+        for snapshot in response['Snapshots']:
+            if snapshot['VolumeId'] not in members:
+                # Attached after the instance was described
+                ec2.delete_snapshot(SnapshotId=snapshot['SnapshotId'])
+                continue
+            stripe_index = members.index(snapshot['VolumeId'])
+            ec2.create_tags(Resources=[snapshot['SnapshotId']], Tags=member_tags(snapshot['VolumeId'], stripe_index))
+            snapshot_ids[stripe_index] = snapshot['SnapshotId']
+        
+        return [snapshot_ids[stripe_index] for stripe_index in sorted(snapshot_ids)]
+        
+    except Exception as e:
+        logger.error(f"Error creating cache set snapshots: {str(e)}")
+        raise
+
+
 def cleanup_old_snapshots():
     """Clean up snapshots older than 30 days."""
     try:
@@ -0,0 +1,315 @@
+"""Lambda function to pre-warm idle cache volumes against the latest commit."""
+
+import json
+import os
+import shlex
+import boto3
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from botocore.exceptions import ClientError
+from warm_plan import plan_warmers
+import cache_sets  # Lambda layer
+import ec2_clients  # Lambda layer
+import sdk_profiler  # Lambda layer
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Opt-in AWS call profiling (SDK_PROFILING), hooked before the clients are created
+sdk_profiler.install()
+
+# Initialize AWS clients
+dynamodb = boto3.resource('dynamodb')
+# Adaptive retries, on the EC2 API budget shared by the cache pool functions
+ec2 = ec2_clients.ec2_client()
+
+# Environment variables
+CACHE_POOL_TABLE = os.environ.get('CACHE_POOL_TABLE', 'unity-cicd-cache-pool-status')
+PREWARM_ENABLED = os.environ.get('PREWARM_ENABLED', 'false').lower() == 'true'
+REPOSITORY_URL = os.environ.get('REPOSITORY_URL', '')
+BRANCH = os.environ.get('BRANCH', 'main')
+PROJECT_PATH = os.environ.get('PROJECT_PATH', '.')
+CREDENTIALS_PARAMETER = os.environ.get('CREDENTIALS_PARAMETER', '')
+OFF_PEAK_HOURS = [int(hour) for hour in os.environ.get('OFF_PEAK_HOURS', '1,2,3,4').split(',') if hour]
+STALE_HOURS = float(os.environ.get('STALE_HOURS', '12'))
+MAX_WARMERS = int(os.environ.get('MAX_WARMERS', '2'))
+VOLUMES_PER_WARMER = int(os.environ.get('VOLUMES_PER_WARMER', '2'))
+WARM_TIMEOUT_MINUTES = int(os.environ.get('WARM_TIMEOUT_MINUTES', '90'))
+INSTANCE_TYPES = [t for t in os.environ.get('INSTANCE_TYPES', 'c6i.2xlarge,c5.2xlarge').split(',') if t]
+# {project_id: {launch_template, cache_volume_profile}}: the agent pool of each cache partition
+WARM_POOLS = json.loads(os.environ.get('WARM_POOLS') or '{}')
+# {availability_zone: subnet_id}
+SUBNETS = json.loads(os.environ.get('SUBNETS') or '{}')
+
+# Spot capacity errors; the next instance type is tried
+CAPACITY_ERRORS = {
+    'InsufficientInstanceCapacity',
+    'SpotMaxPriceTooLow',
+    'MaxSpotInstanceCountExceeded',
+    'Unsupported',
+}
+
+
+@sdk_profiler.profiled
+def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    Return finished warmers' volumes to the pool and, in off-peak hours, launch
+    Spot warmer instances for the most stale Available cache sets.
+    
+    Args:
+        event: Scheduled EventBridge event (contents are ignored)
+    
+    Returns:
+        {
+            "statusCode": 200,
+            "recovered_volumes": 1,
+            "warmers": [{"instance_id": "i-...", "availability_zone": "us-east-1a",
+                         "project_id": "unity-game", "volume_ids": ["vol-..."]}]
+        }
+    """
+    try:
+        now = int(datetime.utcnow().timestamp())
+        table = dynamodb.Table(CACHE_POOL_TABLE)
+        
+        warming = scan_status(table, 'Warming')
+        recovered = recover_abandoned_sets(warming, now)
+        warming = [item for item in warming if item['VolumeId'] not in recovered]
+        
+        results = {
+            'statusCode': 200,
+            'recovered_volumes': len(recovered),
+            'warmers': []
+        }
+        
+        if not PREWARM_ENABLED or not REPOSITORY_URL:
+            logger.info("Pre-warming is disabled or has no repository")
+            return results
+        if datetime.utcnow().hour not in OFF_PEAK_HOURS:
+            logger.info(f"Outside the off-peak hours {OFF_PEAK_HOURS}, no warmers launched")
+            return results
+        
+        # Warmers still running count against the budget
+        running = len({item.get('InstanceId') for item in warming})
+        budget = max(0, MAX_WARMERS - running)
+        
+        available = scan_status(table, 'Available')
+        
+        for warmer in plan_warmers(available, now, STALE_HOURS, budget, VOLUMES_PER_WARMER):
+            try:
+                launched = launch_warmer(warmer, now)
+                if launched:
+                    results['warmers'].append(launched)
+            except Exception as e:
+                logger.error(f"Error launching a warmer in {warmer['availability_zone']} for {warmer['project_id']}: {str(e)}")
+        
+        logger.info(f"Cache pre-warming: {results}")
+        return results
+    
+    except Exception as e:
+        logger.error(f"Error pre-warming cache volumes: {str(e)}")
+        return {
+            'statusCode': 500,
+            'error': str(e)
+        }
+
+
+def scan_status(table, status: str) -> List[Dict[str, Any]]:
+    """All cache sets with the status, page by page."""
+    scan_kwargs = {
+        'FilterExpression': '#status = :status',
+        'ExpressionAttributeNames': {'#status': 'Status'},
+        'ExpressionAttributeValues': {':status': status},
+    }
+    items = []
+    while True:
+        response = table.scan(**scan_kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def recover_abandoned_sets(items: List[Dict[str, Any]], now: int) -> List[str]:
+    """Return Warming sets to the pool once their warmer is gone and the volumes are detached.
+    
+    Warmers release their sets through the release Lambda; this covers warmers that
+    were interrupted, hit the timeout or never started. The attempt still counts.
+    """
+    instance_ids = list({item['InstanceId'] for item in items if item.get('InstanceId')})
+    alive = set()
+    if instance_ids:
+        try:
+            reservations = ec2.describe_instances(InstanceIds=instance_ids)['Reservations']
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'InvalidInstanceID.NotFound':
+                raise
+            reservations = []
+        alive = {
+            instance['InstanceId']
+            for reservation in reservations for instance in reservation['Instances']
+            if instance['State']['Name'] in ('pending', 'running')
+        }
+    
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    recovered = []
+    for item in items:
+        started = int(item.get('WarmStarted', 0))
+        if item.get('InstanceId') in alive and now - started < (WARM_TIMEOUT_MINUTES + 15) * 60:
+            continue
+        volume_ids = cache_sets.cache_set_volumes(item)
+        volumes = ec2.describe_volumes(VolumeIds=volume_ids)['Volumes']
+        if any(volume['State'] != 'available' for volume in volumes):
+            continue
+        try:
+            table.update_item(
+                Key={'VolumeId': item['VolumeId']},
+                UpdateExpression='SET #status = :available, PoolKey = :pool_key, LastWarmAttempt = :now '
+                                 'REMOVE InstanceId, WarmStarted',
+                ConditionExpression='#status = :warming',
+                ExpressionAttributeNames={'#status': 'Status'},
+                ExpressionAttributeValues={':available': 'Available', ':warming': 'Warming', ':now': now,
+                                           ':pool_key': cache_sets.available_pool_key(item)}
+            )
+            recovered.append(item['VolumeId'])
+            logger.info(f"Returned {item['VolumeId']} to the pool, its warmer {item.get('InstanceId')} is gone")
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+    
+    return recovered
+
+
+def claim_sets(items: List[Dict[str, Any]], now: int) -> List[Dict[str, Any]]:
+    """Mark Available sets as Warming, out of allocations' reach; sets an agent allocated meanwhile are skipped."""
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    claimed = []
+    for item in items:
+        try:
+            table.update_item(
+                Key={'VolumeId': item['VolumeId']},
+                UpdateExpression='SET #status = :warming, WarmStarted = :now REMOVE PoolKey',
+                ConditionExpression='#status = :available',
+                ExpressionAttributeNames={'#status': 'Status'},
+                ExpressionAttributeValues={':warming': 'Warming', ':available': 'Available', ':now': now}
+            )
+            claimed.append(item)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            logger.info(f"Volume {item['VolumeId']} was allocated meanwhile, not warming it")
+    return claimed
+
+
+def finish_claim(items: List[Dict[str, Any]], instance_id: Optional[str] = None):
+    """Return claimed sets to Available, or record the warmer that took them."""
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    for item in items:
+        if instance_id:
+            table.update_item(
+                Key={'VolumeId': item['VolumeId']},
+                UpdateExpression='SET InstanceId = :instance_id',
+                ExpressionAttributeValues={':instance_id': instance_id}
+            )
+        else:
+            table.update_item(
+                Key={'VolumeId': item['VolumeId']},
+                UpdateExpression='SET #status = :available, PoolKey = :pool_key REMOVE WarmStarted',
+                ExpressionAttributeNames={'#status': 'Status'},
+                ExpressionAttributeValues={':available': 'Available', ':pool_key': cache_sets.available_pool_key(item)}
+            )
+
+
+def launch_warmer(warmer: Dict[str, Any], now: int) -> Optional[Dict[str, Any]]:
+    """Claim the warmer's sets and launch a Spot instance in their AZ to warm them."""
+    pool = WARM_POOLS.get(warmer['project_id'])
+    subnet_id = SUBNETS.get(warmer['availability_zone'])
+    if not pool or not subnet_id:
+        logger.warning(f"No agent pool or subnet for {warmer['project_id']} in {warmer['availability_zone']}")
+        return None
+    
+    items = claim_sets(warmer['items'], now)
+    if not items:
+        return None
+    
+    user_data = build_user_data([cache_sets.cache_set_volumes(item) for item in items], pool['cache_volume_profile'])
+    instance_id = None
+    try:
+        for instance_type in INSTANCE_TYPES:
+            try:
+                instance_id = run_warmer_instance(pool['launch_template'], instance_type, subnet_id, user_data)
+                break
+            except ClientError as e:
+                if e.response['Error']['Code'] not in CAPACITY_ERRORS:
+                    raise
+                logger.info(f"No Spot capacity for {instance_type} in {warmer['availability_zone']}: {e.response['Error']['Code']}")
+    finally:
+        finish_claim(items, instance_id)
+    
+    if not instance_id:
+        logger.warning(f"No warmer launched in {warmer['availability_zone']}, no Spot capacity for {INSTANCE_TYPES}")
+        return None
+    
+    volume_ids = [item['VolumeId'] for item in items]
+    logger.info(f"Warmer {instance_id} launched in {warmer['availability_zone']} for {volume_ids}")
+    return {
+        'instance_id': instance_id,
+        'availability_zone': warmer['availability_zone'],
+        'project_id': warmer['project_id'],
+        'volume_ids': volume_ids,
+    }
+
+
+def run_warmer_instance(launch_template: str, instance_type: str, subnet_id: str, user_data: str) -> str:
+    """Launch a one-time Spot instance from the pool's launch template with the warmer user data."""
+    response = ec2.run_instances(
+        # The version the pool's Auto Scaling group launches
+        LaunchTemplate={'LaunchTemplateName': launch_template, 'Version': '$Latest'},
+        InstanceType=instance_type,
+        SubnetId=subnet_id,
+        MinCount=1,
+        MaxCount=1,
+        UserData=user_data,
+        InstanceInitiatedShutdownBehavior='terminate',
+        InstanceMarketOptions={
+            'MarketType': 'spot',
+            'SpotOptions': {
+                'SpotInstanceType': 'one-time',
+                'InstanceInterruptionBehavior': 'terminate',
+            },
+        },
+        TagSpecifications=[
+            {
+                'ResourceType': 'instance',
+                'Tags': [
+                    {'Key': 'Name', 'Value': 'jenkins-cache-warmer'},
+                    {'Key': 'Purpose', 'Value': 'CacheWarmer'},
+                ],
+            }
+        ],
+    )
+    return response['Instances'][0]['InstanceId']
+
+
+def build_user_data(cache_sets: List[List[str]], cache_volume_profile: Dict[str, Any]) -> str:
+    """User data replacing the agent's: warm the sets in turn, then terminate."""
+    arguments = ' '.join(
+        shlex.quote(argument) for argument in [REPOSITORY_URL, BRANCH, PROJECT_PATH]
+        + [','.join(volume_ids) for volume_ids in cache_sets]
+    )
+    return f"""#!/bin/bash
+exec > >(tee /var/log/cache-prewarm.log | logger -t cache-prewarm -s 2>/dev/console) 2>&1
+
+# The warming budget: the instance terminates at the timeout, done or not
+shutdown -h +{WARM_TIMEOUT_MINUTES}
+
+# Same cache volume profile and cache owner as the pool's agents
+mkdir -p /etc/jenkins-agent
+echo {shlex.quote(json.dumps(cache_volume_profile))} > /etc/jenkins-agent/cache-volume.json
+useradd -m -s /bin/bash jenkins || true
+
+GIT_TOKEN_PARAMETER={shlex.quote(CREDENTIALS_PARAMETER)} /opt/manage-cache-volume.sh prewarm {arguments}
+shutdown -h now
+"""
@@ -0,0 +1,47 @@
+"""Choice of the idle cache sets a prewarm run refreshes.
+
+A cache set is stale when it has been neither used by a build nor warmed for
+stale_hours; sets whose last warming attempt failed wait as long before the
+next one. The most stale sets are warmed first, grouped into one warmer
+instance per AZ and cache partition (a volume only attaches in its own AZ),
+within the run's budget of warmers and sets per warmer.
+"""
+
+from typing import Any, Dict, List
+
+HOUR_SECONDS = 3600
+
+
+def staleness(item: Dict[str, Any], now: int) -> int:
+    """Seconds since the set was last used by a build or warmed."""
+    return now - max(int(item.get('LastUsed', 0)), int(item.get('LastWarmed', 0)))
+
+
+def plan_warmers(items: List[Dict[str, Any]], now: int, stale_hours: float,
+                 max_warmers: int, volumes_per_warmer: int) -> List[Dict[str, Any]]:
+    """Group the stale Available sets into warmers, most stale set first.
+    
+    Returns:
+        [{"availability_zone": "us-east-1a", "project_id": "unity-game",
+          "items": [<table item>, ...]}, ...]
+    """
+    threshold = stale_hours * HOUR_SECONDS
+    candidates = [
+        item for item in items
+        if item.get('Status') == 'Available'
+        and staleness(item, now) >= threshold
+        and now - int(item.get('LastWarmAttempt', 0)) >= threshold
+    ]
+    candidates.sort(key=lambda item: staleness(item, now), reverse=True)
+    
+    warmers = {}
+    for item in candidates:
+        key = (item['AvailabilityZone'], item.get('ProjectId', 'unity-game'))
+        if key not in warmers:
+            if len(warmers) >= max_warmers:
+                continue
+            warmers[key] = {'availability_zone': key[0], 'project_id': key[1], 'items': []}
+        if len(warmers[key]['items']) < volumes_per_warmer:
+            warmers[key]['items'].append(item)
+    
+    return list(warmers.values())
@@ -0,0 +1,317 @@
+"""Lambda function to register Jenkins agent nodes from Auto Scaling lifecycle events."""
+
+import json
+import os
+import boto3
+import logging
+import urllib.parse
+import urllib.error
+import urllib.request
+import http.cookiejar
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+import cache_sets  # Lambda layer
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+autoscaling = boto3.client('autoscaling')
+ssm = boto3.client('ssm')
+ec2 = boto3.client('ec2')
+cloudwatch = boto3.client('cloudwatch')
+dynamodb = boto3.resource('dynamodb')
+lambda_client = boto3.client('lambda')
+
+# Environment variables
+JENKINS_URL = os.environ.get('JENKINS_URL', 'http://jenkins.unity-cicd.internal:8080')
+AGENT_LABELS = os.environ.get('AGENT_LABELS', 'unity linux')
+NUM_EXECUTORS = os.environ.get('NUM_EXECUTORS', '2')
+# Node settings per agent pool ASG: {asg_name: {name, labels, num_executors}}
+AGENT_POOLS = json.loads(os.environ.get('AGENT_POOLS') or '{}')
+REMOTE_FS = os.environ.get('REMOTE_FS', '/opt/jenkins')
+SECRET_PARAMETER_PREFIX = os.environ.get('SECRET_PARAMETER_PREFIX', '/jenkins/agents')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'JenkinsUnity/AgentBoot')
+FLEET_METRICS_NAMESPACE = os.environ.get('FLEET_METRICS_NAMESPACE', 'JenkinsUnity/AgentFleet')
+CACHE_POOL_TABLE = os.environ.get('CACHE_POOL_TABLE', 'unity-cicd-cache-pool-status')
+RELEASE_FUNCTION_NAME = os.environ.get('RELEASE_FUNCTION_NAME', 'unity-cicd-release-cache-volume')
+
+LAUNCH_LIFECYCLE_ACTION = 'EC2 Instance-launch Lifecycle Action'
+TERMINATE_SUCCESSFUL = 'EC2 Instance Terminate Successful'
+
+
+def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    Create or delete the Jenkins node for an agent instance.
+    
+    Args:
+        event: EventBridge Auto Scaling event, either
+            "EC2 Instance-launch Lifecycle Action" (create node, store JNLP secret) or
+            "EC2 Instance Terminate Successful" (release cache sets, delete node and secret)
+    
+    Returns:
+        {
+            "statusCode": 200,
+            "agent_name": "unity-agent-i-1234567890abcdef0",
+            "action": "Registered|Deregistered"
+        }
+    """
+    detail_type = event.get('detail-type')
+    detail = event.get('detail', {})
+    instance_id = detail.get('EC2InstanceId')
+    
+    try:
+        if not instance_id:
+            raise ValueError("EC2InstanceId is required")
+        
+        agent_name = f"unity-agent-{instance_id}"
+        
+        if detail_type == LAUNCH_LIFECYCLE_ACTION:
+            register_agent(agent_name, instance_id, get_pool(detail.get('AutoScalingGroupName')))
+            publish_registration_latency(instance_id)
+            action = 'Registered'
+        elif detail_type == TERMINATE_SUCCESSFUL:
+            release_cache_sets(instance_id)
+            deregister_agent(agent_name, instance_id)
+            publish_build_lost(instance_id)
+            action = 'Deregistered'
+        else:
+            raise ValueError(f"Unsupported event type: {detail_type}")
+        
+        logger.info(f"{action} Jenkins node {agent_name}")
+        return {
+            'statusCode': 200,
+            'agent_name': agent_name,
+            'action': action
+        }
+        
+    except Exception as e:
+        logger.error(f"Error handling {detail_type} for {instance_id}: {str(e)}")
+        return {
+            'statusCode': 500,
+            'error': str(e)
+        }
+    
+    finally:
+        # Never hold the instance in Pending:Wait, agents fall back to polling Jenkins
+        if detail_type == LAUNCH_LIFECYCLE_ACTION and instance_id:
+            complete_lifecycle_action(detail)
+
+
+class JenkinsClient:
+    """Minimal Jenkins HTTP client with crumb (CSRF) support."""
+    
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+        self._crumb = None
+    
+    def request(self, path: str, data: Optional[Dict[str, str]] = None, timeout: int = 10) -> bytes:
+        """Send a GET, or a POST with form data, and return the response body."""
+        headers = {}
+        body = None
+        if data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers.update(self._get_crumb_header())
+        req = urllib.request.Request(f"{self.base_url}{path}", data=body, headers=headers)
+        with self.opener.open(req, timeout=timeout) as response:
+            return response.read()
+    
+    def _get_crumb_header(self) -> Dict[str, str]:
+        """Fetch the CSRF crumb once; Jenkins without CSRF protection returns 404."""
+        if self._crumb is None:
+            try:
+                crumb = json.loads(self.request('/crumbIssuer/api/json'))
+                self._crumb = {crumb['crumbRequestField']: crumb['crumb']}
+            except urllib.error.HTTPError:
+                self._crumb = {}
+        return self._crumb
+    
+    def node_exists(self, name: str) -> bool:
+        """Check whether a node with this name exists."""
+        try:
+            self.request(f"/computer/{urllib.parse.quote(name)}/api/json")
+            return True
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return False
+            raise
+
+
+def get_pool(auto_scaling_group_name: Optional[str]) -> Dict[str, Any]:
+    """Node settings of the agent pool an Auto Scaling group belongs to."""
+    return AGENT_POOLS.get(auto_scaling_group_name, {
+        'name': 'linux',
+        'labels': AGENT_LABELS,
+        'num_executors': NUM_EXECUTORS,
+    })
+
+
+def register_agent(agent_name: str, instance_id: str, pool: Dict[str, Any]):
+    """Create the JNLP node in Jenkins and store its secret for the agent."""
+    jenkins = JenkinsClient(JENKINS_URL)
+    
+    if not jenkins.node_exists(agent_name):
+        create_node(jenkins, agent_name, instance_id, pool)
+    
+    secret = get_jnlp_secret(jenkins, agent_name)
+    
+    ssm.put_parameter(
+        Name=secret_parameter_name(instance_id),
+        Value=secret,
+        Type='SecureString',
+        Overwrite=True,
+        Description=f"JNLP secret for Jenkins node {agent_name}",
+    )
+
+
+def create_node(jenkins: JenkinsClient, agent_name: str, instance_id: str, pool: Dict[str, Any]):
+    """Create a permanent JNLP (WebSocket) node with the labels of its pool."""
+    node = {
+        'name': agent_name,
+        'nodeDescription': f"Unity Build Agent ({pool['name']}) - {instance_id}",
+        'numExecutors': str(pool['num_executors']),
+        'remoteFS': REMOTE_FS,
+        'labelString': pool['labels'],
+        'mode': 'NORMAL',
+        'type': 'hudson.slaves.DumbSlave',
+        'launcher': {
+            'stapler-class': 'hudson.slaves.JNLPLauncher',
+            '$class': 'hudson.slaves.JNLPLauncher',
+            'webSocket': True,
+            'workDirSettings': {
+                'disabled': False,
+                'workDirPath': '',
+                'internalDir': 'remoting',
+                'failIfWorkDirIsMissing': False,
+            },
+        },
+        'retentionStrategy': {
+            'stapler-class': 'hudson.slaves.RetentionStrategy$Always',
+            '$class': 'hudson.slaves.RetentionStrategy$Always',
+        },
+        'nodeProperties': {'stapler-class-bag': 'true'},
+    }
+    
+    query = urllib.parse.urlencode({'name': agent_name, 'type': 'hudson.slaves.DumbSlave'})
+    jenkins.request(f"/computer/doCreateItem?{query}", data={'json': json.dumps(node)})
+    logger.info(f"Created Jenkins node {agent_name}")
+
+
+def get_jnlp_secret(jenkins: JenkinsClient, agent_name: str) -> str:
+    """Read the agent secret from the node's JNLP file (first application argument)."""
+    jnlp = jenkins.request(f"/computer/{urllib.parse.quote(agent_name)}/jenkins-agent.jnlp").decode()
+    start = jnlp.find('<argument>')
+    end = jnlp.find('</argument>', start)
+    if start == -1 or end == -1:
+        raise ValueError(f"No secret found in JNLP file for {agent_name}")
+    return jnlp[start + len('<argument>'):end].strip()
+
+
+def deregister_agent(agent_name: str, instance_id: str):
+    """Delete the Jenkins node and the stored secret of a terminated agent."""
+    jenkins = JenkinsClient(JENKINS_URL)
+    
+    if jenkins.node_exists(agent_name):
+        jenkins.request(f"/computer/{urllib.parse.quote(agent_name)}/doDelete", data={})
+    
+    try:
+        ssm.delete_parameter(Name=secret_parameter_name(instance_id))
+    except ssm.exceptions.ParameterNotFound:
+        pass
+
+
+def release_cache_sets(instance_id: str):
+    """Return the cache sets a terminated agent still held to the pool (replaced or interrupted agents)."""
+    try:
+        table = dynamodb.Table(CACHE_POOL_TABLE)
+        response = table.query(
+            IndexName='Pool-Index',
+            KeyConditionExpression='PoolKey = :pool_key',
+            ExpressionAttributeValues={':pool_key': cache_sets.held_pool_key(instance_id)}
+        )
+        
+        for item in response['Items']:
+            # Asynchronous: the release Lambda waits for the volumes to detach
+            lambda_client.invoke(
+                FunctionName=RELEASE_FUNCTION_NAME,
+                InvocationType='Event',
+                Payload=json.dumps({'volume_id': item['VolumeId'], 'instance_id': instance_id}),
+            )
+            logger.info(f"Releasing cache set {item['VolumeId']} of terminated agent {instance_id}")
+    
+    except Exception as e:
+        logger.error(f"Error releasing cache sets of {instance_id}: {str(e)}")
+
+
+def secret_parameter_name(instance_id: str) -> str:
+    """SSM parameter holding the JNLP secret of an agent instance."""
+    return f"{SECRET_PARAMETER_PREFIX}/{instance_id}/secret"
+
+
+def publish_registration_latency(instance_id: str):
+    """Publish the time from the instance's launch to its node and secret being ready."""
+    try:
+        reservations = ec2.describe_instances(InstanceIds=[instance_id])['Reservations']
+        launched = reservations[0]['Instances'][0]['LaunchTime']
+        latency = (datetime.now(timezone.utc) - launched).total_seconds()
+        
+        cloudwatch.put_metric_data(
+            Namespace=METRICS_NAMESPACE,
+            MetricData=[
+                {
+                    'MetricName': 'NodeRegistrationLatency',
+                    'Value': latency,
+                    'Unit': 'Seconds',
+                }
+            ]
+        )
+        logger.info(f"Node registration latency: {latency:.1f}s")
+        
+    except Exception as e:
+        logger.error(f"Error publishing registration latency: {str(e)}")
+
+
+def publish_build_lost(instance_id: str):
+    """Count a terminated agent that the scale-in protection controller last saw busy."""
+    try:
+        response = ec2.describe_tags(
+            Filters=[
+                {'Name': 'resource-id', 'Values': [instance_id]},
+                {'Name': 'key', 'Values': ['jenkins:busy']},
+            ]
+        )
+        busy = any(tag['Value'] == 'true' for tag in response['Tags'])
+        
+        cloudwatch.put_metric_data(
+            Namespace=FLEET_METRICS_NAMESPACE,
+            MetricData=[
+                {
+                    'MetricName': 'BuildsLostToTermination',
+                    'Value': 1 if busy else 0,
+                    'Unit': 'Count',
+                }
+            ]
+        )
+        if busy:
+            logger.warning(f"Agent {instance_id} was terminated while running a build")
+        
+    except Exception as e:
+        logger.error(f"Error publishing lost build metric: {str(e)}")
+
+
+def complete_lifecycle_action(detail: Dict[str, Any]):
+    """Let the Auto Scaling group continue the launch."""
+    try:
+        autoscaling.complete_lifecycle_action(
+            LifecycleHookName=detail['LifecycleHookName'],
+            AutoScalingGroupName=detail['AutoScalingGroupName'],
+            LifecycleActionToken=detail['LifecycleActionToken'],
+            LifecycleActionResult='CONTINUE',
+        )
+    except Exception as e:
+        logger.error(f"Error completing lifecycle action: {str(e)}")
@@ -5,28 +5,38 @@ import os
 import boto3
 import logging
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+import cache_sets  # Lambda layer
+import ec2_clients  # Lambda layer
+import sdk_profiler  # Lambda layer
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Opt-in AWS call profiling (SDK_PROFILING), hooked before the clients are created
+sdk_profiler.install()
+
 # Initialize AWS clients
 dynamodb = boto3.resource('dynamodb')
-ec2 = boto3.client('ec2')
+# Adaptive retries, on the EC2 API budget shared by the cache pool functions
+ec2 = ec2_clients.ec2_client()
 
 # Environment variables
 CACHE_POOL_TABLE = os.environ.get('CACHE_POOL_TABLE', 'unity-cicd-cache-pool-status')
 
 
+@sdk_profiler.profiled
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """
-    Release a cache volume from a Jenkins agent.
+    Release a cache volume, or every volume of a cache set, from a Jenkins agent.
     
     Args:
         event: {
-            "volume_id": "vol-1234567890abcdef0",
-            "instance_id": "i-1234567890abcdef0"
+            "volume_id": "vol-1234567890abcdef0",  # any volume of the cache set
+            "instance_id": "i-1234567890abcdef0",
+            "prewarm": {"result": "success", "commit": "4f2a9c1"}  # set by cache warmers
         }
     
     Returns:
@@ -39,18 +49,20 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         # Parse input parameters
         volume_id = event.get('volume_id')
         instance_id = event.get('instance_id')
+        prewarm = event.get('prewarm')
         
         if not volume_id:
             raise ValueError("volume_id is required")
         
-        logger.info(f"Releasing cache volume: {volume_id} from instance: {instance_id}")
+        volume_id, volume_ids, item = resolve_cache_set(volume_id)
+        logger.info(f"Releasing cache volume: {volume_id} ({len(volume_ids)} volumes) from instance: {instance_id}")
         
-        # Detach volume from instance if attached
+        # Detach volumes from instance if attached
         if instance_id:
-            detach_volume_from_instance(volume_id, instance_id)
+            detach_volume_from_instance(volume_ids, instance_id)
         
         # Update volume status to Available
-        update_volume_status(volume_id, 'Available')
+        update_volume_status(volume_id, 'Available', prewarm, cache_sets.available_pool_key(item) if item else None)
         
         logger.info(f"Successfully released volume: {volume_id}")
         return {
@@ -66,56 +78,102 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
         }
 
 
-def detach_volume_from_instance(volume_id: str, instance_id: str):
-    """Detach EBS volume from EC2 instance."""
-    try:
-        # Check if volume is attached
-        response = ec2.describe_volumes(VolumeIds=[volume_id])
-        volume = response['Volumes'][0]
+def resolve_cache_set(volume_id: str):
+    """Return the table key of the volume's cache set, the set's volumes and its item (None if untracked)."""
+    table = dynamodb.Table(CACHE_POOL_TABLE)
+    
+    item = table.get_item(Key={'VolumeId': volume_id}).get('Item')
+    if not item:
+        # A member other than the first: follow its CacheSet tag
+        volume = ec2.describe_volumes(VolumeIds=[volume_id])['Volumes'][0]
+        tags = {tag['Key']: tag['Value'] for tag in volume.get('Tags', [])}
+        if tags.get('CacheSet', volume_id) != volume_id:
+            item = table.get_item(Key={'VolumeId': tags['CacheSet']}).get('Item')
+    
+    if not item:
+        return volume_id, [volume_id], None
+    return item['VolumeId'], cache_sets.cache_set_volumes(item), item
+
+
+def detach_volume_from_instance(volume_ids: List[str], instance_id: str):
+    """Detach the EBS volumes of a cache set from EC2 instance.
+    
+    Raises while a volume is still attached, so a set the instance holds never becomes Available.
+    """
+    attached = attached_volumes(volume_ids, instance_id)
+    for volume_id, state in attached.items():
+        if state in ['attached', 'attaching']:
+            logger.info(f"Detaching volume {volume_id} from instance {instance_id}")
+            
+            # Detach volume
+            ec2.detach_volume(
+                VolumeId=volume_id,
+                InstanceId=instance_id,
+                Force=False  # Graceful detach
+            )
+    
+    if attached:
+        try:
+            # Wait for volumes to be available, also those a terminating instance is detaching
+            ec2.get_waiter('volume_available').wait(
+                VolumeIds=list(attached),
+                WaiterConfig={'Delay': 5, 'MaxAttempts': 60}
+            )
+            logger.info(f"Volumes {list(attached)} successfully detached")
+            return
+        except Exception as e:
+            logger.error(f"Error waiting for volumes to detach: {str(e)}")
         
-        # Find attachment to the specified instance
+        still_attached = attached_volumes(volume_ids, instance_id)
+        if still_attached:
+            raise RuntimeError(f"Volumes {list(still_attached)} are still attached to {instance_id}")
+
+
+def attached_volumes(volume_ids: List[str], instance_id: str) -> Dict[str, str]:
+    """Attachment state of the set's volumes attached to the instance; deleted volumes are left out."""
+    response = ec2.describe_volumes(Filters=[{'Name': 'volume-id', 'Values': volume_ids}])
+    
+    attached = {}
+    for volume in response['Volumes']:
         for attachment in volume.get('Attachments', []):
-            if attachment['InstanceId'] == instance_id and attachment['State'] in ['attached', 'attaching']:
-                logger.info(f"Detaching volume {volume_id} from instance {instance_id}")
-                
-                # Detach volume
-                ec2.detach_volume(
-                    VolumeId=volume_id,
-                    InstanceId=instance_id,
-                    Force=False  # Graceful detach
-                )
-                
-                # Wait for volume to be available
-                ec2.get_waiter('volume_available').wait(
-                    VolumeIds=[volume_id],
-                    WaiterConfig={'Delay': 5, 'MaxAttempts': 60}
-                )
-                
-                logger.info(f"Volume {volume_id} successfully detached")
-                break
-        else:
-            logger.info(f"Volume {volume_id} is not attached to instance {instance_id}")
-            
-    except Exception as e:
-        logger.error(f"Error detaching volume: {str(e)}")
-        # Don't raise exception here, continue with status update
-        # The volume might already be detached
+            if attachment['InstanceId'] == instance_id and attachment['State'] != 'detached':
+                attached[volume['VolumeId']] = attachment['State']
+    return attached
 
 
-def update_volume_status(volume_id: str, status: str):
-    """Update volume status in DynamoDB."""
+def update_volume_status(volume_id: str, status: str, prewarm: Optional[Dict[str, Any]] = None,
+                         pool_key: Optional[str] = None):
+    """Update volume status in DynamoDB.
+    
+    A warmer's release records the warming instead of a use, so warming never
+    keeps an unused volume from aging out. The pool_key puts an Available set
+    into Pool-Index, where allocations look for it.
+    """
     try:
         table = dynamodb.Table(CACHE_POOL_TABLE)
+        now = int(datetime.utcnow().timestamp())
+        
+        update_expression = 'SET #status = :status'
+        values = {':status': status, ':now': now}
+        if pool_key and status == 'Available':
+            update_expression += ', PoolKey = :pool_key'
+            values[':pool_key'] = pool_key
+        
+        if prewarm:
+            update_expression += ', LastWarmAttempt = :now'
+            if prewarm.get('result') == 'success':
+                update_expression += ', LastWarmed = :now, WarmedCommit = :commit'
+                values[':commit'] = prewarm.get('commit', '')
+            update_expression += ' REMOVE InstanceId, WarmStarted'
+        else:
+            update_expression += ', LastUsed = :now REMOVE InstanceId'
         
         # Update status and remove instance ID
         table.update_item(
             Key={'VolumeId': volume_id},
-            UpdateExpression='SET #status = :status, LastUsed = :last_used REMOVE InstanceId',
+            UpdateExpression=update_expression,
             ExpressionAttributeNames={'#status': 'Status'},
-            ExpressionAttributeValues={
-                ':status': status,
-                ':last_used': int(datetime.utcnow().timestamp())
-            }
+            ExpressionAttributeValues=values
         )
         
         logger.info(f"Updated volume {volume_id} status to {status}")
@@ -0,0 +1,68 @@
+"""Cache set records of the cache pool table, shared by the cache pool Lambdas.
+
+A cache set is one EBS volume or a striped set of them, tracked by one item
+keyed by its first volume. Available sets are found through Pool-Index under
+a PoolKey of their AZ, cache partition and stripe width, spread over
+INDEX_SHARDS write shards by a hash of the first volume. Every function that
+makes a set Available writes the key the allocate Lambda reads, from here.
+InUse sets of an instance are found through the same index under a key of the
+instance, so the table needs no second index for them.
+"""
+
+import os
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+# Pool-Index write shards per AZ, partition and width
+INDEX_SHARDS = int(os.environ.get('INDEX_SHARDS', '1'))
+
+
+def cache_set_volumes(item: Dict[str, Any]) -> List[str]:
+    """Volumes of a cache set in stripe order; single volumes predate cache sets."""
+    return list(item.get('VolumeIds') or [item['VolumeId']])
+
+
+def pool_key(availability_zone: str, project_id: str, stripe_width: int, shard: int = 0) -> str:
+    """Pool-Index partition key of the Available cache sets of an AZ, partition, width and write shard."""
+    key = f"{availability_zone}#{project_id}#{stripe_width}"
+    return f"{key}#{shard}" if INDEX_SHARDS > 1 else key
+
+
+def available_pool_key(item: Dict[str, Any]) -> str:
+    """Pool-Index partition key of a cache set while it is Available."""
+    return pool_key(
+        item['AvailabilityZone'],
+        item.get('ProjectId', 'unity-game'),
+        len(cache_set_volumes(item)),
+        zlib.crc32(item['VolumeId'].encode()) % INDEX_SHARDS,
+    )
+
+
+def available_sets(table, availability_zone: str, project_id: str, stripe_width: int) -> Iterator[Dict[str, Any]]:
+    """Every Available cache set of an AZ, partition and width, read from each write shard of Pool-Index."""
+    for shard in range(INDEX_SHARDS):
+        query = {
+            'IndexName': 'Pool-Index',
+            'KeyConditionExpression': 'PoolKey = :pool_key',
+            'ExpressionAttributeValues': {':pool_key': pool_key(availability_zone, project_id, stripe_width, shard)},
+        }
+        while True:
+            response = table.query(**query)
+            yield from response['Items']
+            if 'LastEvaluatedKey' not in response:
+                break
+            query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def held_pool_key(instance_id: str) -> str:
+    """Pool-Index partition key of the InUse cache sets an instance holds."""
+    return f"held#{instance_id}"
+
+
+def expected_pool_key(item: Dict[str, Any]) -> Optional[str]:
+    """Pool-Index partition key of a cache set in its current status; None keeps it out of the index."""
+    if item['Status'] == 'Available':
+        return available_pool_key(item)
+    if item['Status'] == 'InUse' and item.get('InstanceId'):
+        return held_pool_key(item['InstanceId'])
+    return None
@@ -0,0 +1,117 @@
+"""Throttling-aware EC2 clients for the cache pool Lambdas.
+
+ec2_client() returns an EC2 client in botocore's adaptive retry mode: throttled
+calls are retried with exponential backoff and full jitter, and the client slows
+its own request rate after being throttled. With EC2_BUDGET_TABLE set, every EC2
+call, waiter polls included, also takes a token from a per-second budget shared
+by all concurrent invocations of the cache pool functions: one DynamoDB counter
+per second and kind of call, as EC2 rates describe and mutating calls separately.
+A function with EC2_BUDGET_SHARE below 1 stops at that share of each second's
+budget and leaves the rest to the others, so maintenance yields to allocation.
+
+A call that finds its second's budget spent waits for the next second, with
+jitter, up to EC2_BUDGET_MAX_WAIT_SECONDS. After that, or when the budget table
+cannot be reached, it goes out anyway and is left to the retries.
+"""
+
+import logging
+import os
+import random
+import time
+from typing import Callable, Dict
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# Attempts per call in adaptive retry mode, the first one included
+EC2_MAX_ATTEMPTS = int(os.environ.get('EC2_MAX_ATTEMPTS', '8'))
+EC2_BUDGET_TABLE = os.environ.get('EC2_BUDGET_TABLE', '')
+# Calls per second shared by the cache pool functions, per kind of call
+EC2_DESCRIBE_PER_SECOND = int(os.environ.get('EC2_DESCRIBE_PER_SECOND', '10'))
+EC2_MUTATE_PER_SECOND = int(os.environ.get('EC2_MUTATE_PER_SECOND', '3'))
+# Share of each second's budget this function may use
+EC2_BUDGET_SHARE = float(os.environ.get('EC2_BUDGET_SHARE', '1'))
+EC2_BUDGET_MAX_WAIT_SECONDS = float(os.environ.get('EC2_BUDGET_MAX_WAIT_SECONDS', '30'))
+
+# Counters of past seconds expire (DynamoDB TTL)
+COUNTER_TTL_SECONDS = 300
+# Calls waiting for the next second spread over its first part
+WAIT_JITTER_SECONDS = 0.25
+
+RETRY_CONFIG = Config(retries={'mode': 'adaptive', 'total_max_attempts': EC2_MAX_ATTEMPTS})
+
+
+def call_kind(operation: str) -> str:
+    """The EC2 rate an operation counts against: "describe" for reads, "mutate" for the rest."""
+    return 'describe' if operation.startswith(('Describe', 'Get')) else 'mutate'
+
+
+def budget_ceiling(per_second: int, share: float) -> int:
+    """Calls per second a function with this share may make; at least one."""
+    return max(1, int(per_second * share))
+
+
+class RateBudget:
+    """Per-second EC2 call budget shared across invocations through DynamoDB counters."""
+
+    def __init__(self, table, rates: Dict[str, int], share: float = 1.0, max_wait_seconds: float = 30,
+                 clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        self.table = table
+        self.ceilings = {kind: budget_ceiling(rate, share) for kind, rate in rates.items()}
+        self.max_wait_seconds = max_wait_seconds
+        self.clock = clock
+        self.sleep = sleep
+
+    def acquire(self, kind: str) -> bool:
+        """Take a token of this second's budget, waiting for a later second if it is spent.
+        
+        Returns:
+            False when the call goes out without a token (waited too long, budget unavailable)
+        """
+        deadline = self.clock() + self.max_wait_seconds
+        while True:
+            now = self.clock()
+            second = int(now)
+            try:
+                self.table.update_item(
+                    Key={'Counter': f"ec2-{kind}#{second}"},
+                    UpdateExpression='ADD Calls :one SET ExpiresAt = :expires_at',
+                    ConditionExpression='attribute_not_exists(Calls) OR Calls < :ceiling',
+                    ExpressionAttributeValues={
+                        ':one': 1,
+                        ':ceiling': self.ceilings[kind],
+                        ':expires_at': second + COUNTER_TTL_SECONDS,
+                    }
+                )
+                return True
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    logger.warning(f"EC2 API budget unavailable, calling without it: {str(e)}")
+                    return False
+            
+            if now >= deadline:
+                logger.warning(f"EC2 {kind} budget spent for {self.max_wait_seconds:.0f}s, calling without it")
+                return False
+            # Not all at the start of the next second
+            self.sleep(min(second + 1 - now + random.uniform(0, WAIT_JITTER_SECONDS), deadline - now))
+
+    def before_call(self, model, **kwargs):
+        self.acquire(call_kind(model.name))
+
+
+def ec2_client():
+    """An EC2 client with adaptive retries, on the shared budget when EC2_BUDGET_TABLE is set."""
+    client = boto3.client('ec2', config=RETRY_CONFIG)
+    if EC2_BUDGET_TABLE:
+        budget = RateBudget(
+            boto3.resource('dynamodb').Table(EC2_BUDGET_TABLE),
+            {'describe': EC2_DESCRIBE_PER_SECOND, 'mutate': EC2_MUTATE_PER_SECOND},
+            EC2_BUDGET_SHARE,
+            EC2_BUDGET_MAX_WAIT_SECONDS,
+        )
+        # Once per call: retries of a call are paced by the adaptive retry mode
+        client.meta.events.register('before-call.ec2', budget.before_call)
+    return client
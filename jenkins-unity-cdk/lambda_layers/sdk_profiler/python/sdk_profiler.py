@@ -0,0 +1,337 @@
+"""Opt-in profiling of the AWS calls of Lambda handlers and tools.
+
+install() hooks botocore's events on the default boto3 session, so it runs
+before the clients are created, and does nothing unless SDK_PROFILING is true.
+Every call made during a profiled invocation is recorded with its operation,
+latency (retries and their backoff included), retries, throttled attempts and
+request and response sizes. profiled() wraps a Lambda handler and reports:
+
+- one "SDK profile" log line per invocation: the handler's duration, the time
+  spent in AWS calls, calls, latency, retries, throttles and bytes per
+  operation, and the slowest calls
+- with SDK_PROFILE_METRICS, the same per operation as CloudWatch metrics in
+  embedded metric format (log lines, no API calls)
+- SDK_PROFILE_SAMPLE_RATE of the invocations run under cProfile; those slower
+  than SDK_PROFILE_SLOW_MS upload the dump (pstats) and their full call list
+  to SDK_PROFILE_BUCKET
+
+Time outside AWS calls is the handler's own work and waiting, waiter delays
+included; the cProfile dump tells them apart.
+"""
+
+import cProfile
+import functools
+import json
+import logging
+import marshal
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+import boto3
+
+logger = logging.getLogger()
+
+SDK_PROFILING = os.environ.get('SDK_PROFILING', 'false').lower() == 'true'
+# Per-operation CloudWatch metrics, written as embedded metric format log lines
+SDK_PROFILE_METRICS = os.environ.get('SDK_PROFILE_METRICS', 'false').lower() == 'true'
+SDK_PROFILE_NAMESPACE = os.environ.get('SDK_PROFILE_NAMESPACE', 'JenkinsUnity/SdkCalls')
+# Share of invocations run under cProfile, and how slow one has to be to upload its dump
+SDK_PROFILE_SAMPLE_RATE = float(os.environ.get('SDK_PROFILE_SAMPLE_RATE', '0'))
+SDK_PROFILE_SLOW_MS = float(os.environ.get('SDK_PROFILE_SLOW_MS', '5000'))
+SDK_PROFILE_BUCKET = os.environ.get('SDK_PROFILE_BUCKET', '')
+SDK_PROFILE_PREFIX = 'sdk-profiles'
+
+# Calls listed one by one in the log line
+SLOWEST_CALLS = 5
+# Values of one metric in an embedded metric format document
+MAX_METRIC_VALUES = 100
+
+# Error codes botocore's retry modes treat as throttling
+THROTTLING_ERRORS = {
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+    'TooManyRequestsException', 'ProvisionedThroughputExceededException', 'TransactionInProgressException',
+    'RequestLimitExceeded', 'BandwidthLimitExceeded', 'LimitExceededException', 'RequestThrottled',
+    'SlowDown', 'PriorRequestNotComplete', 'EC2ThrottledException',
+}
+
+_lock = threading.Lock()
+_active = None
+_installed = False
+
+
+class Invocation:
+    """The AWS calls of one handler invocation or tool run."""
+
+    def __init__(self, name: str, request_id: Optional[str] = None):
+        self.name = name
+        self.request_id = request_id
+        self.calls = []
+        self.started = time.perf_counter()
+        self.duration_ms = None
+
+    def record(self, call: Dict[str, Any]):
+        with _lock:
+            self.calls.append(call)
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals, per-operation figures and the slowest calls of the invocation.
+        
+        Returns:
+            {"handler": "unity-cicd-allocate-cache-volume", "request_id": "...",
+             "duration_ms": 182.4, "sdk_ms": 151.0, "calls": 3, "retries": 0, "throttles": 0,
+             "operations": {"dynamodb.Query": {"calls": 1, "ms": 31.2, "retries": 0, "throttles": 0,
+                                               "errors": 0, "request_bytes": 240, "response_bytes": 512}},
+             "slowest": [{"operation": "dynamodb.Query", "ms": 31.2, "retries": 0, "throttles": 0}]}
+        """
+        operations = summarize_calls(self.calls)
+        return {
+            'handler': self.name,
+            'request_id': self.request_id,
+            'duration_ms': round(self.duration_ms if self.duration_ms is not None else self.elapsed_ms(), 1),
+            'sdk_ms': round(sum(call['ms'] for call in self.calls), 1),
+            'calls': len(self.calls),
+            'retries': sum(call['retries'] for call in self.calls),
+            'throttles': sum(call['throttles'] for call in self.calls),
+            'operations': operations,
+            'slowest': [
+                {'operation': call['operation'], 'ms': round(call['ms'], 1), 'retries': call['retries'],
+                 'throttles': call['throttles'], **({'error': call['error']} if call.get('error') else {})}
+                for call in sorted(self.calls, key=lambda call: call['ms'], reverse=True)[:SLOWEST_CALLS]
+            ],
+        }
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+def summarize_calls(calls: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Calls, latency, retries, throttles, errors and bytes per operation."""
+    operations = {}
+    for call in calls:
+        operation = operations.setdefault(call['operation'], {
+            'calls': 0, 'ms': 0.0, 'retries': 0, 'throttles': 0, 'errors': 0, 'request_bytes': 0, 'response_bytes': 0,
+        })
+        operation['calls'] += 1
+        operation['ms'] += call['ms']
+        operation['retries'] += call['retries']
+        operation['throttles'] += call['throttles']
+        operation['errors'] += 1 if call.get('error') else 0
+        operation['request_bytes'] += call['request_bytes']
+        operation['response_bytes'] += call['response_bytes']
+    for operation in operations.values():
+        operation['ms'] = round(operation['ms'], 1)
+    # Most time first
+    return dict(sorted(operations.items(), key=lambda item: item[1]['ms'], reverse=True))
+
+
+def install(enabled: Optional[bool] = None) -> bool:
+    """Hook the default boto3 session; clients created before this are not profiled.
+    
+    Args:
+        enabled: profile regardless of SDK_PROFILING (for tools)
+    
+    Returns:
+        Whether calls are profiled
+    """
+    global _installed
+    if not (SDK_PROFILING if enabled is None else enabled):
+        return False
+    
+    if boto3.DEFAULT_SESSION is None:
+        boto3.setup_default_session()
+    events = boto3.DEFAULT_SESSION.events
+    events.register('before-call', _before_call, unique_id='sdk-profiler-before-call')
+    events.register('needs-retry', _needs_retry, unique_id='sdk-profiler-needs-retry')
+    events.register('after-call', _after_call, unique_id='sdk-profiler-after-call')
+    events.register('after-call-error', _after_call_error, unique_id='sdk-profiler-after-call-error')
+    _installed = True
+    return True
+
+
+def start(name: str, request_id: Optional[str] = None) -> Invocation:
+    """Record the calls from now on as one invocation."""
+    global _active
+    _active = Invocation(name, request_id)
+    return _active
+
+
+def stop(current: Invocation):
+    global _active
+    current.duration_ms = current.elapsed_ms()
+    if _active is current:
+        _active = None
+
+
+@contextmanager
+def invocation(name: str, request_id: Optional[str] = None):
+    """Record the calls made in the block as one invocation."""
+    current = start(name, request_id)
+    try:
+        yield current
+    finally:
+        stop(current)
+
+
+def profiled(handler: Callable) -> Callable:
+    """Profile the AWS calls of each invocation of a Lambda handler; the handler itself when not installed."""
+    if not _installed:
+        return handler
+    name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME') or handler.__module__
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        profiler = cProfile.Profile() if random.random() < SDK_PROFILE_SAMPLE_RATE else None
+        current = start(name, getattr(context, 'aws_request_id', None))
+        try:
+            if profiler:
+                return profiler.runcall(handler, event, context)
+            return handler(event, context)
+        finally:
+            stop(current)
+            report(current, profiler)
+    
+    return wrapper
+
+
+def report(current: Invocation, profiler: Optional[cProfile.Profile] = None):
+    """Log the invocation's summary and metrics, and upload the dump of a slow profiled one."""
+    try:
+        summary = current.summary()
+        logger.info(f"SDK profile: {json.dumps(summary)}")
+        if SDK_PROFILE_METRICS:
+            # Embedded metric format is read from the raw log line, without the logger's prefix
+            for document in metric_documents(summary, SDK_PROFILE_NAMESPACE, current.calls):
+                print(json.dumps(document))
+        if profiler and SDK_PROFILE_BUCKET and current.duration_ms >= SDK_PROFILE_SLOW_MS:
+            upload_dump(current, profiler)
+    except Exception as e:
+        logger.error(f"Error reporting SDK profile: {str(e)}")
+
+
+def metric_documents(summary: Dict[str, Any], namespace: str,
+                     calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Embedded metric format documents: one per handler invocation, one per operation.
+    
+    SdkLatency holds each call's latency, so its percentiles are per call.
+    """
+    timestamp = int(time.time() * 1000)
+
+    def document(dimensions, metrics, values):
+        return {
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [list(dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, unit in metrics],
+                }],
+            },
+            **dimensions,
+            **values,
+        }
+    
+    documents = [document(
+        {'Handler': summary['handler']},
+        [('InvocationDuration', 'Milliseconds'), ('SdkTime', 'Milliseconds'), ('SdkCalls', 'Count')],
+        {'InvocationDuration': summary['duration_ms'], 'SdkTime': summary['sdk_ms'], 'SdkCalls': summary['calls']},
+    )]
+    for name, operation in summary['operations'].items():
+        latencies = [round(call['ms'], 1) for call in calls if call['operation'] == name][:MAX_METRIC_VALUES]
+        documents.append(document(
+            {'Handler': summary['handler'], 'Operation': name},
+            [('SdkCalls', 'Count'), ('SdkLatency', 'Milliseconds'), ('SdkRetries', 'Count'), ('SdkThrottles', 'Count')],
+            {'SdkCalls': operation['calls'], 'SdkLatency': latencies,
+             'SdkRetries': operation['retries'], 'SdkThrottles': operation['throttles']},
+        ))
+    return documents
+
+
+def upload_dump(current: Invocation, profiler: cProfile.Profile):
+    """Upload the cProfile dump (readable with pstats) and every call of a slow invocation."""
+    profiler.create_stats()
+    now = datetime.utcnow()
+    key = f"{SDK_PROFILE_PREFIX}/{current.name}/{now:%Y/%m/%d}/{now:%H%M%S}-{current.request_id or 'local'}"
+    s3 = boto3.client('s3')
+    s3.put_object(Bucket=SDK_PROFILE_BUCKET, Key=f"{key}.prof", Body=marshal.dumps(profiler.stats))
+    s3.put_object(Bucket=SDK_PROFILE_BUCKET, Key=f"{key}.calls.json",
+                  Body=json.dumps({'summary': current.summary(), 'calls': current.calls}).encode())
+    logger.info(f"Uploaded the cProfile dump of a {current.duration_ms:.0f} ms invocation to s3://{SDK_PROFILE_BUCKET}/{key}.prof")
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    """A summary as a table, for tools run from a terminal."""
+    lines = [
+        f"{summary['handler']}: {summary['duration_ms']:.0f} ms, {summary['sdk_ms']:.0f} ms in "
+        f"{summary['calls']} AWS calls ({summary['retries']} retries, {summary['throttles']} throttled)",
+        f"{'Operation':<48} {'Calls':>6} {'ms':>10} {'Retries':>8} {'Throttled':>10} {'Bytes out':>10} {'Bytes in':>10}",
+    ]
+    for name, operation in summary['operations'].items():
+        lines.append(f"{name:<48} {operation['calls']:>6} {operation['ms']:>10.1f} {operation['retries']:>8} "
+                     f"{operation['throttles']:>10} {operation['request_bytes']:>10} {operation['response_bytes']:>10}")
+    return "\n".join(lines)
+
+
+def _body_size(body) -> int:
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode())
+    if isinstance(body, dict):
+        # Query protocol (EC2, Auto Scaling): form-encoded when sent
+        return len(urlencode(body, doseq=True))
+    # Streamed uploads
+    return 0
+
+
+def _before_call(model, params, context, **kwargs):
+    if _active is not None:
+        context['sdk_profile'] = {
+            'invocation': _active,
+            'operation': f"{model.service_model.service_name}.{model.name}",
+            'started': time.perf_counter(),
+            'throttles': 0,
+            'request_bytes': _body_size(params.get('body')),
+        }
+
+
+def _needs_retry(request_dict, response=None, **kwargs):
+    # Called after every attempt, the last one included
+    profile = request_dict.get('context', {}).get('sdk_profile')
+    if profile is not None and response is not None:
+        if response[1].get('Error', {}).get('Code') in THROTTLING_ERRORS:
+            profile['throttles'] += 1
+
+
+def _after_call(model, http_response, parsed, context, **kwargs):
+    profile = context.pop('sdk_profile', None)
+    if profile is None:
+        return
+    response_bytes = 0
+    if not model.has_streaming_output:
+        response_bytes = len(http_response.content or b'')
+    _finish(profile, parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0), response_bytes,
+            parsed.get('Error', {}).get('Code'))
+
+
+def _after_call_error(context, exception, **kwargs):
+    profile = context.pop('sdk_profile', None)
+    if profile is not None:
+        _finish(profile, 0, 0, type(exception).__name__)
+
+
+def _finish(profile: Dict[str, Any], retries: int, response_bytes: int, error: Optional[str]):
+    profile['invocation'].record({
+        'operation': profile['operation'],
+        'ms': (time.perf_counter() - profile['started']) * 1000,
+        'retries': retries,
+        'throttles': profile['throttles'],
+        'request_bytes': profile['request_bytes'],
+        'response_bytes': response_bytes,
+        'error': error,
+    })
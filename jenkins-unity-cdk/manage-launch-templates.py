@@ -6,17 +6,43 @@ Jenkins Agent Launch Template Management Script
 
 import boto3
 import base64
+import cProfile
 import json
 import argparse
+import sys
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, str(Path(__file__).parent / "lambda_functions" / "allocate_cache_volume"))
+from cache_placement import place_instances, rank_zones, warm_hits  # noqa: E402
+sys.path.insert(0, str(Path(__file__).parent / "lambda_layers" / "sdk_profiler" / "python"))
+import sdk_profiler  # noqa: E402
+# Pool-Index的分片数取自环境变量INDEX_SHARDS，须与部署的cache_pool.index_shards一致
+sys.path.insert(0, str(Path(__file__).parent / "lambda_layers" / "cache_sets" / "python"))
+import cache_sets  # noqa: E402
+
+# 容量不足时回退到下一个AZ
+CAPACITY_ERRORS = {
+    'InsufficientInstanceCapacity',
+    'SpotMaxPriceTooLow',
+    'MaxSpotInstanceCountExceeded',
+    'Unsupported',
+}
+
 class LaunchTemplateManager:
     def __init__(self):
         self.ec2 = boto3.client('ec2')
+        self.dynamodb = boto3.resource('dynamodb')
+        self.cloudwatch = boto3.client('cloudwatch')
         self.config = {
             'security_group_id': 'sg-0cae1c773589f67ba',
             'iam_instance_profile': 'unity-cicd-jenkins-agent-instance-profile',
-            'subnet_id': 'subnet-02ac9ed0cfe66207b'
+            'subnet_id': 'subnet-02ac9ed0cfe66207b',
+            'cache_pool_table': 'unity-cicd-cache-pool-status',
+            'metrics_namespace': 'JenkinsUnity/AgentFleet'
         }
     
     def read_userdata_script(self, script_path):
@@ -136,8 +162,14 @@ class LaunchTemplateManager:
         except Exception as e:
             print(f"❌ Failed to list templates: {e}")
     
-    def launch_instance(self, template_name, count=1):
-        """使用Launch Template启动实例"""
+    def launch_instance(self, template_name, count=1, placement='subnet', project_id='unity-game', stripe_width=1):
+        """使用Launch Template启动实例
+        
+        placement='cache' 时在缓存池中有该项目可用缓存卷的AZ启动（见 launch_near_cache）
+        """
+        if placement == 'cache':
+            return self.launch_near_cache(template_name, count, project_id, stripe_width)
+        
         try:
             response = self.ec2.run_instances(
                 LaunchTemplate={'LaunchTemplateName': template_name},
@@ -155,18 +187,218 @@ class LaunchTemplateManager:
             print(f"❌ Failed to launch instance: {e}")
             return []
 
+    def agent_subnets(self):
+        """与配置子网同一VPC、同为公有或私有的子网，每个AZ一个"""
+        subnet = self.ec2.describe_subnets(SubnetIds=[self.config['subnet_id']])['Subnets'][0]
+        response = self.ec2.describe_subnets(Filters=[{'Name': 'vpc-id', 'Values': [subnet['VpcId']]}])
+        
+        subnets = {subnet['AvailabilityZone']: subnet['SubnetId']}
+        for candidate in sorted(response['Subnets'], key=lambda s: s['SubnetId']):
+            if candidate['MapPublicIpOnLaunch'] == subnet['MapPublicIpOnLaunch']:
+                subnets.setdefault(candidate['AvailabilityZone'], candidate['SubnetId'])
+        return subnets
+    
+    def rank_cache_zones(self, zones, project_id, stripe_width):
+        """按缓存池中该项目（及条带宽度）最新的可用缓存卷对AZ排序"""
+        table = self.dynamodb.Table(self.config['cache_pool_table'])
+        items = []
+        for zone in zones:
+            # allocate Lambda查找的Pool-Index分区键，逐个分片分页读取
+            items.extend(cache_sets.available_sets(table, zone, project_id, stripe_width))
+        
+        ranking = rank_zones(items, zones, project_id, stripe_width, int(time.time()))
+        print(f"🧊 Warm cache sets for {project_id}:")
+        for zone in ranking:
+            age = f", freshest used {zone['freshest_age'] // 3600}h ago" if zone['warm_sets'] else ''
+            print(f"   - {zone['availability_zone']}: {zone['warm_sets']}{age}")
+        return ranking
+    
+    def launch_near_cache(self, template_name, count, project_id, stripe_width=1):
+        """在有可用缓存卷的AZ启动实例，容量不足时按排名回退到其他AZ"""
+        instance_ids = []
+        launched = {}
+        try:
+            subnets = self.agent_subnets()
+            ranking = self.rank_cache_zones(sorted(subnets), project_id, stripe_width)
+            exhausted = set()
+            
+            for zone, zone_count in place_instances(ranking, count):
+                candidates = [zone] + [z['availability_zone'] for z in ranking if z['availability_zone'] != zone]
+                for candidate in candidates:
+                    if candidate in exhausted:
+                        continue
+                    try:
+                        response = self.ec2.run_instances(
+                            LaunchTemplate={'LaunchTemplateName': template_name},
+                            SubnetId=subnets[candidate],
+                            MinCount=zone_count,
+                            MaxCount=zone_count
+                        )
+                    except ClientError as e:
+                        if e.response['Error']['Code'] not in CAPACITY_ERRORS:
+                            raise
+                        print(f"⚠️  No capacity in {candidate}: {e.response['Error']['Code']}")
+                        exhausted.add(candidate)
+                        continue
+                    
+                    zone_ids = [i['InstanceId'] for i in response['Instances']]
+                    instance_ids.extend(zone_ids)
+                    launched[candidate] = launched.get(candidate, 0) + len(zone_ids)
+                    print(f"🚀 Launched {len(zone_ids)} instance(s) in {candidate}: {', '.join(zone_ids)}")
+                    break
+                else:
+                    print(f"❌ No capacity left for {zone_count} instance(s) in any AZ")
+        except Exception as e:
+            print(f"❌ Failed to launch instance: {e}")
+        
+        if launched:
+            print(f"🎯 {warm_hits(ranking, launched)}/{len(instance_ids)} instance(s) placed next to a warm cache set")
+        return instance_ids
+    
+    def launch_fleet(self, template_name, count, project_id, stripe_width=1, capacity_type='spot', instance_types=None):
+        """用EC2 Fleet（instant）启动实例，AZ优先级按缓存排名
+        
+        Spot使用capacity-optimized-prioritized：优先级尽量满足，容量不足时EC2转到其他AZ；
+        按需使用prioritized，严格按优先级
+        """
+        try:
+            subnets = self.agent_subnets()
+            ranking = self.rank_cache_zones(sorted(subnets), project_id, stripe_width)
+            
+            types = instance_types or [None]
+            overrides = []
+            for zone_rank, zone in enumerate(ranking):
+                for type_rank, instance_type in enumerate(types):
+                    override = {
+                        'SubnetId': subnets[zone['availability_zone']],
+                        'Priority': float(zone_rank * len(types) + type_rank)
+                    }
+                    if instance_type:
+                        override['InstanceType'] = instance_type
+                    overrides.append(override)
+            
+            request = {
+                'Type': 'instant',
+                'LaunchTemplateConfigs': [
+                    {
+                        'LaunchTemplateSpecification': {'LaunchTemplateName': template_name, 'Version': '$Default'},
+                        'Overrides': overrides
+                    }
+                ],
+                'TargetCapacitySpecification': {
+                    'TotalTargetCapacity': count,
+                    'DefaultTargetCapacityType': capacity_type
+                }
+            }
+            if capacity_type == 'spot':
+                request['SpotOptions'] = {'AllocationStrategy': 'capacity-optimized-prioritized'}
+            else:
+                request['OnDemandOptions'] = {'AllocationStrategy': 'prioritized'}
+            response = self.ec2.create_fleet(**request)
+            
+            zones_by_subnet = {subnet_id: zone for zone, subnet_id in subnets.items()}
+            instance_ids = []
+            launched = {}
+            for fleet_instances in response.get('Instances', []):
+                subnet_id = fleet_instances['LaunchTemplateAndOverrides']['Overrides']['SubnetId']
+                zone = zones_by_subnet[subnet_id]
+                instance_ids.extend(fleet_instances['InstanceIds'])
+                launched[zone] = launched.get(zone, 0) + len(fleet_instances['InstanceIds'])
+                print(f"🚀 Launched {len(fleet_instances['InstanceIds'])} instance(s) in {zone}: "
+                      f"{', '.join(fleet_instances['InstanceIds'])}")
+            for error in response.get('Errors', []):
+                print(f"⚠️  {error.get('ErrorCode')}: {error.get('ErrorMessage')}")
+            
+            if launched:
+                print(f"🎯 {warm_hits(ranking, launched)}/{len(instance_ids)} instance(s) placed next to a warm cache set")
+            return instance_ids
+        except Exception as e:
+            print(f"❌ Failed to launch fleet: {e}")
+            return []
+    
+    def placement_report(self, days=7):
+        """缓存命中率：allocate Lambda每次分配记录CacheWarmHits（1命中可用缓存卷，0新建）"""
+        end = datetime.now(timezone.utc)
+        start = end - timedelta(days=days)
+        try:
+            paginator = self.cloudwatch.get_paginator('list_metrics')
+            # 每个 (ProjectId, AvailabilityZone) 一条
+            dimension_sets = {
+                tuple(sorted((d['Name'], d['Value']) for d in metric['Dimensions']))
+                for page in paginator.paginate(Namespace=self.config['metrics_namespace'], MetricName='CacheWarmHits')
+                for metric in page['Metrics']
+            }
+            
+            print(f"📊 Cache warm hits over the last {days} day(s):")
+            total_hits = total_allocations = 0
+            for dimension_set in sorted(dimension_sets, key=lambda dims: dims[::-1]):
+                datapoints = self.cloudwatch.get_metric_statistics(
+                    Namespace=self.config['metrics_namespace'],
+                    MetricName='CacheWarmHits',
+                    Dimensions=[{'Name': name, 'Value': value} for name, value in dimension_set],
+                    StartTime=start,
+                    EndTime=end,
+                    Period=86400,
+                    Statistics=['Sum', 'SampleCount']
+                )['Datapoints']
+                hits = int(sum(point['Sum'] for point in datapoints))
+                allocations = int(sum(point['SampleCount'] for point in datapoints))
+                if not allocations:
+                    continue
+                total_hits += hits
+                total_allocations += allocations
+                dimensions = dict(dimension_set)
+                print(f"   - {dimensions.get('ProjectId')} {dimensions.get('AvailabilityZone')}: "
+                      f"{hits}/{allocations} ({hits / allocations:.0%})")
+            
+            if total_allocations:
+                print(f"   Total: {total_hits}/{total_allocations} ({total_hits / total_allocations:.0%})")
+            else:
+                print("   No allocations recorded")
+        except Exception as e:
+            print(f"❌ Failed to read cache metrics: {e}")
+
 def main():
     parser = argparse.ArgumentParser(description='Manage Jenkins Agent Launch Templates')
-    parser.add_argument('action', choices=['create', 'update', 'delete', 'list', 'launch'], 
+    parser.add_argument('action', choices=['create', 'update', 'delete', 'list', 'launch', 'launch-fleet', 'placement-report'], 
                        help='Action to perform')
     parser.add_argument('--platform', choices=['linux', 'windows'], 
                        help='Platform type (for create/update)')
     parser.add_argument('--name', help='Launch Template name')
     parser.add_argument('--count', type=int, default=1, help='Number of instances to launch')
+    parser.add_argument('--placement', choices=['subnet', 'cache'], default='subnet',
+                       help='subnet: the configured subnet; cache: the AZs with warm cache sets (for launch)')
+    parser.add_argument('--project-id', default='unity-game', help='Cache partition of the agents (for cache placement)')
+    parser.add_argument('--stripe-width', type=int, default=1, help='Cache set width of the agents (for cache placement)')
+    parser.add_argument('--capacity-type', choices=['spot', 'on-demand'], default='spot', help='Capacity type (for launch-fleet)')
+    parser.add_argument('--instance-types', help='Comma-separated instance types in priority order (for launch-fleet)')
+    parser.add_argument('--days', type=int, default=7, help='Report window in days (for placement-report)')
+    parser.add_argument('--profile-sdk', action='store_true',
+                       help='Print the AWS calls of the action: latency, retries, throttles and bytes per operation')
+    parser.add_argument('--profile-dump', help='With --profile-sdk, also write a cProfile dump (pstats) to this file')
     
     args = parser.parse_args()
-    manager = LaunchTemplateManager()
+    if not args.profile_sdk:
+        run_action(LaunchTemplateManager(), args)
+        return
     
+    # 在创建客户端之前安装钩子
+    sdk_profiler.install(enabled=True)
+    profiler = cProfile.Profile() if args.profile_dump else None
+    with sdk_profiler.invocation(f"manage-launch-templates {args.action}") as profile:
+        manager = LaunchTemplateManager()
+        if profiler:
+            profiler.runcall(run_action, manager, args)
+        else:
+            run_action(manager, args)
+    
+    print(sdk_profiler.format_summary(profile.summary()))
+    if profiler:
+        profiler.dump_stats(args.profile_dump)
+        print(f"📄 cProfile dump: {args.profile_dump}")
+
+
+def run_action(manager, args):
     if args.action == 'create':
         # 预定义配置
         configs = {
@@ -233,7 +465,18 @@ def main():
         if not args.name:
             print("❌ --name required for launch")
             return
-        manager.launch_instance(args.name, args.count)
+        manager.launch_instance(args.name, args.count, args.placement, args.project_id, args.stripe_width)
+    
+    elif args.action == 'launch-fleet':
+        if not args.name:
+            print("❌ --name required for launch-fleet")
+            return
+        instance_types = args.instance_types.split(',') if args.instance_types else None
+        manager.launch_fleet(args.name, args.count, args.project_id, args.stripe_width,
+                             args.capacity_type, instance_types)
+    
+    elif args.action == 'placement-report':
+        manager.placement_report(args.days)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,851 @@
+#!/bin/bash
+# Jenkins agent cache volume manager, installed as /opt/manage-cache-volume.sh.
+#
+#   allocate    allocate a cache volume of the agent pool's partition and mount the cache at /mnt/cache
+#   release     write the hot tier back, unmount and return the volume to the pool
+#   sync        write the hot tier back to the cache volume
+#   watch-spot  write back and release when a Spot interruption notice arrives
+#   library-acquire <view> [clean]       mount an executor's Library view at /mnt/cache/views/<view>
+#   library-release <view> <result>      unmount the view; "success" writes it back to the shared Library
+#   workspace-reset <job> <workspace>     roll the workspace back to the job's baseline (exit 3: no baseline)
+#   workspace-baseline <job> <workspace>  capture the workspace as the job's baseline when it has none or it is stale
+#   snapshot-freeze   freeze the cache volume's filesystem for a backup snapshot if no build holds a Library view
+#                     or is resetting a workspace view (exit 75: busy)
+#   snapshot-thaw     thaw it again; also runs on its own FREEZE_TIMEOUT seconds after a freeze
+#   prefetch [dir]    read the cache in recorded build order, then the rest, to hydrate a restored volume
+#   record-access <view>  record the order in which a build opens Library files (run by library-acquire)
+#   prewarm <repository> <branch> <project path> <volume set>...
+#                     on a cache warmer instance: import the branch head into each idle cache set
+#                     (comma-separated volume IDs) and return it to the pool
+#
+# Cache tiers ("tier" in /etc/jenkins-agent/cache-volume.json: auto, ebs or nvme):
+#   ebs   the EBS cache volume is mounted at /mnt/cache
+#   nvme  NVMe instance store holds the hot working set at /mnt/cache; the EBS
+#         cache volume is the persistent warm tier at /mnt/cache-warm, copied to
+#         the hot tier on allocate and written back on release and Spot interruption
+#   auto  nvme when the instance has instance-store devices (c5d, m5d, c6id...), else ebs
+#
+# A cache set of several volumes ("stripe_width") is attached as /dev/sdf, /dev/sdg...
+# and striped with md RAID0 into /dev/md/cache-set; the array is reassembled from
+# its superblocks when the set is allocated again.
+#
+# The pool's filesystem profile ("filesystem": fs, mkfs_options, mount_options,
+# readahead_kb, scheduler; see config/filesystem_profiles.yaml) decides how both
+# tiers are formatted, mounted and tuned.
+#
+# Executors share one warm Library: /mnt/cache/Library is a read-mostly base and
+# every executor builds in an overlayfs view of it (/mnt/cache/views/<view>), so
+# concurrent builds never write to the same directory. A successful build's
+# changes (the view's upper dir) are queued and merged into the base once no view
+# is mounted over it, latest build winning per file; a failed build's are dropped.
+# A "clean" view starts from an empty Library and replaces the base on success.
+#
+# Clean builds roll back instead of re-cloning: the cache volume keeps a pristine
+# post-checkout copy of each job's workspace (/mnt/cache/.workspaces/<job>/baselines)
+# and the workspace is an overlayfs view of it. Resetting discards the view's upper
+# dir, so only the sources are reset; the Library lives in its own view and survives.
+#
+# A volume restored from a snapshot loads its blocks from S3 on first read. Each
+# Library view records the order in which its build opens files; the last successful
+# build's order is kept on the volume (/mnt/cache/.access-order/library.list), so it
+# travels with snapshots. When a volume is allocated that has not been read in full
+# under its own volume ID (.hydrated), prefetch reads those files first, ahead of
+# Unity, then everything else.
+#
+# Sets that sit Available for a while fall behind the main branch. The
+# prewarm-cache-pool Lambda launches Spot warmer instances off-peak that attach
+# them, shallow-clone the branch and run a batchmode import into the Library, so
+# the next build only imports what changed since.
+
+set -o pipefail
+
+ACTION=$1
+PROFILE=/etc/jenkins-agent/cache-volume.json
+CACHE_DIR=/mnt/cache
+WARM_DIR=/mnt/cache-warm
+STATE_DIR=/var/lib/jenkins-cache
+CACHE_OWNER=jenkins
+EBS_DEVICES=(/dev/sdf /dev/sdg /dev/sdh /dev/sdi /dev/sdj /dev/sdk /dev/sdl /dev/sdm)
+SET_RAID_DEVICE=/dev/md/cache-set
+HOT_RAID_DEVICE=/dev/md/cache-hot
+WATCH_UNIT=jenkins-cache-spot-watch
+# Spot gives two minutes of notice; leave time to detach and release the volume
+SPOT_SYNC_TIMEOUT=90
+LIBRARY_BASE=$CACHE_DIR/Library
+VIEWS_DIR=$CACHE_DIR/views
+OVERLAY_DIR=$CACHE_DIR/.overlay
+WORKSPACES_DIR=$CACHE_DIR/.workspaces
+# Job workspaces: the agent's -workDir (/opt/jenkins, see jenkins_agent_stack.py) plus workspace/
+AGENT_WORKSPACE_ROOT=${AGENT_WORKSPACE_ROOT:-/opt/jenkins/workspace}
+BASELINE_MAX_AGE_DAYS=7
+FREEZE_TIMEOUT=120
+THAW_UNIT=jenkins-cache-thaw
+ACCESS_LIST=$CACHE_DIR/.access-order/library.list
+PREFETCH_UNIT=jenkins-cache-prefetch
+PREFETCH_THREADS=16
+PREWARM_CHECKOUT=$STATE_DIR/prewarm
+UNITY=/opt/unity/Editor/Unity
+# Views and their upper dirs belong to running builds; write-back skips them
+SYNC_EXCLUDES=(--exclude /views/ --exclude /.overlay/ --exclude '/.workspaces/*/views/')
+
+log() {
+    echo "[cache] $*"
+    logger -t jenkins-cache "$*"
+}
+
+imds() {
+    local token
+    token=$(curl -s -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 300")
+    curl -sf -H "X-aws-ec2-metadata-token: $token" "http://169.254.169.254/latest/meta-data/$1"
+}
+
+INSTANCE_ID=$(imds instance-id)
+AZ=$(imds placement/availability-zone)
+REGION=$(imds placement/region)
+# Scale-out bursts throttle the EC2 API and the cache pool Lambdas (reserved concurrency):
+# retry with backoff and jitter, and slow down once throttled
+export AWS_RETRY_MODE=adaptive
+export AWS_MAX_ATTEMPTS=10
+
+# profile_value <key> <default>: a setting of the pool's cache volume profile ("filesystem.fs" for nested keys)
+profile_value() {
+    python3 - "$PROFILE" "$1" "$2" << 'PY'
+import json, sys
+path, key, default = sys.argv[1:]
+try:
+    with open(path) as f:
+        value = json.load(f)
+    for part in key.split("."):
+        value = value[part]
+    print(value)
+except (FileNotFoundError, KeyError, TypeError):
+    print(default)
+PY
+}
+
+instance_store_devices() {
+    lsblk -dpno NAME,MODEL | awk '/Amazon EC2 NVMe Instance Storage/ {print $1}'
+}
+
+cache_tier() {
+    local tier
+    tier=$(profile_value tier auto)
+    if [ "$tier" = "auto" ]; then
+        if [ -n "$(instance_store_devices)" ]; then tier=nvme; else tier=ebs; fi
+    fi
+    if [ "$tier" = "nvme" ] && [ -z "$(instance_store_devices)" ]; then
+        log "No instance-store devices, falling back to the ebs tier"
+        tier=ebs
+    fi
+    echo "$tier"
+}
+
+invoke_lambda() {
+    local function_name=$1 payload=$2 output=$3
+    aws lambda invoke \
+        --region "$REGION" \
+        --function-name "$function_name" \
+        --cli-binary-format raw-in-base64-out \
+        --payload "$payload" \
+        "$output" > /dev/null
+}
+
+allocate_volume() {
+    # Cache partition and volume profile of the agent pool, written by the launch template user data
+    local payload
+    payload=$(python3 - "$PROFILE" "$AZ" "$INSTANCE_ID" << 'PY'
+import json, os, sys
+path, az, instance_id = sys.argv[1:]
+profile = {}
+if os.path.exists(path):
+    with open(path) as f:
+        profile = json.load(f)
+profile.pop("tier", None)
+profile.pop("filesystem", None)
+profile.setdefault("project_id", "unity-game")
+profile.update(availability_zone=az, instance_id=instance_id)
+print(json.dumps(profile))
+PY
+)
+    invoke_lambda unity-cicd-allocate-cache-volume "$payload" /tmp/volume_response.json || return 1
+    # Volumes of the cache set in stripe order
+    python3 - /tmp/volume_response.json << 'PY'
+import json, sys
+response = json.load(open(sys.argv[1]))
+print(" ".join(response.get("volume_ids") or [response.get("volume_id", "")]))
+PY
+}
+
+# attach_volumes <volume_id>...: attach a cache set in stripe order
+attach_volumes() {
+    local volumes=("$@") i device
+    aws ec2 wait volume-available --region "$REGION" --volume-ids "$@"
+    for i in "${!volumes[@]}"; do
+        aws ec2 attach-volume --region "$REGION" --volume-id "${volumes[$i]}" \
+            --instance-id "$INSTANCE_ID" --device "${EBS_DEVICES[$i]}" > /dev/null || return 1
+    done
+    aws ec2 wait volume-in-use --region "$REGION" --volume-ids "$@"
+    # The NVMe device links appear shortly after the attachment
+    for i in "${!volumes[@]}"; do
+        device=${EBS_DEVICES[$i]}
+        for _ in $(seq 1 30); do
+            [ -e "$device" ] && break
+            sleep 1
+        done
+        if [ ! -e "$device" ]; then
+            log "Device $device did not appear for ${volumes[$i]}"
+            return 1
+        fi
+    done
+}
+
+# cache_set_device <width>: block device of the attached cache set
+cache_set_device() {
+    local width=$1
+    if [ "$width" -eq 1 ]; then
+        echo "${EBS_DEVICES[0]}"
+        return 0
+    fi
+    local members=("${EBS_DEVICES[@]:0:$width}")
+    if mdadm --examine "${members[0]}" > /dev/null 2>&1; then
+        mdadm --assemble "$SET_RAID_DEVICE" "${members[@]}" > /dev/null || return 1
+    else
+        mdadm --create "$SET_RAID_DEVICE" --run --level=0 --chunk=256 \
+            --raid-devices="$width" "${members[@]}" > /dev/null || return 1
+    fi
+    echo "$SET_RAID_DEVICE"
+}
+
+# format_device <device>: create the profile's filesystem unless the device already has it
+format_device() {
+    local device=$1 fs current
+    fs=$(profile_value filesystem.fs ext4)
+    current=$(blkid -s TYPE -o value "$device")
+    [ "$current" = "$fs" ] && return 0
+    if [ -n "$current" ]; then
+        log "Reformatting $device from $current to $fs (filesystem profile $(profile_value filesystem.name -)), the cache is rebuilt"
+    fi
+    # Options are word-split on purpose
+    if [ "$fs" = "xfs" ]; then
+        mkfs.xfs -f -q $(profile_value filesystem.mkfs_options "") "$device"
+    else
+        mkfs.ext4 -F -q $(profile_value filesystem.mkfs_options "") "$device"
+    fi
+}
+
+# tune_device <device> <disk>...: readahead of the device, scheduler and readahead of its disks
+tune_device() {
+    local device=$1 readahead scheduler disk name
+    shift
+    readahead=$(profile_value filesystem.readahead_kb "")
+    scheduler=$(profile_value filesystem.scheduler "")
+    [ -n "$readahead" ] && blockdev --setra $((readahead * 2)) "$device"
+    for disk in "$@"; do
+        name=$(basename "$(readlink -f "$disk")")
+        [ -n "$readahead" ] && blockdev --setra $((readahead * 2)) "$disk"
+        if [ -n "$scheduler" ] && [ -w "/sys/block/$name/queue/scheduler" ]; then
+            echo "$scheduler" > "/sys/block/$name/queue/scheduler" || log "Scheduler $scheduler not available for $name"
+        fi
+    done
+}
+
+# mount_cache <device> <target>: mount with the profile's options
+mount_cache() {
+    local device=$1 target=$2
+    mkdir -p "$target"
+    format_device "$device"
+    mount -o "$(profile_value filesystem.mount_options defaults)" "$device" "$target"
+}
+
+stop_cache_set() {
+    [ -e "$SET_RAID_DEVICE" ] && mdadm --stop "$SET_RAID_DEVICE" > /dev/null
+    return 0
+}
+
+# Instance store is empty after every start; stripe multiple devices and format
+mount_instance_store() {
+    mountpoint -q "$CACHE_DIR" && return 0
+
+    local devices device
+    devices=($(instance_store_devices))
+    if [ "${#devices[@]}" -gt 1 ]; then
+        mdadm --create "$HOT_RAID_DEVICE" --run --level=0 --raid-devices="${#devices[@]}" "${devices[@]}"
+        device=$HOT_RAID_DEVICE
+    else
+        device=${devices[0]}
+    fi
+
+    tune_device "$device" "${devices[@]}"
+    mount_cache "$device" "$CACHE_DIR"
+    log "Hot tier on $device (${#devices[@]} instance-store device(s))"
+}
+
+sync_back() {
+    mountpoint -q "$WARM_DIR" || return 0
+    local start=$SECONDS
+    rsync -a --delete "${SYNC_EXCLUDES[@]}" "$CACHE_DIR/" "$WARM_DIR/"
+    local status=$?
+    sync -f "$WARM_DIR"
+    log "Wrote hot tier back to the cache volume in $((SECONDS - start))s (rsync exit $status)"
+    return $status
+}
+
+active_views() {
+    local view count=0
+    for view in "$VIEWS_DIR"/*; do
+        mountpoint -q "$view" && count=$((count + 1))
+    done
+    echo "$count"
+}
+
+# Merge queued upper dirs into the base, oldest first; only while no view is mounted,
+# since overlayfs does not allow changing a lower dir under a mounted view
+merge_pending() {
+    local pending
+    for pending in $(ls -d "$OVERLAY_DIR"/pending/* 2> /dev/null | sort); do
+        if [ "${pending%.clean}" != "$pending" ]; then
+            find "$LIBRARY_BASE" -mindepth 1 -delete
+        fi
+        python3 - "$pending" "$LIBRARY_BASE" << 'PY'
+import os, shutil, stat, sys
+upper, base = sys.argv[1:]
+
+def is_opaque(path):
+    try:
+        return os.getxattr(path, "trusted.overlay.opaque") == b"y"
+    except OSError:
+        return False
+
+def remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+def merge(src, dst):
+    for name in os.listdir(src):
+        source, target = os.path.join(src, name), os.path.join(dst, name)
+        info = os.lstat(source)
+        if stat.S_ISCHR(info.st_mode) and info.st_rdev == 0:
+            # Whiteout: deleted in the view
+            remove(target)
+        elif stat.S_ISDIR(info.st_mode):
+            if is_opaque(source) or not os.path.isdir(target) or os.path.islink(target):
+                # Replaced or new in the view
+                remove(target)
+                os.mkdir(target)
+                shutil.copystat(source, target)
+                os.chown(target, info.st_uid, info.st_gid)
+            merge(source, target)
+        else:
+            # Same filesystem: a rename, no copy
+            remove(target)
+            os.rename(source, target)
+
+merge(upper, base)
+PY
+        rm -rf "$pending"
+        log "Merged $(basename "$pending") into the shared Library"
+    done
+}
+
+check_name() {
+    if ! [[ "$1" =~ ^[A-Za-z0-9_-]+$ ]]; then
+        echo "Invalid name: $1"
+        exit 1
+    fi
+}
+
+# check_workspace <path>: the resolved workspace, which must be a directory under the agent's workspace root
+check_workspace() {
+    local workspace root
+    workspace=$(realpath -e "$1" 2> /dev/null)
+    root=$(realpath -e "$AGENT_WORKSPACE_ROOT" 2> /dev/null)
+    if [ -z "$workspace" ] || [ -z "$root" ] || [[ "$workspace" != "$root"/* ]] || [ ! -d "$workspace" ]; then
+        echo "Invalid workspace: $1 (not a directory under $AGENT_WORKSPACE_ROOT)" >&2
+        exit 1
+    fi
+    echo "$workspace"
+}
+
+workspace_key() {
+    echo -n "$1" | sha1sum | cut -c1-12
+}
+
+unmount_workspace() {
+    local workspace=$1 key
+    key=$(workspace_key "$workspace")
+    if mountpoint -q "$workspace"; then
+        umount "$workspace" || umount -l "$workspace"
+    fi
+    rm -rf "$WORKSPACES_DIR"/*/views/"$key" "$STATE_DIR/workspaces/$key"
+}
+
+# mount_workspace <job> <workspace>: replace the workspace with a fresh view of the job's current baseline
+mount_workspace() {
+    local job=$1 workspace=$2 key view baseline
+    key=$(workspace_key "$workspace")
+    view=$WORKSPACES_DIR/$job/views/$key
+    baseline=$(realpath -e "$WORKSPACES_DIR/$job/current") || return 1
+
+    unmount_workspace "$workspace"
+    # Files of a plain checkout would only be hidden under the view
+    find "$workspace" -mindepth 1 -delete
+    mkdir -p "$view/upper" "$view/work" "$STATE_DIR/workspaces"
+    chown "$CACHE_OWNER:$CACHE_OWNER" "$view/upper"
+    mount -t overlay overlay \
+        -o "lowerdir=$baseline,upperdir=$view/upper,workdir=$view/work,redirect_dir=off,metacopy=off,index=off" \
+        "$workspace" || return 1
+    # Mounts are per agent, the baselines move with the cache volume
+    echo "$workspace" > "$STATE_DIR/workspaces/$key"
+}
+
+# Drop a job's old baselines once no workspace view is mounted over them
+prune_baselines() {
+    local job=$1 current baseline
+    current=$(realpath -e "$WORKSPACES_DIR/$job/current" 2> /dev/null)
+    for baseline in "$WORKSPACES_DIR/$job"/baselines/*; do
+        [ -d "$baseline" ] && [ "$baseline" != "$current" ] || continue
+        grep -q "lowerdir=$baseline," /proc/mounts || rm -rf "$baseline"
+    done
+}
+
+unmount_workspaces() {
+    local state
+    for state in "$STATE_DIR"/workspaces/*; do
+        [ -f "$state" ] && unmount_workspace "$(cat "$state")"
+    done
+}
+
+current_volume() {
+    if [ -f "$STATE_DIR/volume-id" ]; then
+        cat "$STATE_DIR/volume-id"
+    else
+        aws ec2 describe-volumes \
+            --region "$REGION" \
+            --filters "Name=attachment.instance-id,Values=$INSTANCE_ID" "Name=tag:Purpose,Values=Jenkins-Cache" \
+            --query 'Volumes[0].VolumeId' \
+            --output text
+    fi
+}
+
+# clone_project <repository> <branch> <dir>: shallow clone of the branch head; private
+# repositories take a token from the SSM parameter $GIT_TOKEN_PARAMETER
+clone_project() {
+    local repository=$1 branch=$2 target=$3 token auth=()
+    if [ -n "$GIT_TOKEN_PARAMETER" ]; then
+        token=$(aws ssm get-parameter --region "$REGION" --name "$GIT_TOKEN_PARAMETER" --with-decryption \
+            --query 'Parameter.Value' --output text) || return 1
+        auth=(-c "http.extraHeader=Authorization: Basic $(printf 'x-access-token:%s' "$token" | base64 -w0)")
+    fi
+    rm -rf "$target"
+    git "${auth[@]}" clone --quiet --depth 1 --single-branch --branch "$branch" "$repository" "$target"
+}
+
+# warm_cache_set <project> <volume_id>...: import the project with its Library on the cache set
+warm_cache_set() {
+    local project=$1 device status start
+    shift
+    attach_volumes "$@" || return 1
+    device=$(cache_set_device "$#") || return 1
+    tune_device "$device" "${EBS_DEVICES[@]:0:$#}"
+    mount_cache "$device" "$CACHE_DIR" || { stop_cache_set; return 1; }
+
+    # Changes queued by the last builds first, so the import starts from the newest Library
+    rm -rf "$OVERLAY_DIR"/views "$VIEWS_DIR" "$WORKSPACES_DIR"/*/views
+    mkdir -p "$LIBRARY_BASE" "$OVERLAY_DIR/pending"
+    merge_pending
+    ln -sfn "$LIBRARY_BASE" "$project/Library"
+    start=$SECONDS
+    "$UNITY" -batchmode -nographics -quit -projectPath "$project" -logFile "/var/log/cache-prewarm-$1.log" > /dev/null 2>&1
+    status=$?
+    log "Imported the project into the Library of $1 in $((SECONDS - start))s (Unity exit $status)"
+    rm -f "$project/Library"
+
+    # Agents build as the cache owner
+    chown -R "$CACHE_OWNER:$CACHE_OWNER" "$LIBRARY_BASE"
+    sync -f "$CACHE_DIR"
+    umount "$CACHE_DIR" || status=1
+    stop_cache_set
+    return $status
+}
+
+case $ACTION in
+  allocate)
+    log "Allocating cache volume..."
+    mkdir -p "$STATE_DIR"
+    TIER=$(cache_tier)
+    VOLUME_IDS=($(allocate_volume))
+    VOLUME_ID=${VOLUME_IDS[0]}
+
+    if [ -z "$VOLUME_ID" ]; then
+        log "Failed to allocate cache volume"
+        exit 1
+    fi
+    log "Allocated volume $VOLUME_ID (${#VOLUME_IDS[@]} volume(s), $TIER tier)"
+    attach_volumes "${VOLUME_IDS[@]}" || exit 1
+    DEVICE=$(cache_set_device "${#VOLUME_IDS[@]}") || { log "Failed to assemble the cache set"; exit 1; }
+    tune_device "$DEVICE" "${EBS_DEVICES[@]:0:${#VOLUME_IDS[@]}}"
+
+    if [ "$TIER" = "nvme" ]; then
+        mount_cache "$DEVICE" "$WARM_DIR"
+        mount_instance_store
+        START=$SECONDS
+        rsync -a --delete "$WARM_DIR/" "$CACHE_DIR/"
+        log "Copied the cache volume to the hot tier in $((SECONDS - START))s"
+        # Write back before the instance is reclaimed
+        systemctl is-active --quiet "$WATCH_UNIT" || \
+            systemd-run --unit "$WATCH_UNIT" --setenv=CACHE_WATCHER=1 /opt/manage-cache-volume.sh watch-spot
+    else
+        mount_cache "$DEVICE" "$CACHE_DIR"
+    fi
+
+    # Views left by the previous agent of this volume died with their builds
+    rm -rf "$OVERLAY_DIR"/views "$VIEWS_DIR" "$WORKSPACES_DIR"/*/views
+    mkdir -p "$LIBRARY_BASE" "$VIEWS_DIR" "$OVERLAY_DIR/views" "$OVERLAY_DIR/pending" "$WORKSPACES_DIR"
+    merge_pending
+    for JOB in "$WORKSPACES_DIR"/*/; do
+        [ -d "$JOB" ] && prune_baselines "$(basename "$JOB")"
+    done
+    chown "$CACHE_OWNER:$CACHE_OWNER" "$CACHE_DIR" "$LIBRARY_BASE" "$VIEWS_DIR"
+    echo "$VOLUME_ID" > "$STATE_DIR/volume-id"
+    echo "$TIER" > "$STATE_DIR/tier"
+    log "Cache mounted at $CACHE_DIR"
+
+    # Copying to the hot tier already reads the whole volume
+    if [ "$TIER" = "ebs" ] && [ "$(cat "$CACHE_DIR/.hydrated" 2>/dev/null)" != "$VOLUME_ID" ]; then
+        systemctl stop "$PREFETCH_UNIT" 2>/dev/null || true
+        systemd-run --unit "$PREFETCH_UNIT" /opt/manage-cache-volume.sh prefetch > /dev/null
+    fi
+    ;;
+  release)
+    log "Releasing cache volume..."
+    VOLUME_ID=$(current_volume)
+    if [ "$VOLUME_ID" = "None" ] || [ -z "$VOLUME_ID" ]; then
+        log "No cache volume attached"
+        exit 0
+    fi
+
+    # A backup snapshot in progress loses its idle window
+    [ -f "$STATE_DIR/frozen" ] && "$0" snapshot-thaw
+
+    systemctl stop "$PREFETCH_UNIT" 'jenkins-cache-record-*' 2>/dev/null || true
+
+    # Builds still running lose their views; their changes are dropped
+    for VIEW in "$VIEWS_DIR"/*; do
+        mountpoint -q "$VIEW" && { umount "$VIEW" || umount -l "$VIEW"; }
+    done
+    unmount_workspaces
+
+    if [ "$(cat "$STATE_DIR/tier" 2>/dev/null)" = "nvme" ]; then
+        # The Spot watcher has already written back within the interruption notice
+        if [ -z "$CACHE_WATCHER" ]; then
+            sync_back
+            systemctl stop "$WATCH_UNIT" 2>/dev/null || true
+        fi
+        umount "$WARM_DIR" || true
+        # The hot tier stays mounted; the next allocate refreshes it from its volume
+    else
+        umount "$CACHE_DIR" || true
+    fi
+    stop_cache_set
+
+    invoke_lambda unity-cicd-release-cache-volume \
+        "{\"volume_id\": \"$VOLUME_ID\", \"instance_id\": \"$INSTANCE_ID\"}" \
+        /tmp/release_response.json
+    rm -f "$STATE_DIR/volume-id" "$STATE_DIR/tier"
+    log "Cache volume $VOLUME_ID released"
+    ;;
+  sync)
+    sync_back
+    ;;
+  watch-spot)
+    while ! imds spot/instance-action > /dev/null; do
+        sleep 5
+    done
+    log "Spot interruption notice, writing the hot tier back"
+    timeout "$SPOT_SYNC_TIMEOUT" rsync -a "${SYNC_EXCLUDES[@]}" "$CACHE_DIR/" "$WARM_DIR/" || \
+        log "Write-back cut short by the interruption"
+    "$0" release
+    ;;
+  library-acquire)
+    VIEW=$2
+    check_name "$VIEW"
+    mountpoint -q "$CACHE_DIR" || { log "No cache mounted"; exit 1; }
+    exec 9> "$OVERLAY_DIR/lock"
+    flock 9
+
+    TARGET=$VIEWS_DIR/$VIEW
+    if mountpoint -q "$TARGET"; then
+        log "Library view $VIEW is already mounted"
+        exit 0
+    fi
+    [ "$(active_views)" -eq 0 ] && merge_pending
+
+    rm -rf "$OVERLAY_DIR/views/$VIEW"
+    mkdir -p "$OVERLAY_DIR/views/$VIEW/upper" "$OVERLAY_DIR/views/$VIEW/work" "$TARGET"
+    LOWER=$LIBRARY_BASE
+    if [ "$3" = "clean" ]; then
+        LOWER=$OVERLAY_DIR/empty
+        mkdir -p "$LOWER"
+        touch "$OVERLAY_DIR/views/$VIEW/clean"
+    fi
+    chown "$CACHE_OWNER:$CACHE_OWNER" "$OVERLAY_DIR/views/$VIEW/upper" "$TARGET"
+    # Plain upper dirs (no redirects or metadata-only copies) so they can be merged file by file
+    mount -t overlay overlay \
+        -o "lowerdir=$LOWER,upperdir=$OVERLAY_DIR/views/$VIEW/upper,workdir=$OVERLAY_DIR/views/$VIEW/work,redirect_dir=off,metacopy=off,index=off" \
+        "$TARGET" || exit 1
+    systemctl stop "jenkins-cache-record-$VIEW" 2>/dev/null || true
+    systemd-run --unit "jenkins-cache-record-$VIEW" /opt/manage-cache-volume.sh record-access "$VIEW" > /dev/null || \
+        log "Not recording the Library access order of view $VIEW"
+    log "Library view $VIEW mounted at $TARGET ($(active_views) active)"
+    ;;
+  library-release)
+    VIEW=$2
+    RESULT=$3
+    check_name "$VIEW"
+    exec 9> "$OVERLAY_DIR/lock"
+    flock 9
+
+    TARGET=$VIEWS_DIR/$VIEW
+    # The recorder writes its list when stopped
+    systemctl stop "jenkins-cache-record-$VIEW" 2>/dev/null || true
+    if mountpoint -q "$TARGET"; then
+        umount "$TARGET" || umount -l "$TARGET"
+    fi
+    if [ "$RESULT" = "success" ] && [ -d "$OVERLAY_DIR/views/$VIEW/upper" ]; then
+        SUFFIX=""
+        [ -f "$OVERLAY_DIR/views/$VIEW/clean" ] && SUFFIX=.clean
+        mv "$OVERLAY_DIR/views/$VIEW/upper" "$OVERLAY_DIR/pending/$(date +%s%N)-$VIEW$SUFFIX"
+        log "Queued Library changes of view $VIEW"
+        if [ -s "$STATE_DIR/access-$VIEW.list" ]; then
+            mkdir -p "$(dirname "$ACCESS_LIST")"
+            mv "$STATE_DIR/access-$VIEW.list" "$ACCESS_LIST"
+        fi
+    fi
+    rm -f "$STATE_DIR/access-$VIEW.list"
+    rm -rf "$OVERLAY_DIR/views/$VIEW"
+
+    # The last view out writes back
+    [ "$(active_views)" -eq 0 ] && merge_pending
+    log "Library view $VIEW released ($(active_views) active)"
+    ;;
+  workspace-reset)
+    JOB=$2
+    check_name "$JOB"
+    WORKSPACE=$(check_workspace "$3") || exit 1
+    mountpoint -q "$CACHE_DIR" || { log "No cache mounted"; exit 1; }
+    mkdir -p "$WORKSPACES_DIR"
+    exec 9> "$WORKSPACES_DIR/lock"
+    flock 9
+
+    if [ ! -d "$WORKSPACES_DIR/$JOB/current" ]; then
+        unmount_workspace "$WORKSPACE"
+        log "No baseline for $JOB"
+        exit 3
+    fi
+    START=$SECONDS
+    mount_workspace "$JOB" "$WORKSPACE" || { log "Failed to reset $WORKSPACE"; exit 1; }
+    log "Reset $WORKSPACE to the $JOB baseline of $(date -d "@$(basename "$(readlink "$WORKSPACES_DIR/$JOB/current")")") in $((SECONDS - START))s"
+    ;;
+  workspace-baseline)
+    JOB=$2
+    check_name "$JOB"
+    WORKSPACE=$(check_workspace "$3") || exit 1
+    mountpoint -q "$CACHE_DIR" || { log "No cache mounted"; exit 1; }
+    mkdir -p "$WORKSPACES_DIR/$JOB/baselines"
+    exec 9> "$WORKSPACES_DIR/lock"
+    flock 9
+
+    # Baselines are named by their capture time
+    CAPTURED=$(basename "$(readlink "$WORKSPACES_DIR/$JOB/current" 2> /dev/null)")
+    if [ -n "$CAPTURED" ] && [ $(( $(date +%s) - CAPTURED )) -lt $((BASELINE_MAX_AGE_DAYS * 86400)) ]; then
+        log "Baseline of $JOB is up to date"
+        exit 0
+    fi
+    START=$SECONDS
+    NOW=$(date +%s)
+    # The Library is a link to its cache view, not part of the checkout
+    rsync -a --exclude /Library "$WORKSPACE/" "$WORKSPACES_DIR/$JOB/baselines/$NOW/" || { rm -rf "$WORKSPACES_DIR/$JOB/baselines/$NOW"; exit 1; }
+    ln -sfn "baselines/$NOW" "$WORKSPACES_DIR/$JOB/current.new"
+    mv -T "$WORKSPACES_DIR/$JOB/current.new" "$WORKSPACES_DIR/$JOB/current"
+    mount_workspace "$JOB" "$WORKSPACE" || { log "Failed to mount $WORKSPACE on its baseline"; exit 1; }
+    prune_baselines "$JOB"
+    log "Captured the $JOB baseline from $WORKSPACE in $((SECONDS - START))s"
+    ;;
+  snapshot-freeze)
+    mountpoint -q "$CACHE_DIR" || { log "No cache mounted"; exit 1; }
+    # Holding the view lock keeps builds from starting until the freeze is in place;
+    # on the ebs tier, builds that start afterwards block on the frozen filesystem until the thaw
+    exec 9> "$OVERLAY_DIR/lock"
+    flock -w 30 9 || { log "Library views busy, no snapshot window"; exit 75; }
+    if [ "$(active_views)" -gt 0 ]; then
+        log "$(active_views) build(s) running, no snapshot window"
+        exit 75
+    fi
+    # Workspace resets and baseline captures write to the cache volume under the workspace lock
+    mkdir -p "$WORKSPACES_DIR"
+    exec 8> "$WORKSPACES_DIR/lock"
+    flock -w 30 8 || { log "Workspace views busy, no snapshot window"; exit 75; }
+
+    # The EBS cache volume is the warm tier under an NVMe hot tier
+    TARGET=$CACHE_DIR
+    if [ "$(cat "$STATE_DIR/tier" 2>/dev/null)" = "nvme" ]; then
+        sync_back || exit 1
+        TARGET=$WARM_DIR
+    fi
+    sync -f "$TARGET"
+    fsfreeze -f "$TARGET" || exit 1
+    echo "$TARGET" > "$STATE_DIR/frozen"
+    # Never leave the cache frozen if the thaw does not arrive
+    systemctl stop "$THAW_UNIT.timer" 2>/dev/null || true
+    systemd-run --unit "$THAW_UNIT" --on-active="$FREEZE_TIMEOUT" /opt/manage-cache-volume.sh snapshot-thaw > /dev/null
+    log "Froze $TARGET for a snapshot"
+    ;;
+  snapshot-thaw)
+    if [ -f "$STATE_DIR/frozen" ]; then
+        TARGET=$(cat "$STATE_DIR/frozen")
+        fsfreeze -u "$TARGET" || true
+        rm -f "$STATE_DIR/frozen"
+        log "Thawed $TARGET"
+    fi
+    systemctl stop "$THAW_UNIT.timer" 2>/dev/null || true
+    ;;
+  record-access)
+    VIEW=$2
+    check_name "$VIEW"
+    # fanotify open events on the view's mount, first open of each file only
+    exec python3 - "$VIEWS_DIR/$VIEW" Library "$STATE_DIR/access-$VIEW.list" << 'PY'
+import ctypes, os, signal, struct, sys
+mount, prefix, output = sys.argv[1:]
+FAN_CLOEXEC, FAN_OPEN, FAN_MARK_ADD, FAN_MARK_MOUNT, AT_FDCWD = 0x1, 0x20, 0x1, 0x10, -100
+EVENT = struct.Struct("=IBBHQii")  # struct fanotify_event_metadata
+MAX_FILES = 500000
+
+libc = ctypes.CDLL(None, use_errno=True)
+libc.fanotify_mark.argtypes = [ctypes.c_int, ctypes.c_uint, ctypes.c_uint64, ctypes.c_int, ctypes.c_char_p]
+fd = libc.fanotify_init(FAN_CLOEXEC, os.O_RDONLY | os.O_LARGEFILE)
+if fd < 0 or libc.fanotify_mark(fd, FAN_MARK_ADD | FAN_MARK_MOUNT, FAN_OPEN, AT_FDCWD, mount.encode()) < 0:
+    sys.exit(f"fanotify: {os.strerror(ctypes.get_errno())}")
+
+def stop(signum, frame):
+    raise KeyboardInterrupt
+signal.signal(signal.SIGTERM, stop)
+
+opened = {}
+try:
+    while len(opened) < MAX_FILES:
+        buffer = os.read(fd, 65536)
+        offset = 0
+        while offset < len(buffer):
+            length, _, _, _, _, event_fd, _ = EVENT.unpack_from(buffer, offset)
+            offset += length
+            if event_fd < 0:
+                continue
+            try:
+                path = os.readlink(f"/proc/self/fd/{event_fd}")
+            finally:
+                os.close(event_fd)
+            if path.startswith(mount + "/"):
+                opened.setdefault(prefix + path[len(mount):])
+except KeyboardInterrupt:
+    pass
+
+with open(output + ".tmp", "w") as f:
+    f.writelines(f"{path}\n" for path in opened)
+os.rename(output + ".tmp", output)
+PY
+    ;;
+  prefetch)
+    ROOT=${2:-$CACHE_DIR}
+    START=$SECONDS
+    SUMMARY=$(python3 - "$ROOT" "$PREFETCH_THREADS" << 'PY'
+import json, os, stat, sys, time
+from concurrent.futures import ThreadPoolExecutor
+root, threads = sys.argv[1], int(sys.argv[2])
+# Overlay mounts and upper dirs of running builds
+skip = {os.path.join(root, "views"), os.path.join(root, ".overlay", "views")}
+
+def read(path, keep):
+    try:
+        if not stat.S_ISREG(os.lstat(path).st_mode):
+            return 0
+        size = 0
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    break
+                size += len(chunk)
+            if not keep:
+                # Hydrating, not caching: leave the page cache to the builds
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        return size
+    except OSError:
+        return 0
+
+start = time.time()
+try:
+    with open(os.path.join(root, ".access-order", "library.list")) as f:
+        ordered = [os.path.join(root, line.rstrip("\n")) for line in f if line.strip()]
+except FileNotFoundError:
+    ordered = []
+with ThreadPoolExecutor(threads) as pool:
+    ordered_bytes = sum(pool.map(lambda path: read(path, True), ordered))
+ordered_seconds = time.time() - start
+
+listed = set(ordered)
+rest = []
+for directory, subdirectories, files in os.walk(root):
+    subdirectories[:] = [name for name in subdirectories if os.path.join(directory, name) not in skip]
+    rest.extend(path for path in (os.path.join(directory, name) for name in files) if path not in listed)
+with ThreadPoolExecutor(threads) as pool:
+    rest_bytes = sum(pool.map(lambda path: read(path, False), rest))
+
+print(json.dumps({
+    "ordered_files": len(ordered), "ordered_bytes": ordered_bytes, "ordered_seconds": round(ordered_seconds, 1),
+    "files": len(ordered) + len(rest), "bytes": ordered_bytes + rest_bytes,
+    "seconds": round(time.time() - start, 1),
+}))
+PY
+) || exit 1
+    echo "$SUMMARY"
+    if [ "$ROOT" = "$CACHE_DIR" ]; then
+        echo "$SUMMARY" > "$STATE_DIR/hydration.json"
+        cat "$STATE_DIR/volume-id" > "$CACHE_DIR/.hydrated"
+    fi
+    log "Hydrated $ROOT in $((SECONDS - START))s: $SUMMARY"
+    ;;
+  prewarm)
+    REPOSITORY=$2
+    BRANCH=$3
+    PROJECT_PATH=$4
+    shift 4
+    mkdir -p "$STATE_DIR"
+    COMMIT=""
+    if clone_project "$REPOSITORY" "$BRANCH" "$PREWARM_CHECKOUT"; then
+        COMMIT=$(git -C "$PREWARM_CHECKOUT" rev-parse HEAD)
+        log "Warming $# cache set(s) against $BRANCH at $COMMIT"
+        [ -x /opt/activate-unity-license.sh ] && /opt/activate-unity-license.sh
+    else
+        log "Failed to clone $BRANCH of $REPOSITORY"
+    fi
+
+    # Every set goes back to the pool; a failed warming only records the attempt
+    for SET in "$@"; do
+        VOLUME_IDS=(${SET//,/ })
+        RESULT=failure
+        if [ -n "$COMMIT" ] && warm_cache_set "$PREWARM_CHECKOUT/$PROJECT_PATH" "${VOLUME_IDS[@]}"; then
+            RESULT=success
+        fi
+        invoke_lambda unity-cicd-release-cache-volume \
+            "{\"volume_id\": \"${VOLUME_IDS[0]}\", \"instance_id\": \"$INSTANCE_ID\", \"prewarm\": {\"result\": \"$RESULT\", \"commit\": \"$COMMIT\"}}" \
+            /tmp/release_response.json
+        log "Cache set ${VOLUME_IDS[0]} released after warming ($RESULT)"
+    done
+    ;;
+  *)
+    echo "Usage: $0 {allocate|release|sync|watch-spot|snapshot-freeze|snapshot-thaw|prefetch [dir]|library-acquire <view> [clean]|library-release <view> <success|failure>|workspace-reset <job> <workspace>|workspace-baseline <job> <workspace>|prewarm <repository> <branch> <project path> <volume set>...}"
+    exit 1
+    ;;
+esac
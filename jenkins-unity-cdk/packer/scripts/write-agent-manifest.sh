@@ -0,0 +1,37 @@
+#!/bin/bash
+# Write the baked-component manifest for the Unity Agent AMI.
+# JenkinsAgentStack in "baked" boot mode verifies every package listed here
+# against the installed rpm versions at boot and skips package installation.
+
+set -e
+
+MANIFEST=/opt/unity-agent/manifest.json
+BAKED_PACKAGES="${BAKED_PACKAGES:-amazon-ssm-agent git wget unzip amazon-efs-utils java-17-amazon-corretto}"
+
+sudo mkdir -p /opt/unity-agent
+
+python3 - $BAKED_PACKAGES << 'PY' | sudo tee "$MANIFEST"
+import datetime, hashlib, json, os, subprocess, sys
+
+packages = {}
+for name in sys.argv[1:]:
+    result = subprocess.run(
+        ["rpm", "-q", "--qf", "%{VERSION}-%{RELEASE}", name], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Package {name} is not installed, cannot bake it")
+    packages[name] = result.stdout
+
+with open("/opt/jenkins/agent.jar", "rb") as f:
+    agent_jar_sha256 = hashlib.sha256(f.read()).hexdigest()
+
+print(json.dumps({
+    "format": 1,
+    "built_at": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+    "unity_version": os.environ.get("UNITY_VERSION", ""),
+    "packages": packages,
+    "agent_jar": {"path": "/opt/jenkins/agent.jar", "sha256": agent_jar_sha256},
+}, indent=2))
+PY
+
+echo "Baked manifest written to $MANIFEST"
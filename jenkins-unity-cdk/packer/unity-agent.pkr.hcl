@@ -32,6 +32,12 @@ variable "unity_version" {
   description = "Unity version to install"
 }
 
+variable "agent_jar_url" {
+  type        = string
+  default     = "https://repo.jenkins-ci.org/public/org/jenkins-ci/main/remoting/4.13/remoting-4.13.jar"
+  description = "agent.jar to cache in the AMI; point at http://<master>:8080/jnlpJars/agent.jar to bake the master's exact copy"
+}
+
 variable "android_sdk_version" {
   type        = string
   default     = "34"
@@ -90,7 +96,7 @@ build {
   provisioner "shell" {
     inline = [
       "sudo yum update -y",
-      "sudo yum install -y wget unzip git xorg-x11-server-Xvfb --allowerasing",
+      "sudo yum install -y wget unzip git amazon-efs-utils amazon-ssm-agent xorg-x11-server-Xvfb --allowerasing",
       "sudo yum install -y libXcursor libXrandr libXinerama libXi mesa-libGL gtk3 gtk3-devel",
       "sudo yum groupinstall -y 'Development Tools'"
     ]
@@ -211,81 +217,40 @@ build {
     ]
   }
 
-  # Create cache volume management script
+  # Install the cache volume manager (EBS cache volume, NVMe instance-store hot tier, Library views)
+  provisioner "file" {
+    source      = "${path.root}/scripts/manage-cache-volume.sh"
+    destination = "/tmp/manage-cache-volume.sh"
+  }
+
   provisioner "shell" {
     inline = [
-      "sudo tee /opt/manage-cache-volume.sh > /dev/null <<'EOF'",
-      "#!/bin/bash",
-      "# Cache volume management script",
-      "",
-      "ACTION=$1",
-      "INSTANCE_ID=$(curl -s http://169.254.169.254/latest/meta-data/instance-id)",
-      "AZ=$(curl -s http://169.254.169.254/latest/meta-data/placement/availability-zone)",
-      "REGION=$(curl -s http://169.254.169.254/latest/meta-data/placement/region)",
-      "",
-      "case $ACTION in",
-      "  'allocate')",
-      "    echo 'Allocating cache volume...'",
-      "    VOLUME_RESPONSE=$(aws lambda invoke \\",
-      "        --region $REGION \\",
-      "        --function-name unity-cicd-allocate-cache-volume \\",
-      "        --payload '{\"availability_zone\":\"'$AZ'\",\"project_id\":\"unity-game\",\"instance_id\":\"'$INSTANCE_ID'\"}' \\",
-      "        --output text \\",
-      "        /tmp/volume_response.json)",
-      "    ",
-      "    VOLUME_ID=$(cat /tmp/volume_response.json | python3 -c 'import sys, json; print(json.load(sys.stdin).get(\"volume_id\", \"\"))')",
-      "    ",
-      "    if [ ! -z '$VOLUME_ID' ]; then",
-      "      echo 'Allocated volume: $VOLUME_ID'",
-      "      ",
-      "      # Wait and attach volume",
-      "      aws ec2 wait volume-available --region $REGION --volume-ids $VOLUME_ID",
-      "      aws ec2 attach-volume --region $REGION --volume-id $VOLUME_ID --instance-id $INSTANCE_ID --device /dev/sdf",
-      "      aws ec2 wait volume-in-use --region $REGION --volume-ids $VOLUME_ID",
-      "      ",
-      "      # Mount volume",
-      "      mkdir -p /mnt/cache",
-      "      if ! blkid /dev/xvdf; then",
-      "        mkfs.ext4 /dev/xvdf",
-      "      fi",
-      "      mount /dev/xvdf /mnt/cache",
-      "      chown ec2-user:ec2-user /mnt/cache",
-      "      ",
-      "      echo 'Cache volume mounted successfully'",
-      "    else",
-      "      echo 'Failed to allocate cache volume'",
-      "      exit 1",
-      "    fi",
-      "    ;;",
-      "  'release')",
-      "    echo 'Releasing cache volume...'",
-      "    VOLUME_ID=$(aws ec2 describe-volumes \\",
-      "        --region $REGION \\",
-      "        --filters 'Name=attachment.instance-id,Values='$INSTANCE_ID 'Name=tag:Purpose,Values=Jenkins-Cache' \\",
-      "        --query 'Volumes[0].VolumeId' \\",
-      "        --output text)",
-      "    ",
-      "    if [ '$VOLUME_ID' != 'None' ] && [ ! -z '$VOLUME_ID' ]; then",
-      "      umount /mnt/cache || true",
-      "      aws lambda invoke \\",
-      "          --region $REGION \\",
-      "          --function-name unity-cicd-release-cache-volume \\",
-      "          --payload '{\"volume_id\":\"'$VOLUME_ID'\",\"instance_id\":\"'$INSTANCE_ID'\"}' \\",
-      "          /tmp/release_response.json",
-      "      echo 'Cache volume released'",
-      "    fi",
-      "    ;;",
-      "  *)",
-      "    echo 'Usage: $0 {allocate|release}'",
-      "    exit 1",
-      "    ;;",
-      "esac",
-      "EOF",
+      "sudo yum install -y rsync mdadm xfsprogs",
+      "sudo install -m 0755 /tmp/manage-cache-volume.sh /opt/manage-cache-volume.sh",
       "",
-      "sudo chmod +x /opt/manage-cache-volume.sh"
+      "# Builds mount and release their own Library views and roll their workspaces back",
+      "echo 'jenkins ALL=(root) NOPASSWD: /opt/manage-cache-volume.sh library-acquire *, /opt/manage-cache-volume.sh library-release *, /opt/manage-cache-volume.sh workspace-reset *, /opt/manage-cache-volume.sh workspace-baseline *' > /tmp/jenkins-cache",
+      "sudo visudo -cf /tmp/jenkins-cache",
+      "sudo install -m 0440 /tmp/jenkins-cache /etc/sudoers.d/jenkins-cache"
     ]
   }
 
+  # Cache agent.jar for the jenkins user; agents re-check it against the master's checksum at boot
+  provisioner "shell" {
+    inline = [
+      "sudo useradd -m -s /bin/bash jenkins || true",
+      "sudo mkdir -p /opt/jenkins",
+      "sudo curl -sfL '${var.agent_jar_url}' -o /opt/jenkins/agent.jar",
+      "sudo chown -R jenkins:jenkins /opt/jenkins"
+    ]
+  }
+
+  # Record pinned versions of the baked components (verified by the agent user data in baked mode)
+  provisioner "shell" {
+    script           = "${path.root}/scripts/write-agent-manifest.sh"
+    environment_vars = ["UNITY_VERSION=${var.unity_version}"]
+  }
+
   # Create environment setup script
   provisioner "shell" {
     inline = [
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Jenkins Agent instance-type ranking
+Regenerates config/instance_performance.yaml, the Spot price/performance table
+that orders the agent ASG launch template overrides (capacity-optimized-prioritized).
+"""
+
+import argparse
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import boto3
+import yaml
+
+TABLE_PATH = Path(__file__).parent / "config" / "instance_performance.yaml"
+
+TABLE_HEADER = """\
+# Spot price/performance table for Jenkins agent instance types.
+# Generated by rank-instance-types.py - regenerate instead of editing by hand:
+#   python rank-instance-types.py --refresh-prices
+#   python rank-instance-types.py --results benchmark-results.json --refresh-prices
+# Rows are ordered by cost_per_build (cheapest first); this is the Spot priority order.
+#   build_minutes: reference Unity build wall time (import + tests + build)
+#   spot_price: average Spot price in USD/hour over the lookback window
+#   source: "benchmark" when build_minutes was measured, "estimate" otherwise
+"""
+
+
+def load_table(path=TABLE_PATH):
+    """Load the price/performance table."""
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def write_table(table, path=TABLE_PATH):
+    """Write the table ordered by cost per build."""
+    table['instance_types'] = rank(table['instance_types'])
+    with open(path, 'w') as f:
+        f.write(TABLE_HEADER)
+        yaml.safe_dump(table, f, sort_keys=False, default_flow_style=False)
+
+
+def rank(rows):
+    """Recompute cost per build and sort cheapest first (faster build breaks ties)."""
+    for row in rows:
+        row['cost_per_build'] = round(row['build_minutes'] / 60 * row['spot_price'], 4)
+    return sorted(rows, key=lambda row: (row['cost_per_build'], row['build_minutes']))
+
+
+def describe_instance_type(ec2, instance_type):
+    """Look up family, vCPU and memory of an instance type."""
+    info = ec2.describe_instance_types(InstanceTypes=[instance_type])['InstanceTypes'][0]
+    return {
+        'instance_type': instance_type,
+        'family': instance_type.split('.')[0],
+        'vcpu': info['VCpuInfo']['DefaultVCpus'],
+        'memory_gib': info['MemoryInfo']['SizeInMiB'] // 1024,
+    }
+
+
+def merge_results(table, results, ec2):
+    """Replace build times with measured ones, adding types not yet in the table."""
+    rows = {row['instance_type']: row for row in table['instance_types']}
+    for result in results:
+        instance_type = result['instance_type']
+        if instance_type not in rows:
+            rows[instance_type] = describe_instance_type(ec2, instance_type)
+            rows[instance_type]['spot_price'] = result.get('spot_price', 0.0)
+        rows[instance_type]['build_minutes'] = round(result['build_minutes'], 1)
+        rows[instance_type]['source'] = 'benchmark'
+        print(f"📊 {instance_type}: {rows[instance_type]['build_minutes']} min")
+    table['instance_types'] = list(rows.values())
+
+
+def refresh_spot_prices(table, ec2, lookback_hours):
+    """Average the Spot price of each type across AZs over the lookback window."""
+    instance_types = [row['instance_type'] for row in table['instance_types']]
+    start_time = datetime.now(timezone.utc) - timedelta(hours=lookback_hours)
+
+    prices = {instance_type: [] for instance_type in instance_types}
+    paginator = ec2.get_paginator('describe_spot_price_history')
+    for page in paginator.paginate(
+        InstanceTypes=instance_types,
+        ProductDescriptions=['Linux/UNIX'],
+        StartTime=start_time,
+    ):
+        for price in page['SpotPriceHistory']:
+            prices[price['InstanceType']].append(float(price['SpotPrice']))
+
+    for row in table['instance_types']:
+        samples = prices[row['instance_type']]
+        if samples:
+            row['spot_price'] = round(sum(samples) / len(samples), 4)
+        else:
+            print(f"⚠️  No Spot price history for {row['instance_type']}, keeping {row['spot_price']}")
+
+    table['region'] = ec2.meta.region_name
+    table['spot_price_lookback_hours'] = lookback_hours
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Regenerate the agent instance price/performance table')
+    parser.add_argument('--results', help='Benchmark results JSON: [{"instance_type": ..., "build_minutes": ...}]')
+    parser.add_argument('--refresh-prices', action='store_true', help='Refresh Spot prices from EC2')
+    parser.add_argument('--lookback-hours', type=int, default=168, help='Spot price averaging window')
+    parser.add_argument('--region', help='AWS region for Spot prices')
+    parser.add_argument('--table', default=str(TABLE_PATH), help='Table file to update')
+
+    args = parser.parse_args()
+
+    table = load_table(args.table)
+    ec2 = boto3.client('ec2', region_name=args.region)
+
+    if args.results:
+        with open(args.results, 'r') as f:
+            merge_results(table, json.load(f), ec2)
+
+    if args.refresh_prices:
+        refresh_spot_prices(table, ec2, args.lookback_hours)
+
+    table['generated_at'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    write_table(table, args.table)
+
+    print(f"✅ Wrote {args.table}")
+    for position, row in enumerate(table['instance_types'], 1):
+        print(f"   {position:2d}. {row['instance_type']:<14} {row['build_minutes']:>6.1f} min  "
+              f"${row['spot_price']:.4f}/h  ${row['cost_per_build']:.4f}/build  ({row['source']})")
+
+
+if __name__ == "__main__":
+    main()
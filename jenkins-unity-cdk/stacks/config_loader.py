@@ -1,6 +1,7 @@
 """Configuration loader for Jenkins Unity CI/CD CDK project."""
 
 import os
+import re
 import yaml
 from typing import Dict, Any
 from aws_cdk import App
@@ -34,6 +35,9 @@ class ConfigLoader:
         # Override with CDK context values
         self._override_with_context()
         
+        # Fill agent pools with the shared agent and cache pool defaults
+        self._resolve_agent_pools()
+        
         return self._config
     
     def _override_with_context(self):
@@ -48,6 +52,50 @@ class ConfigLoader:
             if value is not None:
                 self._config[key] = value
     
+    def _resolve_agent_pools(self):
+        """Resolve jenkins_agents.pools, falling back to a single "linux" pool.
+        
+        Keys a pool does not set come from jenkins_agents (labels, executors,
+        instance selection, scaling bounds) and cache_pool (cache volume profile).
+        """
+        agents = self._config["jenkins_agents"]
+        cache_pool = self._config["cache_pool"]
+        
+        pool_defaults = {
+            "labels": agents.get("labels", "unity linux"),
+            "num_executors": agents.get("num_executors", 2),
+            "instance_types": agents.get("instance_types", []),
+            "min_instances": agents["min_instances"],
+            "max_instances": agents["max_instances"],
+            "desired_capacity": agents["desired_capacity"],
+            "root_volume_size": agents.get("root_volume_size", 50),
+            "project_id": "unity-game",
+        }
+        cache_defaults = {
+            key: cache_pool[key]
+            for key in ("volume_size", "volume_type", "iops", "throughput", "min_volumes_per_az", "stripe_width")
+        }
+        cache_defaults["tier"] = cache_pool.get("tier", "auto")
+        cache_defaults["filesystem"] = cache_pool.get("filesystem", "ext4-default")
+        
+        pools = []
+        for pool in agents.get("pools") or [{"name": "linux"}]:
+            if not re.fullmatch(r"[a-z0-9-]+", str(pool.get("name", ""))):
+                raise ValueError(f"Agent pool name must be lowercase alphanumeric or '-': {pool.get('name')!r}")
+            resolved = {**pool_defaults, **pool}
+            resolved["instance_selection"] = {
+                **agents.get("instance_selection", {"strategy": "fixed"}),
+                **pool.get("instance_selection", {}),
+            }
+            resolved["cache"] = {**cache_defaults, **pool.get("cache", {})}
+            pools.append(resolved)
+        
+        names = [pool["name"] for pool in pools]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate agent pool names: {names}")
+        
+        agents["pools"] = pools
+    
     def _get_default_config(self) -> Dict[str, Any]:
         """Return default configuration."""
         return {
@@ -56,7 +104,8 @@ class ConfigLoader:
             "unity_version": "2023.2.20f1",
             "vpc": {
                 "cidr": "10.0.0.0/16",
-                "availability_zones": 3
+                "availability_zones": 3,
+                "private_dns_namespace": "unity-cicd.internal"
             },
             "jenkins_master": {
                 "instance_type": "c5.large",
@@ -64,9 +113,31 @@ class ConfigLoader:
             },
             "jenkins_agents": {
                 "instance_types": ["c5.2xlarge", "c5.4xlarge", "m5.2xlarge"],
+                "instance_selection": {
+                    "strategy": "prioritized",
+                    "vcpu_min": 8,
+                    "vcpu_max": 16,
+                    "memory_gib_min": 16,
+                    "memory_gib_max": 64,
+                    "families": ["c5", "c6i", "c6a", "c7i", "m5", "m6i", "m7i"]
+                },
                 "max_instances": 10,
                 "min_instances": 0,
-                "desired_capacity": 2
+                "desired_capacity": 2,
+                "labels": "unity linux",
+                "num_executors": 2,
+                "scale_in_protection": True,
+                "boot_to_online_minutes": {
+                    "install": 12,
+                    "baked": 5
+                },
+                "health_check": {
+                    "online_deadline_minutes": 20,
+                    "boot_started_grace_minutes": 10,
+                    "offline_deadline_minutes": 10,
+                    "max_offline_drops": 3,
+                    "offline_drops_window_hours": 24
+                }
             },
             "cache_pool": {
                 "volume_size": 100,
@@ -74,7 +145,42 @@ class ConfigLoader:
                 "iops": 3000,
                 "throughput": 125,
                 "min_volumes_per_az": 2,
-                "max_age_days": 7
+                "stripe_width": 1,
+                "max_age_days": 7,
+                "recency_half_life_hours": 24,
+                "max_snapshot_deferrals": 3,
+                "index_shards": 1,
+                "rebalance": {
+                    "enabled": True,
+                    "lookback_days": 14,
+                    "max_moves_per_run": 2
+                },
+                "prewarm": {
+                    "enabled": False,
+                    "repository_url": "",
+                    "branch": "main",
+                    "project_path": ".",
+                    "credentials_parameter": "",
+                    "off_peak_hours": [1, 2, 3, 4],
+                    "stale_hours": 12,
+                    "max_warmers": 2,
+                    "volumes_per_warmer": 2,
+                    "warm_timeout_minutes": 90,
+                    "instance_types": ["c6i.2xlarge", "c5.2xlarge", "m6i.2xlarge"]
+                },
+                "ec2_api_budget": {
+                    "enabled": True,
+                    "describe_per_second": 10,
+                    "mutate_per_second": 3,
+                    "maintenance_share": 0.5,
+                    "max_wait_seconds": 30,
+                    "max_attempts": 8
+                },
+                "reserved_concurrency": {
+                    "allocate": None,
+                    "release": None,
+                    "maintain": 1
+                }
             },
             "efs": {
                 "performance_mode": "generalPurpose",
@@ -84,7 +190,16 @@ class ConfigLoader:
             "monitoring": {
                 "enable_detailed_monitoring": True,
                 "log_retention_days": 30,
-                "enable_xray": False
+                "enable_xray": False,
+                "boot_metrics_namespace": "JenkinsUnity/AgentBoot",
+                "fleet_metrics_namespace": "JenkinsUnity/AgentFleet",
+                "sdk_profiling": {
+                    "enabled": False,
+                    "metrics": True,
+                    "metrics_namespace": "JenkinsUnity/SdkCalls",
+                    "cprofile_sample_rate": 0.0,
+                    "slow_invocation_ms": 5000
+                }
             }
         }
     
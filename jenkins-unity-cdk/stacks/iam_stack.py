@@ -133,6 +133,23 @@ class IamStack(Stack):
             iam.ManagedPolicy.from_aws_managed_policy_name("CloudWatchAgentServerPolicy")
         )
         
+        # Service discovery permissions to publish the master endpoint
+        self.jenkins_master_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "servicediscovery:RegisterInstance",
+                    "servicediscovery:DeregisterInstance",
+                    "route53:ChangeResourceRecordSets",
+                    "route53:GetHealthCheck",
+                    "route53:CreateHealthCheck",
+                    "route53:UpdateHealthCheck",
+                    "route53:DeleteHealthCheck",
+                ],
+                resources=["*"],
+            )
+        )
+        
         # IAM permissions for managing agent instances
         self.jenkins_master_role.add_to_policy(
             iam.PolicyStatement(
@@ -229,6 +246,40 @@ class IamStack(Stack):
             )
         )
         
+        # CloudWatch metrics permissions for boot-phase timings
+        self.jenkins_agent_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "cloudwatch:PutMetricData",
+                ],
+                resources=["*"],
+                conditions={
+                    "StringEquals": {
+                        "cloudwatch:namespace": self.config["monitoring"]["boot_metrics_namespace"]
+                    }
+                },
+            )
+        )
+        
+        # Boot-phase progress tag read by the agent health check
+        self.jenkins_agent_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "ec2:CreateTags",
+                ],
+                resources=[
+                    f"arn:aws:ec2:{self.region}:{self.account}:instance/*",
+                ],
+                conditions={
+                    "ForAllValues:StringEquals": {
+                        "aws:TagKeys": ["jenkins:boot-phase"]
+                    }
+                },
+            )
+        )
+        
         # Systems Manager permissions for Unity license
         self.jenkins_agent_role.add_to_policy(
             iam.PolicyStatement(
@@ -244,6 +295,19 @@ class IamStack(Stack):
             )
         )
         
+        # JNLP secrets stored by the register-agent-node Lambda
+        self.jenkins_agent_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "ssm:GetParameter",
+                ],
+                resources=[
+                    f"arn:aws:ssm:{self.region}:{self.account}:parameter/jenkins/agents/*",
+                ],
+            )
+        )
+        
         # Create instance profile
         self.jenkins_agent_instance_profile = iam.CfnInstanceProfile(
             self, "JenkinsAgentInstanceProfile",
@@ -297,16 +361,165 @@ class IamStack(Stack):
                     "ec2:DetachVolume",
                     "ec2:ModifyVolumeAttribute",
                     "ec2:CreateSnapshot",
+                    "ec2:CreateSnapshots",
                     "ec2:DeleteSnapshot",
                     "ec2:DescribeSnapshots",
                     "ec2:CreateTags",
                     "ec2:DescribeInstances",
                     "ec2:DescribeAvailabilityZones",
+                    "ec2:DescribeTags",
+                    "autoscaling:DescribeAutoScalingGroups",
+                    "autoscaling:DescribeScheduledActions",
+                    "autoscaling:DescribeScalingActivities",
+                ],
+                resources=["*"],
+            )
+        )
+        
+        # Agent node registration permissions
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "ssm:PutParameter",
+                    "ssm:DeleteParameter",
+                ],
+                resources=[
+                    f"arn:aws:ssm:{self.region}:{self.account}:parameter/jenkins/agents/*",
+                ],
+            )
+        )
+        
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "autoscaling:CompleteLifecycleAction",
+                    "autoscaling:SetInstanceProtection",
+                    "autoscaling:SetInstanceHealth",
+                    "autoscaling:BatchPutScheduledUpdateGroupAction",
+                    "autoscaling:BatchDeleteScheduledAction",
+                ],
+                resources=[
+                    f"arn:aws:autoscaling:{self.region}:{self.account}:autoScalingGroup:*:autoScalingGroupName/{self.config['project_prefix']}-*",
+                ],
+            )
+        )
+        
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "cloudwatch:PutMetricData",
+                ],
+                resources=["*"],
+                conditions={
+                    "StringEquals": {
+                        "cloudwatch:namespace": [
+                            self.config["monitoring"]["boot_metrics_namespace"],
+                            self.config["monitoring"]["fleet_metrics_namespace"],
+                        ]
+                    }
+                },
+            )
+        )
+        
+        # Agent pre-scaling forecasts from the fleet queue metrics
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "cloudwatch:GetMetricData",
+                ],
+                resources=["*"],
+            )
+        )
+        
+        # Cache maintenance asks agents for an idle window (filesystem freeze) before backup snapshots
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "ssm:SendCommand",
+                ],
+                resources=[
+                    f"arn:aws:ssm:{self.region}::document/AWS-RunShellScript",
+                    f"arn:aws:ec2:{self.region}:{self.account}:instance/*",
+                ],
+            )
+        )
+        
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "ssm:GetCommandInvocation",
+                    "ssm:ListCommandInvocations",
                 ],
                 resources=["*"],
             )
         )
         
+        # The prewarm Lambda launches cache warmers from the agent launch templates
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "ec2:RunInstances",
+                ],
+                resources=["*"],
+            )
+        )
+        
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "iam:PassRole",
+                ],
+                resources=[self.jenkins_agent_role.role_arn],
+            )
+        )
+        
+        # The register Lambda releases the cache sets of terminated agents through the release Lambda
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "lambda:InvokeFunction",
+                ],
+                resources=[
+                    f"arn:aws:lambda:{self.region}:{self.account}:function:{self.config['project_prefix']}-release-cache-volume",
+                ],
+            )
+        )
+        
+        # Slow profiled invocations upload their cProfile dumps to the logs bucket (monitoring.sdk_profiling)
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "s3:PutObject",
+                ],
+                resources=[
+                    f"arn:aws:s3:::{self.config['project_prefix']}-logs-*/sdk-profiles/*",
+                ],
+            )
+        )
+        
+        # Per-second EC2 API call counters shared by the cache pool functions (cache_pool.ec2_api_budget)
+        self.lambda_execution_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "dynamodb:UpdateItem",
+                ],
+                resources=[
+                    f"arn:aws:dynamodb:{self.region}:{self.account}:table/{self.config['project_prefix']}-ec2-api-budget",
+                ],
+            )
+        )
+        
         # CloudWatch Logs permissions
         self.lambda_execution_role.add_to_policy(
             iam.PolicyStatement(
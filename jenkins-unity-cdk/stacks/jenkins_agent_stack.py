@@ -4,12 +4,75 @@ from aws_cdk import (
     Stack,
     aws_ec2 as ec2,
     aws_autoscaling as autoscaling,
+    aws_events as events,
+    aws_events_targets as targets,
     aws_iam as iam,
+    aws_cloudwatch as cloudwatch,
     Duration,
     CfnOutput,
 )
 from constructs import Construct
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+import json
+import os
+import yaml
+
+
+# Boot phases timed by the agent user data and start-agent.sh, in boot order
+BOOT_PHASES = [
+    "BakedManifestCheck",
+    "SystemUpdate",
+    "SsmAgent",
+    "Dependencies",
+    "JavaInstall",
+    "JenkinsWait",
+    "AgentJarDownload",
+    "CacheAllocate",
+    "MasterDiscovery",
+    "JenkinsReady",
+    "NodeRegistration",
+    "AgentJarSync",
+    "AgentConnect",
+]
+
+# Packages the agent user data installs; a baked AMI manifest must pin all of them
+BAKED_PACKAGES = [
+    "amazon-ssm-agent",
+    "git",
+    "wget",
+    "unzip",
+    "amazon-efs-utils",
+    "java-17-amazon-corretto",
+]
+
+
+# Spot price/performance table regenerated by rank-instance-types.py, cheapest build first
+INSTANCE_PERFORMANCE_TABLE = os.path.join(os.path.dirname(__file__), "..", "config", "instance_performance.yaml")
+
+# Cache filesystem profiles applied by manage-cache-volume.sh
+FILESYSTEM_PROFILES = os.path.join(os.path.dirname(__file__), "..", "config", "filesystem_profiles.yaml")
+
+
+def cache_volume_profile(pool: Dict[str, Any]) -> Dict[str, Any]:
+    """Cache volume partition and profile of a pool (/etc/jenkins-agent/cache-volume.json on its instances).
+    
+    Also written by the cache warmers the prewarm-cache-pool Lambda launches.
+    """
+    with open(FILESYSTEM_PROFILES, 'r') as f:
+        profiles = yaml.safe_load(f)["profiles"]
+    name = pool["cache"]["filesystem"]
+    if name not in profiles:
+        raise ValueError(f"Unknown cache filesystem profile for the {pool['name']} pool: {name}")
+    return {
+        "project_id": pool["project_id"],
+        "volume_size": pool["cache"]["volume_size"],
+        "volume_type": pool["cache"]["volume_type"],
+        "iops": pool["cache"]["iops"],
+        "throughput": pool["cache"]["throughput"],
+        "stripe_width": pool["cache"]["stripe_width"],
+        "tier": pool["cache"]["tier"],
+        "filesystem": {"name": name, **profiles[name]},
+    }
 
 
 class JenkinsAgentStack(Stack):
@@ -25,33 +88,261 @@ class JenkinsAgentStack(Stack):
         self.iam_stack = iam_stack
         self.lambda_stack = lambda_stack
         
-        # Create Jenkins Agent infrastructure
-        self._create_launch_template()
-        self._create_auto_scaling_group()
+        # Jenkins Master endpoint published through Cloud Map
+        self.jenkins_url = f"http://{self.vpc_stack.jenkins_master_hostname}:8080"
+        
+        # Boot-phase metrics published by the agent user data and start-agent.sh
+        self.boot_metrics_namespace = self.config["monitoring"]["boot_metrics_namespace"]
+        self.boot_phases = BOOT_PHASES
+        
+        # Baked mode skips package installation on AMIs from packer/unity-agent.pkr.hcl
+        self.baked = self.config["jenkins_agents"].get("boot_mode", "install") == "baked"
+        if self.baked and not self.config.get("unity_ami_id"):
+            raise ValueError("jenkins_agents.boot_mode 'baked' requires unity_ami_id")
+        # Time for all BOOT_PHASES, launch to node online
+        self.boot_to_online = Duration.minutes(
+            self.config["jenkins_agents"]["boot_to_online_minutes"]["baked" if self.baked else "install"]
+        )
+        
+        # Jenkins queue and executor metrics per pool, published by the queue metrics Lambda
+        self.fleet_metrics_namespace = self.config["monitoring"]["fleet_metrics_namespace"]
+        
+        # Create one launch template and Auto Scaling group per agent pool
+        self.agent_pools = self.config["jenkins_agents"]["pools"]
+        self.launch_templates = {}
+        self.agent_asgs = {}
+        for pool in self.agent_pools:
+            self._create_agent_pool(pool)
+        
+        # Register Jenkins nodes from ASG lifecycle events
+        self._add_node_registration()
+
+    def _create_agent_pool(self, pool: Dict[str, Any]):
+        """Create the launch template, Auto Scaling group and scaling of one agent pool."""
+        
+        construct_prefix = f"JenkinsAgent{pool['name'].title().replace('-', '')}"
+        self.launch_templates[pool["name"]] = self._create_launch_template(pool, construct_prefix)
+        self.agent_asgs[pool["name"]] = self._create_auto_scaling_group(pool, construct_prefix)
 
-    def _create_launch_template(self):
+    def _create_launch_template(self, pool: Dict[str, Any], construct_prefix: str) -> ec2.LaunchTemplate:
         """Create launch template for Jenkins Agents with Spot instances."""
         
+        # Build user data script
+        user_data_script = self._build_user_data_script(pool)
+
+        # 使用预构建的Unity AMI或默认AMI
+        if "unity_ami_id" in self.config and self.config["unity_ami_id"]:
+            machine_image = ec2.MachineImage.generic_linux({
+                self.region: self.config["unity_ami_id"]
+            })
+        else:
+            machine_image = ec2.MachineImage.latest_amazon_linux2023()
+            
+        return ec2.LaunchTemplate(
+            self, f"{construct_prefix}LaunchTemplate",
+            launch_template_name=self.config["resource_namer"]("jenkins-agent-lt", pool["name"]),
+            machine_image=machine_image,
+            security_group=self.vpc_stack.jenkins_agent_sg,
+            role=self.iam_stack.jenkins_agent_role,
+            user_data=ec2.UserData.custom(user_data_script),
+            block_devices=[
+                ec2.BlockDevice(
+                    device_name="/dev/xvda",
+                    volume=ec2.BlockDeviceVolume.ebs(
+                        volume_size=pool["root_volume_size"],  # OS disk
+                        volume_type=ec2.EbsDeviceVolumeType.GP3,
+                        encrypted=True,
+                        delete_on_termination=True,
+                    )
+                )
+            ],
+            require_imdsv2=True,
+        )
+
+    def _build_boot_profiler_script(self):
+        """Build the boot-phase profiler helper sourced by the agent boot scripts."""
+        
+        # Phase timings are taken from /proc/uptime so they line up with the
+        # kernel boot, and are published in one put-metric-data call per script.
+        # Every datapoint is sent twice: once per phase only (for the fleet-wide
+        # dashboard breakdown) and once with InstanceType/ImageId/AZ dimensions.
+        return f"""# Boot-phase profiler for Jenkins agents
+BOOT_METRICS_NAMESPACE="{self.boot_metrics_namespace}"
+BOOT_PHASE_LOG="${{BOOT_PHASE_LOG:-/var/log/agent-boot/user-data.phases}}"
+""" + r"""
+_boot_now() { cut -d' ' -f1 /proc/uptime; }
+
+_boot_imds() {
+    local token
+    token=$(curl -s -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 300")
+    curl -s -H "X-aws-ec2-metadata-token: $token" "http://169.254.169.254/latest/meta-data/$1"
+}
+
+# phase_begin <Phase> / phase_end <Phase>: time a named boot phase.
+phase_begin() { eval "_PHASE_START_$1=$(_boot_now)"; }
+
+phase_end() {
+    local start_var="_PHASE_START_$1"
+    [ -n "${!start_var}" ] || return 0
+    echo "PhaseDuration $1 $(awk -v s="${!start_var}" -v e="$(_boot_now)" 'BEGIN { printf "%.2f", e - s }')" >> "$BOOT_PHASE_LOG"
+}
+
+# boot_metric <MetricName> <Seconds>: record a boot milestone not tied to a phase
+boot_metric() { echo "$1 - $2" >> "$BOOT_PHASE_LOG"; }
+
+# boot_tag started|online: tag the instance for the agent health check, once per state
+boot_tag() {
+    ( aws ec2 create-tags --region "$(_boot_imds placement/region)" --resources "$(_boot_imds instance-id)" \
+        --tags "Key=jenkins:boot-phase,Value=$1@$(date +%s)" > /dev/null 2>&1 & )
+}
+
+# phase_flush: publish everything recorded so far to CloudWatch
+phase_flush() {
+    [ -s "$BOOT_PHASE_LOG" ] || return 0
+    local region data
+    region=$(_boot_imds placement/region)
+    data=$(awk -v it="$(_boot_imds instance-type)" -v ami="$(_boot_imds ami-id)" -v az="$(_boot_imds placement/availability-zone)" '
+        function datum(metric, value, dims) {
+            printf "%s{\"MetricName\":\"%s\",\"Unit\":\"Seconds\",\"Value\":%s,\"Dimensions\":[%s]}", sep, metric, value, dims
+            sep = ","
+        }
+        BEGIN { printf "[" }
+        {
+            host = "{\"Name\":\"InstanceType\",\"Value\":\"" it "\"},{\"Name\":\"ImageId\",\"Value\":\"" ami "\"},{\"Name\":\"AvailabilityZone\",\"Value\":\"" az "\"}"
+            if ($2 == "-") {
+                datum($1, $3, "")
+                datum($1, $3, host)
+            } else {
+                phase = "{\"Name\":\"Phase\",\"Value\":\"" $2 "\"}"
+                datum($1, $3, phase)
+                datum($1, $3, phase "," host)
+            }
+        }
+        END { printf "]" }' "$BOOT_PHASE_LOG")
+    if aws cloudwatch put-metric-data --region "$region" --namespace "$BOOT_METRICS_NAMESPACE" --metric-data "$data"; then
+        cat "$BOOT_PHASE_LOG" >> "$BOOT_PHASE_LOG.published"
+        rm -f "$BOOT_PHASE_LOG"
+    else
+        echo "Failed to publish boot-phase metrics, keeping $BOOT_PHASE_LOG"
+    fi
+}
+"""
+
+    def _build_agent_jar_prefetch_script(self):
+        """Build the user data section that waits for Jenkins and downloads agent.jar."""
+        
+        return f"""
+# Jenkins Master endpoint from service discovery
+JENKINS_URL="{self.jenkins_url}"
+echo "Jenkins URL: $JENKINS_URL"
+
+# Wait for Jenkins to be ready
+echo "Waiting for Jenkins to be ready..."
+phase_begin JenkinsWait
+for i in $(seq 1 20); do
+    if curl -s "$JENKINS_URL/login" > /dev/null 2>&1; then
+        echo "Jenkins is ready"
+        break
+    fi
+    echo "Waiting for Jenkins... attempt $i/20"
+    sleep 15
+done
+phase_end JenkinsWait
+
+# Download agent.jar
+echo "Downloading Jenkins agent.jar..."
+phase_begin AgentJarDownload
+cd /opt/jenkins
+if curl -o agent.jar "$JENKINS_URL/jnlpJars/agent.jar"; then
+    echo "Agent.jar downloaded successfully"
+else
+    echo "Failed to download agent.jar, but continuing..."
+fi
+phase_end AgentJarDownload
+"""
+
+    def _build_baked_manifest_check_script(self):
+        """Build the check of the baked AMI manifest written by packer/unity-agent.pkr.hcl."""
+        
+        # Every required package must be listed, and every listed package must
+        # still be installed at its pinned version
+        required = " ".join(BAKED_PACKAGES)
+        return f"""BAKED_MANIFEST=/opt/unity-agent/manifest.json
+verify_baked_manifest() {{
+    if [ ! -f "$BAKED_MANIFEST" ]; then
+        echo "No baked manifest at $BAKED_MANIFEST"
+        return 1
+    fi
+    python3 - "$BAKED_MANIFEST" {required} << 'PY'
+import json, subprocess, sys
+
+manifest = json.load(open(sys.argv[1]))
+packages = manifest.get("packages", {{}})
+ok = True
+for name in sys.argv[2:]:
+    if name not in packages:
+        print(f"Baked manifest is missing {{name}}")
+        ok = False
+for name, pinned in packages.items():
+    installed = subprocess.run(
+        ["rpm", "-q", "--qf", "%{{VERSION}}-%{{RELEASE}}", name], capture_output=True, text=True
+    ).stdout
+    if installed != pinned:
+        print(f"{{name}}: baked {{pinned}}, installed {{installed or 'none'}}")
+        ok = False
+sys.exit(0 if ok else 1)
+PY
+}}"""
+
+    def _build_user_data_script(self, pool: Dict[str, Any]):
+        """Build the user data script for the Jenkins Agents of a pool."""
+        
+        # Cache volume partition and profile passed to the allocate Lambda
+        cache_volume_json = json.dumps(cache_volume_profile(pool))
+        
         # 简化的 Agent 启动脚本
         user_data_script = f"""#!/bin/bash
 # Set up logging
 exec > >(tee /var/log/user-data.log|logger -t user-data -s 2>/dev/console) 2>&1
 echo "Starting Jenkins Agent setup at $(date)"
 
+# Boot-phase profiler (also sourced by start-agent.sh)
+mkdir -p /opt/jenkins /var/log/agent-boot
+cat > /opt/jenkins/boot-phase.sh << 'EOF'
+{self._build_boot_profiler_script()}EOF
+source /opt/jenkins/boot-phase.sh
+boot_metric UserDataStart "$(_boot_now)"
+boot_tag started
+
+# Agent pool; /opt/manage-cache-volume.sh allocates from the pool's cache partition
+mkdir -p /etc/jenkins-agent
+echo "POOL_NAME={pool['name']}" > /etc/jenkins-agent/pool.env
+echo '{cache_volume_json}' > /etc/jenkins-agent/cache-volume.json
+"""
+
+        # Package installation, skipped on a verified baked AMI
+        install_script = """
 # Update system
+phase_begin SystemUpdate
 yum update -y
+phase_end SystemUpdate
 
 # Install SSM Agent
+phase_begin SsmAgent
 yum install -y amazon-ssm-agent
 systemctl enable amazon-ssm-agent
 systemctl start amazon-ssm-agent
+phase_end SsmAgent
 
 # Install dependencies with conflict resolution
 echo "Installing dependencies with conflict resolution..."
+phase_begin Dependencies
 yum install -y git wget unzip amazon-efs-utils --allowerasing
+phase_end Dependencies
 
 # Install Java with conflict resolution
 echo "Installing Java 17..."
+phase_begin JavaInstall
 yum install -y java-17-amazon-corretto --allowerasing
 
 # Verify Java installation with retry
@@ -78,75 +369,99 @@ echo "Java installed successfully at $JAVA_HOME"
 echo "Final Java verification:"
 java -version
 echo "JAVA_HOME: $JAVA_HOME"
+phase_end JavaInstall
+"""
+
+        if self.baked:
+            user_data_script += f"""
+# Baked mode: the AMI carries pinned packages and agent.jar, verify them instead of installing
+{self._build_baked_manifest_check_script()}
+phase_begin BakedManifestCheck
+if verify_baked_manifest; then
+    echo "Baked AMI manifest verified, skipping package installation"
+    BAKED_AMI=true
+    systemctl enable --now amazon-ssm-agent
+else
+    echo "Baked AMI manifest check failed, falling back to package installation"
+    BAKED_AMI=false
+fi
+phase_end BakedManifestCheck
+
+if [ "$BAKED_AMI" != "true" ]; then
+{install_script}
+fi
 
+JAVA_HOME=$(readlink -f /usr/bin/java | sed "s:bin/java::")
+grep -q "^JAVA_HOME=" /etc/environment || echo "JAVA_HOME=$JAVA_HOME" >> /etc/environment
+"""
+        else:
+            user_data_script += install_script
+
+        user_data_script += """
 # Create jenkins user
 useradd -m -s /bin/bash jenkins || true
 mkdir -p /opt/jenkins
-chown jenkins:jenkins /opt/jenkins
+chown -R jenkins:jenkins /opt/jenkins /var/log/agent-boot
 
 echo "Basic setup completed"
 """
 
+        # agent.jar is cached in a baked AMI and checked against the master by start-agent.sh
+        if not self.baked:
+            user_data_script += self._build_agent_jar_prefetch_script()
         
-        
+        # Attach the pool's cache set before the agent can take builds
+        user_data_script += """
+# Allocate and mount the cache volume set (/etc/jenkins-agent/cache-volume.json)
+phase_begin CacheAllocate
+if [ -x /opt/manage-cache-volume.sh ]; then
+    /opt/manage-cache-volume.sh allocate || echo "Cache allocation failed, builds run without the cache volume"
+else
+    echo "No /opt/manage-cache-volume.sh on this AMI, skipping cache allocation"
+fi
+phase_end CacheAllocate
+"""
+
         # 简化的 Jenkins Agent 连接脚本
         user_data_script += f"""
 # Setup Jenkins Agent
 echo "Setting up Jenkins Agent..."
 
-# Use Jenkins Master private IP for internal communication
-JENKINS_URL="http://10.0.0.66:8080"
-echo "Jenkins URL: $JENKINS_URL"
-
-# Get instance info
-INSTANCE_ID=$(curl -s http://169.254.169.254/latest/meta-data/instance-id)
-AGENT_NAME="unity-agent-$INSTANCE_ID"
-
-echo "Agent Name: $AGENT_NAME"
-
-# Wait for Jenkins to be ready
-echo "Waiting for Jenkins to be ready..."
-for i in $(seq 1 20); do
-    if curl -s "$JENKINS_URL/login" > /dev/null 2>&1; then
-        echo "Jenkins is ready"
-        break
-    fi
-    echo "Waiting for Jenkins... attempt $i/20"
-    sleep 15
-done
-
-# Download agent.jar
-echo "Downloading Jenkins agent.jar..."
-cd /opt/jenkins
-if curl -o agent.jar "$JENKINS_URL/jnlpJars/agent.jar"; then
-    echo "Agent.jar downloaded successfully"
-else
-    echo "Failed to download agent.jar, but continuing..."
-fi
-
 # Create JNLP agent startup script with auto-registration
 cat > /opt/jenkins/start-agent.sh << 'EOF'
 #!/bin/bash
 echo "Starting Jenkins JNLP Agent with auto-registration..."
 
+# Profile only the first start after boot; service restarts are not boot time
+BOOT_PHASE_LOG=/var/log/agent-boot/start-agent.phases
+source /opt/jenkins/boot-phase.sh
+BOOT_ONLINE_MARKER="/var/log/agent-boot/online.$(cat /proc/sys/kernel/random/boot_id)"
+if [ -f "$BOOT_ONLINE_MARKER" ]; then
+    phase_begin() {{ :; }}
+    phase_end() {{ :; }}
+fi
+
 # Use IMDSv2 to get instance metadata
 TOKEN=$(curl -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 21600" -s)
 INSTANCE_ID=$(curl -H "X-aws-ec2-metadata-token: $TOKEN" -s http://169.254.169.254/latest/meta-data/instance-id)
 AGENT_NAME="unity-agent-$INSTANCE_ID"
 PRIVATE_IP=$(curl -H "X-aws-ec2-metadata-token: $TOKEN" -s http://169.254.169.254/latest/meta-data/local-ipv4)
 
-# Dynamically get Jenkins Master private IP
-MASTER_IP=$(aws ec2 describe-instances \
-  --filters "Name=tag:Name,Values=*jenkins-master*" "Name=instance-state-name,Values=running" \
-  --query "Reservations[0].Instances[0].PrivateIpAddress" \
-  --output text 2>/dev/null)
-
-if [ "$MASTER_IP" = "None" ] || [ -z "$MASTER_IP" ]; then
-  echo "Could not find Jenkins Master, using fallback IP"
-  MASTER_IP="10.0.0.66"
-fi
+# Resolve the Jenkins Master through its service discovery DNS name (10s TTL)
+phase_begin MasterDiscovery
+JENKINS_HOST="{self.vpc_stack.jenkins_master_hostname}"
+for i in $(seq 1 30); do
+    MASTER_IP=$(getent hosts "$JENKINS_HOST" | awk '{{print $1; exit}}')
+    if [ -n "$MASTER_IP" ]; then
+        echo "Jenkins Master $JENKINS_HOST resolves to $MASTER_IP"
+        break
+    fi
+    echo "Waiting for $JENKINS_HOST to be registered... attempt $i/30"
+    sleep 5
+done
 
-JENKINS_URL="http://$MASTER_IP:8080"
+JENKINS_URL="{self.jenkins_url}"
+phase_end MasterDiscovery
 
 echo "Agent Name: $AGENT_NAME"
 echo "Private IP: $PRIVATE_IP"
@@ -155,6 +470,7 @@ cd /opt/jenkins
 
 # Wait for Jenkins to be fully ready
 echo "Waiting for Jenkins to be ready..."
+phase_begin JenkinsReady
 for i in $(seq 1 30); do
     if curl -s "$JENKINS_URL/login" | grep -q "Jenkins"; then
         echo "Jenkins is ready"
@@ -163,51 +479,74 @@ for i in $(seq 1 30); do
     echo "Waiting... attempt $i/30"
     sleep 10
 done
-
-# Create node via Jenkins API (using anonymous access for initial setup)
-echo "Creating Jenkins node via API..."
-NODE_CONFIG='<slave>
-  <name>'$AGENT_NAME'</name>
-  <description>Unity Build Agent - '$INSTANCE_ID'</description>
-  <remoteFS>/opt/jenkins</remoteFS>
-  <numExecutors>2</numExecutors>
-  <mode>NORMAL</mode>
-  <launcher class="hudson.slaves.JNLPLauncher">
-    <workDirSettings>
-      <disabled>false</disabled>
-      <workDirPath></workDirPath>
-      <internalDir>remoting</internalDir>
-      <failIfWorkDirIsMissing>false</failIfWorkDirIsMissing>
-    </workDirSettings>
-  </launcher>
-  <label>unity linux</label>
-  <nodeProperties/>
-</slave>'
-
-# Wait for Jenkins Master to create the node
-echo "Waiting for Jenkins Master to create node $AGENT_NAME..."
-echo "Jenkins URL: $JENKINS_URL"
-echo "Agent Name: $AGENT_NAME"
-echo "Private IP: $PRIVATE_IP"
-
-for i in $(seq 1 60); do
-    if curl -s "$JENKINS_URL/computer/$AGENT_NAME/jenkins-agent.jnlp" | grep -q "<jnlp>"; then
-        echo "Node $AGENT_NAME found in Jenkins"
+phase_end JenkinsReady
+
+# The register-agent-node Lambda creates the node on the ASG launch event and stores
+# its JNLP secret in SSM. Fall back to the node's JNLP file (node created by the
+# master's agent monitor), backing off exponentially with full jitter.
+echo "Fetching JNLP secret for $AGENT_NAME..."
+REGION=$(curl -H "X-aws-ec2-metadata-token: $TOKEN" -s http://169.254.169.254/latest/meta-data/placement/region)
+AGENT_SECRET=""
+phase_begin NodeRegistration
+for i in $(seq 1 10); do
+    AGENT_SECRET=$(aws ssm get-parameter --region "$REGION" --name "/jenkins/agents/$INSTANCE_ID/secret" \
+        --with-decryption --query Parameter.Value --output text 2>/dev/null)
+    if [ -n "$AGENT_SECRET" ]; then
+        echo "Got JNLP secret from the registration Lambda"
         break
     fi
-    echo "Waiting for node creation... attempt $i/60"
-    sleep 10
+    AGENT_SECRET=$(curl -s "$JENKINS_URL/computer/$AGENT_NAME/jenkins-agent.jnlp" \
+        | grep -o '<argument>[^<]*</argument>' | head -1 | sed 's/<[^>]*>//g')
+    if [ -n "$AGENT_SECRET" ]; then
+        echo "Got JNLP secret from Jenkins"
+        break
+    fi
+    BACKOFF_CAP=$(( 2 ** i < 60 ? 2 ** i : 60 ))
+    DELAY=$(( RANDOM % BACKOFF_CAP + 1 ))
+    echo "Node $AGENT_NAME not registered yet, retrying in $DELAY seconds... attempt $i/10"
+    sleep $DELAY
 done
+phase_end NodeRegistration
 
-# Download agent.jar if not exists
-if [ ! -f agent.jar ]; then
+# Download agent.jar if missing or different from the master's copy
+phase_begin AgentJarSync
+MASTER_JAR_SHA=$(curl -sf "$JENKINS_URL/userContent/agent.jar.sha256" | cut -d' ' -f1)
+LOCAL_JAR_SHA=$(sha256sum agent.jar 2>/dev/null | cut -d' ' -f1)
+if [ ! -f agent.jar ] || {{ [ -n "$MASTER_JAR_SHA" ] && [ "$MASTER_JAR_SHA" != "$LOCAL_JAR_SHA" ]; }}; then
     echo "Downloading agent.jar..."
-    curl -sO "$JENKINS_URL/jnlpJars/agent.jar"
+    curl -sf -o agent.jar.tmp "$JENKINS_URL/jnlpJars/agent.jar" && mv agent.jar.tmp agent.jar
+else
+    echo "Cached agent.jar matches the master"
+fi
+phase_end AgentJarSync
+
+# Report time-to-online once Jenkins shows the node as connected
+if [ ! -f "$BOOT_ONLINE_MARKER" ]; then
+    phase_begin AgentConnect
+    (
+        for i in $(seq 1 60); do
+            if curl -s "$JENKINS_URL/computer/$AGENT_NAME/api/json?tree=offline" | grep -q '"offline":false'; then
+                phase_end AgentConnect
+                boot_metric TimeToOnline "$(_boot_now)"
+                phase_flush
+                boot_tag online
+                touch "$BOOT_ONLINE_MARKER"
+                break
+            fi
+            sleep 2
+        done
+    ) &
 fi
 
-# Connect with JNLP using WebSocket
-echo "Connecting with JNLP to $JENKINS_URL/computer/$AGENT_NAME/jenkins-agent.jnlp"
-java -jar agent.jar -jnlpUrl "$JENKINS_URL/computer/$AGENT_NAME/jenkins-agent.jnlp" -webSocket -workDir /opt/jenkins
+# Connect using WebSocket
+# Keep the JVM DNS cache short so reconnects follow a replaced master
+if [ -n "$AGENT_SECRET" ]; then
+    echo "Connecting to $JENKINS_URL as $AGENT_NAME"
+    java -Dsun.net.inetaddr.ttl=10 -jar agent.jar -url "$JENKINS_URL/" -name "$AGENT_NAME" -secret "$AGENT_SECRET" -webSocket -workDir /opt/jenkins
+else
+    echo "Connecting with JNLP to $JENKINS_URL/computer/$AGENT_NAME/jenkins-agent.jnlp"
+    java -Dsun.net.inetaddr.ttl=10 -jar agent.jar -jnlpUrl "$JENKINS_URL/computer/$AGENT_NAME/jenkins-agent.jnlp" -webSocket -workDir /opt/jenkins
+fi
 EOF
 
 chmod +x /opt/jenkins/start-agent.sh
@@ -241,66 +580,43 @@ systemctl start jenkins-agent
 
 echo "Jenkins JNLP Agent service started"
 
+# Publish user data phase timings
+boot_metric UserDataEnd "$(_boot_now)"
+phase_flush
+
 echo "Jenkins Agent setup completed at $(date)"
 echo "Setup completed successfully" > /tmp/setup-complete
 """
+        return user_data_script
 
-        # 使用预构建的Unity AMI或默认AMI
-        if "unity_ami_id" in self.config and self.config["unity_ami_id"]:
-            machine_image = ec2.MachineImage.generic_linux({
-                self.region: self.config["unity_ami_id"]
-            })
-        else:
-            machine_image = ec2.MachineImage.latest_amazon_linux2023()
-            
-        self.launch_template = ec2.LaunchTemplate(
-            self, "JenkinsAgentLaunchTemplate",
-            launch_template_name=self.config["resource_namer"]("jenkins-agent-lt"),
-            machine_image=machine_image,
-            security_group=self.vpc_stack.jenkins_agent_sg,
-            role=self.iam_stack.jenkins_agent_role,
-            user_data=ec2.UserData.custom(user_data_script),
-            block_devices=[
-                ec2.BlockDevice(
-                    device_name="/dev/xvda",
-                    volume=ec2.BlockDeviceVolume.ebs(
-                        volume_size=50,  # OS disk
-                        volume_type=ec2.EbsDeviceVolumeType.GP3,
-                        encrypted=True,
-                        delete_on_termination=True,
-                    )
-                )
-            ],
-            require_imdsv2=True,
-        )
-
-    def _create_auto_scaling_group(self):
-        """Create Auto Scaling Group for Jenkins Agents with Spot instances."""
+    def _create_auto_scaling_group(self, pool: Dict[str, Any], construct_prefix: str) -> autoscaling.AutoScalingGroup:
+        """Create Auto Scaling Group for the Jenkins Agents of a pool with Spot instances."""
         
         # Create mixed instances policy for Spot instances
-        self.jenkins_agent_asg = autoscaling.AutoScalingGroup(
-            self, "JenkinsAgentASG",
-            auto_scaling_group_name=self.config["resource_namer"]("jenkins-agent-asg"),
+        launch_template_overrides, spot_allocation_strategy = self._build_instance_overrides(pool)
+        asg = autoscaling.AutoScalingGroup(
+            self, f"{construct_prefix}ASG",
+            auto_scaling_group_name=self.config["resource_namer"]("jenkins-agent-asg", pool["name"]),
             vpc=self.vpc_stack.vpc,
             vpc_subnets=ec2.SubnetSelection(
                 subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
             ),
             mixed_instances_policy=autoscaling.MixedInstancesPolicy(
-                launch_template=self.launch_template,
+                launch_template=self.launch_templates[pool["name"]],
                 instances_distribution=autoscaling.InstancesDistribution(
                     on_demand_base_capacity=0,
                     on_demand_percentage_above_base_capacity=0,  # 100% Spot
-                    spot_instance_pools=4,
+                    spot_allocation_strategy=spot_allocation_strategy,
+                    # Pools only apply to lowest-price allocation
+                    spot_instance_pools=(
+                        4 if spot_allocation_strategy == autoscaling.SpotAllocationStrategy.LOWEST_PRICE else None
+                    ),
                 ),
-                launch_template_overrides=[
-                    autoscaling.LaunchTemplateOverrides(
-                        instance_type=ec2.InstanceType(instance_type)
-                    ) for instance_type in self.config["jenkins_agents"]["instance_types"]
-                ]
+                launch_template_overrides=launch_template_overrides,
             ),
-            min_capacity=self.config["jenkins_agents"]["min_instances"],
-            max_capacity=self.config["jenkins_agents"]["max_instances"],
-            desired_capacity=self.config["jenkins_agents"]["desired_capacity"],
+            min_capacity=pool["min_instances"],
+            max_capacity=pool["max_instances"],
+            desired_capacity=pool["desired_capacity"],
             health_check=autoscaling.HealthCheck.ec2(
                 grace=Duration.minutes(10)  # 延长健康检查宽限期
             ),
@@ -310,24 +626,161 @@ echo "Setup completed successfully" > /tmp/setup-complete
                 pause_time=Duration.minutes(2),
                 wait_on_resource_signals=False,  # 不等待信号，避免Unity安装超时
             ),
+            # Agents stay protected until the scale-in protection Lambda sees them idle
+            new_instances_protected_from_scale_in=self.config["jenkins_agents"]["scale_in_protection"],
+            # Scale in the agents whose caches are coldest and executors idle
+            termination_policies=[autoscaling.TerminationPolicy.CUSTOM_LAMBDA_FUNCTION],
+            termination_policy_custom_lambda_function_arn=(
+                self.lambda_stack.agent_termination_policy_function.function_arn
+            ),
         )
 
         # Add scaling policies
-        self._add_scaling_policies()
+        self._add_scaling_policies(pool, asg)
+        
+        # The hook emits the launch event as early as possible; the register Lambda completes it
+        asg.add_lifecycle_hook(
+            "NodeRegistrationHook",
+            lifecycle_hook_name=self.config["resource_namer"]("agent-node-registration", pool["name"]),
+            lifecycle_transition=autoscaling.LifecycleTransition.INSTANCE_LAUNCHING,
+            default_result=autoscaling.DefaultResult.CONTINUE,
+            heartbeat_timeout=Duration.minutes(2),
+        )
 
         # Outputs
         CfnOutput(
-            self, "JenkinsAgentASGName",
-            value=self.jenkins_agent_asg.auto_scaling_group_name,
-            description="Jenkins Agent Auto Scaling Group Name",
-            export_name=f"{self.config['project_prefix']}-jenkins-agent-asg-name"
+            self, f"{construct_prefix}ASGName",
+            value=asg.auto_scaling_group_name,
+            description=f"Jenkins Agent Auto Scaling Group Name ({pool['name']} pool)",
+            export_name=f"{self.config['project_prefix']}-jenkins-agent-{pool['name']}-asg-name"
         )
+        
+        return asg
+
+    def _build_instance_overrides(self, pool: Dict[str, Any]) -> Tuple[List[autoscaling.LaunchTemplateOverrides], autoscaling.SpotAllocationStrategy]:
+        """Build launch template overrides and the Spot allocation strategy for a pool's ASG.
+        
+        Strategies (instance_selection.strategy of the pool):
+          prioritized - types from the price/performance table that match the
+                        vCPU/memory/family filters, cheapest build first,
+                        allocated capacity-optimized-prioritized
+          attributes  - attribute-based instance requirements, EC2 picks any
+                        matching type, allocated capacity-optimized
+          fixed       - jenkins_agents.instance_types, lowest-price allocation
+        """
+        selection = pool["instance_selection"]
+        strategy = selection["strategy"]
+        
+        if strategy == "fixed":
+            return [
+                autoscaling.LaunchTemplateOverrides(
+                    instance_type=ec2.InstanceType(instance_type)
+                ) for instance_type in pool["instance_types"]
+            ], autoscaling.SpotAllocationStrategy.LOWEST_PRICE
+        
+        if strategy == "attributes":
+            requirements = autoscaling.CfnAutoScalingGroup.InstanceRequirementsProperty(
+                v_cpu_count=autoscaling.CfnAutoScalingGroup.VCpuCountRequestProperty(
+                    min=selection["vcpu_min"],
+                    max=selection["vcpu_max"],
+                ),
+                memory_mib=autoscaling.CfnAutoScalingGroup.MemoryMiBRequestProperty(
+                    min=selection["memory_gib_min"] * 1024,
+                    max=selection["memory_gib_max"] * 1024,
+                ),
+                allowed_instance_types=[f"{family}.*" for family in selection["families"]],
+                burstable_performance="excluded",
+            )
+            return [
+                autoscaling.LaunchTemplateOverrides(instance_requirements=requirements)
+            ], autoscaling.SpotAllocationStrategy.CAPACITY_OPTIMIZED
+        
+        if strategy == "prioritized":
+            instance_types = [
+                row["instance_type"] for row in self._load_instance_performance()
+                if row["family"] in selection["families"]
+                and selection["vcpu_min"] <= row["vcpu"] <= selection["vcpu_max"]
+                and selection["memory_gib_min"] <= row["memory_gib"] <= selection["memory_gib_max"]
+            ]
+            if not instance_types:
+                raise ValueError(f"No instance type in the price/performance table matches the {pool['name']} pool instance_selection")
+            
+            # Override order is the Spot priority order
+            return [
+                autoscaling.LaunchTemplateOverrides(
+                    instance_type=ec2.InstanceType(instance_type)
+                ) for instance_type in instance_types
+            ], autoscaling.SpotAllocationStrategy.CAPACITY_OPTIMIZED_PRIORITIZED
+        
+        raise ValueError(f"Unknown instance_selection.strategy for the {pool['name']} pool: {strategy}")
+
+    def _load_instance_performance(self) -> List[Dict[str, Any]]:
+        """Load the price/performance table rows, cheapest build first."""
+        with open(INSTANCE_PERFORMANCE_TABLE, 'r') as f:
+            rows = yaml.safe_load(f)["instance_types"]
+        return sorted(rows, key=lambda row: (row["cost_per_build"], row["build_minutes"]))
 
-    def _add_scaling_policies(self):
-        """Add scaling policies for the Auto Scaling Group."""
+    def _add_node_registration(self):
+        """Create Jenkins nodes on launch and delete them on termination via the register-agent-node Lambda."""
         
-        # Scale on CPU utilization
-        self.jenkins_agent_asg.scale_on_cpu_utilization(
-            "CPUScaling",
-            target_utilization_percent=70,
+        node_registration_rule = events.Rule(
+            self, "AgentNodeRegistrationRule",
+            rule_name=self.config["resource_namer"]("agent-node-registration"),
+            description="Register and deregister Jenkins agent nodes",
+            event_pattern=events.EventPattern(
+                source=["aws.autoscaling"],
+                detail_type=[
+                    "EC2 Instance-launch Lifecycle Action",
+                    "EC2 Instance Terminate Successful",
+                ],
+                detail={
+                    "AutoScalingGroupName": [
+                        self.config["resource_namer"]("jenkins-agent-asg", pool["name"])
+                        for pool in self.agent_pools
+                    ]
+                },
+            ),
+        )
+        node_registration_rule.add_target(
+            targets.LambdaFunction(self.lambda_stack.register_agent_node_function)
+        )
+
+    def _add_scaling_policies(self, pool: Dict[str, Any], asg: autoscaling.AutoScalingGroup):
+        """Scale a pool on the Jenkins queue of its labels."""
+        
+        queue_length = cloudwatch.Metric(
+            namespace=self.fleet_metrics_namespace,
+            metric_name="QueueLength",
+            dimensions_map={"Pool": pool["name"]},
+            statistic="Maximum",
+            period=Duration.minutes(1),
+        )
+        
+        # Scale out as soon as builds queue, also from zero instances
+        asg.scale_on_metric(
+            "QueueScaleOut",
+            metric=queue_length,
+            scaling_steps=[
+                autoscaling.ScalingInterval(upper=1, change=0),
+                autoscaling.ScalingInterval(lower=1, change=1),
+                autoscaling.ScalingInterval(lower=4, change=2),
+                autoscaling.ScalingInterval(lower=10, change=4),
+            ],
+            adjustment_type=autoscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+            evaluation_periods=1,
+            # A queue that persists while the new agents boot does not launch more of them
+            estimated_instance_warmup=self.boot_to_online,
+        )
+        
+        # Scale in one agent at a time after 15 minutes with an empty queue; agents
+        # running builds are protected and the termination policy picks cold caches
+        asg.scale_on_metric(
+            "QueueScaleIn",
+            metric=queue_length,
+            scaling_steps=[
+                autoscaling.ScalingInterval(upper=0, change=-1),
+                autoscaling.ScalingInterval(lower=1, change=0),
+            ],
+            adjustment_type=autoscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+            evaluation_periods=15,
         )
\ No newline at end of file
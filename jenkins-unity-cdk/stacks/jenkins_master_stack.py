@@ -6,6 +6,7 @@ from aws_cdk import (
     aws_elasticloadbalancingv2 as elbv2,
     aws_autoscaling as autoscaling,
     aws_iam as iam,
+    aws_servicediscovery as servicediscovery,
     Duration,
     CfnOutput,
 )
@@ -26,10 +27,24 @@ class JenkinsMasterStack(Stack):
         self.iam_stack = iam_stack
         
         # Create Jenkins Master infrastructure
+        self._create_service_discovery()
         self._create_launch_template()
         self._create_auto_scaling_group()
         self._create_application_load_balancer()
 
+    def _create_service_discovery(self):
+        """Create Cloud Map service the Jenkins Master registers its private IP with."""
+        
+        # Short TTL so agents follow a replaced master within seconds
+        self.jenkins_master_service = servicediscovery.Service(
+            self, "JenkinsMasterService",
+            namespace=self.vpc_stack.private_dns_namespace,
+            name="jenkins",
+            dns_record_type=servicediscovery.DnsRecordType.A,
+            dns_ttl=Duration.seconds(10),
+            description="Jenkins Master endpoint for agents",
+        )
+
     def _create_launch_template(self):
         """Create launch template for Jenkins Master."""
         
@@ -62,6 +77,7 @@ class JenkinsMasterStack(Stack):
         """Build the user data script for Jenkins Master."""
         
         efs_id = self.storage_stack.jenkins_efs.file_system_id
+        service_id = self.jenkins_master_service.service_id
         region = self.region
         project_prefix = self.config['project_prefix']
         
@@ -171,6 +187,22 @@ for i in $(seq 1 30); do
     sleep 10
 done
 
+# Publish this master's private IP through Cloud Map (jenkins.<namespace>)
+# A replacement master overwrites the same instance record on boot
+IMDS_TOKEN=$(curl -s -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 300")
+MASTER_PRIVATE_IP=$(curl -s -H "X-aws-ec2-metadata-token: $IMDS_TOKEN" http://169.254.169.254/latest/meta-data/local-ipv4)
+for i in $(seq 1 5); do
+    if aws servicediscovery register-instance --region {region} \
+        --service-id {service_id} \
+        --instance-id jenkins-master \
+        --attributes AWS_INSTANCE_IPV4=$MASTER_PRIVATE_IP,AWS_INSTANCE_PORT=8080; then
+        echo "Registered Jenkins Master endpoint $MASTER_PRIVATE_IP"
+        break
+    fi
+    echo "Service discovery registration attempt $i/5 failed, retrying..."
+    sleep 10
+done
+
 # Install Docker for build tools
 yum install -y docker --allowerasing
 systemctl enable docker
@@ -285,6 +317,43 @@ for i in $(seq 1 60); do
     sleep 5
 done
 
+# Publish the agent.jar checksum so agents with a cached copy (baked AMIs) can validate it.
+# Republished on every Jenkins start: an upgraded Jenkins serves a new agent.jar
+cat > /opt/publish-agent-jar-checksum.sh << 'SCRIPT'
+#!/bin/bash
+mkdir -p /var/lib/jenkins/userContent
+for i in $(seq 1 60); do
+    if curl -sf -o /tmp/agent.jar http://localhost:8080/jnlpJars/agent.jar; then
+        sha256sum /tmp/agent.jar | cut -d' ' -f1 > /var/lib/jenkins/userContent/agent.jar.sha256
+        chown -R jenkins:jenkins /var/lib/jenkins/userContent
+        echo "Published agent.jar checksum: $(cat /var/lib/jenkins/userContent/agent.jar.sha256)"
+        break
+    fi
+    sleep 5
+done
+rm -f /tmp/agent.jar
+SCRIPT
+
+chmod +x /opt/publish-agent-jar-checksum.sh
+
+cat > /etc/systemd/system/jenkins-agent-jar-checksum.service << 'EOF'
+[Unit]
+Description=Publish the agent.jar checksum of the running Jenkins
+After=jenkins.service
+PartOf=jenkins.service
+
+[Service]
+Type=oneshot
+ExecStart=/opt/publish-agent-jar-checksum.sh
+
+[Install]
+WantedBy=jenkins.service
+EOF
+
+systemctl daemon-reload
+systemctl enable jenkins-agent-jar-checksum.service
+/opt/publish-agent-jar-checksum.sh
+
 # Create script to auto-create JNLP nodes for agents
 cat > /opt/create-agent-node.sh << 'SCRIPT'
 #!/bin/bash
@@ -7,12 +7,16 @@ from aws_cdk import (
     aws_events_targets as targets,
     aws_ec2 as ec2,
     aws_logs as logs,
+    aws_iam as iam,
     Duration,
     CfnOutput,
     RemovalPolicy,
 )
 from constructs import Construct
 from typing import Dict, Any
+import json
+
+from stacks.jenkins_agent_stack import cache_volume_profile
 
 
 class LambdaStack(Stack):
@@ -27,14 +31,88 @@ class LambdaStack(Stack):
         self.storage_stack = storage_stack
         self.iam_stack = iam_stack
         
+        # Agent pools and their Auto Scaling groups
+        self.agent_pools = self.config["jenkins_agents"]["pools"]
+        self.agent_asg_names = [
+            self.config["resource_namer"]("jenkins-agent-asg", pool["name"]) for pool in self.agent_pools
+        ]
+        
+        # Shared by the cache pool functions
+        self._create_sdk_profiler_layer()
+        self._create_ec2_clients_layer()
+        self._create_cache_sets_layer()
+        
         # Create Lambda functions
         self._create_allocate_cache_volume_function()
         self._create_release_cache_volume_function()
         self._create_maintain_cache_pool_function()
+        self._create_prewarm_cache_pool_function()
+        self._create_register_agent_node_function()
+        self._create_agent_termination_policy_function()
+        self._create_agent_scale_in_protection_function()
+        self._create_agent_health_check_function()
+        self._create_agent_queue_metrics_function()
+        self._create_agent_prescaling_function()
         
         # Create scheduled maintenance
         self._create_maintenance_schedule()
 
+    def _create_sdk_profiler_layer(self):
+        """Create the Lambda layer with the opt-in AWS call profiler of the cache pool functions."""
+        
+        self.sdk_profiler_layer = _lambda.LayerVersion(
+            self, "SdkProfilerLayer",
+            layer_version_name=self.config["resource_namer"]("sdk-profiler"),
+            code=_lambda.Code.from_asset("lambda_layers/sdk_profiler"),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_11],
+            description="AWS SDK call profiler, enabled by monitoring.sdk_profiling",
+        )
+        
+        profiling = self.config["monitoring"]["sdk_profiling"]
+        self.sdk_profiling_environment = {
+            "SDK_PROFILING": str(profiling["enabled"]).lower(),
+            "SDK_PROFILE_METRICS": str(profiling["metrics"]).lower(),
+            "SDK_PROFILE_NAMESPACE": profiling["metrics_namespace"],
+            "SDK_PROFILE_SAMPLE_RATE": str(profiling["cprofile_sample_rate"]),
+            "SDK_PROFILE_SLOW_MS": str(profiling["slow_invocation_ms"]),
+            "SDK_PROFILE_BUCKET": self.storage_stack.logs_bucket.bucket_name,
+        }
+
+    def _create_ec2_clients_layer(self):
+        """Create the Lambda layer with the throttling-aware EC2 clients of the cache pool functions."""
+        
+        self.ec2_clients_layer = _lambda.LayerVersion(
+            self, "Ec2ClientsLayer",
+            layer_version_name=self.config["resource_namer"]("ec2-clients"),
+            code=_lambda.Code.from_asset("lambda_layers/ec2_clients"),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_11],
+            description="EC2 clients with adaptive retries on a shared API rate budget",
+        )
+
+    def _create_cache_sets_layer(self):
+        """Create the Lambda layer with the cache set records and Pool-Index keys of the cache pool functions."""
+        
+        self.cache_sets_layer = _lambda.LayerVersion(
+            self, "CacheSetsLayer",
+            layer_version_name=self.config["resource_namer"]("cache-sets"),
+            code=_lambda.Code.from_asset("lambda_layers/cache_sets"),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_11],
+            description="Cache set volumes and Pool-Index keys of the cache pool table",
+        )
+
+    def _ec2_budget_environment(self, share: float = 1.0) -> Dict[str, str]:
+        """Environment of the EC2 clients; share is the part of each second's budget the function may use."""
+        
+        budget = self.config["cache_pool"]["ec2_api_budget"]
+        return {
+            "EC2_MAX_ATTEMPTS": str(budget["max_attempts"]),
+            "EC2_BUDGET_TABLE": self.storage_stack.ec2_budget_table.table_name if budget["enabled"] else "",
+            "EC2_DESCRIBE_PER_SECOND": str(budget["describe_per_second"]),
+            "EC2_MUTATE_PER_SECOND": str(budget["mutate_per_second"]),
+            "EC2_BUDGET_SHARE": str(share),
+            "EC2_BUDGET_MAX_WAIT_SECONDS": str(budget["max_wait_seconds"]),
+        }
+
     def _create_allocate_cache_volume_function(self):
         """Create Lambda function to allocate cache volumes."""
         
@@ -61,12 +139,20 @@ class LambdaStack(Stack):
             ),
             security_groups=[self.vpc_stack.lambda_sg],
             log_group=allocate_log_group,
+            # Scale-out bursts keep their concurrency when other functions are busy
+            reserved_concurrent_executions=self.config["cache_pool"]["reserved_concurrency"]["allocate"],
+            layers=[self.sdk_profiler_layer, self.ec2_clients_layer, self.cache_sets_layer],
             environment={
                 "CACHE_POOL_TABLE": self.storage_stack.cache_pool_table.table_name,
+                "INDEX_SHARDS": str(self.config["cache_pool"]["index_shards"]),
                 "VOLUME_SIZE": str(self.config["cache_pool"]["volume_size"]),
                 "VOLUME_TYPE": self.config["cache_pool"]["volume_type"],
                 "IOPS": str(self.config["cache_pool"]["iops"]),
                 "THROUGHPUT": str(self.config["cache_pool"]["throughput"]),
+                "STRIPE_WIDTH": str(self.config["cache_pool"]["stripe_width"]),
+                "METRICS_NAMESPACE": self.config["monitoring"]["fleet_metrics_namespace"],
+                **self.sdk_profiling_environment,
+                **self._ec2_budget_environment(),
             },
             description="Allocate cache volumes for Jenkins agents",
         )
@@ -97,8 +183,13 @@ class LambdaStack(Stack):
             ),
             security_groups=[self.vpc_stack.lambda_sg],
             log_group=release_log_group,
+            reserved_concurrent_executions=self.config["cache_pool"]["reserved_concurrency"]["release"],
+            layers=[self.sdk_profiler_layer, self.ec2_clients_layer, self.cache_sets_layer],
             environment={
                 "CACHE_POOL_TABLE": self.storage_stack.cache_pool_table.table_name,
+                "INDEX_SHARDS": str(self.config["cache_pool"]["index_shards"]),
+                **self.sdk_profiling_environment,
+                **self._ec2_budget_environment(),
             },
             description="Release cache volumes from Jenkins agents",
         )
@@ -106,6 +197,8 @@ class LambdaStack(Stack):
     def _create_maintain_cache_pool_function(self):
         """Create Lambda function to maintain cache pool."""
         
+        rebalance = self.config["cache_pool"]["rebalance"]
+        
         # Create log group with explicit removal policy
         maintain_log_group = logs.LogGroup(
             self, "MaintainCachePoolLogGroup",
@@ -129,18 +222,418 @@ class LambdaStack(Stack):
             ),
             security_groups=[self.vpc_stack.lambda_sg],
             log_group=maintain_log_group,
+            reserved_concurrent_executions=self.config["cache_pool"]["reserved_concurrency"]["maintain"],
+            layers=[self.sdk_profiler_layer, self.ec2_clients_layer, self.cache_sets_layer],
             environment={
                 "CACHE_POOL_TABLE": self.storage_stack.cache_pool_table.table_name,
+                "INDEX_SHARDS": str(self.config["cache_pool"]["index_shards"]),
                 "MAX_AGE_DAYS": str(self.config["cache_pool"]["max_age_days"]),
                 "MIN_VOLUMES_PER_AZ": str(self.config["cache_pool"]["min_volumes_per_az"]),
+                "CACHE_PARTITIONS": json.dumps({
+                    pool["project_id"]: pool["cache"] for pool in self.agent_pools
+                }),
                 "VOLUME_SIZE": str(self.config["cache_pool"]["volume_size"]),
                 "VOLUME_TYPE": self.config["cache_pool"]["volume_type"],
                 "IOPS": str(self.config["cache_pool"]["iops"]),
                 "THROUGHPUT": str(self.config["cache_pool"]["throughput"]),
+                "STRIPE_WIDTH": str(self.config["cache_pool"]["stripe_width"]),
+                "MAX_SNAPSHOT_DEFERRALS": str(self.config["cache_pool"]["max_snapshot_deferrals"]),
+                "REBALANCE_ENABLED": str(rebalance["enabled"]).lower(),
+                "REBALANCE_LOOKBACK_DAYS": str(rebalance["lookback_days"]),
+                "MAX_MOVES_PER_RUN": str(rebalance["max_moves_per_run"]),
+                "METRICS_NAMESPACE": self.config["monitoring"]["fleet_metrics_namespace"],
+                "POOL_ASGS": json.dumps({
+                    pool["project_id"]: asg_name for asg_name, pool in zip(self.agent_asg_names, self.agent_pools)
+                }),
+                **self.sdk_profiling_environment,
+                # Leaves the rest of each second's EC2 budget to allocation
+                **self._ec2_budget_environment(self.config["cache_pool"]["ec2_api_budget"]["maintenance_share"]),
             },
             description="Maintain cache pool - cleanup and optimization",
         )
 
+    def _create_prewarm_cache_pool_function(self):
+        """Create Lambda function that warms idle cache volumes on off-peak Spot instances."""
+        
+        prewarm = self.config["cache_pool"]["prewarm"]
+        # Warmers boot the pool launch templates with their own user data and need Unity on the AMI
+        if prewarm["enabled"] and not self.config.get("unity_ami_id"):
+            raise ValueError("cache_pool.prewarm requires unity_ami_id")
+        
+        # Create log group with explicit removal policy
+        prewarm_log_group = logs.LogGroup(
+            self, "PrewarmCachePoolLogGroup",
+            log_group_name=f"/aws/lambda/{self.config['resource_namer']('prewarm-cache-pool')}",
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        agent_subnets = self.vpc_stack.vpc.select_subnets(
+            subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+        ).subnets
+        
+        self.prewarm_cache_pool_function = _lambda.Function(
+            self, "PrewarmCachePoolFunction",
+            function_name=self.config["resource_namer"]("prewarm-cache-pool"),
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="lambda_function.lambda_handler",
+            code=_lambda.Code.from_asset("lambda_functions/prewarm_cache_pool"),
+            timeout=Duration.minutes(5),
+            memory_size=256,
+            role=self.iam_stack.lambda_execution_role,
+            vpc=self.vpc_stack.vpc,
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ),
+            security_groups=[self.vpc_stack.lambda_sg],
+            log_group=prewarm_log_group,
+            layers=[self.sdk_profiler_layer, self.ec2_clients_layer, self.cache_sets_layer],
+            environment={
+                "CACHE_POOL_TABLE": self.storage_stack.cache_pool_table.table_name,
+                "INDEX_SHARDS": str(self.config["cache_pool"]["index_shards"]),
+                "PREWARM_ENABLED": str(prewarm["enabled"]).lower(),
+                "REPOSITORY_URL": prewarm["repository_url"],
+                "BRANCH": prewarm["branch"],
+                "PROJECT_PATH": prewarm["project_path"],
+                "CREDENTIALS_PARAMETER": prewarm["credentials_parameter"],
+                "OFF_PEAK_HOURS": ",".join(str(hour) for hour in prewarm["off_peak_hours"]),
+                "STALE_HOURS": str(prewarm["stale_hours"]),
+                "MAX_WARMERS": str(prewarm["max_warmers"]),
+                "VOLUMES_PER_WARMER": str(prewarm["volumes_per_warmer"]),
+                "WARM_TIMEOUT_MINUTES": str(prewarm["warm_timeout_minutes"]),
+                "INSTANCE_TYPES": ",".join(prewarm["instance_types"]),
+                "WARM_POOLS": json.dumps({
+                    pool["project_id"]: {
+                        "launch_template": self.config["resource_namer"]("jenkins-agent-lt", pool["name"]),
+                        "cache_volume_profile": cache_volume_profile(pool),
+                    }
+                    for pool in self.agent_pools
+                }),
+                "SUBNETS": json.dumps({
+                    subnet.availability_zone: subnet.subnet_id for subnet in agent_subnets
+                }),
+                **self.sdk_profiling_environment,
+                # Off-peak warming leaves the rest of each second's EC2 budget to allocation
+                **self._ec2_budget_environment(self.config["cache_pool"]["ec2_api_budget"]["maintenance_share"]),
+            },
+            description="Warm idle cache volumes against the latest commit on Spot instances",
+        )
+        
+        # Hourly: warmers are launched in the off-peak hours, finished ones are cleaned up any time
+        prewarm_rule = events.Rule(
+            self, "PrewarmCachePoolRule",
+            rule_name=self.config["resource_namer"]("prewarm-cache-pool"),
+            description="Warm idle cache volumes off-peak",
+            schedule=events.Schedule.rate(Duration.hours(1)),
+        )
+        prewarm_rule.add_target(
+            targets.LambdaFunction(self.prewarm_cache_pool_function)
+        )
+
+    def _create_register_agent_node_function(self):
+        """Create Lambda function to register Jenkins agent nodes on ASG lifecycle events."""
+        
+        # Create log group with explicit removal policy
+        register_log_group = logs.LogGroup(
+            self, "RegisterAgentNodeLogGroup",
+            log_group_name=f"/aws/lambda/{self.config['resource_namer']('register-agent-node')}",
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        self.register_agent_node_function = _lambda.Function(
+            self, "RegisterAgentNodeFunction",
+            function_name=self.config["resource_namer"]("register-agent-node"),
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="lambda_function.lambda_handler",
+            code=_lambda.Code.from_asset("lambda_functions/register_agent_node"),
+            timeout=Duration.minutes(1),
+            memory_size=128,
+            role=self.iam_stack.lambda_execution_role,
+            vpc=self.vpc_stack.vpc,
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ),
+            security_groups=[self.vpc_stack.lambda_sg],
+            log_group=register_log_group,
+            layers=[self.cache_sets_layer],
+            environment={
+                "JENKINS_URL": f"http://{self.vpc_stack.jenkins_master_hostname}:8080",
+                "AGENT_LABELS": self.config["jenkins_agents"]["labels"],
+                "NUM_EXECUTORS": str(self.config["jenkins_agents"]["num_executors"]),
+                "AGENT_POOLS": json.dumps({
+                    asg_name: {
+                        "name": pool["name"],
+                        "labels": pool["labels"],
+                        "num_executors": pool["num_executors"],
+                    }
+                    for asg_name, pool in zip(self.agent_asg_names, self.agent_pools)
+                }),
+                "REMOTE_FS": "/opt/jenkins",
+                "SECRET_PARAMETER_PREFIX": "/jenkins/agents",
+                "METRICS_NAMESPACE": self.config["monitoring"]["boot_metrics_namespace"],
+                "FLEET_METRICS_NAMESPACE": self.config["monitoring"]["fleet_metrics_namespace"],
+                "CACHE_POOL_TABLE": self.storage_stack.cache_pool_table.table_name,
+                "RELEASE_FUNCTION_NAME": self.release_cache_volume_function.function_name,
+            },
+            description="Register Jenkins agent nodes from Auto Scaling lifecycle events",
+        )
+
+    def _create_agent_termination_policy_function(self):
+        """Create Lambda function used as the agent ASG custom termination policy."""
+        
+        # Create log group with explicit removal policy
+        termination_log_group = logs.LogGroup(
+            self, "AgentTerminationPolicyLogGroup",
+            log_group_name=f"/aws/lambda/{self.config['resource_namer']('agent-termination-policy')}",
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        self.agent_termination_policy_function = _lambda.Function(
+            self, "AgentTerminationPolicyFunction",
+            function_name=self.config["resource_namer"]("agent-termination-policy"),
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="lambda_function.lambda_handler",
+            code=_lambda.Code.from_asset("lambda_functions/agent_termination_policy"),
+            # Auto Scaling waits at most one minute for the policy before falling back
+            timeout=Duration.seconds(30),
+            memory_size=128,
+            role=self.iam_stack.lambda_execution_role,
+            vpc=self.vpc_stack.vpc,
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ),
+            security_groups=[self.vpc_stack.lambda_sg],
+            log_group=termination_log_group,
+            layers=[self.ec2_clients_layer, self.cache_sets_layer],
+            environment={
+                "CACHE_POOL_TABLE": self.storage_stack.cache_pool_table.table_name,
+                "JENKINS_URL": f"http://{self.vpc_stack.jenkins_master_hostname}:8080",
+                "RECENCY_HALF_LIFE_HOURS": str(self.config["cache_pool"]["recency_half_life_hours"]),
+                "VOLUME_SIZE": str(self.config["cache_pool"]["volume_size"]),
+                **self._ec2_budget_environment(),
+                # Within the function timeout: a spent budget must not lose Auto Scaling its answer
+                "EC2_BUDGET_MAX_WAIT_SECONDS": "5",
+            },
+            description="Choose agent instances to terminate, coldest caches first",
+        )
+        
+        # Auto Scaling invokes the policy through its service-linked role
+        self.agent_termination_policy_function.add_permission(
+            "AutoScalingInvoke",
+            principal=iam.ArnPrincipal(
+                f"arn:aws:iam::{self.account}:role/aws-service-role/"
+                "autoscaling.amazonaws.com/AWSServiceRoleForAutoScaling"
+            ),
+        )
+
+    def _create_agent_scale_in_protection_function(self):
+        """Create Lambda function that protects agents running builds from scale-in."""
+        
+        # Create log group with explicit removal policy
+        protection_log_group = logs.LogGroup(
+            self, "AgentScaleInProtectionLogGroup",
+            log_group_name=f"/aws/lambda/{self.config['resource_namer']('agent-scale-in-protection')}",
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        self.agent_scale_in_protection_function = _lambda.Function(
+            self, "AgentScaleInProtectionFunction",
+            function_name=self.config["resource_namer"]("agent-scale-in-protection"),
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="lambda_function.lambda_handler",
+            code=_lambda.Code.from_asset("lambda_functions/agent_scale_in_protection"),
+            timeout=Duration.minutes(1),
+            memory_size=128,
+            role=self.iam_stack.lambda_execution_role,
+            vpc=self.vpc_stack.vpc,
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ),
+            security_groups=[self.vpc_stack.lambda_sg],
+            log_group=protection_log_group,
+            environment={
+                "AUTO_SCALING_GROUP_NAMES": ",".join(self.agent_asg_names),
+                "JENKINS_URL": f"http://{self.vpc_stack.jenkins_master_hostname}:8080",
+                "METRICS_NAMESPACE": self.config["monitoring"]["fleet_metrics_namespace"],
+                "PROTECTION_ENABLED": str(self.config["jenkins_agents"]["scale_in_protection"]).lower(),
+            },
+            description="Toggle agent scale-in protection from Jenkins executor state",
+        )
+        
+        # Reconcile every minute; the controller is idempotent and releases an agent
+        # after two idle runs in a row
+        protection_rule = events.Rule(
+            self, "AgentScaleInProtectionRule",
+            rule_name=self.config["resource_namer"]("agent-scale-in-protection"),
+            description="Reconcile agent scale-in protection with Jenkins executors",
+            schedule=events.Schedule.rate(Duration.minutes(1)),
+        )
+        protection_rule.add_target(
+            targets.LambdaFunction(self.agent_scale_in_protection_function)
+        )
+
+    def _create_agent_health_check_function(self):
+        """Create Lambda function that replaces agents which never connect or keep dropping offline."""
+        
+        # Create log group with explicit removal policy
+        health_log_group = logs.LogGroup(
+            self, "AgentHealthCheckLogGroup",
+            log_group_name=f"/aws/lambda/{self.config['resource_namer']('agent-health-check')}",
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        health_check = self.config["jenkins_agents"]["health_check"]
+        self.agent_health_check_function = _lambda.Function(
+            self, "AgentHealthCheckFunction",
+            function_name=self.config["resource_namer"]("agent-health-check"),
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="lambda_function.lambda_handler",
+            code=_lambda.Code.from_asset("lambda_functions/agent_health_check"),
+            timeout=Duration.minutes(2),
+            memory_size=128,
+            role=self.iam_stack.lambda_execution_role,
+            vpc=self.vpc_stack.vpc,
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ),
+            security_groups=[self.vpc_stack.lambda_sg],
+            log_group=health_log_group,
+            layers=[self.ec2_clients_layer],
+            environment={
+                "AUTO_SCALING_GROUP_NAMES": ",".join(self.agent_asg_names),
+                "JENKINS_URL": f"http://{self.vpc_stack.jenkins_master_hostname}:8080",
+                "METRICS_NAMESPACE": self.config["monitoring"]["fleet_metrics_namespace"],
+                "ONLINE_DEADLINE_MINUTES": str(health_check["online_deadline_minutes"]),
+                "BOOT_STARTED_GRACE_MINUTES": str(health_check["boot_started_grace_minutes"]),
+                "OFFLINE_DEADLINE_MINUTES": str(health_check["offline_deadline_minutes"]),
+                "MAX_OFFLINE_DROPS": str(health_check["max_offline_drops"]),
+                "OFFLINE_DROPS_WINDOW_HOURS": str(health_check["offline_drops_window_hours"]),
+                # Periodic checks leave the rest of each second's EC2 budget to allocation
+                **self._ec2_budget_environment(self.config["cache_pool"]["ec2_api_budget"]["maintenance_share"]),
+            },
+            description="Mark agents that are not online in Jenkins unhealthy",
+        )
+        
+        health_rule = events.Rule(
+            self, "AgentHealthCheckRule",
+            rule_name=self.config["resource_namer"]("agent-health-check"),
+            description="Evaluate Jenkins agent health against node online state",
+            schedule=events.Schedule.rate(Duration.minutes(2)),
+        )
+        health_rule.add_target(
+            targets.LambdaFunction(self.agent_health_check_function)
+        )
+
+    def _create_agent_queue_metrics_function(self):
+        """Create Lambda function that publishes the Jenkins queue of each agent pool."""
+        
+        # Create log group with explicit removal policy
+        queue_log_group = logs.LogGroup(
+            self, "AgentQueueMetricsLogGroup",
+            log_group_name=f"/aws/lambda/{self.config['resource_namer']('agent-queue-metrics')}",
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        self.agent_queue_metrics_function = _lambda.Function(
+            self, "AgentQueueMetricsFunction",
+            function_name=self.config["resource_namer"]("agent-queue-metrics"),
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="lambda_function.lambda_handler",
+            code=_lambda.Code.from_asset("lambda_functions/agent_queue_metrics"),
+            timeout=Duration.seconds(30),
+            memory_size=128,
+            role=self.iam_stack.lambda_execution_role,
+            vpc=self.vpc_stack.vpc,
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ),
+            security_groups=[self.vpc_stack.lambda_sg],
+            log_group=queue_log_group,
+            environment={
+                "JENKINS_URL": f"http://{self.vpc_stack.jenkins_master_hostname}:8080",
+                "METRICS_NAMESPACE": self.config["monitoring"]["fleet_metrics_namespace"],
+                "AGENT_POOLS": json.dumps([
+                    {"name": pool["name"], "labels": pool["labels"]} for pool in self.agent_pools
+                ]),
+            },
+            description="Publish Jenkins queue length and executors per agent pool",
+        )
+        
+        # Pool step scaling evaluates the queue every minute
+        queue_rule = events.Rule(
+            self, "AgentQueueMetricsRule",
+            rule_name=self.config["resource_namer"]("agent-queue-metrics"),
+            description="Publish Jenkins queue metrics for agent pool scaling",
+            schedule=events.Schedule.rate(Duration.minutes(1)),
+        )
+        queue_rule.add_target(
+            targets.LambdaFunction(self.agent_queue_metrics_function)
+        )
+
+    def _create_agent_prescaling_function(self):
+        """Create Lambda function that schedules agent pool minimums from the queue forecast."""
+        
+        prescaling = self.config["jenkins_agents"]["prescaling"]
+        
+        # Create log group with explicit removal policy
+        prescaling_log_group = logs.LogGroup(
+            self, "AgentPrescalingLogGroup",
+            log_group_name=f"/aws/lambda/{self.config['resource_namer']('agent-prescaling')}",
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_WEEK,
+        )
+        
+        self.agent_prescaling_function = _lambda.Function(
+            self, "AgentPrescalingFunction",
+            function_name=self.config["resource_namer"]("agent-prescaling"),
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="lambda_function.lambda_handler",
+            code=_lambda.Code.from_asset("lambda_functions/agent_prescaling"),
+            timeout=Duration.minutes(2),
+            memory_size=256,
+            role=self.iam_stack.lambda_execution_role,
+            vpc=self.vpc_stack.vpc,
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ),
+            security_groups=[self.vpc_stack.lambda_sg],
+            log_group=prescaling_log_group,
+            environment={
+                "METRICS_NAMESPACE": self.config["monitoring"]["fleet_metrics_namespace"],
+                "AGENT_POOLS": json.dumps({
+                    pool["name"]: {
+                        "asg_name": asg_name,
+                        "num_executors": pool["num_executors"],
+                        "min_instances": pool["min_instances"],
+                        "max_instances": pool["max_instances"],
+                    }
+                    for asg_name, pool in zip(self.agent_asg_names, self.agent_pools)
+                }),
+                "LOOKBACK_WEEKS": str(prescaling["lookback_weeks"]),
+                "QUANTILE": str(prescaling["quantile"]),
+                "LEAD_MINUTES": str(prescaling["lead_minutes"]),
+                "HORIZON_HOURS": str(prescaling["horizon_hours"]),
+                "PRESCALING_ENABLED": str(prescaling["enabled"]).lower(),
+            },
+            description="Schedule agent pool minimums ahead of forecast queue peaks",
+        )
+        
+        # Refresh the schedule well inside the forecast horizon
+        prescaling_rule = events.Rule(
+            self, "AgentPrescalingRule",
+            rule_name=self.config["resource_namer"]("agent-prescaling"),
+            description="Forecast agent demand and schedule pool minimums",
+            schedule=events.Schedule.rate(Duration.hours(6)),
+        )
+        prescaling_rule.add_target(
+            targets.LambdaFunction(self.agent_prescaling_function)
+        )
+
     def _create_maintenance_schedule(self):
         """Create scheduled maintenance for cache pool."""
         
@@ -163,6 +656,20 @@ class LambdaStack(Stack):
             targets.LambdaFunction(self.maintain_cache_pool_function)
         )
 
+        # Cache sets moved between AZs are restored as soon as their snapshots complete
+        move_completion_rule = events.Rule(
+            self, "CachePoolMoveCompletionRule",
+            rule_name=self.config["resource_namer"]("cache-pool-move-completion"),
+            description="Restore cache sets moved between AZs once their snapshots complete",
+            schedule=events.Schedule.rate(Duration.hours(1)),
+        )
+        move_completion_rule.add_target(
+            targets.LambdaFunction(
+                self.maintain_cache_pool_function,
+                event=events.RuleTargetInput.from_object({"action": "complete-moves"}),
+            )
+        )
+        
         # Outputs
         CfnOutput(
             self, "AllocateCacheVolumeFunctionArn",
@@ -178,6 +685,48 @@ class LambdaStack(Stack):
             export_name=f"{self.config['project_prefix']}-release-cache-volume-arn"
         )
         
+        CfnOutput(
+            self, "RegisterAgentNodeFunctionArn",
+            value=self.register_agent_node_function.function_arn,
+            description="Register Agent Node Lambda Function ARN",
+            export_name=f"{self.config['project_prefix']}-register-agent-node-arn"
+        )
+        
+        CfnOutput(
+            self, "AgentTerminationPolicyFunctionArn",
+            value=self.agent_termination_policy_function.function_arn,
+            description="Agent Termination Policy Lambda Function ARN",
+            export_name=f"{self.config['project_prefix']}-agent-termination-policy-arn"
+        )
+        
+        CfnOutput(
+            self, "AgentScaleInProtectionFunctionArn",
+            value=self.agent_scale_in_protection_function.function_arn,
+            description="Agent Scale-in Protection Lambda Function ARN",
+            export_name=f"{self.config['project_prefix']}-agent-scale-in-protection-arn"
+        )
+        
+        CfnOutput(
+            self, "AgentHealthCheckFunctionArn",
+            value=self.agent_health_check_function.function_arn,
+            description="Agent Health Check Lambda Function ARN",
+            export_name=f"{self.config['project_prefix']}-agent-health-check-arn"
+        )
+        
+        CfnOutput(
+            self, "AgentQueueMetricsFunctionArn",
+            value=self.agent_queue_metrics_function.function_arn,
+            description="Agent Queue Metrics Lambda Function ARN",
+            export_name=f"{self.config['project_prefix']}-agent-queue-metrics-arn"
+        )
+        
+        CfnOutput(
+            self, "AgentPrescalingFunctionArn",
+            value=self.agent_prescaling_function.function_arn,
+            description="Agent Prescaling Lambda Function ARN",
+            export_name=f"{self.config['project_prefix']}-agent-prescaling-arn"
+        )
+        
         CfnOutput(
             self, "MaintainCachePoolFunctionArn",
             value=self.maintain_cache_pool_function.function_arn,
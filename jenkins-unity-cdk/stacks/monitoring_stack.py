@@ -102,27 +102,28 @@ class MonitoringStack(Stack):
             cw_actions.SnsAction(self.alerts_topic)
         )
         
-        # Jenkins Agents CPU alarm
-        jenkins_agents_cpu_alarm = cloudwatch.Alarm(
-            self, "JenkinsAgentsHighCPU",
-            alarm_name=self.config["resource_namer"]("jenkins-agents-high-cpu"),
-            alarm_description="Jenkins Agents high CPU utilization",
-            metric=cloudwatch.Metric(
-                namespace="AWS/EC2",
-                metric_name="CPUUtilization",
-                dimensions_map={
-                    "AutoScalingGroupName": self.jenkins_agent_stack.jenkins_agent_asg.auto_scaling_group_name
-                },
-                statistic="Average",
-                period=Duration.minutes(5),
-            ),
-            threshold=90,
-            evaluation_periods=2,
-            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
-        )
-        jenkins_agents_cpu_alarm.add_alarm_action(
-            cw_actions.SnsAction(self.alerts_topic)
-        )
+        # Jenkins Agents CPU alarm per pool
+        for pool_name, agent_asg in self.jenkins_agent_stack.agent_asgs.items():
+            jenkins_agents_cpu_alarm = cloudwatch.Alarm(
+                self, f"JenkinsAgents{pool_name.title().replace('-', '')}HighCPU",
+                alarm_name=self.config["resource_namer"]("jenkins-agents-high-cpu", pool_name),
+                alarm_description=f"Jenkins Agents ({pool_name} pool) high CPU utilization",
+                metric=cloudwatch.Metric(
+                    namespace="AWS/EC2",
+                    metric_name="CPUUtilization",
+                    dimensions_map={
+                        "AutoScalingGroupName": agent_asg.auto_scaling_group_name
+                    },
+                    statistic="Average",
+                    period=Duration.minutes(5),
+                ),
+                threshold=90,
+                evaluation_periods=2,
+                comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            )
+            jenkins_agents_cpu_alarm.add_alarm_action(
+                cw_actions.SnsAction(self.alerts_topic)
+            )
         
         # EFS throughput alarm
         efs_throughput_alarm = cloudwatch.Alarm(
@@ -151,6 +152,12 @@ class MonitoringStack(Stack):
             ("allocate-cache-volume", self.lambda_stack.allocate_cache_volume_function),
             ("release-cache-volume", self.lambda_stack.release_cache_volume_function),
             ("maintain-cache-pool", self.lambda_stack.maintain_cache_pool_function),
+            ("register-agent-node", self.lambda_stack.register_agent_node_function),
+            ("agent-termination-policy", self.lambda_stack.agent_termination_policy_function),
+            ("agent-scale-in-protection", self.lambda_stack.agent_scale_in_protection_function),
+            ("agent-health-check", self.lambda_stack.agent_health_check_function),
+            ("agent-queue-metrics", self.lambda_stack.agent_queue_metrics_function),
+            ("agent-prescaling", self.lambda_stack.agent_prescaling_function),
         ]:
             error_alarm = cloudwatch.Alarm(
                 self, f"Lambda{function_name.replace('-', '')}Errors",
@@ -229,40 +236,147 @@ class MonitoringStack(Stack):
             )
         )
         
-        # Jenkins Agents metrics
+        # Jenkins Agents metrics per pool
+        for pool_name, agent_asg in self.jenkins_agent_stack.agent_asgs.items():
+            self.dashboard.add_widgets(
+                cloudwatch.GraphWidget(
+                    title=f"Jenkins Agents ({pool_name}) - Instance Count & CPU",
+                    left=[
+                        cloudwatch.Metric(
+                            namespace="AWS/AutoScaling",
+                            metric_name="GroupDesiredCapacity",
+                            dimensions_map={
+                                "AutoScalingGroupName": agent_asg.auto_scaling_group_name
+                            },
+                            statistic="Average",
+                            period=Duration.minutes(5),
+                        ),
+                        cloudwatch.Metric(
+                            namespace="AWS/AutoScaling",
+                            metric_name="GroupInServiceInstances",
+                            dimensions_map={
+                                "AutoScalingGroupName": agent_asg.auto_scaling_group_name
+                            },
+                            statistic="Average",
+                            period=Duration.minutes(5),
+                        )
+                    ],
+                    right=[
+                        cloudwatch.Metric(
+                            namespace="AWS/EC2",
+                            metric_name="CPUUtilization",
+                            dimensions_map={
+                                "AutoScalingGroupName": agent_asg.auto_scaling_group_name
+                            },
+                            statistic="Average",
+                            period=Duration.minutes(5),
+                        )
+                    ],
+                    width=12,
+                    height=6,
+                )
+            )
+        
+        # Jenkins queue per pool, the input of pool scaling
         self.dashboard.add_widgets(
             cloudwatch.GraphWidget(
-                title="Jenkins Agents - Instance Count & CPU",
+                title="Jenkins Agents - Queue Length & Busy Executors by Pool",
                 left=[
                     cloudwatch.Metric(
-                        namespace="AWS/AutoScaling",
-                        metric_name="GroupDesiredCapacity",
-                        dimensions_map={
-                            "AutoScalingGroupName": self.jenkins_agent_stack.jenkins_agent_asg.auto_scaling_group_name
-                        },
+                        namespace=self.config["monitoring"]["fleet_metrics_namespace"],
+                        metric_name="QueueLength",
+                        dimensions_map={"Pool": pool_name},
+                        statistic="Maximum",
+                        period=Duration.minutes(1),
+                    ) for pool_name in self.jenkins_agent_stack.agent_asgs
+                ],
+                right=[
+                    cloudwatch.Metric(
+                        namespace=self.config["monitoring"]["fleet_metrics_namespace"],
+                        metric_name="BusyExecutors",
+                        dimensions_map={"Pool": pool_name},
                         statistic="Average",
                         period=Duration.minutes(5),
-                    ),
+                    ) for pool_name in self.jenkins_agent_stack.agent_asgs
+                ],
+                width=12,
+                height=6,
+            )
+        )
+        
+        # Jenkins Agents boot-phase timings
+        boot_namespace = self.jenkins_agent_stack.boot_metrics_namespace
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Jenkins Agents - Boot Phase Breakdown",
+                left=[
                     cloudwatch.Metric(
-                        namespace="AWS/AutoScaling",
-                        metric_name="GroupInServiceInstances",
-                        dimensions_map={
-                            "AutoScalingGroupName": self.jenkins_agent_stack.jenkins_agent_asg.auto_scaling_group_name
-                        },
+                        namespace=boot_namespace,
+                        metric_name="PhaseDuration",
+                        dimensions_map={"Phase": phase},
+                        label=phase,
                         statistic="Average",
-                        period=Duration.minutes(5),
+                        period=Duration.hours(1),
+                    ) for phase in self.jenkins_agent_stack.boot_phases
+                ],
+                stacked=True,
+                width=12,
+                height=6,
+            ),
+            cloudwatch.GraphWidget(
+                title="Jenkins Agents - Time to Online by Instance Type / AMI / AZ",
+                left=[
+                    cloudwatch.MathExpression(
+                        expression=(
+                            f"SEARCH('{{{boot_namespace},AvailabilityZone,ImageId,InstanceType}} "
+                            f"MetricName=\"TimeToOnline\"', 'Average', 3600)"
+                        ),
+                        label="",
+                        using_metrics={},
+                        period=Duration.hours(1),
                     )
                 ],
-                right=[
+                width=12,
+                height=6,
+            )
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Jenkins Agents - Node Registration Latency",
+                left=[
                     cloudwatch.Metric(
-                        namespace="AWS/EC2",
-                        metric_name="CPUUtilization",
-                        dimensions_map={
-                            "AutoScalingGroupName": self.jenkins_agent_stack.jenkins_agent_asg.auto_scaling_group_name
-                        },
+                        namespace=boot_namespace,
+                        metric_name="NodeRegistrationLatency",
+                        label=f"NodeRegistrationLatency ({statistic})",
+                        statistic=statistic,
+                        period=Duration.hours(1),
+                    ) for statistic in ["Average", "Maximum"]
+                ],
+                width=12,
+                height=6,
+            )
+        )
+        
+        # Scale-in protection; compare lost builds with protection on and off
+        fleet_namespace = self.config["monitoring"]["fleet_metrics_namespace"]
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Jenkins Agents - Scale-in Protection",
+                left=[
+                    cloudwatch.Metric(
+                        namespace=fleet_namespace,
+                        metric_name=metric_name,
                         statistic="Average",
                         period=Duration.minutes(5),
-                    )
+                    ) for metric_name in ["BusyAgents", "ProtectedAgents"]
+                ],
+                right=[
+                    cloudwatch.Metric(
+                        namespace=fleet_namespace,
+                        metric_name=metric_name,
+                        statistic="Sum",
+                        period=Duration.hours(1),
+                    ) for metric_name in ["BuildsLostToTermination", "UnhealthyAgentsReplaced"]
                 ],
                 width=12,
                 height=6,
@@ -30,6 +30,9 @@ class StorageStack(Stack):
         # Create DynamoDB table for cache pool status
         self._create_dynamodb_table()
         
+        # Create DynamoDB table for the shared EC2 API budget
+        self._create_ec2_budget_table()
+        
         # Create S3 buckets
         self._create_s3_buckets()
 
@@ -91,6 +94,24 @@ class StorageStack(Stack):
             ),
         )
         
+        # Sparse index of the Available cache sets, one key per AZ, partition and
+        # stripe width (optionally write-sharded), newest LastUsed first: finding
+        # the hottest matching set reads one item. Writers set PoolKey when a set
+        # becomes Available and replace or remove it when it leaves. InUse sets
+        # are keyed by their instance, for the agent lifecycle Lambdas, instead
+        # of in a second index (a table update adds one index at most).
+        self.cache_pool_table.add_global_secondary_index(
+            index_name="Pool-Index",
+            partition_key=dynamodb.Attribute(
+                name="PoolKey",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="LastUsed",
+                type=dynamodb.AttributeType.NUMBER
+            ),
+        )
+        
         # Add Global Secondary Index for Project-Status queries
         self.cache_pool_table.add_global_secondary_index(
             index_name="Project-Status-Index",
@@ -112,6 +133,23 @@ class StorageStack(Stack):
             export_name=f"{self.config['project_prefix']}-cache-pool-table-name"
         )
 
+    def _create_ec2_budget_table(self):
+        """Create DynamoDB table of the per-second EC2 API call counters of the cache pool functions."""
+        
+        # Short-lived counters: no backups, expired by TTL
+        self.ec2_budget_table = dynamodb.Table(
+            self, "Ec2ApiBudgetTable",
+            table_name=self.config["resource_namer"]("ec2-api-budget"),
+            partition_key=dynamodb.Attribute(
+                name="Counter",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            encryption=dynamodb.TableEncryption.AWS_MANAGED,
+            time_to_live_attribute="ExpiresAt",
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+
     def _create_s3_buckets(self):
         """Create S3 buckets for build artifacts, cache templates, and logs."""
         
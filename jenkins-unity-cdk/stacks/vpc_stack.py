@@ -3,6 +3,7 @@
 from aws_cdk import (
     Stack,
     aws_ec2 as ec2,
+    aws_servicediscovery as servicediscovery,
     CfnOutput,
 )
 from constructs import Construct
@@ -47,6 +48,9 @@ class VpcStack(Stack):
         
         # Create Security Groups
         self._create_security_groups()
+        
+        # Create private DNS namespace for service discovery
+        self._create_private_dns_namespace()
 
         # Outputs
         CfnOutput(
@@ -73,6 +77,26 @@ class VpcStack(Stack):
             subnets=[ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS)]
         )
 
+    def _create_private_dns_namespace(self):
+        """Create Cloud Map private DNS namespace used to discover the Jenkins Master."""
+        
+        self.private_dns_namespace = servicediscovery.PrivateDnsNamespace(
+            self, "PrivateDnsNamespace",
+            name=self.config["vpc"]["private_dns_namespace"],
+            vpc=self.vpc,
+            description="Private service discovery namespace for Jenkins Unity CI/CD",
+        )
+        
+        # Jenkins Master registers itself under this name on every boot
+        self.jenkins_master_hostname = f"jenkins.{self.config['vpc']['private_dns_namespace']}"
+
+        CfnOutput(
+            self, "PrivateDnsNamespaceId",
+            value=self.private_dns_namespace.namespace_id,
+            description="Cloud Map private DNS namespace ID",
+            export_name=f"{self.config['project_prefix']}-private-dns-namespace-id"
+        )
+
     def _create_security_groups(self):
         """Create security groups for different components."""
         
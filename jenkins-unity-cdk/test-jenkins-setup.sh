@@ -16,7 +16,7 @@ fi
 echo ""
 echo "2. 检查Agent ASG状态..."
 aws autoscaling describe-auto-scaling-groups \
-    --auto-scaling-group-names unity-cicd-jenkins-agent-asg \
+    --auto-scaling-group-names unity-cicd-jenkins-agent-asg-linux \
     --query 'AutoScalingGroups[0].{MinSize:MinSize,MaxSize:MaxSize,DesiredCapacity:DesiredCapacity,InstanceCount:length(Instances)}' \
     --output table
 
@@ -0,0 +1,233 @@
+"""A moto cache pool for benchmarking the pool Lambdas.
+
+Every test gets a fresh pool of each size in POOL_BENCHMARK_SCALES (default
+"10 1000 10000") in its own mocked account: the cache pool table with the storage
+stack's indexes, one agent pool's Auto Scaling group over three AZs, an agent
+instance, and the Lambdas loaded with the environment the Lambda stack gives
+them. Half of the seeded cache sets are Available, spread evenly over the AZs,
+the rest are in use by agents that stay busy (no idle window for snapshots):
+they answer the maintenance run's snapshot-freeze command with a failure.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import boto3
+import pytest
+from botocore.awsrequest import AWSResponse
+from moto import mock_aws
+
+LAMBDA_FUNCTIONS = Path(__file__).parents[2] / "lambda_functions"
+LAMBDA_LAYERS = sorted((Path(__file__).parents[2] / "lambda_layers").glob("*/python"))
+SCALES = [int(volumes) for volumes in os.environ.get("POOL_BENCHMARK_SCALES", "10 1000 10000").split()]
+REGION = "us-east-1"
+TABLE_NAME = "unity-cicd-cache-pool-status"
+AGENT_ASG = "unity-cicd-jenkins-agents"
+PROJECT_ID = "unity-game"
+PARTITION = {"min_volumes_per_az": 1, "volume_size": 100, "volume_type": "gp3", "iops": 3000,
+             "throughput": 125, "stripe_width": 1}
+
+
+class ApiCalls:
+    """Counts the AWS API calls, waiter polls included, of clients created after it is registered."""
+
+    def __init__(self):
+        self.counts = None
+
+    def register(self, session):
+        session.events.register('before-call', self._count, unique_id='pool-benchmark-api-calls')
+
+    def _count(self, model, **kwargs):
+        if self.counts is not None:
+            # By the boto3 client name: "autoscaling", not the event name's "auto-scaling"
+            self.counts[f"{model.service_model.service_name}.{model.name}"] += 1
+
+    @contextmanager
+    def recording(self):
+        """Count the calls made inside the block."""
+        self.counts = Counter()
+        try:
+            yield self.counts
+        finally:
+            self.counts = None
+
+
+class Clock:
+    """Stands in for the time module of a Lambda, sleeping without waiting."""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class BusyAgents:
+    """Answers ssm.ListCommandInvocations, which moto lacks, for clients created after it is registered.
+
+    Every agent fails the commands sent to it, as snapshot-freeze does while a build
+    holds a Library view. The call is still counted.
+    """
+
+    def __init__(self):
+        self.commands = {}
+
+    def register(self, session):
+        session.events.register('after-call.ssm.SendCommand', self._sent)
+        # After the call counter: a handler of the operation's own event would run before it
+        session.events.register('before-call', self._invocations)
+
+    def _sent(self, parsed, **kwargs):
+        self.commands[parsed['Command']['CommandId']] = parsed['Command']['InstanceIds']
+
+    def _invocations(self, model, params, **kwargs):
+        if (model.service_model.service_name, model.name) != ('ssm', 'ListCommandInvocations'):
+            return None
+        command_id = json.loads(params['body'])['CommandId']
+        invocations = [
+            {'CommandId': command_id, 'InstanceId': instance_id, 'Status': 'Failed'}
+            for instance_id in self.commands.get(command_id, [])
+        ]
+        return AWSResponse(params['url'], 200, {}, None), {'CommandInvocations': invocations}
+
+
+class Pool:
+    def __init__(self, volumes, zones, instance_id, api_calls, lambdas):
+        self.volumes = volumes
+        self.zones = zones
+        self.instance_id = instance_id
+        self.api_calls = api_calls
+        self.lambdas = lambdas
+        self.table = boto3.resource('dynamodb').Table(TABLE_NAME)
+        self.ec2 = boto3.client('ec2')
+
+
+def load_lambda(name):
+    """A fresh copy of a Lambda module, importing the helper modules beside it and the layers."""
+    directory = str(LAMBDA_FUNCTIONS / name)
+    for path in [directory, *map(str, LAMBDA_LAYERS)]:
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(f"{name}_benchmark", Path(directory) / "lambda_function.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_agent_pool():
+    """The agent pool's Auto Scaling group in three AZs and a running agent; returns (AZs, instance ID)."""
+    ec2 = boto3.client('ec2')
+    subnets = sorted(ec2.describe_subnets(Filters=[{'Name': 'default-for-az', 'Values': ['true']}])['Subnets'],
+                     key=lambda subnet: subnet['AvailabilityZone'])[:3]
+    image_id = ec2.describe_images(Owners=['amazon'])['Images'][0]['ImageId']
+    ec2.create_launch_template(
+        LaunchTemplateName='unity-cicd-jenkins-agent',
+        LaunchTemplateData={'ImageId': image_id, 'InstanceType': 'c5.2xlarge'}
+    )
+    boto3.client('autoscaling').create_auto_scaling_group(
+        AutoScalingGroupName=AGENT_ASG,
+        LaunchTemplate={'LaunchTemplateName': 'unity-cicd-jenkins-agent', 'Version': '$Latest'},
+        MinSize=0,
+        MaxSize=10,
+        DesiredCapacity=0,
+        VPCZoneIdentifier=','.join(subnet['SubnetId'] for subnet in subnets)
+    )
+    instance = ec2.run_instances(ImageId=image_id, InstanceType='c5.2xlarge', MinCount=1, MaxCount=1,
+                                 SubnetId=subnets[0]['SubnetId'])['Instances'][0]
+    return [subnet['AvailabilityZone'] for subnet in subnets], instance['InstanceId']
+
+
+def create_table():
+    """The cache pool table of the storage stack."""
+    dynamodb = boto3.client('dynamodb')
+
+    def index(name, partition_key, sort_key=None):
+        return {
+            'IndexName': name,
+            'KeySchema': [{'AttributeName': partition_key, 'KeyType': 'HASH'}]
+            + ([{'AttributeName': sort_key, 'KeyType': 'RANGE'}] if sort_key else []),
+            'Projection': {'ProjectionType': 'ALL'},
+        }
+
+    dynamodb.create_table(
+        TableName=TABLE_NAME,
+        BillingMode='PAY_PER_REQUEST',
+        AttributeDefinitions=[
+            {'AttributeName': name, 'AttributeType': attribute_type}
+            for name, attribute_type in [('VolumeId', 'S'), ('AvailabilityZone', 'S'), ('Status', 'S'),
+                                         ('PoolKey', 'S'), ('LastUsed', 'N'), ('ProjectId', 'S')]
+        ],
+        KeySchema=[{'AttributeName': 'VolumeId', 'KeyType': 'HASH'}],
+        GlobalSecondaryIndexes=[
+            index('AZ-Status-Index', 'AvailabilityZone', 'Status'),
+            index('Pool-Index', 'PoolKey', 'LastUsed'),
+            index('Project-Status-Index', 'ProjectId', 'Status'),
+        ],
+    )
+
+
+def seed_pool(volumes, zones, cache_sets):
+    """Write the cache sets; none of them old enough to be cleaned up."""
+    now = int(time.time())
+    table = boto3.resource('dynamodb').Table(TABLE_NAME)
+    with table.batch_writer() as batch:
+        for index in range(volumes):
+            volume_id = f"vol-{index:017x}"
+            zone = zones[index % len(zones)]
+            item = {
+                'VolumeId': volume_id,
+                'VolumeIds': [volume_id],
+                'StripeWidth': 1,
+                'AvailabilityZone': zone,
+                'ProjectId': PROJECT_ID,
+                'CreatedTime': now - index,
+                'LastUsed': now - index,
+                'CacheVersion': '1.0',
+            }
+            if (index // len(zones)) % 2 == 0:
+                item.update(Status='Available', PoolKey=cache_sets.pool_key(zone, PROJECT_ID, 1))
+            else:
+                instance_id = f"i-{index:017x}"
+                item.update(Status='InUse', InstanceId=instance_id, PoolKey=cache_sets.held_pool_key(instance_id))
+            batch.put_item(Item=item)
+
+
+@pytest.fixture(params=SCALES, ids=lambda volumes: f"{volumes}-volumes")
+def pool(request):
+    with pytest.MonkeyPatch.context() as env, mock_aws():
+        env.setenv('AWS_DEFAULT_REGION', REGION)
+        env.setenv('AWS_ACCESS_KEY_ID', 'testing')
+        env.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+        env.setenv('CACHE_POOL_TABLE', TABLE_NAME)
+        env.setenv('CACHE_PARTITIONS', json.dumps({PROJECT_ID: PARTITION}))
+        env.setenv('POOL_ASGS', json.dumps({PROJECT_ID: AGENT_ASG}))
+
+        # Every client the Lambdas create from here on is counted
+        boto3.setup_default_session()
+        api_calls = ApiCalls()
+        api_calls.register(boto3.DEFAULT_SESSION)
+        BusyAgents().register(boto3.DEFAULT_SESSION)
+
+        zones, instance_id = create_agent_pool()
+        create_table()
+        lambdas = {
+            'allocate': load_lambda('allocate_cache_volume'),
+            'release': load_lambda('release_cache_volume'),
+            'maintain': load_lambda('maintain_cache_pool'),
+        }
+        # Polls for the agents' answers within QUIESCE_TIMEOUT_SECONDS without waiting between them
+        env.setattr(lambdas['maintain'], 'time', Clock())
+        seed_pool(request.param, zones, lambdas['allocate'].cache_sets)
+
+        yield Pool(request.param, zones, instance_id, api_calls, lambdas)
+
+        boto3.DEFAULT_SESSION = None
@@ -0,0 +1,102 @@
+"""Latency, throughput and AWS API calls of the cache pool Lambdas, against their budgets.
+
+Run with `python -m pytest tests/benchmark`; --benchmark-json keeps the
+timings together with the calls of every operation (extra_info.api_calls).
+"""
+
+import functools
+import operator
+from pathlib import Path
+
+from benchmarks.lambda_budgets import budget_violations, load_budgets
+
+from .conftest import PROJECT_ID
+
+BUDGETS = load_budgets(str(Path(__file__).with_name("budgets.yaml")))
+
+
+def rounds(pool, most=10):
+    """Fewer rounds for large pools, where moto itself takes seconds per scan."""
+    return max(1, min(most, 10_000 // pool.volumes))
+
+
+def measure(benchmark, pool, operation, target, setup=None, most_rounds=10):
+    """Benchmark one operation, record its API calls and check both against the budget."""
+    results = []
+    round_calls = []
+
+    def run():
+        with pool.api_calls.recording() as calls:
+            results.append(target())
+        round_calls.append(calls)
+
+    benchmark.pedantic(run, setup=setup, rounds=rounds(pool, most_rounds), iterations=1)
+
+    assert all(result['statusCode'] == 200 for result in results), results
+    # The most calls any round made
+    calls = dict(functools.reduce(operator.or_, round_calls))
+    benchmark.extra_info.update(operation=operation, volumes=pool.volumes, api_calls=calls)
+
+    # No timings when benchmarks are disabled
+    median_ms = benchmark.stats.stats.median * 1000 if benchmark.stats else None
+    violations = budget_violations(calls, median_ms, BUDGETS[operation], pool.volumes)
+    assert not violations, f"{operation} with {pool.volumes} cache sets is over budget: {'; '.join(violations)}"
+    return results
+
+
+def test_allocate_warm_set(benchmark, pool):
+    allocate = pool.lambdas['allocate']
+    claimed = []
+
+    def return_claimed_set():
+        # The same set is claimed every round
+        if claimed:
+            pool.table.update_item(
+                Key={'VolumeId': claimed.pop()},
+                UpdateExpression='SET #status = :available, PoolKey = :pool_key REMOVE InstanceId',
+                ExpressionAttributeNames={'#status': 'Status'},
+                ExpressionAttributeValues={':available': 'Available',
+                                           ':pool_key': allocate.cache_sets.pool_key(pool.zones[0], PROJECT_ID, 1)}
+            )
+
+    def allocate_set():
+        response = allocate.lambda_handler(
+            {'availability_zone': pool.zones[0], 'project_id': PROJECT_ID, 'instance_id': pool.instance_id}, None)
+        claimed.append(response.get('volume_id'))
+        return response
+
+    results = measure(benchmark, pool, 'allocate-warm', allocate_set, setup=return_claimed_set)
+    assert {result['status'] for result in results} == {'Available'}
+
+
+def test_allocate_new_set(benchmark, pool):
+    # A partition without sets in the pool
+    event = {'availability_zone': pool.zones[0], 'project_id': 'unity-game-webgl', 'instance_id': pool.instance_id}
+
+    results = measure(benchmark, pool, 'allocate-new',
+                      lambda: pool.lambdas['allocate'].lambda_handler(event, None))
+    assert {result['status'] for result in results} == {'Created'}
+
+
+def test_release_attached_set(benchmark, pool):
+    volume_id = pool.ec2.create_volume(Size=100, VolumeType='gp3', AvailabilityZone=pool.zones[0])['VolumeId']
+
+    def attach_in_use_set():
+        pool.ec2.attach_volume(VolumeId=volume_id, InstanceId=pool.instance_id, Device='/dev/sdf')
+        pool.table.put_item(Item={
+            'VolumeId': volume_id, 'VolumeIds': [volume_id], 'StripeWidth': 1, 'Status': 'InUse',
+            'AvailabilityZone': pool.zones[0], 'ProjectId': PROJECT_ID, 'LastUsed': 0,
+            'InstanceId': pool.instance_id,
+        })
+
+    measure(benchmark, pool, 'release', setup=attach_in_use_set,
+            target=lambda: pool.lambdas['release'].lambda_handler(
+                {'volume_id': volume_id, 'instance_id': pool.instance_id}, None))
+
+
+def test_maintain(benchmark, pool):
+    # Deferred snapshots are taken anyway after max_snapshot_deferrals runs
+    results = measure(benchmark, pool, 'maintain',
+                      lambda: pool.lambdas['maintain'].lambda_handler({'source': 'aws.events'}, None),
+                      most_rounds=3)
+    assert all(result['created_volumes'] == 0 and result['moves_started'] == 0 for result in results)
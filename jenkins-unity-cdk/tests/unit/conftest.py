@@ -0,0 +1,69 @@
+"""Mocked AWS accounts for unit tests of the Lambda handlers."""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import boto3
+import pytest
+from moto import mock_aws
+
+LAMBDA_FUNCTIONS = Path(__file__).parents[2] / "lambda_functions"
+LAMBDA_LAYERS = sorted((Path(__file__).parents[2] / "lambda_layers").glob("*/python"))
+TABLE_NAME = "unity-cicd-cache-pool-status"
+
+
+def load_lambda(name):
+    """A fresh copy of a Lambda module with clients of the mocked account; load inside the `aws` fixture."""
+    directory = str(LAMBDA_FUNCTIONS / name)
+    for path in [directory, *map(str, LAMBDA_LAYERS)]:
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(f"{name}_test", Path(directory) / "lambda_function.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_cache_pool_table():
+    """The cache pool table with the storage stack's indexes."""
+    def index(name, *key):
+        return {
+            "IndexName": name,
+            "KeySchema": [{"AttributeName": attribute, "KeyType": key_type}
+                          for attribute, key_type in zip(key, ["HASH", "RANGE"])],
+            "Projection": {"ProjectionType": "ALL"},
+        }
+
+    return boto3.resource("dynamodb").create_table(
+        TableName=TABLE_NAME,
+        BillingMode="PAY_PER_REQUEST",
+        AttributeDefinitions=[
+            {"AttributeName": name, "AttributeType": attribute_type}
+            for name, attribute_type in [("VolumeId", "S"), ("AvailabilityZone", "S"), ("Status", "S"),
+                                         ("PoolKey", "S"), ("LastUsed", "N"), ("ProjectId", "S")]
+        ],
+        KeySchema=[{"AttributeName": "VolumeId", "KeyType": "HASH"}],
+        GlobalSecondaryIndexes=[
+            index("AZ-Status-Index", "AvailabilityZone", "Status"),
+            index("Pool-Index", "PoolKey", "LastUsed"),
+            index("Project-Status-Index", "ProjectId", "Status"),
+        ],
+    )
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("CACHE_POOL_TABLE", TABLE_NAME)
+    with mock_aws():
+        boto3.setup_default_session()
+        yield
+        boto3.DEFAULT_SESSION = None
+
+
+def benchmark_records(fields, *rows, **defaults):
+    """Recorded benchmark results, one per row of values for the fields; the defaults fill the rest."""
+    return [{**defaults, **dict(zip(fields, row))} for row in rows]
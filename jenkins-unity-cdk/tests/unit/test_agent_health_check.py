@@ -0,0 +1,101 @@
+import time
+from datetime import datetime, timezone
+
+import boto3
+
+from .conftest import create_cache_pool_table, load_lambda
+
+HOUR = 3600
+ONLINE = {"offline": False, "temporarilyOffline": False}
+OFFLINE = {"offline": True, "temporarilyOffline": False}
+
+
+def _instance(instance_id, **tags):
+    return {"InstanceId": instance_id, "LaunchTime": datetime(2026, 1, 1, tzinfo=timezone.utc),
+            "Tags": [{"Key": key, "Value": value} for key, value in tags.items()]}
+
+
+def test_a_started_boot_gets_a_grace_period_past_the_deadline(aws):
+    health = load_lambda("agent_health_check")
+    launched = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+
+    def evaluate(minutes, boot=None, node=None):
+        tags = {health.BOOT_PHASE_TAG: f"{boot}@{int(launched + 60)}"} if boot else {}
+        return health.evaluate_instance(_instance("i-booting", **tags), node, launched + minutes * 60)
+
+    assert evaluate(15) is None
+    assert evaluate(25) == "not online after 25 minutes (boot never started)"
+    assert evaluate(25, boot="started") is None
+    assert evaluate(35, boot="started") == "not online after 35 minutes (boot started)"
+    # Online once but never seen so by the check: the grace period applies too
+    assert evaluate(25, boot="online") is None
+    # Disabled on purpose
+    assert evaluate(45, node={"offline": True, "temporarilyOffline": True}) is None
+
+
+def test_offline_drops_count_within_the_window(aws, monkeypatch):
+    health = load_lambda("agent_health_check")
+    tagged = {}
+    monkeypatch.setattr(health, "tag_instance", lambda instance_id, tags: tagged.update(tags))
+    now = time.time()
+    state = {health.NODE_STATE_TAG: "online"}
+
+    # Two earlier drops within the day make the third one replace the agent
+    drops = f"{int(now - 20 * HOUR)} {int(now - HOUR)}"
+    instance = _instance("i-flaky", **state, **{health.OFFLINE_DROPS_TAG: drops})
+    assert health.evaluate_instance(instance, OFFLINE, now) == "dropped offline 3 times in 24 hours"
+
+    # Drops of the previous days, and counts of earlier versions, age out
+    drops = f"{int(now - 30 * HOUR)} {int(now - 25 * HOUR)}"
+    for value in [drops, "7"]:
+        instance = _instance("i-flaky", **state, **{health.OFFLINE_DROPS_TAG: value})
+        assert health.evaluate_instance(instance, OFFLINE, now) is None
+        assert tagged[health.OFFLINE_DROPS_TAG] == str(int(now))
+
+    # Drops caused by the master are not counted, nor is the node's state moved
+    tagged.clear()
+    instance = _instance("i-flaky", **state, **{health.OFFLINE_DROPS_TAG: f"{int(now - HOUR)} {int(now - HOUR)}"})
+    assert health.evaluate_instance(instance, OFFLINE, now, master_restarted=True) is None
+    assert tagged == {}
+
+
+def test_a_master_restart_drops_every_connected_agent(aws):
+    health = load_lambda("agent_health_check")
+    instances = [_instance("i-1", **{health.NODE_STATE_TAG: "online"}),
+                 _instance("i-2", **{health.NODE_STATE_TAG: "online"}),
+                 _instance("i-booting")]
+
+    assert health.dropped_together(instances, {"i-1": OFFLINE, "i-2": None, "i-booting": None})
+    assert not health.dropped_together(instances, {"i-1": OFFLINE, "i-2": ONLINE, "i-booting": None})
+    assert not health.dropped_together(instances[:1], {"i-1": OFFLINE})
+
+
+def test_a_cache_set_stays_in_use_while_its_volumes_are_attached(aws, monkeypatch):
+    table = create_cache_pool_table()
+    ec2 = boto3.client("ec2")
+    image_id = ec2.describe_images(Owners=["amazon"])["Images"][0]["ImageId"]
+    instance_id = ec2.run_instances(ImageId=image_id, MinCount=1, MaxCount=1,
+                                    Placement={"AvailabilityZone": "us-east-1a"})["Instances"][0]["InstanceId"]
+    volume_id = ec2.create_volume(Size=100, AvailabilityZone="us-east-1a")["VolumeId"]
+    ec2.attach_volume(VolumeId=volume_id, InstanceId=instance_id, Device="/dev/sdf")
+    register = load_lambda("register_agent_node")
+    table.put_item(Item={"VolumeId": volume_id, "Status": "InUse", "AvailabilityZone": "us-east-1a",
+                         "ProjectId": "unity-game", "InstanceId": instance_id, "LastUsed": int(time.time()),
+                         "PoolKey": register.cache_sets.held_pool_key(instance_id)})
+
+    # The terminated agent's set is released asynchronously
+    invocations = []
+    monkeypatch.setattr(register.lambda_client, "invoke", lambda **kwargs: invocations.append(kwargs))
+    register.release_cache_sets(instance_id)
+    assert [invocation["InvocationType"] for invocation in invocations] == ["Event"]
+
+    # A volume that does not detach in time keeps the set InUse
+    release = load_lambda("release_cache_volume")
+    with monkeypatch.context() as stuck:
+        stuck.setattr(release.ec2, "detach_volume", lambda **kwargs: None)
+        stuck.setattr(release.ec2, "get_waiter", lambda name: None)
+        assert release.lambda_handler({"volume_id": volume_id, "instance_id": instance_id}, None)["statusCode"] == 500
+    assert table.get_item(Key={"VolumeId": volume_id})["Item"]["Status"] == "InUse"
+
+    assert release.lambda_handler({"volume_id": volume_id, "instance_id": instance_id}, None)["statusCode"] == 200
+    assert table.get_item(Key={"VolumeId": volume_id})["Item"]["Status"] == "Available"
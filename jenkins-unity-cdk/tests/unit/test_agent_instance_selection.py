@@ -0,0 +1,109 @@
+import aws_cdk as cdk
+import aws_cdk.assertions as assertions
+import pytest
+
+from stacks.config_loader import ConfigLoader
+from stacks.iam_stack import IamStack
+from stacks.jenkins_agent_stack import JenkinsAgentStack
+from stacks.lambda_stack import LambdaStack
+from stacks.storage_stack import StorageStack
+from stacks.vpc_stack import VpcStack
+
+# One pool per strategy: linux keeps the default prioritized selection
+SELECTIONS = {
+    "android": {"strategy": "attributes", "vcpu_min": 16, "vcpu_max": 32, "memory_gib_min": 32,
+                "memory_gib_max": 128, "families": ["c6i", "m6i"]},
+    "webgl": {"strategy": "fixed"},
+}
+
+
+@pytest.fixture(scope="module")
+def agent_stack():
+    """The agent stack synthesized from the default config, wired like app.py."""
+    app = cdk.App()
+    config_loader = ConfigLoader(app)
+    config = config_loader.load_config()
+    config["resource_namer"] = lambda resource_type, identifier="": config_loader.get_resource_name(resource_type, identifier)
+    config["s3_bucket_namer"] = lambda bucket_type: config_loader.get_s3_bucket_name(
+        bucket_type, "123456789012", config["aws_region"])
+    for pool in config["jenkins_agents"]["pools"]:
+        if pool["name"] in SELECTIONS:
+            pool["instance_selection"] = SELECTIONS[pool["name"]]
+    pools = {pool["name"]: pool for pool in config["jenkins_agents"]["pools"]}
+    pools["webgl"]["instance_types"] = ["c5.2xlarge", "m5.2xlarge"]
+
+    env = cdk.Environment(account="123456789012", region=config["aws_region"])
+    vpc_stack = VpcStack(app, "vpc", config=config, env=env)
+    storage_stack = StorageStack(app, "storage", config=config, vpc_stack=vpc_stack, env=env)
+    iam_stack = IamStack(app, "iam", config=config, env=env)
+    lambda_stack = LambdaStack(app, "lambda", config=config, vpc_stack=vpc_stack, storage_stack=storage_stack,
+                               iam_stack=iam_stack, env=env)
+    stack = JenkinsAgentStack(app, "agent", config=config, vpc_stack=vpc_stack, storage_stack=storage_stack,
+                              iam_stack=iam_stack, lambda_stack=lambda_stack, env=env)
+    return stack, pools
+
+
+def _mixed_instances_policy(stack, pool_name):
+    groups = assertions.Template.from_stack(stack).find_resources("AWS::AutoScaling::AutoScalingGroup", {
+        "Properties": {"AutoScalingGroupName": f"unity-cicd-jenkins-agent-asg-{pool_name}"}
+    })
+    [group] = groups.values()
+    return group["Properties"]["MixedInstancesPolicy"]
+
+
+def test_prioritized_pools_list_matching_types_cheapest_build_first(agent_stack):
+    stack, pools = agent_stack
+    policy = _mixed_instances_policy(stack, "linux")
+
+    assert policy["InstancesDistribution"]["SpotAllocationStrategy"] == "capacity-optimized-prioritized"
+    assert "SpotInstancePools" not in policy["InstancesDistribution"]
+    instance_types = [override["InstanceType"] for override in policy["LaunchTemplate"]["Overrides"]]
+    selection = pools["linux"]["instance_selection"]
+    rows = stack._load_instance_performance()
+    assert instance_types == [
+        row["instance_type"] for row in rows
+        if row["family"] in selection["families"]
+        and selection["vcpu_min"] <= row["vcpu"] <= selection["vcpu_max"]
+        and selection["memory_gib_min"] <= row["memory_gib"] <= selection["memory_gib_max"]
+    ]
+    # The filters drop what the default selection excludes
+    assert "r5.2xlarge" not in instance_types and "c5.9xlarge" not in instance_types
+    costs = {row["instance_type"]: row["cost_per_build"] for row in rows}
+    assert [costs[instance_type] for instance_type in instance_types] == sorted(costs[t] for t in instance_types)
+
+
+def test_attribute_pools_let_ec2_pick_any_matching_type(agent_stack):
+    stack, _ = agent_stack
+    policy = _mixed_instances_policy(stack, "android")
+
+    assert policy["InstancesDistribution"]["SpotAllocationStrategy"] == "capacity-optimized"
+    assert policy["LaunchTemplate"]["Overrides"] == [{
+        "InstanceRequirements": {
+            "VCpuCount": {"Min": 16, "Max": 32},
+            "MemoryMiB": {"Min": 32768, "Max": 131072},
+            "AllowedInstanceTypes": ["c6i.*", "m6i.*"],
+            "BurstablePerformance": "excluded",
+        }
+    }]
+
+
+def test_fixed_pools_keep_their_types_at_lowest_price(agent_stack):
+    stack, _ = agent_stack
+    policy = _mixed_instances_policy(stack, "webgl")
+
+    assert policy["InstancesDistribution"]["SpotAllocationStrategy"] == "lowest-price"
+    assert policy["InstancesDistribution"]["SpotInstancePools"] == 4
+    assert policy["LaunchTemplate"]["Overrides"] == [
+        {"InstanceType": "c5.2xlarge"}, {"InstanceType": "m5.2xlarge"}
+    ]
+
+
+def test_selections_without_a_type_to_launch_are_rejected(agent_stack):
+    stack, pools = agent_stack
+    no_match = {**pools["linux"], "instance_selection": {**pools["linux"]["instance_selection"], "vcpu_min": 96}}
+    with pytest.raises(ValueError, match="No instance type .* matches the linux pool"):
+        stack._build_instance_overrides(no_match)
+
+    unknown = {**pools["linux"], "instance_selection": {"strategy": "cheapest"}}
+    with pytest.raises(ValueError, match="Unknown instance_selection.strategy for the linux pool: cheapest"):
+        stack._build_instance_overrides(unknown)
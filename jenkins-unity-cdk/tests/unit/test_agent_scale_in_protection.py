@@ -0,0 +1,61 @@
+import boto3
+
+from .conftest import load_lambda
+
+ASG_NAME = "unity-cicd-jenkins-agent-asg-linux"
+
+
+def _create_agent_pool(instances):
+    """An agent Auto Scaling group whose instances launch protected, as the agent stack creates it."""
+    ec2 = boto3.client("ec2")
+    image_id = ec2.describe_images(Owners=["amazon"])["Images"][0]["ImageId"]
+    ec2.create_launch_template(LaunchTemplateName="agent", LaunchTemplateData={"ImageId": image_id,
+                                                                               "InstanceType": "c5.large"})
+    autoscaling = boto3.client("autoscaling")
+    autoscaling.create_auto_scaling_group(
+        AutoScalingGroupName=ASG_NAME, LaunchTemplate={"LaunchTemplateName": "agent"},
+        MinSize=0, MaxSize=instances, DesiredCapacity=instances, AvailabilityZones=["us-east-1a"],
+        NewInstancesProtectedFromScaleIn=True,
+    )
+    group = autoscaling.describe_auto_scaling_groups(AutoScalingGroupNames=[ASG_NAME])["AutoScalingGroups"][0]
+    return sorted(instance["InstanceId"] for instance in group["Instances"])
+
+
+def test_agents_are_released_after_two_idle_runs_and_tagged_on_changes(aws, monkeypatch):
+    agent, builder, booting = _create_agent_pool(3)
+    protection = load_lambda("agent_scale_in_protection")
+    executors = {}
+    monkeypatch.setattr(protection, "get_busy_executors", lambda: dict(executors))
+    create_tags = protection.ec2.create_tags
+    tag_writes = []
+
+    def recorded_create_tags(**kwargs):
+        tag_writes.append((kwargs["Tags"][0]["Value"], sorted(kwargs["Resources"])))
+        return create_tags(**kwargs)
+
+    monkeypatch.setattr(protection.ec2, "create_tags", recorded_create_tags)
+
+    def run():
+        tag_writes.clear()
+        response = protection.lambda_handler({}, None)
+        return response["protected"], response["unprotected"]
+
+    # The booting agent has no node yet: it keeps the protection it launched with
+    executors.update({f"unity-agent-{agent}": 0, f"unity-agent-{builder}": 1})
+    assert run() == ([], [])
+    assert sorted(tag_writes) == [("false", [agent]), ("true", [builder])]
+
+    # Idle again a minute later: released, and no tag rewritten
+    assert run() == ([], [agent])
+    assert tag_writes == []
+
+    # A build on the released agent protects it again at once
+    executors.update({f"unity-agent-{agent}": 2, f"unity-agent-{builder}": 0})
+    assert run() == ([agent], [])
+    assert sorted(tag_writes) == [("false", [builder]), ("true", [agent])]
+
+    group = boto3.client("autoscaling").describe_auto_scaling_groups(
+        AutoScalingGroupNames=[ASG_NAME])["AutoScalingGroups"][0]
+    protected = {instance["InstanceId"]: instance["ProtectedFromScaleIn"] for instance in group["Instances"]}
+    assert protected == {agent: True, builder: True, booting: True}
+    assert run() == ([], [builder])
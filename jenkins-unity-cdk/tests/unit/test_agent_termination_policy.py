@@ -0,0 +1,43 @@
+import time
+
+import boto3
+
+from .conftest import create_cache_pool_table, load_lambda
+
+HOUR = 3600
+
+
+def _instances(*instance_ids):
+    return [{"AvailabilityZone": "us-east-1a", "InstanceId": instance_id, "InstanceMarketOption": "spot"}
+            for instance_id in instance_ids]
+
+
+def test_idle_agents_with_the_coldest_cache_are_terminated_first(aws, monkeypatch):
+    table = create_cache_pool_table()
+    ec2 = boto3.client("ec2")
+    policy = load_lambda("agent_termination_policy")
+    now = int(time.time())
+    hot, cold = (ec2.create_volume(Size=100, AvailabilityZone="us-east-1a")["VolumeId"] for _ in range(2))
+    deleted = ec2.create_volume(Size=100, AvailabilityZone="us-east-1a")["VolumeId"]
+    ec2.delete_volume(VolumeId=deleted)
+    for volume_ids, instance_id, last_used in [([hot], "i-hot", now), ([cold, deleted], "i-cold", now - 72 * HOUR)]:
+        table.put_item(Item={"VolumeId": volume_ids[0], "VolumeIds": volume_ids, "Status": "InUse",
+                             "AvailabilityZone": "us-east-1a", "ProjectId": "unity-game",
+                             "InstanceId": instance_id, "LastUsed": last_used,
+                             "PoolKey": policy.cache_sets.held_pool_key(instance_id)})
+    # Released sets carry no InstanceId
+    table.put_item(Item={"VolumeId": "vol-available", "Status": "Available", "AvailabilityZone": "us-east-1a",
+                         "ProjectId": "unity-game", "LastUsed": now})
+
+    monkeypatch.setattr(policy, "get_busy_executors", lambda: {"unity-agent-i-busy": 1})
+
+    # A deleted member volume does not void the scores
+    values = policy.get_cache_values(["i-hot", "i-cold", "i-busy", "i-new"])
+    assert set(values) == {"i-hot", "i-cold"}
+    assert values["i-hot"] > values["i-cold"] > 0
+
+    event = {"Instances": _instances("i-busy", "i-hot", "i-cold", "i-new"),
+             "CapacityToTerminate": [{"AvailabilityZone": "us-east-1a", "Capacity": 3,
+                                      "InstanceMarketOption": "spot"}],
+             "Cause": "SCALE_IN"}
+    assert policy.lambda_handler(event, None) == {"InstanceIDs": ["i-new", "i-cold", "i-hot"]}
@@ -0,0 +1,59 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "lambda_functions" / "maintain_cache_pool"))
+
+from az_balance import launch_outcomes, plan_moves, zone_targets  # noqa: E402
+
+
+def _launch(zone, status="Successful"):
+    return {"Description": "Launching a new EC2 instance: i-0123", "StatusCode": status,
+            "Details": json.dumps({"Subnet ID": "subnet-1", "Availability Zone": zone})}
+
+
+def test_launch_outcomes_count_launches_failures_and_interruptions():
+    activities = [
+        _launch("us-east-1a"),
+        _launch("us-east-1a"),
+        _launch("us-east-1b"),
+        # Failed Spot launches only name the AZ in the status message
+        {"Description": "Launching a new EC2 instance.  Status Reason: ...", "StatusCode": "Failed", "Details": "{}",
+         "StatusMessage": "We currently do not have sufficient c5.2xlarge capacity in the Availability Zone you requested (us-east-1b)."},
+        {"Description": "Terminating EC2 instance: i-0456", "StatusCode": "Successful",
+         "Details": json.dumps({"Availability Zone": "us-east-1b"}),
+         "Cause": "... in response to an EC2 instance rebalance recommendation."},
+        {"Description": "Terminating EC2 instance: i-0789", "StatusCode": "Successful",
+         "Details": json.dumps({"Availability Zone": "us-east-1a"}), "Cause": "... changing the desired capacity from 2 to 1."},
+    ]
+
+    assert launch_outcomes(activities) == {
+        "us-east-1a": {"launched": 2, "failed": 0, "interrupted": 0},
+        "us-east-1b": {"launched": 1, "failed": 1, "interrupted": 1},
+    }
+
+
+def test_stock_follows_demand_and_spot_reliability():
+    zones = ["us-east-1a", "us-east-1b", "us-east-1c"]
+    outcomes = {
+        "us-east-1a": {"launched": 8, "failed": 0, "interrupted": 0},
+        "us-east-1b": {"launched": 8, "failed": 6, "interrupted": 2},
+    }
+    # Allocations outnumber the launches the activity history still holds in us-east-1c
+    allocations = {"us-east-1a": 5, "us-east-1c": 4}
+
+    targets = zone_targets(6, zones, outcomes, allocations)
+
+    # Same launches in a and b, but half of b's capacity failed or was reclaimed
+    assert targets == {"us-east-1a": 3, "us-east-1b": 2, "us-east-1c": 1}
+    assert zone_targets(6, zones, {}, {}) == {"us-east-1a": 2, "us-east-1b": 2, "us-east-1c": 2}
+
+
+def test_moves_go_from_surplus_to_shortfall_within_the_budget():
+    available = {"us-east-1a": 1, "us-east-1b": 3, "us-east-1d": 2}
+    targets = {"us-east-1a": 4, "us-east-1b": 2}
+
+    assert plan_moves(available, targets, max_moves=5) == [
+        ("us-east-1d", "us-east-1a"), ("us-east-1b", "us-east-1a"), ("us-east-1d", "us-east-1a"),
+    ]
+    assert len(plan_moves(available, targets, max_moves=1)) == 1
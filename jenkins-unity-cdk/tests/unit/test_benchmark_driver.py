@@ -0,0 +1,56 @@
+import base64
+
+import boto3
+
+from benchmarks.driver import BENCHMARK_USER_DATA, BenchmarkDriver, bench_records
+
+PROFILE = {"volume_size": 200, "volume_type": "gp3", "iops": 6000, "throughput": 250}
+
+
+def _driver():
+    ec2 = boto3.client("ec2")
+    image_id = ec2.describe_images(Owners=["amazon"])["Images"][0]["ImageId"]
+    ec2.create_launch_template(LaunchTemplateName="unity-cicd-jenkins-agent-lt-linux", LaunchTemplateData={
+        "ImageId": image_id, "InstanceType": "c5.large",
+        "UserData": base64.b64encode(b"#!/bin/bash\n/opt/jenkins/start-agent.sh\n").decode(),
+    })
+    subnet_id = ec2.describe_subnets()["Subnets"][0]["SubnetId"]
+    return BenchmarkDriver("us-east-1", "unity-cicd-jenkins-agent-lt-linux", subnet_id, "bucket", "bench",
+                           "CacheSetBenchmark")
+
+
+def test_benchmark_instances_replace_the_agent_user_data(aws):
+    driver = _driver()
+
+    instance_id, availability_zone = driver.launch("c6i.4xlarge", "jenkins-agent-cache-set-benchmark")
+
+    user_data = driver.ec2.describe_instance_attribute(InstanceId=instance_id, Attribute="userData")
+    assert base64.b64decode(user_data["UserData"]["Value"]).decode() == BENCHMARK_USER_DATA
+    [instance] = driver.ec2.describe_instances(InstanceIds=[instance_id])["Reservations"][0]["Instances"]
+    assert instance["InstanceType"] == "c6i.4xlarge"
+    tags = {tag["Key"]: tag["Value"] for tag in instance["Tags"]}
+    assert (tags["Name"], tags["Purpose"]) == ("jenkins-agent-cache-set-benchmark", "CacheSetBenchmark")
+    assert availability_zone == instance["Placement"]["AvailabilityZone"]
+
+
+def test_benchmark_volumes_take_the_pool_profile_and_are_deleted(aws):
+    driver = _driver()
+    instance_id, availability_zone = driver.launch("c6i.4xlarge", "jenkins-agent-cache-set-benchmark")
+
+    volume_ids = driver.attach_volumes(instance_id, availability_zone, PROFILE, ["/dev/sdp", "/dev/sdq"],
+                                       "jenkins-agent-cache-set-benchmark")
+
+    volumes = driver.ec2.describe_volumes(VolumeIds=volume_ids)["Volumes"]
+    assert [(volume["Size"], volume["Iops"], volume["Attachments"][0]["Device"]) for volume in volumes] == [
+        (200, 6000, "/dev/sdp"), (200, 6000, "/dev/sdq")]
+    assert sorted(tag["Value"] for volume in volumes for tag in volume["Tags"] if tag["Key"] == "Name") == [
+        "jenkins-agent-cache-set-benchmark-0", "jenkins-agent-cache-set-benchmark-1"]
+
+    driver.delete_volumes(instance_id, volume_ids)
+    assert driver.ec2.describe_volumes(Filters=[{"Name": "tag:Purpose", "Values": ["CacheSetBenchmark"]}])["Volumes"] == []
+
+
+def test_bench_lines_are_the_recorded_results():
+    output = 'Installing fio\nBENCH {"run": 1, "seconds": 60.0}\nBENCH {"run": 2, "seconds": 61.5}\n'
+
+    assert bench_records(output) == [{"run": 1, "seconds": 60.0}, {"run": 2, "seconds": 61.5}]
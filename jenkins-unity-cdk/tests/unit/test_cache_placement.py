@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "lambda_functions" / "allocate_cache_volume"))
+
+from cache_placement import place_instances, rank_zones, warm_hits  # noqa: E402
+
+NOW = 1_700_000_000
+ZONES = ["us-east-1a", "us-east-1b", "us-east-1c"]
+
+
+def _item(volume_id, az, hours_unused, project_id="unity-game", status="Available", width=1):
+    return {"VolumeId": volume_id, "VolumeIds": [volume_id] + [f"{volume_id}-{i}" for i in range(1, width)],
+            "Status": status, "AvailabilityZone": az, "ProjectId": project_id, "LastUsed": NOW - hours_unused * 3600}
+
+
+def test_zones_with_the_freshest_warm_set_come_first():
+    items = [
+        _item("vol-b1", "us-east-1b", 30),
+        _item("vol-c1", "us-east-1c", 2),
+        _item("vol-c2", "us-east-1c", 40),
+        # Other partition, other width, in use, or in an AZ the agents cannot launch in
+        _item("vol-a1", "us-east-1a", 1, project_id="unity-game-android"),
+        _item("vol-a2", "us-east-1a", 1, width=2),
+        _item("vol-a3", "us-east-1a", 1, status="InUse"),
+        _item("vol-d1", "us-east-1d", 1),
+    ]
+
+    ranking = rank_zones(items, ZONES, "unity-game", 1, NOW)
+
+    assert [(z["availability_zone"], z["warm_sets"]) for z in ranking] == [
+        ("us-east-1c", 2), ("us-east-1b", 1), ("us-east-1a", 0),
+    ]
+    assert ranking[0]["freshest_age"] == 2 * 3600
+
+
+def test_instances_take_the_warm_sets_first_and_hits_are_capped_by_them():
+    ranking = rank_zones([_item("vol-c1", "us-east-1c", 2), _item("vol-b1", "us-east-1b", 30)],
+                         ZONES, "unity-game", 1, NOW)
+
+    assert place_instances(ranking, 1) == [("us-east-1c", 1)]
+    assert place_instances(ranking, 4) == [("us-east-1c", 3), ("us-east-1b", 1)]
+    # No capacity in us-east-1c: its instances went to us-east-1a
+    assert warm_hits(ranking, {"us-east-1a": 3, "us-east-1b": 1}) == 1
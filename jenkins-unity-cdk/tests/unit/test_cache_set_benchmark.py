@@ -0,0 +1,36 @@
+from benchmarks.cache_sets import render_report, summarize
+
+from .conftest import benchmark_records
+
+RECORDED = benchmark_records(
+    ("stripe_width", "run", "test", "seconds", "mb_per_s", "exit_code"),
+    (1, 1, "seq_read", 60.0, 250.0),
+    (1, 2, "seq_read", 60.0, 260.0),
+    (2, 1, "seq_read", 60.0, 500.0),
+    (2, 2, "seq_read", 60.0, 9999.0, 1),
+    (1, 1, "import_cold", 900.0),
+    (2, 1, "import_cold", 600.0),
+    (4, 1, "import_cold", 450.0),
+    mb_per_s=0.0, ops_per_s=0.0, exit_code=0,
+)
+
+
+def test_summarize_compares_against_a_single_volume():
+    summaries = {(s["test"], s["stripe_width"]): s for s in summarize(RECORDED)}
+
+    assert summaries[("seq_read", 1)]["value"] == 255.0
+    assert summaries[("seq_read", 1)]["speedup"] == 1.0
+    # The failed run is excluded
+    assert summaries[("seq_read", 2)]["runs"] == 1
+    assert round(summaries[("seq_read", 2)]["speedup"], 2) == 1.96
+    # Shorter import is a speedup
+    assert summaries[("import_cold", 2)]["speedup"] == 1.5
+    assert summaries[("import_cold", 4)]["speedup"] == 2.0
+
+
+def test_report_orders_tests_then_widths():
+    report = render_report(summarize(RECORDED), {"volume_type": "gp3", "volume_size": 200, "iops": 6000, "throughput": 250})
+    rows = [line for line in report.splitlines() if line.startswith("| seq_read") or line.startswith("| import_cold")]
+
+    assert rows[0].startswith("| seq_read | 1 |")
+    assert rows[-1] == "| import_cold | 4 | 1 | 450.0 s | 2.00x |"
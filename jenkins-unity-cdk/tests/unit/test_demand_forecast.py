@@ -0,0 +1,66 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "lambda_functions" / "agent_prescaling"))
+
+from demand_forecast import HOUR, WEEK, backtest, forecast, hourly_demand, plan_capacity, schedule_changes  # noqa: E402
+
+# A Monday at midnight UTC
+MONDAY = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _weekly_history(weeks, peak=4):
+    """Weekdays need `peak` agents from 09:00 to 18:00, nothing otherwise."""
+    history = {}
+    for hour_index in range(weeks * 7 * 24):
+        hour = MONDAY + HOUR * hour_index
+        history[hour] = peak if hour.weekday() < 5 and 9 <= hour.hour < 18 else 0
+    return history
+
+
+def test_hourly_demand_rounds_up_to_whole_agents():
+    busy = {MONDAY: 3, MONDAY + HOUR: 0}
+    queued = {MONDAY: 2}
+
+    assert hourly_demand(busy, queued, num_executors=2) == {MONDAY: 3, MONDAY + HOUR: 0}
+
+
+def test_forecast_uses_quantile_of_the_same_hour_of_week():
+    history = _weekly_history(4)
+    # One unusually busy Monday morning among four weeks
+    history[MONDAY + WEEK * 2 + HOUR * 10] = 8
+    target = MONDAY + WEEK * 4 + HOUR * 10
+
+    assert forecast(history, target, lookback_weeks=4, q=0.5) == 4
+    assert forecast(history, target, lookback_weeks=4, q=1.0) == 8
+    assert forecast(history, MONDAY, lookback_weeks=4, q=0.8) is None
+
+
+def test_schedule_raises_early_and_drops_after_the_peak():
+    start = MONDAY + WEEK * 4
+    plan = plan_capacity(_weekly_history(4), start, 24, lookback_weeks=4, q=0.8,
+                         min_instances=0, max_instances=3)
+
+    changes = schedule_changes(plan, timedelta(minutes=30))
+
+    assert changes == [
+        (start - timedelta(minutes=30), 0),
+        (start + timedelta(hours=8, minutes=30), 3),  # capped at max_instances
+        (start + timedelta(hours=18), 0),
+    ]
+
+
+def test_backtest_reports_avoided_wait():
+    history = _weekly_history(6)
+
+    result = backtest(history, MONDAY + WEEK * 4, MONDAY + WEEK * 6, lookback_weeks=4, q=0.8,
+                      min_instances=0, max_instances=10, boot_minutes=15)
+
+    # Every weekday morning the reactive fleet boots 4 agents while builds wait
+    assert result["hours"] == 2 * 7 * 24
+    assert result["mean_absolute_error"] == 0
+    assert result["reactive_wait_minutes"] == 10 * 4 * 15
+    assert result["predictive_wait_minutes"] == 0
+    assert result["avoided_wait_minutes"] == 600
+    assert result["extra_agent_hours"] == 0
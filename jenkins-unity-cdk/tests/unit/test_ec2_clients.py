@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+import boto3
+import pytest
+from moto import mock_aws
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "lambda_layers" / "ec2_clients" / "python"))
+
+from ec2_clients import RateBudget, budget_ceiling, call_kind  # noqa: E402
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def table(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb")
+        yield dynamodb.create_table(
+            TableName="unity-cicd-ec2-api-budget",
+            KeySchema=[{"AttributeName": "Counter", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "Counter", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+def test_calls_are_budgeted_by_kind():
+    assert call_kind("DescribeVolumes") == "describe"
+    assert call_kind("GetConsoleOutput") == "describe"
+    assert call_kind("CreateVolume") == "mutate"
+    assert call_kind("DetachVolume") == "mutate"
+    assert budget_ceiling(3, 0.5) == 1
+    assert budget_ceiling(1, 0.1) == 1
+
+
+def test_maintenance_stops_at_its_share_and_allocation_takes_the_rest(table):
+    clock = Clock(1_700_000_000.0)
+    rates = {"describe": 10, "mutate": 4}
+    maintain = RateBudget(table, rates, share=0.5, max_wait_seconds=5, clock=clock.time, sleep=clock.sleep)
+    allocate = RateBudget(table, rates, max_wait_seconds=5, clock=clock.time, sleep=clock.sleep)
+
+    assert maintain.acquire("mutate") and maintain.acquire("mutate")
+    assert allocate.acquire("mutate") and allocate.acquire("mutate")
+    assert clock.slept == []
+
+    # The second's budget is spent: the next call waits for the next second
+    assert allocate.acquire("mutate")
+    assert len(clock.slept) == 1 and 1.0 <= clock.slept[0] <= 1.25
+    assert int(clock.now) == 1_700_000_001
+
+    # Describe calls have their own budget
+    assert maintain.acquire("describe")
+
+
+def test_calls_go_out_without_a_token_after_the_longest_wait(table):
+    clock = Clock(1_700_000_000.5)
+    budget = RateBudget(table, {"describe": 1, "mutate": 1}, max_wait_seconds=0, clock=clock.time, sleep=clock.sleep)
+
+    assert budget.acquire("mutate")
+    assert not budget.acquire("mutate")
+    assert clock.slept == []
@@ -0,0 +1,58 @@
+from benchmarks.filesystem_profiles import fastest_profiles, file_sizes, parse_strace, summarize, to_iolog
+
+from .conftest import benchmark_records
+
+STRACE = """\
+100 openat(AT_FDCWD</p>, "/p/Library/ArtifactDB", O_RDONLY|O_CLOEXEC) = 5</p/Library/ArtifactDB>
+100 read(5</p/Library/ArtifactDB>, "db) = 3"..., 4096) = 4096
+101 pread64(5</p/Library/ArtifactDB>,  <unfinished ...>
+100 lseek(5</p/Library/ArtifactDB>, 100, SEEK_SET) = 100
+101 <... pread64 resumed>"x"..., 512, 8192) = 512
+100 openat(AT_FDCWD</p>, "/p/Assets/hero.png", O_RDONLY) = 6</p/Assets/hero.png>
+100 read(6</p/Assets/hero.png>, "png"..., 4096) = 4096
+100 openat(AT_FDCWD</p>, "/p/Library/missing", O_RDONLY) = -1 ENOENT (No such file or directory)
+100 read(5</p/Library/ArtifactDB>, "q"..., 50) = 50
+100 close(5</p/Library/ArtifactDB>) = 0
+""".splitlines(keepends=True)
+
+
+def test_strace_becomes_a_library_iolog():
+    events = parse_strace(STRACE)
+
+    # Positions follow reads and lseek, pread64 carries its own offset
+    assert events == [
+        ("Library/ArtifactDB", "open", 0, 0),
+        ("Library/ArtifactDB", "read", 0, 4096),
+        ("Library/ArtifactDB", "read", 8192, 512),
+        ("Library/ArtifactDB", "read", 100, 50),
+        ("Library/ArtifactDB", "close", 0, 0),
+    ]
+    assert file_sizes(events) == {"Library/ArtifactDB": 8704}
+    assert to_iolog(events).splitlines() == [
+        "fio version 2 iolog",
+        "Library/ArtifactDB add",
+        "Library/ArtifactDB open",
+        "Library/ArtifactDB read 0 4096",
+        "Library/ArtifactDB read 8192 512",
+        "Library/ArtifactDB read 100 50",
+        "Library/ArtifactDB close",
+    ]
+
+
+def test_fastest_profile_by_replay_time_per_instance_type():
+    records = benchmark_records(
+        ("instance_type", "profile", "phase", "seconds", "exit_code"),
+        ("c6i.4xlarge", "ext4-default", "populate", 300), ("c6i.4xlarge", "ext4-default", "replay", 90),
+        ("c6i.4xlarge", "xfs-library", "populate", 200), ("c6i.4xlarge", "xfs-library", "replay", 60),
+        # Fastest replay, but the populate phase failed
+        ("c6i.4xlarge", "ext4-library", "populate", 10, 1), ("c6i.4xlarge", "ext4-library", "replay", 5),
+        ("c5d.2xlarge", "ext4-library", "populate", 250), ("c5d.2xlarge", "ext4-library", "replay", 70),
+        run=1, exit_code=0,
+    )
+
+    summaries = summarize(records)
+
+    assert fastest_profiles(summaries) == {"c5d.2xlarge": "ext4-library", "c6i.4xlarge": "xfs-library"}
+    assert [s["profile"] for s in summaries if s["instance_type"] == "c6i.4xlarge"] == [
+        "xfs-library", "ext4-default", "ext4-library",
+    ]
@@ -0,0 +1,67 @@
+from benchmarks.instance_types import PHASES, rank, render_report, summarize, table_results
+
+from .conftest import benchmark_records
+
+
+def _build(instance_type, run, cache, seconds_per_phase, spot_price, failed_phase=None):
+    return benchmark_records(
+        ("phase", "exit_code"),
+        *((phase, 1 if phase == failed_phase else 0) for phase in PHASES),
+        run_id=f"{instance_type}-{run}", instance_type=instance_type, availability_zone="us-east-1a",
+        cache=cache, seconds=seconds_per_phase, cpu_percent=80.0,
+        iowait_percent=5.0 if cache == "cold" else 1.0, spot_price=spot_price,
+    )
+
+
+RECORDED = (
+    # Fast but expensive: 3 x 400s warm at $0.30/h
+    _build("c6i.4xlarge", 1, "cold", 600, 0.30)
+    + _build("c6i.4xlarge", 1, "warm", 400, 0.30)
+    + _build("c6i.4xlarge", 2, "warm", 420, 0.30)
+    # Slower but cheaper: 3 x 600s warm at $0.14/h
+    + _build("c5.2xlarge", 1, "cold", 1500, 0.14)
+    + _build("c5.2xlarge", 1, "warm", 600, 0.14)
+    + _build("c5.2xlarge", 2, "warm", 9999, 0.14, failed_phase="Build")
+    # Every warm run failed
+    + _build("m5.2xlarge", 1, "warm", 700, 0.16, failed_phase="Import")
+)
+
+
+def test_summarize_uses_median_of_complete_runs():
+    summaries = {(s["instance_type"], s["cache"]): s for s in summarize(RECORDED)}
+
+    c6i = summaries[("c6i.4xlarge", "warm")]
+    assert c6i["runs"] == 2
+    assert c6i["phase_seconds"]["Build"] == 410
+    assert c6i["total_seconds"] == 1230
+
+    c5 = summaries[("c5.2xlarge", "warm")]
+    assert c5["runs"] == 1
+    assert c5["failed_runs"] == 1
+    assert c5["total_seconds"] == 1800
+
+    assert summaries[("c5.2xlarge", "cold")]["iowait_percent"] == 5.0
+
+
+def test_rank_orders_by_cost_per_build_and_skips_failed_types():
+    ranking = rank(summarize(RECORDED), cache="warm")
+
+    assert [row["instance_type"] for row in ranking] == ["c5.2xlarge", "c6i.4xlarge"]
+    assert round(ranking[0]["cost_per_build"], 4) == 0.07
+    assert round(ranking[1]["cost_per_build"], 4) == 0.1025
+
+
+def test_cold_ranking_and_table_results():
+    results = table_results(rank(summarize(RECORDED), cache="cold"))
+
+    assert results == [
+        {"instance_type": "c6i.4xlarge", "build_minutes": 30.0, "spot_price": 0.3},
+        {"instance_type": "c5.2xlarge", "build_minutes": 75.0, "spot_price": 0.14},
+    ]
+
+
+def test_render_report_lists_ranking_and_failed_types():
+    report = render_report(summarize(RECORDED))
+
+    assert "| 1 | c5.2xlarge | 30.0 | 0.1400 | 0.0700 |" in report
+    assert "| m5.2xlarge | warm | 0 | 1 | - | - | - | - | - |" in report
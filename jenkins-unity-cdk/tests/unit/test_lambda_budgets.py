@@ -0,0 +1,29 @@
+from benchmarks.lambda_budgets import budget_violations, call_budget
+
+ALLOCATE = {
+    "calls": {"dynamodb.Query": 1, "dynamodb.UpdateItem": 1},
+    "median_ms": {10: 40, 1000: 70},
+}
+MAINTAIN = {
+    "calls": {10: {"dynamodb.Scan": 7, "ssm.SendCommand": 8}, 1000: {"dynamodb.Scan": 7, "ssm.SendCommand": 998}},
+}
+
+
+def test_calls_over_the_budget_or_not_in_it_are_violations():
+    calls = {"dynamodb.Query": 2, "dynamodb.UpdateItem": 1, "ec2.DescribeVolumes": 1}
+
+    assert budget_violations(calls, 35.0, ALLOCATE, 10) == [
+        "dynamodb.Query: 2 calls, budget 1",
+        "ec2.DescribeVolumes: 1 calls, budget 0",
+    ]
+    assert budget_violations({"dynamodb.Query": 1}, 75.0, ALLOCATE, 1000) == ["median 75.0 ms, budget 70 ms"]
+    # Fewer calls are fine, and pool sizes without a latency budget or timings are not checked
+    assert budget_violations({"dynamodb.Query": 1}, 500.0, ALLOCATE, 50000) == []
+    assert budget_violations({"dynamodb.Query": 1}, None, ALLOCATE, 10) == []
+
+
+def test_call_budgets_per_pool_size_only_apply_at_that_size():
+    assert call_budget(MAINTAIN, 1000) == {"dynamodb.Scan": 7, "ssm.SendCommand": 998}
+    assert call_budget(MAINTAIN, 10000) is None
+    assert budget_violations({"ssm.SendCommand": 9998}, None, MAINTAIN, 10000) == []
+    assert call_budget(ALLOCATE, 10000) == ALLOCATE["calls"]
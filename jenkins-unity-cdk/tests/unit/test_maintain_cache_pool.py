@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta
+from itertools import count
+
+import boto3
+from moto.ec2.models import elastic_block_store
+
+from .conftest import create_cache_pool_table, load_lambda
+
+
+class Clock:
+    """Stands in for the time module, sleeping without waiting."""
+
+    def __init__(self):
+        self.now = 1_800_000_000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_backups_freeze_all_agents_at_once_and_defer_busy_ones(aws, monkeypatch):
+    table = create_cache_pool_table()
+    ec2 = boto3.client("ec2")
+    volumes = {}
+    for instance_id, deferrals in [("i-idle", 0), ("i-busy", 0), ("i-stale", 3), ("i-silent", 0)]:
+        volumes[instance_id] = ec2.create_volume(Size=100, AvailabilityZone="us-east-1a")["VolumeId"]
+        table.put_item(Item={"VolumeId": volumes[instance_id], "Status": "InUse", "AvailabilityZone": "us-east-1a",
+                             "ProjectId": "unity-game", "InstanceId": instance_id, "SnapshotDeferrals": deferrals})
+
+    maintain = load_lambda("maintain_cache_pool")
+    commands = []
+
+    def run_cache_command(instance_ids, action):
+        commands.append((action, sorted(instance_ids)))
+        return f"command-{len(commands)}"
+
+    monkeypatch.setattr(maintain, "time", Clock())
+    monkeypatch.setattr(maintain, "run_cache_command", run_cache_command)
+    # The busy agents hold a Library view, the silent one never answers
+    monkeypatch.setattr(maintain, "command_statuses", lambda command_id: {
+        "i-idle": "Success", "i-busy": "Failed", "i-stale": "Failed", "i-silent": "InProgress",
+    })
+
+    assert maintain.create_backup_snapshots() == (2, 2)
+
+    assert commands == [
+        ("snapshot-freeze", ["i-busy", "i-idle", "i-silent", "i-stale"]),
+        ("snapshot-thaw", ["i-idle"]),
+        ("snapshot-thaw", ["i-silent"]),
+    ]
+    snapshots = ec2.describe_snapshots(Filters=[{"Name": "tag:Purpose", "Values": ["Cache-Backup"]}])["Snapshots"]
+    consistent = {
+        tags["SourceVolume"]: tags["Consistent"]
+        for tags in ({tag["Key"]: tag["Value"] for tag in snapshot["Tags"]} for snapshot in snapshots)
+    }
+    # Deferred three times, the stale set is backed up crash-consistent
+    assert consistent == {volumes["i-idle"]: "true", volumes["i-stale"]: "false"}
+    deferrals = {instance_id: table.get_item(Key={"VolumeId": volume_id})["Item"]["SnapshotDeferrals"]
+                 for instance_id, volume_id in volumes.items()}
+    assert deferrals == {"i-idle": 0, "i-busy": 1, "i-stale": 0, "i-silent": 1}
+
+
+def test_a_striped_set_allocated_while_it_is_snapshotted_is_not_moved(aws, monkeypatch):
+    monkeypatch.setenv("CACHE_PARTITIONS", '{"unity-game": {"stripe_width": 2}}')
+    table = create_cache_pool_table()
+    ec2 = boto3.client("ec2")
+    sets = []
+    for _ in range(2):
+        volume_ids = [ec2.create_volume(Size=100, AvailabilityZone="us-east-1a")["VolumeId"] for _ in range(2)]
+        table.put_item(Item={"VolumeId": volume_ids[0], "VolumeIds": volume_ids, "Status": "Available",
+                             "AvailabilityZone": "us-east-1a", "ProjectId": "unity-game", "LastUsed": 1})
+        sets.append(volume_ids[0])
+
+    maintain = load_lambda("maintain_cache_pool")
+    create_volume_snapshot = maintain.create_volume_snapshot
+
+    def allocated_midway(item, stripe_index, description, consistent):
+        snapshot_id = create_volume_snapshot(item, stripe_index, description, consistent)
+        if item["VolumeId"] == sets[0] and stripe_index == 0:
+            table.update_item(Key={"VolumeId": sets[0]}, UpdateExpression="SET #status = :in_use",
+                              ExpressionAttributeNames={"#status": "Status"},
+                              ExpressionAttributeValues={":in_use": "InUse"})
+        return snapshot_id
+
+    monkeypatch.setattr(maintain, "create_volume_snapshot", allocated_midway)
+    targets = {"unity-game": {"us-east-1a": 0, "us-east-1b": 2}}
+
+    assert maintain.start_moves(targets) == 1
+    moving = {item["VolumeId"]: item for item in maintain.pending_moves()}
+    assert list(moving) == [sets[1]]
+    # Only the snapshots of the set that stayed unused are kept
+    snapshots = ec2.describe_snapshots(Filters=[{"Name": "tag:Purpose", "Values": ["Cache-Backup"]}])["Snapshots"]
+    assert sorted(snapshot["SnapshotId"] for snapshot in snapshots) == sorted(moving[sets[1]]["MoveSnapshots"])
+
+
+def _launch_agent(ec2):
+    image_id = ec2.describe_images(Owners=["amazon"])["Images"][0]["ImageId"]
+    instance = ec2.run_instances(ImageId=image_id, MinCount=1, MaxCount=1,
+                                 Placement={"AvailabilityZone": "us-east-1a"})["Instances"][0]
+    return instance["InstanceId"]
+
+
+def _backup_tags(ec2, **filters):
+    snapshots = ec2.describe_snapshots(Filters=[{"Name": "tag:Purpose", "Values": ["Cache-Backup"]}] + [
+        {"Name": f"tag:{key}", "Values": [value]} for key, value in filters.items()])["Snapshots"]
+    return [{tag["Key"]: tag["Value"] for tag in snapshot["Tags"]} for snapshot in snapshots]
+
+
+def test_a_striped_set_backup_only_snapshots_the_set(aws, monkeypatch):
+    ec2 = boto3.client("ec2")
+    instance_id = _launch_agent(ec2)
+    volume_ids = [ec2.create_volume(Size=100, AvailabilityZone="us-east-1a")["VolumeId"] for _ in range(3)]
+    for volume_id, device in zip(volume_ids, ["/dev/sdg", "/dev/sdf", "/dev/sdp"]):
+        ec2.attach_volume(VolumeId=volume_id, InstanceId=instance_id, Device=device)
+    # The third volume is attached to the agent but not part of its set
+    item = {"VolumeId": volume_ids[0], "VolumeIds": volume_ids[:2], "Status": "InUse",
+            "AvailabilityZone": "us-east-1a", "ProjectId": "unity-game", "InstanceId": instance_id}
+    create_cache_pool_table().put_item(Item=item)
+
+    maintain = load_lambda("maintain_cache_pool")
+    specifications = []
+    create_snapshots = maintain.ec2.create_snapshots
+
+    def recorded_create_snapshots(**kwargs):
+        specifications.append(kwargs["InstanceSpecification"])
+        return create_snapshots(**kwargs)
+
+    monkeypatch.setattr(maintain.ec2, "create_snapshots", recorded_create_snapshots)
+
+    assert maintain.snapshot_cache_sets([item], True) == (1, 0)
+
+    assert specifications == [{"InstanceId": instance_id, "ExcludeBootVolume": True,
+                               "ExcludeDataVolumeIds": [volume_ids[2]]}]
+    backup = sorted((tags["StripeIndex"], tags["SourceVolume"], tags["CacheSet"], tags["StripeWidth"])
+                    for tags in _backup_tags(ec2))
+    assert backup == [("0", volume_ids[0], volume_ids[0], "2"), ("1", volume_ids[1], volume_ids[0], "2")]
+
+
+def test_new_stock_is_restored_from_the_newest_consistent_backup(aws, monkeypatch):
+    monkeypatch.setenv("CACHE_PARTITIONS", '{"unity-game": {"stripe_width": 2, "volume_size": 100, '
+                                           '"volume_type": "gp3", "iops": 3000, "throughput": 125}}')
+    create_cache_pool_table()
+    ec2 = boto3.client("ec2")
+    maintain = load_lambda("maintain_cache_pool")
+    # Snapshot start times are reported to the second; start each backup a minute after the last
+    started = (datetime(2026, 1, 1) + timedelta(minutes=minute) for minute in count())
+    monkeypatch.setattr(elastic_block_store, "utcnow", lambda: next(started))
+
+    def backup(consistent, members=(0, 1)):
+        volume_ids = [ec2.create_volume(Size=100, AvailabilityZone="us-east-1a")["VolumeId"] for _ in range(2)]
+        item = {"VolumeId": volume_ids[0], "VolumeIds": volume_ids, "ProjectId": "unity-game"}
+        snapshot_ids = [maintain.create_volume_snapshot(item, stripe_index, f"Backup of {volume_ids[0]}", consistent)
+                        for stripe_index in members]
+        return snapshot_ids
+
+    backup(True)
+    newest = backup(True)
+    # Newer, but crash-consistent or missing a member
+    backup(False)
+    backup(True, members=(0,))
+
+    assert maintain.ensure_minimum_volumes({"unity-game": {"us-east-1a": 1}}) == 1
+
+    [created] = maintain.cache_sets.available_sets(maintain.dynamodb.Table(maintain.CACHE_POOL_TABLE),
+                                                   "us-east-1a", "unity-game", 2)
+    volumes = ec2.describe_volumes(VolumeIds=created["VolumeIds"])["Volumes"]
+    restored = {volume["VolumeId"]: volume["SnapshotId"] for volume in volumes}
+    assert [restored[volume_id] for volume_id in created["VolumeIds"]] == newest
+
+
+def test_a_set_backed_up_since_its_last_use_moves_from_its_backup(aws, monkeypatch):
+    monkeypatch.setenv("CACHE_PARTITIONS", '{"unity-game": {"stripe_width": 1}}')
+    table = create_cache_pool_table()
+    ec2 = boto3.client("ec2")
+    maintain = load_lambda("maintain_cache_pool")
+    volume_id = ec2.create_volume(Size=100, AvailabilityZone="us-east-1a")["VolumeId"]
+    item = {"VolumeId": volume_id, "Status": "Available", "AvailabilityZone": "us-east-1a",
+            "ProjectId": "unity-game", "LastUsed": 1}
+    table.put_item(Item=item)
+    [backup_id] = [maintain.create_volume_snapshot(item, 0, "Automated backup", True)]
+    maintain.record_snapshot(volume_id, True)
+
+    assert maintain.start_moves({"unity-game": {"us-east-1a": 0, "us-east-1b": 1}}) == 1
+
+    [moving] = maintain.pending_moves()
+    assert moving["MoveSnapshots"] == [backup_id]
+    assert len(_backup_tags(ec2)) == 1
+
+
+def test_backfill_keys_in_use_sets_by_their_instance(aws):
+    table = create_cache_pool_table()
+    maintain = load_lambda("maintain_cache_pool")
+    cache_sets = maintain.cache_sets
+    sets = {
+        "vol-held": {"Status": "InUse", "InstanceId": "i-agent"},
+        "vol-moved": {"Status": "InUse", "InstanceId": "i-new", "PoolKey": cache_sets.held_pool_key("i-old")},
+        "vol-unheld": {"Status": "InUse", "PoolKey": cache_sets.held_pool_key("i-old")},
+        "vol-free": {"Status": "Available", "PoolKey": cache_sets.held_pool_key("i-old")},
+        "vol-warming": {"Status": "Warming", "InstanceId": "i-warmer"},
+    }
+    for volume_id, item in sets.items():
+        table.put_item(Item={"VolumeId": volume_id, "AvailabilityZone": "us-east-1a", "ProjectId": "unity-game",
+                             "LastUsed": 1, **item})
+
+    assert maintain.backfill_pool_keys() == 4
+    keys = {volume_id: table.get_item(Key={"VolumeId": volume_id})["Item"].get("PoolKey") for volume_id in sets}
+    assert keys == {
+        "vol-held": "held#i-agent",
+        "vol-moved": "held#i-new",
+        "vol-unheld": None,
+        "vol-free": "us-east-1a#unity-game#1",
+        "vol-warming": None,
+    }
+
+    policy = load_lambda("agent_termination_policy")
+    assert set(policy.get_in_use_sets(["i-agent", "i-new", "i-old"])) == {"i-agent", "i-new"}
+
+
+def test_stock_is_counted_over_every_write_shard(aws, monkeypatch):
+    table = create_cache_pool_table()
+    maintain = load_lambda("maintain_cache_pool")
+    monkeypatch.setattr(maintain.cache_sets, "INDEX_SHARDS", 4)
+    for index in range(6):
+        item = {"VolumeId": f"vol-{index}", "Status": "Available", "AvailabilityZone": "us-east-1a",
+                "ProjectId": "unity-game", "LastUsed": index}
+        table.put_item(Item={**item, "PoolKey": maintain.cache_sets.available_pool_key(item)})
+
+    assert maintain.ensure_minimum_volumes({"unity-game": {"us-east-1a": 6}}) == 0
+    assert maintain.ensure_minimum_volumes({"unity-game": {"us-east-1a": 8}}) == 2
+    assert len(list(maintain.cache_sets.available_sets(table, "us-east-1a", "unity-game", 1))) == 8
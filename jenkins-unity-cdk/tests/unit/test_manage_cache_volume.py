@@ -0,0 +1,34 @@
+import re
+import subprocess
+from pathlib import Path
+
+SCRIPT = Path(__file__).parents[2] / "packer" / "scripts" / "manage-cache-volume.sh"
+AGENT_STACK = Path(__file__).parents[2] / "stacks" / "jenkins_agent_stack.py"
+
+
+def _run(function, *args, env=None):
+    """Run one function of the agent script (the script itself needs instance metadata)."""
+    source = re.search(rf"^{function}\(\) {{\n.*?^}}\n", SCRIPT.read_text(), re.M | re.S).group(0)
+    return subprocess.run(["bash", "-c", f'{source}\n{function} "$@"', "bash", *args],
+                          capture_output=True, text=True, env=env)
+
+
+def test_the_workspace_root_is_the_agents_work_dir():
+    work_dir = re.search(r"-workDir (\S+)", AGENT_STACK.read_text()).group(1)
+    root = re.search(r"AGENT_WORKSPACE_ROOT=\$\{AGENT_WORKSPACE_ROOT:-(\S+)\}", SCRIPT.read_text()).group(1)
+
+    assert root == f"{work_dir}/workspace"
+
+
+def test_only_job_workspaces_under_the_workspace_root_are_accepted(tmp_path):
+    root = tmp_path / "opt" / "jenkins" / "workspace"
+    (root / "unity-build").mkdir(parents=True)
+    (tmp_path / "home" / "jenkins").mkdir(parents=True)
+    env = {"PATH": "/usr/bin:/bin", "AGENT_WORKSPACE_ROOT": str(root)}
+
+    accepted = _run("check_workspace", str(root / "unity-build" / "."), env=env)
+    assert accepted.returncode == 0
+    assert accepted.stdout.strip() == str(root / "unity-build")
+
+    for path in [tmp_path / "home" / "jenkins", root / ".." / "..", root, root / "missing"]:
+        assert _run("check_workspace", str(path), env=env).returncode == 1
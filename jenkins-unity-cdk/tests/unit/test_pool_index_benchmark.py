@@ -0,0 +1,35 @@
+from benchmarks.pool_index import render_report, summarize
+
+from .conftest import benchmark_records
+
+RECORDED = benchmark_records(
+    ("strategy", "shards", "run", "seconds", "items_read", "hottest_key_share", "claimed", "double_claims"),
+    ("pool-index", 4, 1, 0.5, 10, 0.3),
+    ("az-status", 1, 1, 2.0, 900, 1.0, 10, 3),
+    ("az-status", 1, 2, 1.0, 1000, 1.0, 9),
+    ("pool-index", 1, 1, 1.0, 12, 0.25),
+    concurrency=8, allocations=10, claimed=10, double_claims=0, queries=10,
+    latencies_ms=[float(ms) for ms in range(1, 11)],
+)
+
+
+def test_summarize_compares_reads_and_hot_keys_per_allocation():
+    summaries = {(s["strategy"], s["shards"]): s for s in summarize(RECORDED)}
+
+    az_status = summaries[("az-status", 1)]
+    assert az_status["runs"] == 2
+    assert az_status["throughput"] == 7.5
+    assert az_status["items_read_per_allocation"] == 95.0
+    assert az_status["missed"] == 1
+    assert az_status["double_claims"] == 3
+    assert az_status["p50_ms"] == 5.0
+    assert summaries[("pool-index", 4)]["items_read_per_allocation"] == 1.0
+    assert summaries[("pool-index", 1)]["hottest_key_share"] == 0.25
+
+
+def test_report_lists_strategies_then_shards():
+    report = render_report(summarize(RECORDED), 2000, "moto")
+    rows = [line for line in report.splitlines() if line.startswith("| 8 |")]
+
+    assert [row.split(" | ")[1:3] for row in rows] == [["az-status", "1"], ["pool-index", "1"], ["pool-index", "4"]]
+    assert rows[2] == "| 8 | pool-index | 4 | 20.0 | 5.0 | 10.0 | 1.00 | 1.0 | 30% | 0 | 0 |"
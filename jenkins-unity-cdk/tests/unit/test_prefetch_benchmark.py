@@ -0,0 +1,35 @@
+from benchmarks.prefetch import render_report, summarize
+
+from .conftest import benchmark_records
+
+RECORDED = benchmark_records(
+    ("mode", "run", "import_seconds", "hydration_seconds", "ordered_seconds", "exit_code"),
+    ("lazy", 1, 900.0),
+    ("lazy", 2, 1000.0),
+    ("prefetch", 1, 300.0, 600.0, 90.0),
+    ("prefetch", 2, 5.0, None, None, 1),
+    ("hydrated", 1, 200.0, 580.0, 85.0),
+    hydration_seconds=None, ordered_seconds=None, exit_code=0,
+)
+
+
+def test_summarize_compares_imports_against_a_hydrated_volume():
+    summaries = {s["mode"]: s for s in summarize(RECORDED)}
+
+    assert summaries["lazy"]["import_seconds"] == 950.0
+    assert summaries["lazy"]["slowdown"] == 4.75
+    assert summaries["lazy"]["hydration_seconds"] is None
+    # The failed import is excluded
+    assert summaries["prefetch"]["runs"] == 1
+    assert summaries["prefetch"]["failed_runs"] == 1
+    assert summaries["prefetch"]["slowdown"] == 1.5
+    assert summaries["hydrated"]["slowdown"] == 1.0
+
+
+def test_report_lists_modes_in_order():
+    report = render_report(summarize(RECORDED), "snap-0123")
+    rows = [line for line in report.splitlines() if line.startswith("| lazy") or line.startswith("| prefetch")
+            or line.startswith("| hydrated")]
+
+    assert [row.split(" | ")[0] for row in rows] == ["| lazy", "| prefetch", "| hydrated"]
+    assert rows[0] == "| lazy | 2 | 0 | 950.0 | 4.75x | - | - |"
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "lambda_functions" / "agent_queue_metrics"))
+
+from queue_pools import label_matches, queue_lengths  # noqa: E402
+
+# Every pool carries "unity"
+POOLS = [
+    {"name": "linux", "labels": "unity linux"},
+    {"name": "android", "labels": "unity android"},
+    {"name": "webgl", "labels": "unity webgl"},
+]
+
+
+def _waiting(label=None, buildable=True):
+    why = f"Waiting for next available executor on ‘{label}’" if label else "Waiting for next available executor"
+    return {"buildable": buildable, "why": why}
+
+
+def test_each_queued_build_counts_once_against_the_first_pool_that_can_run_it():
+    items = [
+        _waiting("unity&&android"),
+        _waiting("unity&&android"),
+        _waiting("unity&&linux"),
+        _waiting("unity linux"),
+        # Any pool: the first
+        _waiting("unity"),
+        _waiting(),
+        _waiting("webgl || android"),
+        # Scaled to zero: no agent carries the label yet
+        {"buildable": True, "why": "There are no nodes with the label ‘unity&&webgl’"},
+        # No pool can run it, or it needs no agent yet
+        _waiting("macos"),
+        _waiting("agent-7"),
+        _waiting("unity&&android", buildable=False),
+    ]
+
+    assert queue_lengths(items, POOLS) == {"linux": 4, "android": 3, "webgl": 1}
+
+
+def test_label_expressions():
+    labels = frozenset({"unity", "android"})
+
+    assert label_matches("unity && android", labels)
+    assert label_matches("(linux || android) && !webgl", labels)
+    assert label_matches("linux -> webgl", labels)
+    assert not label_matches("unity && linux", labels)
+    assert not label_matches("unity linux", labels)
@@ -0,0 +1,58 @@
+import importlib.util
+from pathlib import Path
+
+import boto3
+import yaml
+
+SCRIPT = Path(__file__).parents[2] / "rank-instance-types.py"
+
+
+def _load_script():
+    spec = importlib.util.spec_from_file_location("rank_instance_types", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _row(instance_type, vcpu, memory_gib, build_minutes, spot_price):
+    return {"instance_type": instance_type, "family": instance_type.split(".")[0], "vcpu": vcpu,
+            "memory_gib": memory_gib, "build_minutes": build_minutes, "spot_price": spot_price,
+            "source": "estimate"}
+
+
+def test_rank_orders_by_cost_per_build_and_faster_builds_break_ties():
+    rank_instance_types = _load_script()
+    rows = rank_instance_types.rank([
+        _row("c5.4xlarge", 16, 32, 20.0, 0.30),   # $0.10/build
+        _row("c6i.2xlarge", 8, 16, 30.0, 0.16),   # $0.08/build
+        _row("m5.2xlarge", 8, 32, 40.0, 0.12),    # $0.08/build, slower
+    ])
+
+    assert [row["instance_type"] for row in rows] == ["c6i.2xlarge", "m5.2xlarge", "c5.4xlarge"]
+    assert [row["cost_per_build"] for row in rows] == [0.08, 0.08, 0.1]
+
+
+def test_benchmark_results_regenerate_the_table(aws, tmp_path):
+    rank_instance_types = _load_script()
+    table_path = tmp_path / "instance_performance.yaml"
+    rank_instance_types.write_table({"region": "us-east-1", "instance_types": [
+        _row("c5.2xlarge", 8, 16, 30.0, 0.14),
+        _row("c6i.2xlarge", 8, 16, 25.0, 0.15),
+    ]}, table_path)
+
+    table = rank_instance_types.load_table(table_path)
+    rank_instance_types.merge_results(table, [
+        {"instance_type": "c5.2xlarge", "build_minutes": 40.04},
+        # Not in the table yet: its shape comes from EC2, its price from the result
+        {"instance_type": "m5.2xlarge", "build_minutes": 20.0, "spot_price": 0.12},
+    ], boto3.client("ec2"))
+    rank_instance_types.write_table(table, table_path)
+
+    assert table_path.read_text().startswith(rank_instance_types.TABLE_HEADER)
+    rows = yaml.safe_load(table_path.read_text())["instance_types"]
+    assert [(row["instance_type"], row["cost_per_build"], row["source"]) for row in rows] == [
+        ("m5.2xlarge", 0.04, "benchmark"),
+        ("c6i.2xlarge", 0.0625, "estimate"),
+        ("c5.2xlarge", 0.0933, "benchmark"),
+    ]
+    assert rows[0]["vcpu"] == 8 and rows[0]["memory_gib"] == 32
@@ -0,0 +1,121 @@
+import json
+import time
+
+import boto3
+
+from .conftest import create_cache_pool_table, load_lambda
+
+ASG_NAME = "unity-cicd-jenkins-agent-asg-android"
+POOLS = {ASG_NAME: {"name": "android", "labels": "unity android", "num_executors": 2}}
+
+
+class FakeJenkins:
+    """Stands in for the Jenkins HTTP API: its nodes and the posts made to it."""
+
+    def __init__(self, *nodes):
+        self.nodes = set(nodes)
+        self.posts = []
+
+    def node_exists(self, name):
+        return name in self.nodes
+
+    def request(self, path, data=None, timeout=10):
+        if data is None:
+            return b"<jnlp><application-desc><argument>s3cr3t</argument></application-desc></jnlp>"
+        self.posts.append((path, data))
+        if path.startswith("/computer/doCreateItem"):
+            self.nodes.add(json.loads(data["json"])["name"])
+        elif path.endswith("/doDelete"):
+            self.nodes.discard(path.split("/")[2])
+        return b""
+
+
+def _launch_instance():
+    ec2 = boto3.client("ec2")
+    image_id = ec2.describe_images(Owners=["amazon"])["Images"][0]["ImageId"]
+    return ec2.run_instances(ImageId=image_id, MinCount=1, MaxCount=1)["Instances"][0]["InstanceId"]
+
+
+def _event(detail_type, instance_id):
+    return {
+        "detail-type": detail_type,
+        # The event's own time is when it was delivered, not the launch
+        "time": "2020-01-01T00:00:00Z",
+        "detail": {"EC2InstanceId": instance_id, "AutoScalingGroupName": ASG_NAME,
+                   "LifecycleHookName": "agent-launch", "LifecycleActionToken": "token"},
+    }
+
+
+def _load(monkeypatch, jenkins):
+    monkeypatch.setenv("AGENT_POOLS", json.dumps(POOLS))
+    register = load_lambda("register_agent_node")
+    monkeypatch.setattr(register, "JenkinsClient", lambda base_url: jenkins)
+    metrics = []
+    monkeypatch.setattr(register.cloudwatch, "put_metric_data", lambda **kwargs: metrics.extend(kwargs["MetricData"]))
+    completed = []
+    monkeypatch.setattr(register.autoscaling, "complete_lifecycle_action", lambda **kwargs: completed.append(kwargs))
+    return register, metrics, completed
+
+
+def test_a_launched_agent_gets_its_pool_node_and_secret(aws, monkeypatch):
+    jenkins = FakeJenkins()
+    register, metrics, completed = _load(monkeypatch, jenkins)
+    instance_id = _launch_instance()
+
+    response = register.lambda_handler(_event(register.LAUNCH_LIFECYCLE_ACTION, instance_id), None)
+
+    assert response == {"statusCode": 200, "agent_name": f"unity-agent-{instance_id}", "action": "Registered"}
+    [(path, data)] = jenkins.posts
+    node = json.loads(data["json"])
+    assert (node["labelString"], node["numExecutors"]) == ("unity android", "2")
+    parameter = boto3.client("ssm").get_parameter(Name=f"/jenkins/agents/{instance_id}/secret", WithDecryption=True)
+    assert parameter["Parameter"]["Value"] == "s3cr3t"
+    assert parameter["Parameter"]["Type"] == "SecureString"
+    assert [call["LifecycleActionResult"] for call in completed] == ["CONTINUE"]
+    # Measured from the instance's launch, not from the event's time
+    [latency] = metrics
+    assert latency["MetricName"] == "NodeRegistrationLatency"
+    assert 0 <= latency["Value"] < 300
+
+    # A retried event keeps the node and refreshes the secret
+    register.lambda_handler(_event(register.LAUNCH_LIFECYCLE_ACTION, instance_id), None)
+    assert len(jenkins.posts) == 1
+
+
+def test_a_failed_registration_never_holds_the_launch(aws, monkeypatch):
+    jenkins = FakeJenkins()
+    register, metrics, completed = _load(monkeypatch, jenkins)
+    monkeypatch.setattr(jenkins, "request", lambda path, data=None, timeout=10: b"<jnlp></jnlp>")
+
+    response = register.lambda_handler(_event(register.LAUNCH_LIFECYCLE_ACTION, "i-unreachable"), None)
+
+    assert response["statusCode"] == 500
+    assert len(completed) == 1
+    assert metrics == []
+
+
+def test_a_terminated_agent_releases_its_sets_and_loses_its_node_and_secret(aws, monkeypatch):
+    table = create_cache_pool_table()
+    instance_id = _launch_instance()
+    jenkins = FakeJenkins(f"unity-agent-{instance_id}")
+    register, metrics, completed = _load(monkeypatch, jenkins)
+    invocations = []
+    monkeypatch.setattr(register.lambda_client, "invoke", lambda **kwargs: invocations.append(kwargs))
+    boto3.client("ssm").put_parameter(Name=f"/jenkins/agents/{instance_id}/secret", Value="s3cr3t",
+                                      Type="SecureString")
+    boto3.client("ec2").create_tags(Resources=[instance_id], Tags=[{"Key": "jenkins:busy", "Value": "true"}])
+    for volume_id, held_by in [("vol-held", instance_id), ("vol-other", "i-other")]:
+        table.put_item(Item={"VolumeId": volume_id, "Status": "InUse", "AvailabilityZone": "us-east-1a",
+                             "ProjectId": "unity-game", "InstanceId": held_by, "LastUsed": int(time.time()),
+                             "PoolKey": register.cache_sets.held_pool_key(held_by)})
+
+    response = register.lambda_handler(_event(register.TERMINATE_SUCCESSFUL, instance_id), None)
+
+    assert response["action"] == "Deregistered"
+    assert jenkins.nodes == set()
+    assert boto3.client("ssm").describe_parameters()["Parameters"] == []
+    assert [json.loads(invocation["Payload"]) for invocation in invocations] == [
+        {"volume_id": "vol-held", "instance_id": instance_id}
+    ]
+    assert [(metric["MetricName"], metric["Value"]) for metric in metrics] == [("BuildsLostToTermination", 1)]
+    assert completed == []
@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+import boto3
+import pytest
+from moto import mock_aws
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "lambda_layers" / "sdk_profiler" / "python"))
+
+import sdk_profiler  # noqa: E402
+
+
+def _call(operation, ms, retries=0, throttles=0, error=None):
+    return {"operation": operation, "ms": ms, "retries": retries, "throttles": throttles,
+            "request_bytes": 100, "response_bytes": 400, "error": error}
+
+
+def test_operations_are_summed_and_ordered_by_time():
+    calls = [
+        _call("dynamodb.Query", 20.0),
+        _call("ec2.DescribeVolumes", 30.0, retries=2, throttles=2, error="RequestLimitExceeded"),
+        _call("ec2.DescribeVolumes", 25.0),
+    ]
+
+    operations = sdk_profiler.summarize_calls(calls)
+
+    assert list(operations) == ["ec2.DescribeVolumes", "dynamodb.Query"]
+    assert operations["ec2.DescribeVolumes"] == {"calls": 2, "ms": 55.0, "retries": 2, "throttles": 2,
+                                                 "errors": 1, "request_bytes": 200, "response_bytes": 800}
+
+    invocation = sdk_profiler.Invocation("unity-cicd-release-cache-volume", "req-1")
+    for call in calls:
+        invocation.record(call)
+    invocation.duration_ms = 120.0
+    documents = sdk_profiler.metric_documents(invocation.summary(), "JenkinsUnity/SdkCalls", calls)
+
+    assert [document.get("Operation") for document in documents] == [None, "ec2.DescribeVolumes", "dynamodb.Query"]
+    assert documents[0]["SdkTime"] == 75.0
+    assert documents[1]["SdkLatency"] == [30.0, 25.0]
+    assert documents[1]["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Handler", "Operation"]]
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        boto3.setup_default_session()
+        yield
+        boto3.DEFAULT_SESSION = None
+
+
+def test_calls_of_clients_created_after_install_are_recorded(session):
+    assert sdk_profiler.install(enabled=True)
+    ec2 = boto3.client("ec2")
+
+    # Outside an invocation nothing is recorded
+    ec2.describe_volumes()
+    with sdk_profiler.invocation("manage-launch-templates list") as profile:
+        ec2.describe_volumes()
+        with pytest.raises(ec2.exceptions.ClientError):
+            ec2.describe_volumes(VolumeIds=["vol-00000000000000000"])
+
+    summary = profile.summary()
+    assert summary["calls"] == 2
+    assert summary["operations"]["ec2.DescribeVolumes"]["errors"] == 1
+    assert summary["operations"]["ec2.DescribeVolumes"]["request_bytes"] > 0
+    assert summary["duration_ms"] >= summary["sdk_ms"]
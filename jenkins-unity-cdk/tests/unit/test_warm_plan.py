@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[2] / "lambda_functions" / "prewarm_cache_pool"))
+
+from warm_plan import HOUR_SECONDS, plan_warmers  # noqa: E402
+
+NOW = 1_700_000_000
+
+
+def _item(volume_id, az, hours_unused, project_id="unity-game", status="Available", **times):
+    item = {"VolumeId": volume_id, "Status": status, "AvailabilityZone": az, "ProjectId": project_id,
+            "LastUsed": NOW - hours_unused * HOUR_SECONDS}
+    item.update({key: NOW - hours * HOUR_SECONDS for key, hours in times.items()})
+    return item
+
+
+def test_stale_sets_are_grouped_per_az_and_partition_most_stale_first():
+    items = [
+        _item("vol-a1", "us-east-1a", 20),
+        _item("vol-a2", "us-east-1a", 40),
+        _item("vol-a3", "us-east-1a", 30),
+        _item("vol-b1", "us-east-1b", 15),
+        _item("vol-b2", "us-east-1b", 50, project_id="unity-game-android"),
+        # Used recently, warmed recently, failed warming recently, or not Available
+        _item("vol-a4", "us-east-1a", 2),
+        _item("vol-a5", "us-east-1a", 40, LastWarmed=3),
+        _item("vol-a6", "us-east-1a", 40, LastWarmAttempt=1),
+        _item("vol-a7", "us-east-1a", 40, status="InUse"),
+    ]
+
+    warmers = plan_warmers(items, NOW, stale_hours=12, max_warmers=2, volumes_per_warmer=2)
+
+    assert [(w["availability_zone"], w["project_id"]) for w in warmers] == [
+        ("us-east-1b", "unity-game-android"),
+        ("us-east-1a", "unity-game"),
+    ]
+    assert [item["VolumeId"] for item in warmers[1]["items"]] == ["vol-a2", "vol-a3"]